@@ -0,0 +1,84 @@
+from fastapi import APIRouter, HTTPException, Query, Header, Response
+from fastapi.concurrency import run_in_threadpool
+from app.api.v1.endpoints.detection import detection_service
+from app.services.profiler import ProfilerBusy
+from app.core.security import check_token
+from app.core.config import settings
+
+router = APIRouter()
+
+@router.post("/admin/profile")
+async def start_profile(
+    requests: int | None = Query(None, ge=1, description="End after this many detections"),
+    seconds: float | None = Query(None, gt=0, description="End after this long (default 30s, capped at PROFILE_MAX_SECONDS)"),
+    x_admin_token: str | None = Header(None),
+):
+    """
+    Start a profiling session over live traffic
+
+    The session ends after `requests` detections or `seconds`, whichever
+    comes first. Download the result from /admin/profile/{id} once it has
+    finished.
+
+    Returns:
+        The new session's id and counters
+
+    Raises:
+        HTTPException: 401/404 for a bad token or disabled endpoint, 409 if a
+            session is already running
+    """
+    check_token(x_admin_token, settings.ADMIN_API_TOKEN, "admin")
+    if seconds is None:
+        seconds = 30 if requests is None else settings.PROFILE_MAX_SECONDS
+    seconds = min(seconds, settings.PROFILE_MAX_SECONDS)
+    try:
+        # The first session in a process warms up torch.profiler, which blocks for a moment
+        return await run_in_threadpool(detection_service.profiler.start, max_requests=requests, seconds=seconds)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+@router.get("/admin/profile")
+async def profile_status(x_admin_token: str | None = Header(None)):
+    """Running session (if any) and the finished sessions still available for download"""
+    check_token(x_admin_token, settings.ADMIN_API_TOKEN, "admin")
+    return detection_service.profiler.status()
+
+@router.post("/admin/profile/stop")
+async def stop_profile(x_admin_token: str | None = Header(None)):
+    """
+    End the running session early
+
+    Raises:
+        HTTPException: 404 if no session is running
+    """
+    check_token(x_admin_token, settings.ADMIN_API_TOKEN, "admin")
+    # Waits for the artifact to be packed, which can take a moment
+    summary = await run_in_threadpool(detection_service.profiler.stop)
+    if summary is None:
+        raise HTTPException(status_code=404, detail="No profiling session is running")
+    return summary
+
+@router.get("/admin/profile/{session_id}")
+async def download_profile(session_id: str, x_admin_token: str | None = Header(None)):
+    """
+    Download a finished session as a zip
+
+    Contains summary.json, cpu_stacks.txt (collapsed stacks for flamegraph
+    tools), cpu_top.txt, torch_ops.txt, torch_trace_*.json (chrome://tracing)
+    and allocations.txt.
+
+    Raises:
+        HTTPException: 404 for an unknown or expired session, 409 while it is still running
+    """
+    check_token(x_admin_token, settings.ADMIN_API_TOKEN, "admin")
+    try:
+        artifact = detection_service.profiler.artifact(session_id)
+    except ProfilerBusy as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    if artifact is None:
+        raise HTTPException(status_code=404, detail=f"Profiling session {session_id} not found")
+    return Response(
+        content=artifact,
+        media_type="application/zip",
+        headers={"Content-Disposition": f'attachment; filename="profile-{session_id}.zip"'},
+    )
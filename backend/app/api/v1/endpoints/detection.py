@@ -1,106 +1,251 @@
-from fastapi import APIRouter, UploadFile, File, HTTPException
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query, Header
+from fastapi.concurrency import run_in_threadpool
 from app.services.detection_service import DetectionService
-from PIL import Image
-from io import BytesIO
+from app.core.model_catalog import parse_model_selection
+from app.services.admission import LANES, QueueFull
+from app.services.traffic_recorder import TrafficRecorder
+from app.models.preprocessing import compress_image, image_pixels
+from app.core.config import settings
+import time
 
 router = APIRouter()
 
 # Initialize detection service (singleton)
 detection_service = DetectionService()
 
-def compress_image(image_bytes: bytes, max_size_mb: float = 5.0) -> bytes:
+# Samples /detect traffic for python -m app.cli.replay (off unless RECORD_DIR is set)
+traffic_recorder = TrafficRecorder(
+    settings.RECORD_DIR,
+    settings.RECORD_SAMPLE_RATE,
+    images=settings.RECORD_IMAGES,
+    thumbnail_side=settings.RECORD_THUMBNAIL_SIDE,
+    max_requests=settings.RECORD_MAX_REQUESTS,
+)
+
+def resolve_models(models: str | None) -> tuple[str, ...] | None:
+    """Parse the `models` query parameter, turning bad names into a 400"""
+    try:
+        return parse_model_selection(models)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+def resolve_priority(priority: str | None) -> str:
+    """Parse the X-Priority header (interactive | batch), defaulting to interactive"""
+    if priority is None or not priority.strip():
+        return "interactive"
+    priority = priority.strip().lower()
+    if priority not in LANES:
+        raise HTTPException(status_code=400, detail=f"Unknown priority: {priority}. Choose from: {', '.join(LANES)}")
+    return priority
+
+def queue_full_response(e: QueueFull) -> HTTPException:
+    """429 telling the client when the backlog should have drained"""
+    print(f"[DEBUG] Rejected: {e}")
+    return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": str(e.retry_after)})
+
+async def read_image_upload(file: UploadFile, compress: bool = True) -> bytes:
     """
-    Compress image to reduce file size while maintaining quality
+    Validate an uploaded image and compress it for the detectors
 
     Args:
-        image_bytes: Original image bytes
-        max_size_mb: Target max size in MB
+        file: Uploaded image file (PNG, JPG, JPEG, WEBP)
+        compress: Compress to the GPT API size limit. Only needed when
+            ChatGPT Vision runs; the local models resize the image anyway.
 
     Returns:
-        Compressed image bytes
+        Image bytes, compressed to at most 5MB if requested
+
+    Raises:
+        HTTPException: 400 if the file is not an image or exceeds 20MB
     """
-    max_size_bytes = max_size_mb * 1024 * 1024
+    return await prepare_image(await read_upload(file), compress)
 
-    # If already small enough, return as is
-    if len(image_bytes) <= max_size_bytes:
-        return image_bytes
+async def read_upload(file: UploadFile) -> bytes:
+    """
+    Check an upload's content type and read it as received
 
-    # Open image
-    img = Image.open(BytesIO(image_bytes))
+    Raises:
+        HTTPException: 400 if the file is not an image
+    """
+    print(f"[DEBUG] Received file: {file.filename}, content_type: {file.content_type}")
 
-    # Convert RGBA to RGB if needed
-    if img.mode == 'RGBA':
-        img = img.convert('RGB')
+    # Validate file type
+    if not file.content_type or not file.content_type.startswith("image/"):
+        error_msg = f"Invalid file type: {file.content_type}. Must be an image."
+        print(f"[ERROR] {error_msg}")
+        raise HTTPException(status_code=400, detail=error_msg)
 
-    # Calculate resize ratio to target around 2048px max dimension
-    max_dimension = 2048
-    if max(img.size) > max_dimension:
-        ratio = max_dimension / max(img.size)
-        new_size = tuple(int(dim * ratio) for dim in img.size)
-        img = img.resize(new_size, Image.Resampling.LANCZOS)
+    # Read image bytes
+    return await file.read()
 
-    # Compress with progressive quality reduction
-    quality = 85
-    output = BytesIO()
+async def prepare_image(image_bytes: bytes, compress: bool = True) -> bytes:
+    """
+    Check the upload size limit and compress an image for the detectors (see read_image_upload())
 
-    while quality > 20:
-        output.seek(0)
-        output.truncate(0)
-        img.save(output, format='JPEG', quality=quality, optimize=True)
+    Raises:
+        HTTPException: 400 if the image exceeds 20MB
+    """
+    file_size_mb = len(image_bytes) / (1024 * 1024)
+    print(f"[DEBUG] File size: {file_size_mb:.2f} MB")
 
-        if len(output.getvalue()) <= max_size_bytes:
-            break
+    # Validate file size (20MB limit for upload)
+    if len(image_bytes) > 20 * 1024 * 1024:
+        raise HTTPException(status_code=400, detail=f"Image size ({file_size_mb:.2f}MB) exceeds 20MB limit")
 
-        quality -= 5
+    if not compress:
+        return image_bytes
 
-    compressed_bytes = output.getvalue()
-    print(f"[DEBUG] Compressed from {len(image_bytes)/(1024*1024):.2f}MB to {len(compressed_bytes)/(1024*1024):.2f}MB (quality={quality})")
+    # Compress image if needed (target max 5MB for API)
+    return await run_in_threadpool(compress_within_budget, image_bytes)
 
-    return compressed_bytes
+def compress_within_budget(image_bytes: bytes) -> bytes:
+    """compress_image() under the shared decoded-pixel budget"""
+    if len(image_bytes) <= 5.0 * 1024 * 1024:
+        return image_bytes
+    try:
+        pixels = image_pixels(image_bytes)
+    except Exception:
+        pixels = 0  # not an image we can read; compress_image reports the error
+    with detection_service.pixel_budget.acquire(pixels), detection_service.memory.stage("compress"):
+        return compress_image(image_bytes, max_size_mb=5.0)
 
 @router.post("/detect")
-async def detect_deepfake(file: UploadFile = File(...)):
+async def detect_deepfake(
+    file: UploadFile = File(...),
+    models: str | None = Query(None, description="Comma-separated models to run, e.g. 'sbi,distildire'. Defaults to all."),
+    x_priority: str | None = Header(None, description="interactive (default) or batch"),
+):
     """
     Detect if an uploaded image is a deepfake
 
     Args:
         file: Uploaded image file (PNG, JPG, JPEG, WEBP)
+        models: Comma-separated subset of sbi, distildire, chatgpt
+        x_priority: Admission lane; batch callers yield model slots to interactive ones
 
     Returns:
-        Detection results with confidence scores from all models
-    """
-    print(f"[DEBUG] Received file: {file.filename}, content_type: {file.content_type}")
+        Detection results with confidence scores from the selected models;
+        models that were not requested have status "skipped"
 
-    # Validate file type
-    if not file.content_type or not file.content_type.startswith("image/"):
-        error_msg = f"Invalid file type: {file.content_type}. Must be an image."
-        print(f"[ERROR] {error_msg}")
-        raise HTTPException(status_code=400, detail=error_msg)
+    Raises:
+        HTTPException: 429 with Retry-After when a selected model's queue is full
+    """
+    selected = resolve_models(models)
+    priority = resolve_priority(x_priority)
+    record = traffic_recorder.sample()
+    started, start = time.time(), time.perf_counter()
+    timings = {} if record else None
+    status, result, image_bytes = 500, None, b""
 
     try:
-        # Read image bytes
-        image_bytes = await file.read()
-        file_size_mb = len(image_bytes) / (1024 * 1024)
-        print(f"[DEBUG] File size: {file_size_mb:.2f} MB")
-
-        # Validate file size (20MB limit for upload)
-        if len(image_bytes) > 20 * 1024 * 1024:
-            raise HTTPException(status_code=400, detail=f"Image size ({file_size_mb:.2f}MB) exceeds 20MB limit")
-
-        # Compress image if needed (target max 5MB for API)
-        compressed_bytes = compress_image(image_bytes, max_size_mb=5.0)
+        # Keep the upload as received for the recorder; it may be compressed below
+        image_bytes = await read_upload(file)
+        compressed_bytes = await prepare_image(image_bytes, compress=selected is None or "chatgpt" in selected)
 
         # Run detection
-        print(f"[DEBUG] Starting detection...")
-        result = detection_service.detect(compressed_bytes)
+        print(f"[DEBUG] Starting detection (models={','.join(selected) if selected else 'all'})...")
+        # Off the event loop, so concurrent requests can reach the model executors
+        result = await run_in_threadpool(
+            detection_service.detect, compressed_bytes, models=selected, priority=priority, timings=timings
+        )
         print(f"[DEBUG] Detection complete: {result}")
 
+        status = 200
         return result
 
-    except HTTPException:
+    except QueueFull as e:
+        status = 429
+        raise queue_full_response(e)
+    except HTTPException as e:
+        status = e.status_code
         raise
     except Exception as e:
         print(f"[ERROR] Detection error: {type(e).__name__}: {str(e)}")
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=f"Detection failed: {str(e)}")
+    finally:
+        if record:
+            record_request(image_bytes, file.content_type, started, time.perf_counter() - start,
+                           status, selected, priority, result, timings)
+
+
+def record_request(image_bytes: bytes, content_type: str | None, started: float, elapsed: float, status: int,
+                   selected: tuple[str, ...] | None, priority: str, result: dict | None, timings: dict):
+    """
+    Hand a sampled request to the traffic recorder, with the upload as received
+
+    Only queues it (the recorder writes on its own thread), so the response
+    isn't held up. image_bytes is empty for uploads rejected before reading.
+    """
+    models = (result or {}).get("models", {})
+    gpt = models.get("chatgpt", {})
+    traffic_recorder.submit(
+        image_bytes,
+        started=started,
+        latency_ms=round(elapsed * 1000, 2),
+        status=status,
+        models=list(selected) if selected else None,
+        priority=priority,
+        content_type=content_type,
+        tier=(result or {}).get("tier"),
+        model_ms={name: round(seconds * 1000, 2) for name, seconds in timings.items()},
+        model_status={name: model["status"] for name, model in models.items()},
+        gpt_confidence=gpt.get("confidence") if gpt.get("status") == "active" else None,
+    )
+
+@router.get("/queues")
+async def queue_stats():
+    """
+    Admission queue state per model
+
+    Returns:
+        For each model: slots, running and waiting requests per lane, lane
+        depth limits, admitted/rejected counts and average service time
+    """
+    return detection_service.queue_stats()
+
+@router.get("/load")
+async def load_stats():
+    """
+    Current degradation tier
+
+    Returns:
+        The tier serving new requests, the configured tiers, the queue and
+        latency load driving the choice, and the number of tier changes
+    """
+    return detection_service.load_stats()
+
+@router.get("/memory")
+async def memory_stats():
+    """
+    Memory budget state
+
+    Returns:
+        Current and startup RSS, peak RSS and largest growth per stage
+        (compress, sbi, distildire, chatgpt), and decoded-pixel budget usage
+    """
+    return detection_service.memory_stats()
+
+@router.get("/workers")
+async def worker_stats():
+    """
+    Remote inference workers (EXECUTOR_MODE=remote)
+
+    Returns:
+        Per worker: health, served models and checkpoint versions,
+        concurrency, calls in flight from this process, served and failed calls
+    """
+    return detection_service.worker_stats()
+
+@router.get("/recording")
+async def recording_stats():
+    """
+    Traffic recorder state (RECORD_DIR)
+
+    Returns:
+        Whether recording is on, the archive directory, sample rate, image
+        mode, requests recorded so far, the cap, and samples dropped
+        because the writer fell behind
+    """
+    return traffic_recorder.stats()
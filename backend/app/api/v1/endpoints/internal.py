@@ -0,0 +1,83 @@
+from fastapi import APIRouter, HTTPException, Query, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from app.api.v1.endpoints.detection import detection_service, resolve_models, resolve_priority, queue_full_response
+from app.services.admission import QueueFull
+from app.core.tensor_codec import decode_frames
+from app.core.security import check_token
+from app.core.config import settings
+
+router = APIRouter()
+
+
+async def read_capped_body(request: Request, max_mb: int) -> bytes:
+    """
+    Read the request body, refusing it as soon as it exceeds max_mb
+
+    Raises:
+        HTTPException: 400 for a malformed Content-Length, 411 when there is
+            neither a Content-Length nor a chunked body, 413 when too large
+    """
+    max_bytes = max_mb * 1024 * 1024
+    content_length = request.headers.get("content-length")
+    if content_length is not None:
+        content_length = content_length.strip()
+        if not (content_length.isascii() and content_length.isdigit()):
+            raise HTTPException(status_code=400, detail="Invalid Content-Length header")
+        if int(content_length) > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Body exceeds {max_mb}MB")
+    elif "chunked" not in request.headers.get("transfer-encoding", "").lower():
+        raise HTTPException(status_code=411, detail="Content-Length required")
+
+    # The header may understate a chunked or misbehaving client's body
+    chunks, size = [], 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > max_bytes:
+            raise HTTPException(status_code=413, detail=f"Body exceeds {max_mb}MB")
+        chunks.append(chunk)
+    return b"".join(chunks)
+
+
+@router.post("/internal/detect/raw")
+async def detect_raw_frames(
+    request: Request,
+    models: str | None = Query(None, description="Comma-separated subset of 'sbi,distildire'. Defaults to both."),
+    x_internal_token: str | None = Header(None),
+    x_priority: str | None = Header(None, description="interactive (default) or batch"),
+):
+    """
+    Detect deepfakes in already-decoded RGB frames (internal callers only)
+
+    The body is a uint8 array of shape [H, W, 3] or [N, H, W, 3], either as
+    a .npy file or in the RGB8 raw format (see app.core.tensor_codec). The
+    pixels are fed to SBI/DistilDIRE preprocessing without a copy, skipping
+    JPEG compression and decoding.
+
+    Returns:
+        tier, and per frame: is_fake plus the per-model results of /detect
+
+    Raises:
+        HTTPException: 401/404 for a bad token or disabled endpoint, 400 for a
+            malformed body, Content-Length or chatgpt, 411 without a length,
+            413 for oversized requests, 429 when full
+    """
+    check_token(x_internal_token, settings.INTERNAL_API_TOKEN, "internal API")
+    selected = resolve_models(models)
+    priority = resolve_priority(x_priority)
+
+    body = await read_capped_body(request, settings.INTERNAL_MAX_BODY_MB)
+
+    try:
+        frames = decode_frames(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(frames) > settings.INTERNAL_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch of {len(frames)} exceeds {settings.INTERNAL_MAX_BATCH} frames")
+
+    print(f"[DEBUG] Raw detection: {list(frames.shape)} (models={','.join(selected) if selected else 'sbi,distildire'})")
+    try:
+        return await run_in_threadpool(detection_service.detect_frames, frames, models=selected, priority=priority)
+    except QueueFull as e:
+        raise queue_full_response(e)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
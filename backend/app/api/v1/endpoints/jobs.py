@@ -0,0 +1,56 @@
+from functools import partial
+from fastapi import APIRouter, UploadFile, File, HTTPException, Query
+from app.api.v1.endpoints.detection import detection_service, read_image_upload, resolve_models
+from app.services.job_queue import JobQueue, JobWorkerPool
+from app.core.config import settings
+
+router = APIRouter()
+
+# Durable queue + local worker pool sharing the detection service singleton.
+# Workers are started/stopped with the app (see app.main). Jobs run in the
+# batch lane and wait for a model slot instead of being rejected: the
+# worker count already bounds how many are in flight.
+job_queue = JobQueue(settings.JOB_DB_PATH, max_retries=settings.JOB_MAX_RETRIES,
+                     lease_seconds=settings.JOB_LEASE_SECONDS)
+worker_pool = JobWorkerPool(
+    job_queue,
+    partial(detection_service.detect, priority="batch", bounded=False),
+    workers=settings.JOB_WORKERS,
+    result_retention_seconds=settings.JOB_RESULT_RETENTION_SECONDS,
+)
+
+@router.post("/jobs", status_code=202)
+async def create_job(
+    file: UploadFile = File(...),
+    models: str | None = Query(None, description="Comma-separated models to run, e.g. 'sbi,distildire'. Defaults to all."),
+):
+    """
+    Enqueue an image for asynchronous deepfake detection
+
+    Args:
+        file: Uploaded image file (PNG, JPG, JPEG, WEBP)
+        models: Comma-separated subset of sbi, distildire, chatgpt
+
+    Returns:
+        The job id and its initial status; poll GET /jobs/{id} for the result
+    """
+    selected = resolve_models(models)
+    compressed_bytes = await read_image_upload(file, compress=selected is None or "chatgpt" in selected)
+    params = {"models": list(selected)} if selected else {}
+    job_id = job_queue.enqueue(compressed_bytes, params)
+    print(f"[DEBUG] Enqueued job {job_id}")
+    return {"id": job_id, "status": "queued"}
+
+@router.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """
+    Get the status of a detection job
+
+    Returns:
+        Job status (queued, running, done, failed), attempt count, and the
+        detection result once done (same shape as POST /detect)
+    """
+    job = job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return job
@@ -0,0 +1,66 @@
+from fastapi import APIRouter, HTTPException, Query, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from app.core.model_catalog import CHECKPOINT_FILES, parse_model_selection
+from app.services.inference_worker import InferenceWorker, ModelNotLoaded
+from app.core.tensor_codec import decode_frames
+from app.core.security import check_token
+from app.core.config import settings
+
+router = APIRouter()
+
+# Models hosted by this worker (singleton)
+inference_worker = InferenceWorker(
+    [name for name in parse_model_selection(settings.WORKER_MODELS) or CHECKPOINT_FILES if name in CHECKPOINT_FILES],
+    concurrency=settings.WORKER_CONCURRENCY,
+)
+
+@router.get("/worker/health")
+async def worker_health(x_worker_token: str | None = Header(None)):
+    """
+    Models this worker serves and its current load (polled by the API's worker pool)
+
+    Returns:
+        models (kind -> checkpoint version), concurrency, in_flight, and served and failed counts
+    """
+    check_token(x_worker_token, settings.WORKER_API_TOKEN, "worker")
+    return inference_worker.health()
+
+@router.post("/worker/infer/{kind}")
+async def worker_infer(
+    kind: str,
+    request: Request,
+    input_size: int | None = Query(None, ge=32, description="SBI input size (degraded tier); frames are resized to it if needed"),
+    quantized: bool = Query(False, description="Use the int8 copy, if the worker built one"),
+    x_worker_token: str | None = Header(None),
+):
+    """
+    Run one model on a batch of frames
+
+    The body is uint8 [N, H, W, 3] frames in the RGB8 raw or .npy format
+    (see app.core.tensor_codec), normally already resized to the model input.
+
+    Returns:
+        version, and [is_fake, confidence] per frame in "predictions"
+
+    Raises:
+        HTTPException: 401/404 for a bad token or disabled endpoint, 400 for a
+            malformed body, 413 for oversized requests, 503 if the model isn't loaded here
+    """
+    check_token(x_worker_token, settings.WORKER_API_TOKEN, "worker")
+    if kind not in CHECKPOINT_FILES:
+        raise HTTPException(status_code=404, detail=f"Unknown model: {kind}")
+
+    body = await request.body()
+    if len(body) > settings.INTERNAL_MAX_BODY_MB * 1024 * 1024:
+        raise HTTPException(status_code=413, detail=f"Body exceeds {settings.INTERNAL_MAX_BODY_MB}MB")
+    try:
+        frames = decode_frames(body)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if len(frames) > settings.INTERNAL_MAX_BATCH:
+        raise HTTPException(status_code=413, detail=f"Batch of {len(frames)} exceeds {settings.INTERNAL_MAX_BATCH} frames")
+
+    try:
+        return await run_in_threadpool(inference_worker.infer, kind, frames, input_size=input_size, quantized=quantized)
+    except ModelNotLoaded as e:
+        raise HTTPException(status_code=503, detail=str(e))
@@ -0,0 +1,351 @@
+"""
+Offline bulk scanner
+
+Scores a directory tree or a manifest of image paths with the same models
+and thresholds as POST /detect, without the HTTP layer:
+
+- a process pool reads and decodes the images, resizing each one once per
+  model input size
+- SBI/DistilDIRE score them in batches through DetectionService.detect_frames()
+- ChatGPT (optional, paid) runs on the original files alongside each batch
+- results are appended to a CSV file, or to a directory of Parquet part
+  files, every --checkpoint-every images
+
+A rerun with the same --output skips every path already recorded there, so
+an interrupted scan picks up where it stopped.
+
+    cd backend
+    python -m app.cli.bulk_scan /data/images --output scans/nightly.parquet
+    python -m app.cli.bulk_scan --manifest paths.txt --output scan.csv --models sbi,distildire,chatgpt
+"""
+import argparse
+import csv
+import itertools
+import multiprocessing as mp
+import os
+import sys
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import numpy as np
+
+from app.models.preprocessing import compress_image, load_resized_pixels
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".bmp", ".tif", ".tiff")
+
+# Output columns and their types; confidences are empty for models not run
+COLUMNS = {
+    "path": "string",
+    "is_fake": "bool",
+    "sbi_confidence": "float",
+    "sbi_version": "string",
+    "distildire_confidence": "float",
+    "distildire_version": "string",
+    "chatgpt_confidence": "float",
+    "chatgpt_version": "string",
+    "error": "string",
+    "scanned_at": "string",
+}
+
+
+def iter_paths(root: str | None, manifest: str | None):
+    """
+    Image paths from a directory walk (sorted, so reruns see the same order)
+    or a manifest: one path per line, or a CSV file with a "path" column
+    """
+    if manifest:
+        with open(manifest, newline="") as f:
+            if manifest.endswith(".csv"):
+                for row in csv.DictReader(f):
+                    yield row["path"]
+            else:
+                for line in f:
+                    line = line.strip()
+                    if line and not line.startswith("#"):
+                        yield line
+        return
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for name in sorted(filenames):
+            if name.lower().endswith(IMAGE_EXTENSIONS):
+                yield os.path.join(dirpath, name)
+
+
+def decode(path: str, sizes: tuple[int, ...]):
+    """Worker: read and decode one image. Returns (path, {size: uint8 pixels} or None, error)"""
+    try:
+        with open(path, "rb") as f:
+            return path, load_resized_pixels(f.read(), sizes), None
+    except Exception as e:
+        return path, None, f"{type(e).__name__}: {e}"
+
+
+def decode_all(paths, sizes: tuple[int, ...], workers: int, prefetch: int):
+    """Decode in a process pool, yielding in input order and at most prefetch images ahead"""
+    pool = ProcessPoolExecutor(workers, mp_context=mp.get_context("spawn"))
+    pending = deque()
+    try:
+        for path in paths:
+            pending.append(pool.submit(decode, path, sizes))
+            if len(pending) >= prefetch:
+                yield pending.popleft().result()
+        while pending:
+            yield pending.popleft().result()
+    finally:
+        pool.shutdown(cancel_futures=True)
+
+
+class CsvResults:
+    """Results appended to a single CSV file"""
+
+    def __init__(self, path: str):
+        self.path = path
+        self._drop_partial_line()
+
+    def _drop_partial_line(self):
+        # A crash mid-write can leave half a row at the end; cut it so the
+        # next append starts on a fresh line (that image is simply rescanned)
+        if not os.path.exists(self.path):
+            return
+        with open(self.path, "rb+") as f:
+            size = f.seek(0, os.SEEK_END)
+            tail_start = max(0, size - 65536)
+            f.seek(tail_start)
+            tail = f.read()
+            if tail.endswith(b"\n") or not tail:
+                return
+            cut = tail.rfind(b"\n")
+            f.truncate(tail_start + cut + 1 if cut >= 0 else 0)
+
+    def recorded(self) -> dict[str, str | None]:
+        """Path -> error of every row written so far (the last row wins)"""
+        if not os.path.exists(self.path):
+            return {}
+        with open(self.path, newline="") as f:
+            return {row["path"]: row["error"] or None for row in csv.DictReader(f)}
+
+    def write(self, rows: list[dict]):
+        new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        with open(self.path, "a", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=list(COLUMNS))
+            if new:
+                writer.writeheader()
+            writer.writerows(rows)
+            f.flush()
+            os.fsync(f.fileno())
+
+
+class ParquetResults:
+    """Results written to a directory of part files, one per checkpoint"""
+
+    def __init__(self, path: str):
+        try:
+            import pyarrow
+            import pyarrow.parquet
+        except ImportError:
+            print("[ERROR] Parquet output needs pyarrow (pip install pyarrow); use a .csv --output instead")
+            sys.exit(2)
+        self.pa, self.pq = pyarrow, pyarrow.parquet
+        types = {"string": pyarrow.string(), "bool": pyarrow.bool_(), "float": pyarrow.float64()}
+        self.schema = pyarrow.schema([(name, types[kind]) for name, kind in COLUMNS.items()])
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    def _parts(self) -> list[str]:
+        return sorted(name for name in os.listdir(self.path) if name.startswith("part-") and name.endswith(".parquet"))
+
+    def recorded(self) -> dict[str, str | None]:
+        """Path -> error of every row written so far (the last row wins)"""
+        recorded = {}
+        for name in self._parts():
+            table = self.pq.read_table(os.path.join(self.path, name), columns=["path", "error"])
+            recorded.update(zip(table.column("path").to_pylist(), table.column("error").to_pylist()))
+        return recorded
+
+    def write(self, rows: list[dict]):
+        parts = self._parts()
+        index = int(parts[-1][len("part-"):-len(".parquet")]) + 1 if parts else 0
+        name = f"part-{index:06d}.parquet"
+        # Write then rename, so a crash never leaves a truncated part behind
+        tmp = os.path.join(self.path, f".{name}.tmp")
+        self.pq.write_table(self.pa.Table.from_pylist(rows, schema=self.schema), tmp)
+        os.replace(tmp, os.path.join(self.path, name))
+
+
+def open_results(path: str):
+    """CSV for a .csv path, otherwise a Parquet part directory"""
+    if path.endswith(".csv"):
+        return CsvResults(path)
+    return ParquetResults(path)
+
+
+def score_gpt(service, path: str) -> dict:
+    """ChatGPT Vision on the original file, compressed as /detect does"""
+    try:
+        with open(path, "rb") as f:
+            image_bytes = compress_image(f.read(), max_size_mb=5.0)
+    except Exception as e:
+        return {"confidence": None, "status": "error", "version": None, "error": f"{type(e).__name__}: {e}"}
+    return service.detect(image_bytes, models=("chatgpt",), priority="batch", bounded=False)["models"]["chatgpt"]
+
+
+def score_batch(service, batch: list[tuple], local: tuple[str, ...], sizes: dict[str, int],
+                gpt_pool: ThreadPoolExecutor | None, thresholds: dict[str, float]) -> list[dict]:
+    """One output row per (path, pixels, error) in batch"""
+    scanned_at = datetime.now(timezone.utc).isoformat(timespec="seconds")
+    rows = []
+    for path, _, error in batch:
+        row = dict.fromkeys(COLUMNS)
+        row.update(path=path, error=error, scanned_at=scanned_at)
+        rows.append(row)
+    decoded = [i for i, (_, pixels, _) in enumerate(batch) if pixels is not None]
+
+    # GPT calls are network-bound: start them first and collect after the local models
+    gpt = {i: gpt_pool.submit(score_gpt, service, batch[i][0]) for i in decoded} if gpt_pool else {}
+
+    results = {i: {} for i in decoded}
+    for name in local:
+        if not decoded:
+            break
+        frames = np.stack([batch[i][1][sizes[name]] for i in decoded])
+        scored = service.detect_frames(frames, models=(name,), priority="batch", bounded=False)["frames"]
+        for i, frame in zip(decoded, scored):
+            results[i][name] = frame["models"][name]
+    for i, future in gpt.items():
+        results[i]["chatgpt"] = future.result()
+
+    for i, per_model in results.items():
+        row = rows[i]
+        errors = []
+        for name, result in per_model.items():
+            if result["status"] == "active":
+                row[f"{name}_confidence"] = result["confidence"]
+                row[f"{name}_version"] = result["version"]
+            else:
+                errors.append(f"{name}: {result.get('error', result['status'])}")
+        row["error"] = "; ".join(errors) or None
+        row["is_fake"] = any(
+            row[f"{name}_confidence"] is not None and row[f"{name}_confidence"] >= thresholds[name]
+            for name in per_model
+        )
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Score a directory or manifest of images offline")
+    parser.add_argument("root", nargs="?", help="Directory to scan recursively")
+    parser.add_argument("--manifest", help="File with one image path per line, or a CSV with a 'path' column")
+    parser.add_argument("--output", required=True,
+                        help="Results: a .csv file, or a directory of Parquet parts for any other path")
+    parser.add_argument("--models", default="sbi,distildire",
+                        help="Models to run; chatgpt makes one paid API call per image")
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--workers", type=int, default=max(1, (os.cpu_count() or 2) // 2),
+                        help="Decoder processes")
+    parser.add_argument("--checkpoint-every", type=int, default=1000,
+                        help="Images per write to --output (at most this many are rescanned after a crash)")
+    parser.add_argument("--retry-errors", action="store_true", help="Rescan paths whose recorded row has an error")
+    parser.add_argument("--limit", type=int, help="Stop after this many new images")
+    parser.add_argument("--report-every", type=float, default=10, help="Seconds between progress lines")
+    args = parser.parse_args()
+    if bool(args.root) == bool(args.manifest):
+        parser.error("give either a directory or --manifest")
+
+    # Imported here so --help and the decoder processes don't load the models
+    from app.core.config import settings
+    from app.models import sbi_model, distildire_model
+    from app.core.model_catalog import parse_model_selection
+    from app.services.detection_service import MODEL_NAMES, THRESHOLDS, DetectionService
+
+    try:
+        models = parse_model_selection(args.models) or MODEL_NAMES
+    except ValueError as e:
+        parser.error(str(e))
+    local = tuple(name for name in models if name != "chatgpt")
+    sizes = {"sbi": sbi_model.INPUT_SIZE, "distildire": distildire_model.INPUT_SIZE}
+
+    results = open_results(args.output)
+    recorded = results.recorded()
+    done = {path for path, error in recorded.items() if not (args.retry_errors and error)}
+    if recorded:
+        print(f"[DEBUG] Resuming: {len(recorded)} paths already in {args.output}, {len(recorded) - len(done)} to retry")
+
+    # A scan runs at full quality on one pinned checkpoint per model: no
+    # degradation tiers and no hot reload halfway through
+    settings.DEGRADATION_TIERS = ""
+    settings.MODEL_RELOAD_INTERVAL = 0
+    service = DetectionService()
+    missing = [name for name in local if not service.registries[name].available]
+    if missing:
+        print(f"[ERROR] No checkpoint for {', '.join(missing)}; refusing to record placeholder scores")
+        service.close()
+        sys.exit(2)
+
+    skipped = [0]
+
+    def todo():
+        for path in iter_paths(args.root, args.manifest):
+            if path in done:
+                skipped[0] += 1
+            else:
+                yield path
+
+    paths = itertools.islice(todo(), args.limit) if args.limit else todo()
+    gpt_pool = ThreadPoolExecutor(settings.CHATGPT_CONCURRENCY) if "chatgpt" in models else None
+
+    scanned = errors = 0
+    pending_rows, batch = [], []
+    decode_wait = model_time = 0.0
+    start = last_report = time.perf_counter()
+
+    def flush(rows):
+        nonlocal scanned, errors, pending_rows, last_report
+        pending_rows += rows
+        scanned += len(rows)
+        errors += sum(1 for row in rows if row["error"])
+        if len(pending_rows) >= args.checkpoint_every:
+            results.write(pending_rows)
+            pending_rows = []
+        now = time.perf_counter()
+        if now - last_report >= args.report_every:
+            last_report = now
+            print(f"[DEBUG] {scanned} scanned ({errors} errors, {skipped[0]} skipped), "
+                  f"{scanned / (now - start):.1f} images/s")
+
+    try:
+        waited = time.perf_counter()
+        for item in decode_all(paths, tuple(sizes[name] for name in local), args.workers, prefetch=2 * args.batch_size):
+            decode_wait += time.perf_counter() - waited
+            batch.append(item)
+            if len(batch) >= args.batch_size:
+                t = time.perf_counter()
+                rows = score_batch(service, batch, local, sizes, gpt_pool, THRESHOLDS)
+                model_time += time.perf_counter() - t
+                batch = []
+                flush(rows)
+            waited = time.perf_counter()
+        if batch:
+            t = time.perf_counter()
+            flush(score_batch(service, batch, local, sizes, gpt_pool, THRESHOLDS))
+            model_time += time.perf_counter() - t
+    except KeyboardInterrupt:
+        print("⚠ Interrupted; saving what was scanned so far")
+    finally:
+        if pending_rows:
+            results.write(pending_rows)
+        if gpt_pool:
+            gpt_pool.shutdown(cancel_futures=True)
+        service.close()
+
+    elapsed = time.perf_counter() - start
+    print(f"\n{scanned} images in {elapsed:.1f}s ({scanned / max(elapsed, 1e-9):.1f} images/s), "
+          f"{errors} errors, {skipped[0]} already scanned")
+    print(f"  waiting on decode {decode_wait:.1f}s, scoring {model_time:.1f}s "
+          f"({args.workers} decoder processes, batch {args.batch_size})")
+    print(f"✓ Results in {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""
+Import-time budget for the API modules and the CLIs
+
+Imports each entry point in a fresh interpreter (python -X importtime) and
+checks that:
+
+- heavy packages stay out of modules that don't need them at import time.
+  The API (app.main) and the model modules, for instance, must not load
+  torch, numpy, torchvision, timm or efficientnet_pytorch until a model is
+  built, and launchers like app.cli.inference_worker must not load torch
+  at all
+- import time stays within --tolerance of a recorded baseline, when one is
+  given. Record it on the machine the check runs on (CI), not a laptop
+
+    cd backend
+    python -m app.cli.import_budget                                  # report + import rules
+    python -m app.cli.import_budget --write-baseline import_times.json
+    python -m app.cli.import_budget --baseline import_times.json --tolerance 25
+
+Exits with status 1 if a module imports a package it must not, or its
+import time regressed past the tolerance.
+"""
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+
+MODEL_LIBS = ("torchvision", "timm", "efficientnet_pytorch")
+LAZY = ("torch", "numpy") + MODEL_LIBS
+
+# Module -> packages it must not import. torch and numpy load with the first
+# model or decoded frame; app.main is imported with no checkpoints (see ENV),
+# so what it pulls in is the API's own startup path
+TARGETS = {
+    "app.main": LAZY,
+    "app.core.config": ("torch", "openai"),
+    "app.models.chatgpt_vision": ("openai", "torch"),
+    "app.models.sbi_model": LAZY + ("openai",),
+    "app.models.distildire_model": LAZY + ("openai",),
+    "app.services.detection_service": LAZY + ("openai",),
+    "app.services.remote_workers": LAZY + ("openai",),
+    "app.services.inference_worker": LAZY + ("openai",),
+    "app.worker": LAZY + ("openai",),
+    "app.cli.inference_worker": ("torch", "openai"),
+    "app.cli.bulk_scan": ("torch",) + MODEL_LIBS + ("openai",),
+    "app.cli.memory_stress": ("torch", "openai"),
+    "app.cli.replay": ("torch", "openai"),
+}
+
+# Imports run without checkpoints, reload watchers or a real API key, so
+# importing app.main builds placeholder models instead of loading them
+ENV = {
+    "MODEL_SBI_PATH": os.path.join(tempfile.gettempdir(), "import-budget-no-models"),
+    "MODEL_DISTILDIRE_PATH": os.path.join(tempfile.gettempdir(), "import-budget-no-models"),
+    "MODEL_RELOAD_INTERVAL": "0",
+    "OPENAI_API_KEY": "import-budget",
+    "JOB_DB_PATH": os.path.join(tempfile.gettempdir(), "import-budget-jobs.sqlite3"),
+    "RECORD_DIR": "",
+    "EXECUTOR_MODE": "inprocess",
+}
+
+_LINE = re.compile(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)")
+
+
+def measure(module: str) -> tuple[float, dict[str, float]]:
+    """
+    Import module in a fresh interpreter
+
+    Returns:
+        (milliseconds to import it, {top-level package: cumulative ms} of
+        everything it pulled in)
+
+    Raises:
+        RuntimeError: If the import fails
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True, text=True, cwd=os.getcwd(), env={**os.environ, **ENV},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    total, packages = None, {}
+    for line in result.stderr.splitlines():
+        match = _LINE.match(line)
+        if not match:
+            continue
+        cumulative, name = int(match.group(2)) / 1000, match.group(4)
+        top = name.split(".")[0]
+        # Nested modules report first; the package's own line has the largest figure
+        packages[top] = max(packages.get(top, 0), cumulative)
+        if name == module:
+            total = cumulative
+    if total is None:
+        raise RuntimeError(f"No import time reported for {module} (already imported by sitecustomize?)")
+    return total, packages
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check import times and heavy imports of the API and CLI modules")
+    parser.add_argument("modules", nargs="*", help=f"Modules to check (default: {len(TARGETS)} entry points)")
+    parser.add_argument("--repeat", type=int, default=3, help="Fresh imports per module; the fastest counts")
+    parser.add_argument("--baseline", help="JSON of milliseconds per module to compare against")
+    parser.add_argument("--tolerance", type=float, default=25, help="Allowed slowdown over the baseline, in percent")
+    parser.add_argument("--min-delta-ms", type=float, default=50,
+                        help="Ignore slowdowns smaller than this, whatever the percentage")
+    parser.add_argument("--write-baseline", help="Write the measured times here")
+    parser.add_argument("--top", type=int, default=4, help="Heaviest packages listed per module")
+    args = parser.parse_args()
+
+    modules = args.modules or list(TARGETS)
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+
+    times, failures = {}, []
+    print(f"{'module':<34} {'ms':>8} {'baseline':>9}  heaviest imports")
+    for module in modules:
+        try:
+            runs = [measure(module) for _ in range(args.repeat)]
+        except RuntimeError as e:
+            print(f"[ERROR] {e}")
+            failures.append(f"{module}: import failed")
+            continue
+        ms, packages = min(runs, key=lambda run: run[0])
+        times[module] = round(ms, 1)
+
+        own = module.split(".")[0]
+        heaviest = sorted(((t, name) for name, t in packages.items() if name != own), reverse=True)[:args.top]
+        before = baseline.get(module)
+        print(f"{module:<34} {ms:>8.0f} {'-' if before is None else f'{before:.0f}':>9}  "
+              + ", ".join(f"{name} {t:.0f}" for t, name in heaviest))
+
+        forbidden = sorted(set(TARGETS.get(module, ())) & packages.keys())
+        if forbidden:
+            failures.append(f"{module} imports {', '.join(forbidden)}")
+        if before is not None and ms > before * (1 + args.tolerance / 100) and ms - before > args.min_delta_ms:
+            failures.append(f"{module} import took {ms:.0f}ms, baseline {before:.0f}ms (+{(ms - before) / before:.0%})")
+
+    if args.write_baseline:
+        with open(args.write_baseline, "w") as f:
+            json.dump(times, f, indent=2)
+        print(f"\n✓ Baseline written to {args.write_baseline}")
+
+    if failures:
+        print("\n✗ Import budget exceeded:")
+        for failure in failures:
+            print(f"  {failure}")
+        sys.exit(1)
+    print("\n✓ Import budget met")
+
+
+if __name__ == "__main__":
+    main()
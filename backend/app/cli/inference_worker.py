@@ -0,0 +1,128 @@
+"""
+Start inference workers for EXECUTOR_MODE=remote
+
+One worker per host in production; several on one machine for testing
+routing and failover:
+
+    cd backend
+    python -m app.cli.inference_worker --port 8100                 # one worker, all cores
+    python -m app.cli.inference_worker --count 3 --port 8101 --cores 0-11
+
+Each worker is a uvicorn process serving app.worker:app. It loads the
+checkpoints from MODEL_SBI_PATH / MODEL_DISTILDIRE_PATH on its own host.
+With --cores, the cores are split evenly between local workers and each
+worker is pinned to its share. The command prints the REMOTE_WORKERS and
+WORKER_API_TOKEN settings for the API, and runs until interrupted. A worker
+that exits (e.g. killed to test failover) is restarted unless
+--no-restart is given.
+"""
+import argparse
+import os
+import secrets
+import signal
+import subprocess
+import sys
+import time
+import urllib.request
+
+from app.core.config import settings
+from app.core.cpu_affinity import parse_cores
+
+
+def spawn(port: int, host: str, env: dict, cores: list[int], threads: int) -> subprocess.Popen:
+    env = {**env, "OMP_NUM_THREADS": str(threads)}
+    process = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.worker:app", "--host", host, "--port", str(port), "--log-level", "warning"],
+        env=env,
+    )
+    if cores and hasattr(os, "sched_setaffinity"):
+        # Set on the child before it imports torch, so its thread pool fits the share
+        os.sched_setaffinity(process.pid, cores)
+    return process
+
+
+def wait_ready(url: str, process: subprocess.Popen, timeout: float) -> bool:
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if process.poll() is not None:
+            return False
+        try:
+            with urllib.request.urlopen(f"{url}/health", timeout=2) as response:
+                if response.status == 200:
+                    return True
+        except OSError:
+            pass
+        time.sleep(0.5)
+    return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run SBI/DistilDIRE inference workers for a remote-mode API")
+    parser.add_argument("--count", type=int, default=1, help="Workers to start on this machine")
+    parser.add_argument("--port", type=int, default=8100, help="Port of the first worker; the others follow")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (0.0.0.0 for other hosts)")
+    parser.add_argument("--models", default=settings.WORKER_MODELS or "sbi,distildire")
+    parser.add_argument("--concurrency", type=int, default=settings.WORKER_CONCURRENCY,
+                        help="Inference calls each worker runs at once")
+    parser.add_argument("--cores", default="", help="Cores to split between the workers, e.g. 0-11")
+    parser.add_argument("--token", default=settings.WORKER_API_TOKEN,
+                        help="Shared token (default: WORKER_API_TOKEN, or a random one)")
+    parser.add_argument("--start-timeout", type=float, default=300, help="Seconds to wait for each worker to load")
+    parser.add_argument("--no-restart", dest="restart", action="store_false", help="Leave exited workers down")
+    args = parser.parse_args()
+
+    token = args.token or secrets.token_urlsafe(24)
+    env = {**os.environ, "WORKER_API_TOKEN": token, "WORKER_MODELS": args.models,
+           "WORKER_CONCURRENCY": str(args.concurrency)}
+    cores = parse_cores(args.cores)
+    per_worker = max(1, len(cores) // args.count) if cores else 0
+    shares = []
+    for i in range(args.count):
+        share = cores[i * per_worker:(i + 1) * per_worker]
+        if cores and not share:
+            share = [cores[i % len(cores)]]  # more workers than cores: wrap around
+        shares.append(share)
+    # Unpinned workers still split the machine instead of each taking every core
+    threads = [len(share) or max(1, (os.cpu_count() or 1) // args.count) for share in shares]
+
+    ports = [args.port + i for i in range(args.count)]
+    advertised = "127.0.0.1" if args.host in ("0.0.0.0", "::") else args.host
+    urls = [f"http://{advertised}:{port}" for port in ports]
+    processes = [spawn(port, args.host, env, share, n) for port, share, n in zip(ports, shares, threads)]
+
+    def stop(*_):
+        for process in processes:
+            if process.poll() is None:
+                process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        sys.exit(0)
+
+    signal.signal(signal.SIGTERM, stop)
+    try:
+        for url, process in zip(urls, processes):
+            if not wait_ready(url, process, args.start_timeout):
+                print(f"[ERROR] Worker {url} did not start")
+                stop()
+            print(f"✓ Worker {url} ready")
+
+        print("\nAPI settings:")
+        print("  EXECUTOR_MODE=remote")
+        print(f"  REMOTE_WORKERS={','.join(urls)}")
+        print(f"  WORKER_API_TOKEN={token}")
+
+        while True:
+            time.sleep(1)
+            for i, process in enumerate(processes):
+                if process.poll() is not None and args.restart:
+                    print(f"⚠ Worker {urls[i]} exited with {process.returncode}, restarting")
+                    processes[i] = spawn(ports[i], args.host, env, shares[i], threads[i])
+    except KeyboardInterrupt:
+        stop()
+
+
+if __name__ == "__main__":
+    main()
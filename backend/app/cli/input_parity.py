@@ -0,0 +1,135 @@
+"""
+Parity and preprocessing-time check for the uint8 input path (UINT8_INPUT)
+
+Loads each model twice, as served today and with uint8_input=True, and runs
+the same images through both:
+
+- parity: fake probability from the uint8 model against the torchvision
+  transform (Resize -> ToTensor -> Normalize) on the float model, and
+  against the float model's own predict() and predict_frames() paths; plus
+  the first convolution's output, which still differs when a model's
+  output hardly depends on its input (e.g. untrained weights)
+- time: per-image preprocessing for the torchvision transform, the pooled
+  float path and the uint8 path, from encoded bytes and from an already
+  resized image (the part the uint8 path changes), plus the model forward
+  on each input type
+
+    cd backend
+    python -m app.cli.input_parity --images 32
+    python -m app.cli.input_parity photos/*.jpg --models distildire
+
+Exits with status 1 if any probability differs by more than --tolerance.
+"""
+import argparse
+import sys
+import time
+
+import torch
+import torchvision.transforms as transforms
+
+from app.cli.memory_stress import make_corpus
+from app.core.config import settings
+from app.models.preprocessing import fill_input_tensor, load_resized, load_resized_pixels, to_input_tensor
+from app.services.detection_service import CHECKPOINT_FILES, DetectionService
+
+MODEL_CLASSES = {}
+
+
+def _model_class(kind: str):
+    # Imported on use: each module pulls in its backbone
+    if not MODEL_CLASSES:
+        from app.models.distildire_model import DistilDIREModel
+        from app.models.sbi_model import SBIModel
+        MODEL_CLASSES.update({"sbi": SBIModel, "distildire": DistilDIREModel})
+    return MODEL_CLASSES[kind]
+
+
+def _ms_per_call(fn, items, repeat: int) -> float:
+    fn(items[0])  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            fn(item)
+    return (time.perf_counter() - start) * 1000 / (repeat * len(items))
+
+
+def check_model(kind: str, images: list[bytes], repeat: int) -> dict:
+    """Parity and timings of the uint8 path against the float path for one model"""
+    model_class = _model_class(kind)
+    model_dir = DetectionService._model_dir(kind)
+    reference = model_class(model_dir, CHECKPOINT_FILES[kind])
+    fast = model_class(model_dir, CHECKPOINT_FILES[kind], uint8_input=True)
+    module = sys.modules[model_class.__module__]
+    size, normalize = module.INPUT_SIZE, module.NORMALIZE or ()
+
+    diffs = {"transform": [], "predict": [], "frames": [], "first conv": []}
+    with torch.no_grad():
+        for image in images:
+            expected = module.input_conv(reference.model)(reference.preprocess(image))
+            folded = module.input_conv(fast.model)(fast.preprocess(image).float())
+            # Relative to the activations' scale, which differs per model
+            diffs["first conv"].append(((folded - expected).abs().max() / expected.abs().max()).item())
+    for image in images:
+        fast_prob = fast.predict(image)[1]
+        diffs["transform"].append(abs(fast_prob - reference.predict_tensor(to_input_tensor(image, reference.transform))[1]))
+        diffs["predict"].append(abs(fast_prob - reference.predict(image)[1]))
+        frame = torch.from_numpy(load_resized_pixels(image, [size])[size]).unsqueeze(0)
+        diffs["frames"].append(abs(fast.predict_frames(frame)[0][1] - reference.predict_frames(frame)[0][1]))
+
+    resized = [load_resized(image, size) for image in images]
+    to_tensor = transforms.Compose(reference.transform.transforms[1:])  # everything after Resize
+
+    def fill(dtype: torch.dtype):
+        return lambda img: fill_input_tensor(img, torch.empty(1, 3, size, size, dtype=dtype), *normalize)
+
+    timings = {
+        "transform": (_ms_per_call(lambda b: to_input_tensor(b, reference.transform), images, repeat),
+                      _ms_per_call(to_tensor, resized, repeat)),
+        "float": (_ms_per_call(reference.preprocess, images, repeat), _ms_per_call(fill(torch.float32), resized, repeat)),
+        "uint8": (_ms_per_call(fast.preprocess, images, repeat), _ms_per_call(fill(torch.uint8), resized, repeat)),
+    }
+    forward_ms = {
+        "float": _ms_per_call(reference.predict_tensor, [reference.preprocess(images[0])], repeat),
+        "uint8": _ms_per_call(fast.predict_tensor, [fast.preprocess(images[0])], repeat),
+    }
+    return {"diffs": {name: max(values) for name, values in diffs.items()}, "timings": timings, "forward_ms": forward_ms}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the uint8 input path against the float preprocessing")
+    parser.add_argument("paths", nargs="*", help="Images to check (default: generated images)")
+    parser.add_argument("--images", type=int, default=16, help="Generated images when no paths are given")
+    parser.add_argument("--models", default="sbi,distildire")
+    parser.add_argument("--repeat", type=int, default=3, help="Timing passes over the images")
+    parser.add_argument("--tolerance", type=float, default=1e-4, help="Largest allowed probability difference (relative for the first conv)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    if args.paths:
+        images = []
+        for path in args.paths:
+            with open(path, "rb") as f:
+                images.append(f.read())
+    else:
+        images = make_corpus(args.images, 64, 1600, args.seed)
+
+    failed = False
+    for kind in args.models.split(","):
+        kind = kind.strip()
+        result = check_model(kind, images, args.repeat)
+        diffs = result["diffs"]
+        worst = max(diffs.values())
+        failed |= worst > args.tolerance
+        print(f"\n{kind}: {len(images)} images, uint8_input={settings.UINT8_INPUT} in settings")
+        print("  max diff of uint8 path vs " + ", ".join(f"{name}: {diff:.2e}" for name, diff in diffs.items())
+              + f" [{'ok' if worst <= args.tolerance else 'FAIL'}, tolerance {args.tolerance:.0e}]")
+        print(f"  {'preprocessing':<14} {'from bytes ms':>14} {'from resized ms':>16}")
+        for name, (from_bytes, from_resized) in result["timings"].items():
+            print(f"  {name:<14} {from_bytes:>14.2f} {from_resized:>16.3f}")
+        print("  forward ms: " + ", ".join(f"{name} {ms:.1f}" for name, ms in result["forward_ms"].items()))
+
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,159 @@
+"""
+Memory stress test for the detection pipeline
+
+Sends thousands of mixed-size images (tiny thumbnails up to large photos
+that take the compression path) through the same code as POST /detect and
+checks that RSS stops growing once warmed up.
+
+    cd backend
+    python -m app.cli.memory_stress --requests 3000 --concurrency 4
+
+Exits with status 1 if RSS after warm-up grows by more than --tolerance-mb.
+"""
+import argparse
+import io
+import json
+import random
+import sys
+import threading
+import time
+
+import numpy as np
+from PIL import Image
+
+from app.services.memory_budget import rss_bytes
+
+MB = 1024 * 1024
+
+
+def make_pixels(width: int, height: int, rng: np.random.Generator) -> np.ndarray:
+    # Smooth gradient plus noise: compresses like a photo, not like a flat color
+    y, x = np.mgrid[0:height, 0:width]
+    base = np.stack([x * 255 // max(1, width - 1), y * 255 // max(1, height - 1), (x + y) % 256], axis=-1)
+    noise = rng.integers(-40, 40, size=(height, width, 3))
+    return np.clip(base + noise, 0, 255).astype(np.uint8)
+
+
+def make_image(width: int, height: int, fmt: str, rng: np.random.Generator) -> bytes:
+    pixels = make_pixels(width, height, rng)
+    mode = "RGBA" if fmt == "PNG" and width % 2 else "RGB"
+    image = Image.fromarray(pixels).convert(mode)
+    buffer = io.BytesIO()
+    if fmt == "JPEG":
+        image.save(buffer, format=fmt, quality=95)
+    else:
+        image.save(buffer, format=fmt)
+    return buffer.getvalue()
+
+
+def make_corpus(count: int, min_side: int, max_side: int, seed: int) -> list[bytes]:
+    rng = np.random.default_rng(seed)
+    corpus = []
+    for i in range(count):
+        # Log-uniform sides: mostly small/medium, a few very large
+        width, height = np.exp(rng.uniform(np.log(min_side), np.log(max_side), size=2)).astype(int)
+        corpus.append(make_image(int(width), int(height), "JPEG" if i % 3 else "PNG", rng))
+    return corpus
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check that RSS stays flat over many mixed-size detection requests")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--models", default="sbi,distildire",
+                        help="Models to run; include chatgpt only with a real API key (paid calls)")
+    parser.add_argument("--compress", action="store_true",
+                        help="Run the upload compression step even without chatgpt (it only runs for GPT in the API)")
+    parser.add_argument("--images", type=int, default=32, help="Distinct images to cycle through")
+    parser.add_argument("--min-side", type=int, default=64)
+    parser.add_argument("--max-side", type=int, default=6000)
+    parser.add_argument("--warmup", type=int, default=200, help="Requests before the RSS baseline is taken")
+    parser.add_argument("--sample-every", type=int, default=50)
+    parser.add_argument("--tolerance-mb", type=float, default=64)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", dest="json_path", help="Write the report here")
+    args = parser.parse_args()
+
+    # Imported here so --help doesn't load the models
+    from app.api.v1.endpoints.detection import compress_within_budget, detection_service
+    from app.core.model_catalog import parse_model_selection
+
+    models = parse_model_selection(args.models)
+    compress = args.compress or models is None or "chatgpt" in models
+
+    print(f"[DEBUG] Generating {args.images} images ({args.min_side}-{args.max_side}px)...")
+    corpus = make_corpus(args.images, args.min_side, args.max_side, args.seed)
+    print(f"[DEBUG] Corpus: {sum(len(b) for b in corpus) / MB:.1f}MB, largest {max(len(b) for b in corpus) / MB:.1f}MB")
+
+    order = random.Random(args.seed)
+    lock = threading.Lock()
+    next_request = [0]
+    samples = []  # (request number, rss bytes)
+    errors = []
+
+    def worker():
+        while True:
+            with lock:
+                n = next_request[0]
+                if n >= args.requests:
+                    return
+                next_request[0] += 1
+                image_bytes = corpus[order.randrange(len(corpus))]
+            try:
+                data = compress_within_budget(image_bytes) if compress else image_bytes
+                detection_service.detect(data, models=models, bounded=False)
+            except Exception as e:
+                errors.append(f"{type(e).__name__}: {e}")
+            if n % args.sample_every == 0:
+                rss = rss_bytes()
+                with lock:
+                    samples.append((n, rss))
+                print(f"[DEBUG] {n}/{args.requests} requests, RSS {rss / MB:.1f}MB")
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=worker) for _ in range(args.concurrency)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    samples.sort()
+    baseline = [rss for n, rss in samples if n >= args.warmup]
+    if not baseline:
+        print("[ERROR] No samples after warm-up; raise --requests or lower --warmup")
+        sys.exit(2)
+    growth = max(baseline) - baseline[0]
+
+    report = {
+        "requests": args.requests,
+        "concurrency": args.concurrency,
+        "elapsed_s": round(elapsed, 1),
+        "errors": len(errors),
+        "baseline_rss_mb": round(baseline[0] / MB, 1),
+        "max_rss_mb": round(max(baseline) / MB, 1),
+        "growth_mb": round(growth / MB, 1),
+        "tolerance_mb": args.tolerance_mb,
+        "samples": [(n, round(rss / MB, 1)) for n, rss in samples],
+        "memory": detection_service.memory_stats(),
+    }
+    detection_service.close()
+
+    print(f"\n{args.requests} requests in {elapsed:.1f}s ({args.requests / elapsed:.1f} req/s), {len(errors)} errors")
+    for stage, stats in report["memory"]["stages"].items():
+        print(f"  {stage:<10} calls={stats['calls']:<6} peak RSS {stats['peak_rss_mb']}MB, max growth {stats['max_growth_mb']}MB")
+    print(f"  pixel budget: {report['memory']['pixel_budget']}")
+    print(f"RSS after warm-up: {report['baseline_rss_mb']}MB -> max {report['max_rss_mb']}MB (+{report['growth_mb']}MB)")
+
+    if args.json_path:
+        with open(args.json_path, "w") as f:
+            json.dump(report, f, indent=2)
+
+    if growth / MB > args.tolerance_mb:
+        print(f"✗ RSS grew {growth / MB:.1f}MB after warm-up (tolerance {args.tolerance_mb}MB)")
+        sys.exit(1)
+    print("✓ RSS stayed flat")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,407 @@
+"""
+Replay recorded /detect traffic against a build and compare latencies
+
+Record production traffic with RECORD_DIR (see app.services.traffic_recorder),
+then replay it against the build under test with GPT served by a local stub
+that reproduces the recorded GPT latencies and confidences:
+
+    cd backend
+    python -m app.cli.replay gpt-stub recordings/ --port 8300
+    # start the build with OPENAI_BASE_URL=http://127.0.0.1:8300/v1 OPENAI_API_KEY=stub
+    python -m app.cli.replay run recordings/ --url http://127.0.0.1:8000 --speed 2 --out candidate.json
+    python -m app.cli.replay compare baseline.json candidate.json --max-regression 10
+
+run re-issues the requests at their recorded inter-arrival times divided by
+--speed, and reports latency percentiles, 429 and error rates overall, per
+model selection and per image size, next to the recorded ones. Images are
+rebuilt at the recorded dimensions and format from the thumbnail
+("downscaled" archives) or from synthetic pixels ("signature" archives).
+
+compare puts two runs side by side and exits with status 1 if the p95 of
+any group with enough requests regressed by more than --max-regression
+percent.
+"""
+import argparse
+import io
+import json
+import math
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlencode
+
+import numpy as np
+from PIL import Image
+
+from app.cli.memory_stress import make_pixels
+from app.services.traffic_recorder import IMAGES_DIR, REQUESTS_FILE
+
+SIZE_BUCKETS = [(500_000, "<0.5MP"), (2_000_000, "0.5-2MP"), (8_000_000, "2-8MP"), (math.inf, ">=8MP")]
+GPT_SHRINK = 0.90  # chatgpt_vision shrinks P_fake toward 0.5 by this factor
+
+
+def load_archive(directory: str, limit: int | None = None) -> list[dict]:
+    path = os.path.join(directory, REQUESTS_FILE)
+    if not os.path.exists(path):
+        raise SystemExit(f"[ERROR] No {REQUESTS_FILE} in {directory}")
+    with open(path) as f:
+        records = [json.loads(line) for line in f if line.strip()]
+    records.sort(key=lambda r: r["started"])
+    return records[:limit] if limit else records
+
+
+# --- GPT stub -----------------------------------------------------------------
+
+def gpt_samples(records: list[dict]) -> list[tuple[float, float]]:
+    """(latency ms, confidence) of every recorded GPT call"""
+    return [
+        (r["model_ms"]["chatgpt"], r.get("gpt_confidence"))
+        for r in records
+        if "chatgpt" in r.get("model_ms", {})
+    ]
+
+
+def completion(confidence: float | None, model: str) -> dict:
+    """Chat completion whose first-token logprobs decode to the recorded confidence"""
+    p_fake = 0.5 if confidence is None else 0.5 + (confidence - 0.5) / GPT_SHRINK
+    p_fake = min(max(p_fake, 1e-6), 1 - 1e-6)
+    top = [
+        {"token": "NO", "logprob": math.log(p_fake), "bytes": None},
+        {"token": "YES", "logprob": math.log(1 - p_fake), "bytes": None},
+    ]
+    top.sort(key=lambda entry: -entry["logprob"])
+    return {
+        "id": f"chatcmpl-replay-{uuid.uuid4().hex[:12]}",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{
+            "index": 0,
+            "finish_reason": "stop",
+            "message": {"role": "assistant", "content": top[0]["token"]},
+            "logprobs": {"content": [{**top[0], "top_logprobs": top}]},
+        }],
+        "usage": {"prompt_tokens": 0, "completion_tokens": 1, "total_tokens": 1},
+    }
+
+
+def serve_gpt_stub(samples: list[tuple[float, float]], port: int, host: str, latency_scale: float, seed: int):
+    rng = random.Random(seed)
+    lock = threading.Lock()
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            if not self.path.rstrip("/").endswith("/chat/completions"):
+                self.send_error(404)
+                return
+            with lock:
+                latency_ms, confidence = rng.choice(samples)
+            time.sleep(latency_ms * latency_scale / 1000)
+            try:
+                model = json.loads(body).get("model", "stub")
+            except ValueError:
+                model = "stub"
+            data = json.dumps(completion(confidence, model)).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer((host, port), Handler)
+    server.daemon_threads = True
+    latencies = np.array([ms for ms, _ in samples]) * latency_scale
+    print(f"✓ GPT stub on http://{host}:{port}/v1 replaying {len(samples)} recorded calls "
+          f"(p50 {np.percentile(latencies, 50):.0f}ms, p95 {np.percentile(latencies, 95):.0f}ms)")
+    print(f"  Start the build with OPENAI_BASE_URL=http://{host}:{port}/v1 OPENAI_API_KEY=stub")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
+
+
+# --- Replay -------------------------------------------------------------------
+
+def rebuild_image(record: dict, archive: str, rng: np.random.Generator) -> bytes:
+    """Image with the recorded dimensions and format, close to the recorded byte size"""
+    signature = record["image"]
+    fmt, width, height = signature["format"], signature["width"], signature["height"]
+    if not fmt:
+        # The recorded upload was not an image; send the same amount of junk
+        return rng.integers(0, 256, size=signature["bytes"], dtype=np.uint8).tobytes()
+    thumbnail = signature.get("thumbnail")
+    path = os.path.join(archive, IMAGES_DIR, thumbnail) if thumbnail else None
+    if path and os.path.exists(path):
+        with Image.open(path) as small:
+            pixels = np.asarray(small.convert("RGB").resize((width, height), Image.BICUBIC), dtype=np.int16)
+        # Upscaled thumbnails are smoother than photos; grain brings the encoded size closer
+        pixels = np.clip(pixels + rng.integers(-12, 12, size=pixels.shape), 0, 255).astype(np.uint8)
+    else:
+        pixels = make_pixels(width, height, rng)
+    return encode(Image.fromarray(pixels), fmt, signature)
+
+
+def encode(image: Image.Image, fmt: str, signature: dict) -> bytes:
+    if signature.get("mode") in ("RGBA", "L", "LA") and fmt != "JPEG":
+        image = image.convert(signature["mode"])
+    elif image.mode != "RGB":
+        image = image.convert("RGB")
+    if fmt not in ("JPEG", "WEBP"):
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt)
+        return buffer.getvalue()
+    # Lossy: the quality whose output is closest to the recorded size
+    best = None
+    for quality in (95, 85, 75, 60):
+        buffer = io.BytesIO()
+        image.save(buffer, format=fmt, quality=quality)
+        data = buffer.getvalue()
+        if best is None or abs(len(data) - signature["bytes"]) < abs(len(best) - signature["bytes"]):
+            best = data
+        if len(data) <= signature["bytes"]:
+            break
+    return best
+
+
+def multipart(image_bytes: bytes, filename: str, content_type: str) -> tuple[bytes, str]:
+    boundary = uuid.uuid4().hex
+    head = (
+        f"--{boundary}\r\n"
+        f'Content-Disposition: form-data; name="file"; filename="{filename}"\r\n'
+        f"Content-Type: {content_type}\r\n\r\n"
+    ).encode()
+    return head + image_bytes + f"\r\n--{boundary}--\r\n".encode(), f"multipart/form-data; boundary={boundary}"
+
+
+def send(url: str, record: dict, image_bytes: bytes, timeout: float) -> tuple[int, float]:
+    signature = record["image"]
+    ext = (signature["format"] or "bin").lower()
+    content_type = record.get("content_type") or f"image/{ext}"
+    body, body_type = multipart(image_bytes, f"{signature['sha256'][:12]}.{ext}", content_type)
+    query = f"?{urlencode({'models': ','.join(record['models'])})}" if record.get("models") else ""
+    request = urllib.request.Request(
+        f"{url}/api/v1/detect{query}", data=body, method="POST",
+        headers={"Content-Type": body_type, "X-Priority": record.get("priority", "interactive")},
+    )
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except OSError:
+        status = 0  # connection failed or timed out
+    return status, (time.perf_counter() - start) * 1000
+
+
+def replay(records: list[dict], archive: str, url: str, speed: float, concurrency: int,
+           timeout: float, seed: int) -> list[dict]:
+    rng = np.random.default_rng(seed)
+    payloads = {}
+    print(f"[DEBUG] Rebuilding {len({r['image']['sha256'] for r in records})} images...")
+    for record in records:
+        sha = record["image"]["sha256"]
+        if sha not in payloads:
+            payloads[sha] = rebuild_image(record, archive, rng)
+
+    results = [None] * len(records)
+    t0 = records[0]["started"]
+
+    def run(i: int, scheduled: float):
+        lag_ms = (time.perf_counter() - scheduled) * 1000
+        status, latency_ms = send(url, records[i], payloads[records[i]["image"]["sha256"]], timeout)
+        results[i] = {"status": status, "latency_ms": round(latency_ms, 2), "lag_ms": round(lag_ms, 2)}
+
+    print(f"[DEBUG] Replaying {len(records)} requests over {(records[-1]['started'] - t0) / speed:.1f}s (speed x{speed:g})")
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for i, record in enumerate(records):
+            scheduled = start + (record["started"] - t0) / speed
+            delay = scheduled - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(run, i, scheduled)
+    return [
+        {
+            "sha256": record["image"]["sha256"],
+            "pixels": (record["image"]["width"] or 0) * (record["image"]["height"] or 0),
+            "models": record.get("models"),
+            "recorded_status": record["status"],
+            "recorded_latency_ms": record["latency_ms"],
+            **result,
+        }
+        for record, result in zip(records, results)
+    ]
+
+
+# --- Reports ------------------------------------------------------------------
+
+def size_bucket(pixels: int) -> str:
+    return next(label for limit, label in SIZE_BUCKETS if pixels < limit)
+
+
+def group_rows(rows: list[dict]) -> dict[str, list[dict]]:
+    groups = {"all": rows}
+    for row in rows:
+        groups.setdefault(f"models={','.join(row['models']) if row['models'] else 'all'}", []).append(row)
+    for _, label in SIZE_BUCKETS:
+        bucket = [row for row in rows if size_bucket(row["pixels"]) == label]
+        if bucket:
+            groups[f"size {label}"] = bucket
+    return groups
+
+
+def latency_stats(rows: list[dict], status_key: str, latency_key: str) -> dict:
+    ok = [row[latency_key] for row in rows if row[status_key] == 200]
+    stats = {
+        "requests": len(rows),
+        "rate_429": round(sum(row[status_key] == 429 for row in rows) / len(rows), 4),
+        "error_rate": round(sum(row[status_key] not in (200, 429) for row in rows) / len(rows), 4),
+    }
+    for p in (50, 95, 99):
+        stats[f"p{p}_ms"] = round(float(np.percentile(ok, p)), 1) if ok else None
+    return stats
+
+
+def summarize(rows: list[dict], status_key: str = "status", latency_key: str = "latency_ms") -> dict:
+    return {name: latency_stats(group, status_key, latency_key) for name, group in group_rows(rows).items()}
+
+
+def change(before: float | None, after: float | None) -> float | None:
+    if not before or after is None:
+        return None
+    return (after - before) / before * 100
+
+
+def print_table(before: dict, after: dict, labels: tuple[str, str]):
+    print(f"\n{'group':<24} {'n':>6}  {labels[0] + ' p50/p95/p99 ms':>30}  {labels[1] + ' p50/p95/p99 ms':>30}"
+          f"  {'Δp95':>7}  {'429%':>11}  {'err%':>11}")
+    for name, b in before.items():
+        a = after.get(name)
+        if a is None:
+            continue
+        fmt = lambda s: "/".join("-" if s[k] is None else f"{s[k]:.0f}" for k in ("p50_ms", "p95_ms", "p99_ms"))
+        delta = change(b["p95_ms"], a["p95_ms"])
+        print(f"{name:<24} {a['requests']:>6}  {fmt(b):>30}  {fmt(a):>30}  "
+              f"{'-' if delta is None else f'{delta:+.0f}%':>7}  "
+              f"{b['rate_429'] * 100:>5.1f}/{a['rate_429'] * 100:<5.1f}  {b['error_rate'] * 100:>5.1f}/{a['error_rate'] * 100:<5.1f}")
+
+
+def cmd_gpt_stub(args):
+    samples = gpt_samples(load_archive(args.archive))
+    if not samples:
+        raise SystemExit("[ERROR] The archive has no recorded GPT calls")
+    serve_gpt_stub(samples, args.port, args.host, args.latency_scale, args.seed)
+
+
+def cmd_run(args):
+    records = load_archive(args.archive, args.limit)
+    if not records:
+        raise SystemExit("[ERROR] The archive is empty")
+    start = time.perf_counter()
+    rows = replay(records, args.archive, args.url.rstrip("/"), args.speed, args.concurrency, args.timeout, args.seed)
+    elapsed = time.perf_counter() - start
+
+    recorded = summarize(rows, "recorded_status", "recorded_latency_ms")
+    replayed = summarize(rows)
+    lags = [row["lag_ms"] for row in rows]
+    print(f"\n{len(rows)} requests in {elapsed:.1f}s ({len(rows) / elapsed:.1f} req/s), "
+          f"send lag p95 {np.percentile(lags, 95):.0f}ms")
+    if np.percentile(lags, 95) > 100:
+        print(f"⚠ Requests went out late; raise --concurrency (now {args.concurrency}) for a faithful arrival rate")
+    print_table(recorded, replayed, ("recorded", "replay"))
+
+    if args.out:
+        report = {
+            "label": args.label or os.path.splitext(os.path.basename(args.out))[0],
+            "url": args.url,
+            "archive": args.archive,
+            "speed": args.speed,
+            "elapsed_s": round(elapsed, 1),
+            "recorded": recorded,
+            "summary": replayed,
+            "requests": rows,
+        }
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\n✓ Report written to {args.out}")
+
+
+def cmd_compare(args):
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.candidate) as f:
+        candidate = json.load(f)
+    if (baseline["archive"], baseline["speed"]) != (candidate["archive"], candidate["speed"]):
+        print(f"⚠ Runs replayed different traffic: {baseline['archive']} x{baseline['speed']} "
+              f"vs {candidate['archive']} x{candidate['speed']}")
+    print_table(baseline["summary"], candidate["summary"], (baseline["label"], candidate["label"]))
+
+    regressions = []
+    for name, before in baseline["summary"].items():
+        after = candidate["summary"].get(name)
+        if after is None or after["requests"] < args.min_requests:
+            continue
+        delta = change(before["p95_ms"], after["p95_ms"])
+        if delta is not None and delta > args.max_regression:
+            regressions.append(f"{name} p95 {before['p95_ms']:.0f}ms -> {after['p95_ms']:.0f}ms ({delta:+.0f}%)")
+    if regressions:
+        print(f"\n✗ p95 regressed by more than {args.max_regression:g}%:")
+        for line in regressions:
+            print(f"  {line}")
+        sys.exit(1)
+    print(f"\n✓ No group's p95 regressed by more than {args.max_regression:g}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay recorded /detect traffic and compare latencies")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    stub = commands.add_parser("gpt-stub", help="Serve GPT calls with the recorded latencies and confidences")
+    stub.add_argument("archive", help="Recording directory (RECORD_DIR)")
+    stub.add_argument("--port", type=int, default=8300)
+    stub.add_argument("--host", default="127.0.0.1")
+    stub.add_argument("--latency-scale", type=float, default=1.0, help="Multiply recorded GPT latencies")
+    stub.add_argument("--seed", type=int, default=0)
+    stub.set_defaults(func=cmd_gpt_stub)
+
+    run = commands.add_parser("run", help="Replay the archive against a running build")
+    run.add_argument("archive", help="Recording directory (RECORD_DIR)")
+    run.add_argument("--url", default="http://127.0.0.1:8000", help="Base URL of the build under test")
+    run.add_argument("--speed", type=float, default=1.0, help="Arrival rate multiplier (2 = twice the recorded rate)")
+    run.add_argument("--concurrency", type=int, default=64, help="Requests in flight at most")
+    run.add_argument("--timeout", type=float, default=120, help="Seconds per request")
+    run.add_argument("--limit", type=int, help="Replay only the first N recorded requests")
+    run.add_argument("--label", help="Name of this run in comparisons (default: --out file name)")
+    run.add_argument("--out", help="Write the report here, for compare")
+    run.add_argument("--seed", type=int, default=0)
+    run.set_defaults(func=cmd_run)
+
+    compare = commands.add_parser("compare", help="Compare two run reports")
+    compare.add_argument("baseline")
+    compare.add_argument("candidate")
+    compare.add_argument("--max-regression", type=float, default=10, help="Allowed p95 increase in percent")
+    compare.add_argument("--min-requests", type=int, default=20, help="Ignore groups with fewer requests")
+    compare.set_defaults(func=cmd_compare)
+
+    args = parser.parse_args()
+    args.func(args)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,8 +2,79 @@ from pydantic_settings import BaseSettings
 
 class Settings(BaseSettings):
     OPENAI_API_KEY: str = ""
+    OPENAI_BASE_URL: str = ""  # empty = the OpenAI API; e.g. the replay GPT stub (python -m app.cli.replay gpt-stub)
     MODEL_SBI_PATH: str = "./ml_models/sbi_finetuned"
     MODEL_DISTILDIRE_PATH: str = "./ml_models/distildire_finetuned"
+    MODEL_RELOAD_INTERVAL: float = 30  # seconds between checkpoint scans; 0 disables hot reload
+    # Feed uint8 pixels to SBI/DistilDIRE, input normalization folded into their first conv
+    # (check with python -m app.cli.input_parity)
+    UINT8_INPUT: bool = False
+
+    # Async job queue (POST /api/v1/jobs)
+    JOB_DB_PATH: str = "./jobs/jobs.sqlite3"
+    JOB_WORKERS: int = 2
+    JOB_MAX_RETRIES: int = 2
+    JOB_RESULT_RETENTION_SECONDS: int = 86400
+    JOB_LEASE_SECONDS: int = 60  # a running job without a heartbeat for this long is re-queued
+
+    # Model execution: "inprocess", "partitioned" (one worker process pool per model)
+    # or "remote" (inference workers on other hosts, see REMOTE_WORKERS)
+    EXECUTOR_MODE: str = "inprocess"
+    EXECUTOR_AUTOTUNE: bool = False
+    SBI_CORES: str = ""          # e.g. "0-3"; empty splits the cores no other model claims
+    SBI_THREADS: int = 0         # torch threads per replica; 0 = cores per replica
+    SBI_REPLICAS: int = 1
+    DISTILDIRE_CORES: str = ""
+    DISTILDIRE_THREADS: int = 0
+    DISTILDIRE_REPLICAS: int = 1
+
+    # Remote inference workers (EXECUTOR_MODE=remote); start them with python -m app.cli.inference_worker
+    REMOTE_WORKERS: str = ""            # comma-separated base URLs, e.g. "http://10.0.0.5:8100,http://10.0.0.6:8100"
+    REMOTE_HEALTH_INTERVAL: float = 5   # seconds between health checks of each worker
+    REMOTE_TIMEOUT: float = 30          # seconds per inference call
+    REMOTE_RETRIES: int = 2             # other workers tried after one fails
+    # Worker side: token shared with the API (empty disables the worker endpoints),
+    # models to load (empty = both) and inference calls run at once
+    WORKER_API_TOKEN: str = ""
+    WORKER_MODELS: str = ""
+    WORKER_CONCURRENCY: int = 1
+
+    # Admission control: waiting requests allowed per model and priority lane
+    # (X-Priority: interactive | batch) before /detect answers 429; 0 = unbounded
+    ADMISSION_INTERACTIVE_DEPTH: int = 8
+    ADMISSION_BATCH_DEPTH: int = 32
+    CHATGPT_CONCURRENCY: int = 4  # concurrent GPT calls; local models run one request per replica
+
+    # Load-adaptive degradation: cumulative "step:load" tiers (empty disables).
+    # Load is max(fullest queue waiting/depth, recent mean latency / target).
+    DEGRADATION_TIERS: str = "no_gpt:0.5,reduced_resolution:0.75,quantized:0.9"
+    DEGRADATION_LATENCY_TARGET_MS: float = 8000
+    DEGRADATION_COOLDOWN_SECONDS: float = 10
+    DEGRADED_SBI_INPUT_SIZE: int = 288
+    QUANTIZED_BACKEND: str = ""  # "dynamic" builds int8 copies of the models at load time
+
+    # Memory budget: cap on pixels decoded at once across requests (0 = unlimited),
+    # and image size above which freed heap memory is returned to the OS
+    MEMORY_MAX_DECODED_PIXELS: int = 64_000_000
+    MEMORY_TRIM_AFTER_PIXELS: int = 4_000_000
+
+    # Internal raw-frame endpoint (POST /api/v1/internal/detect/raw); disabled while the token is empty
+    INTERNAL_API_TOKEN: str = ""
+    INTERNAL_MAX_BATCH: int = 64
+    INTERNAL_MAX_BODY_MB: int = 256
+
+    # Traffic recording for replay (python -m app.cli.replay); disabled while the directory is empty.
+    # "signature" keeps each image's hash, size and format; "downscaled" also keeps a thumbnail.
+    RECORD_DIR: str = ""
+    RECORD_SAMPLE_RATE: float = 0.05
+    RECORD_IMAGES: str = "signature"
+    RECORD_THUMBNAIL_SIDE: int = 256
+    RECORD_MAX_REQUESTS: int = 100_000  # recording stops once the archive holds this many
+
+    # Admin endpoints (on-demand profiling); disabled while the token is empty
+    ADMIN_API_TOKEN: str = ""
+    PROFILE_MAX_SECONDS: int = 300
+    PROFILE_SAMPLE_INTERVAL_MS: int = 10
     
     class Config:
         env_file = ".env"
@@ -0,0 +1,34 @@
+"""
+Core lists for pinning model executors and inference workers
+
+Kept apart from app.services.model_executor so launchers such as
+app.cli.inference_worker can split cores without importing torch.
+"""
+import os
+
+
+def parse_cores(spec: str) -> list[int]:
+    """
+    Parse a core list such as "0-3,6"
+
+    Returns:
+        Sorted list of core ids (empty for an empty spec)
+    """
+    cores = set()
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            start, end = part.split("-")
+            cores.update(range(int(start), int(end) + 1))
+        else:
+            cores.add(int(part))
+    return sorted(cores)
+
+
+def available_cores() -> list[int]:
+    """Cores this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
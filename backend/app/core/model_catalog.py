@@ -0,0 +1,42 @@
+"""
+Model names, checkpoint files and checkpoint directories
+
+Kept apart from app.services.detection_service so inference workers can
+find their checkpoints without importing the API's detection stack.
+"""
+import os
+
+from app.core.config import settings
+
+MODEL_NAMES = ("sbi", "distildire", "chatgpt")
+CHECKPOINT_FILES = {"sbi": "exp003_best_model.pth", "distildire": "v2_best_model.pth"}
+
+
+def parse_model_selection(value: str | None) -> tuple[str, ...] | None:
+    """
+    Parse a comma-separated model list such as "sbi,distildire"
+
+    Returns:
+        Tuple of model names in canonical order, or None for "all models"
+
+    Raises:
+        ValueError: If a name is unknown or the list is empty
+    """
+    if value is None or value.strip() in ("", "all"):
+        return None
+    names = {name.strip().lower() for name in value.split(",") if name.strip()}
+    unknown = names - set(MODEL_NAMES)
+    if unknown:
+        raise ValueError(
+            f"Unknown model(s): {', '.join(sorted(unknown))}. "
+            f"Choose from: {', '.join(MODEL_NAMES)}"
+        )
+    if not names:
+        raise ValueError("At least one model must be selected")
+    return tuple(name for name in MODEL_NAMES if name in names)
+
+
+def model_dir(kind: str) -> str:
+    """MODEL_<KIND>_PATH, with relative paths taken from the backend directory"""
+    path = getattr(settings, f"MODEL_{kind.upper()}_PATH")
+    return os.path.join(os.path.dirname(__file__), "..", "..", path)
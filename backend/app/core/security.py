@@ -0,0 +1,22 @@
+import hmac
+
+from fastapi import HTTPException
+
+
+def check_token(provided: str | None, expected: str, feature: str):
+    """
+    Guard an internal/admin endpoint with a shared token
+
+    Args:
+        provided: Token sent by the caller
+        expected: Configured token; empty means the feature is disabled
+        feature: Name used in the error message
+
+    Raises:
+        HTTPException: 404 if the feature is disabled (so it isn't advertised),
+            401 if the token is missing or wrong
+    """
+    if not expected:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not provided or not hmac.compare_digest(provided.encode(), expected.encode()):
+        raise HTTPException(status_code=401, detail=f"Invalid or missing {feature} token")
@@ -0,0 +1,131 @@
+"""
+Wire format for already-decoded RGB frames
+
+Two encodings are accepted, told apart by their first bytes:
+
+- .npy (numpy.save output): a uint8 array of shape [H, W, 3] or [N, H, W, 3]
+- raw: the 4-byte magic b"RGB8", then N, H, W, C as little-endian uint32,
+  then N*H*W*C uint8 pixels in row-major RGB order (C must be 3)
+
+Decoding never copies the pixels: the returned array is a read-only view of
+the request body.
+"""
+from __future__ import annotations
+
+import ast
+import math
+import struct
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import numpy as np  # imported on the first decode, not at API startup
+
+RAW_MAGIC = b"RGB8"
+RAW_HEADER = struct.Struct("<4sIIII")
+NPY_MAGIC = b"\x93NUMPY"
+
+
+def _check_shape(shape: tuple[int, ...]) -> tuple[int, int, int, int]:
+    if not all(isinstance(side, int) and side >= 0 for side in shape):
+        raise ValueError(f"Invalid shape: {list(shape)}")
+    if len(shape) == 3:
+        shape = (1,) + tuple(shape)
+    if len(shape) != 4 or shape[3] != 3:
+        raise ValueError(f"Expected RGB frames of shape [H, W, 3] or [N, H, W, 3], got {list(shape)}")
+    if min(shape) == 0:
+        raise ValueError(f"Empty frame batch: {list(shape)}")
+    return shape
+
+
+def _npy_header(body: bytes) -> tuple[dict, int]:
+    # (header dict, offset of the data); the header is checked before anything reads it
+    if len(body) < 10:
+        raise ValueError("Truncated .npy header")
+    major = body[6]
+    if major not in (1, 2, 3):
+        raise ValueError(f"Unsupported .npy format version {major}")
+    if major == 1:
+        (header_len,) = struct.unpack_from("<H", body, 8)
+        offset = 10
+    else:
+        if len(body) < 12:
+            raise ValueError("Truncated .npy header")
+        (header_len,) = struct.unpack_from("<I", body, 8)
+        offset = 12
+    if len(body) < offset + header_len:
+        raise ValueError("Truncated .npy header")
+    try:
+        header = ast.literal_eval(body[offset:offset + header_len].decode("utf-8" if major == 3 else "latin1"))
+    except (ValueError, SyntaxError, UnicodeDecodeError, MemoryError, RecursionError) as e:
+        raise ValueError(f"Malformed .npy header: {e}") from None
+    if not isinstance(header, dict) or not {"descr", "fortran_order", "shape"} <= header.keys():
+        raise ValueError("Malformed .npy header: expected a dict with descr, fortran_order and shape")
+    if not isinstance(header["shape"], tuple):
+        raise ValueError(f"Malformed .npy header: shape {header['shape']!r} is not a tuple")
+    return header, offset + header_len
+
+
+def _decode_npy(body: bytes) -> np.ndarray:
+    # Parse the header ourselves so the data is a view of body, not a copy
+    import numpy as np
+    header, offset = _npy_header(body)
+    try:
+        dtype = np.dtype(header["descr"])
+    except (TypeError, ValueError):
+        raise ValueError(f"Malformed .npy header: unknown dtype {header['descr']!r}") from None
+    if dtype != np.uint8:
+        raise ValueError(f"Expected a uint8 array, got {header['descr']}")
+    if header["fortran_order"]:
+        raise ValueError("Fortran-ordered arrays are not supported; save a C-contiguous array")
+    shape = _check_shape(header["shape"])
+    return _view(body, offset, shape)
+
+
+def _decode_raw(body: bytes) -> np.ndarray:
+    if len(body) < RAW_HEADER.size:
+        raise ValueError("Truncated header")
+    _, n, h, w, c = RAW_HEADER.unpack_from(body)
+    return _view(body, RAW_HEADER.size, _check_shape((n, h, w, c)))
+
+
+def _view(body: bytes, offset: int, shape: tuple[int, ...]) -> np.ndarray:
+    import numpy as np
+    expected = math.prod(shape)  # exact: np.prod can overflow on a bogus header
+    if len(body) - offset != expected:
+        raise ValueError(f"Shape {list(shape)} needs {expected} bytes of pixels, got {len(body) - offset}")
+    return np.frombuffer(body, dtype=np.uint8, count=expected, offset=offset).reshape(shape)
+
+
+def decode_frames(body: bytes) -> np.ndarray:
+    """
+    Decode a request body into frames
+
+    Returns:
+        Read-only uint8 array [N, H, W, 3] sharing memory with body
+
+    Raises:
+        ValueError: Unknown format, wrong dtype/shape, or size mismatch
+    """
+    try:
+        if body.startswith(NPY_MAGIC):
+            return _decode_npy(body)
+        if body.startswith(RAW_MAGIC):
+            return _decode_raw(body)
+    except (IndexError, KeyError, TypeError, OverflowError, struct.error) as e:
+        # Whatever a malformed body trips over is the client's error, not ours
+        raise ValueError(f"Malformed frame data: {type(e).__name__}: {e}") from None
+    raise ValueError("Unknown frame format: expected a .npy file or the RGB8 raw header")
+
+
+def encode_frames(frames: np.ndarray) -> bytes:
+    """
+    Encode uint8 [H, W, 3] or [N, H, W, 3] frames in the raw format
+
+    Raises:
+        ValueError: On a wrong dtype or shape
+    """
+    import numpy as np
+    if frames.dtype != np.uint8:
+        raise ValueError(f"Expected a uint8 array, got {frames.dtype}")
+    n, h, w, c = _check_shape(frames.shape)
+    return RAW_HEADER.pack(RAW_MAGIC, n, h, w, c) + np.ascontiguousarray(frames).tobytes()
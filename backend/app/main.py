@@ -1,6 +1,6 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.v1.endpoints import detection
+from app.api.v1.endpoints import detection, jobs, internal, admin
 
 app = FastAPI(title="Deepfake Detection API")
 
@@ -14,6 +14,19 @@ app.add_middleware(
 
 # Register routers
 app.include_router(detection.router, prefix="/api/v1", tags=["detection"])
+app.include_router(jobs.router, prefix="/api/v1", tags=["jobs"])
+app.include_router(internal.router, prefix="/api/v1", tags=["internal"])
+app.include_router(admin.router, prefix="/api/v1", tags=["admin"])
+
+@app.on_event("startup")
+def start_job_workers():
+    jobs.worker_pool.start()
+
+@app.on_event("shutdown")
+def stop_job_workers():
+    jobs.worker_pool.stop()
+    detection.traffic_recorder.close()
+    detection.detection_service.close()
 
 @app.get("/health")
 async def health():
@@ -0,0 +1,372 @@
+"""
+Synthetic benchmark of the video path: decode -> face detector -> crop/resize -> Detector.
+
+Generates a test video locally: a textured background with drawn face-like
+regions (flat skin-tone ellipses with eyes and a mouth) that drift across
+the frame. The same seed and settings always give the same video, so runs
+on different commits measure the same work. It then scores the video
+through VideoScorer's streaming path, the one used by inference_video.py
+and inference_dataset.py, and reports per-stage time, frames/sec and peak
+RSS.
+
+    python bench_video.py --resolution 1280x720 --frames 300 --faces 2
+    python bench_video.py --detector retinaface -w weights.tar --json bench.json
+
+--detector stub finds the drawn faces by color, so it needs no weights.
+--classifier efficientnet-b4 (default) is the Detector network with
+untrained weights: same cost, no download. Stage times are summed per
+thread. Decode and face detection run in a background thread alongside
+classification, so they can add up to more than the wall time.
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import platform
+import subprocess
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime,timezone
+
+import numpy as np
+import cv2
+import torch
+
+import preprocess
+from scoring import VideoScorer,get_device,load_detector,load_face_detector
+from tracking import FaceTracker
+from frame_gate import FrameGate
+
+
+FACE_RGB=(210,140,90)  # flat skin tone drawn by make_video and keyed on by StubFaceDetector
+CODEC_EXT={'MJPG':'avi','XVID':'avi','mp4v':'mp4','avc1':'mp4'}
+STAGES=('decode','detect','crop','classify')
+
+
+def make_video(path,width,height,n_frames,fps=25,codec='mp4v',n_faces=1,seed=0):
+    # background R stays below the face tone, so only faces match StubFaceDetector
+    rng=np.random.default_rng(seed)
+    writer=cv2.VideoWriter(path,cv2.VideoWriter_fourcc(*codec),fps,(width,height))
+    if not writer.isOpened():
+        raise ValueError(f'Codec {codec} is not available in this OpenCV build')
+    y,x=np.mgrid[0:height,0:width].astype(np.float32)
+    base=np.stack([80+60*np.sin(x/97),90+50*np.cos(y/53),40+30*np.sin((x+y)/71)],-1)
+    textures=[np.clip(base+rng.normal(0,12,base.shape),0,120).astype(np.uint8) for _ in range(4)]
+
+    size=min(width,height)
+    faces=[]
+    for _ in range(n_faces):
+        r=rng.uniform(size/12,size/7)
+        faces.append({
+            'r':r,
+            'pos':rng.uniform([r,r*1.3],[width-r,height-r*1.3]),
+            'vel':rng.uniform(-1,1,2)*size/200,
+        })
+    face_bgr=FACE_RGB[::-1]
+    for i in range(n_frames):
+        frame=textures[i%len(textures)].copy()
+        for f in faces:
+            r=f['r']
+            f['pos']+=f['vel']
+            for axis,limit,margin in ((0,width,r),(1,height,r*1.3)):
+                if not margin<=f['pos'][axis]<=limit-margin:
+                    f['vel'][axis]*=-1
+                    f['pos'][axis]=np.clip(f['pos'][axis],margin,limit-margin)
+            cx,cy=int(f['pos'][0]),int(f['pos'][1])
+            cv2.ellipse(frame,(cx,cy),(int(r),int(r*1.3)),0,0,360,face_bgr,-1)
+            for dx in (-0.4,0.4):
+                cv2.circle(frame,(int(cx+dx*r),int(cy-0.3*r)),max(1,int(r*0.12)),(30,30,30),-1)
+            cv2.ellipse(frame,(cx,int(cy+0.5*r)),(int(r*0.35),max(1,int(r*0.1))),0,0,360,(40,40,120),-1)
+        writer.write(frame)
+    writer.release()
+
+
+def video_path(video_dir,args):
+    name=f'{args.width}x{args.height}_{args.frames}f_{args.fps}fps_{args.faces}faces_{args.codec}_s{args.seed}.{CODEC_EXT.get(args.codec,"avi")}'
+    return os.path.join(video_dir,name)
+
+
+class StubFaceDetector:
+    """Finds the drawn faces by color: cost is a mask and connected components, not a network"""
+
+    def __init__(self,min_area=400,tolerance=30):
+        self.min_area=min_area
+        self.lower=np.array([max(0,c-tolerance) for c in FACE_RGB],dtype=np.uint8)
+        self.upper=np.array([min(255,c+tolerance) for c in FACE_RGB],dtype=np.uint8)
+
+    def predict_jsons(self,frame):
+        mask=cv2.inRange(frame,self.lower,self.upper)
+        n,_,stats,_=cv2.connectedComponentsWithStats(mask)
+        faces=[]
+        for x,y,w,h,area in stats[1:n]:
+            if area>=self.min_area:
+                faces.append({'bbox':[float(x),float(y),float(x+w),float(y+h)],'score':1.})
+        return faces
+
+
+class StubClassifier(torch.nn.Module):
+    # small conv net: measures the pipeline around the classifier rather than the classifier
+    def __init__(self):
+        super().__init__()
+        self.net=torch.nn.Sequential(
+            torch.nn.Conv2d(3,16,5,stride=4),torch.nn.ReLU(),
+            torch.nn.Conv2d(16,32,3,stride=2),torch.nn.ReLU(),
+            torch.nn.AdaptiveAvgPool2d(1),torch.nn.Flatten(),torch.nn.Linear(32,2),
+        )
+
+    def forward(self,x):
+        return self.net(x)
+
+
+def build_classifier(kind,weight_name,device):
+    if weight_name:
+        return load_detector(weight_name,device)
+    if kind=='stub':
+        return StubClassifier().to(device).eval()
+    from efficientnet_pytorch import EfficientNet
+    # Detector's network without the pretrained download; weights don't change the cost
+    return EfficientNet.from_name('efficientnet-b4',num_classes=2).to(device).eval()
+
+
+class StageTimes:
+    """Seconds spent per stage, summed over threads"""
+
+    def __init__(self,device):
+        self.device=device
+        self.seconds=dict.fromkeys(('extract',)+STAGES,0.)
+        self.calls=dict.fromkeys(self.seconds,0)
+        self.lock=threading.Lock()
+
+    def add(self,stage,seconds):
+        with self.lock:
+            self.seconds[stage]+=seconds
+            self.calls[stage]+=1
+
+    @contextmanager
+    def time(self,stage):
+        start=time.perf_counter()
+        try:
+            yield
+        finally:
+            if stage=='classify' and self.device.type=='cuda':
+                torch.cuda.synchronize(self.device)
+            self.add(stage,time.perf_counter()-start)
+
+
+class TimedFaceDetector:
+    def __init__(self,detector,times):
+        self.detector=detector
+        self.times=times
+
+    def predict_jsons(self,frame):
+        with self.times.time('detect'):
+            return self.detector.predict_jsons(frame)
+
+
+@contextmanager
+def instrumented(scorer,times):
+    # time the stages in place, so the benchmark runs the real pipeline code
+    iter_frame_faces=preprocess.iter_frame_faces
+    crop_faces=preprocess.crop_faces
+    forwards=[(model,model.forward) for model in scorer.models]
+
+    def timed_iter_frame_faces(*args,**kwargs):
+        frames=iter_frame_faces(*args,**kwargs)
+        while True:
+            start=time.perf_counter()
+            try:
+                item=next(frames)
+            except StopIteration:
+                times.add('extract',time.perf_counter()-start)
+                return
+            times.add('extract',time.perf_counter()-start)
+            yield item
+
+    def timed_crop_faces(*args,**kwargs):
+        with times.time('crop'):
+            return crop_faces(*args,**kwargs)
+
+    def timed_forward(forward):
+        def run(*args,**kwargs):
+            with times.time('classify'):
+                return forward(*args,**kwargs)
+        return run
+
+    preprocess.iter_frame_faces=timed_iter_frame_faces
+    preprocess.crop_faces=timed_crop_faces
+    for model,forward in forwards:
+        model.forward=timed_forward(forward)
+    try:
+        yield
+    finally:
+        preprocess.iter_frame_faces=iter_frame_faces
+        preprocess.crop_faces=crop_faces
+        for model,_ in forwards:
+            model.__dict__.pop('forward',None)
+
+
+def rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1])*os.sysconf('SC_PAGE_SIZE')
+    except OSError:
+        import resource
+        peak=resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform=='darwin' else peak*1024
+
+
+class PeakRSS:
+    """Samples RSS in a background thread; peak over the with-block"""
+
+    def __init__(self,interval=0.005):
+        self.interval=interval
+        self.stop=threading.Event()
+
+    def __enter__(self):
+        self.start=self.peak=rss_bytes()
+        self.thread=threading.Thread(target=self._run,daemon=True)
+        self.thread.start()
+        return self
+
+    def _run(self):
+        while not self.stop.wait(self.interval):
+            self.peak=max(self.peak,rss_bytes())
+
+    def __exit__(self,*exc):
+        self.stop.set()
+        self.thread.join()
+        self.peak=max(self.peak,rss_bytes())
+
+
+def git_commit():
+    here=os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit=subprocess.run(['git','rev-parse','HEAD'],cwd=here,capture_output=True,text=True,check=True).stdout.strip()
+        dirty=bool(subprocess.run(['git','status','--porcelain','--untracked-files=no'],cwd=here,capture_output=True,text=True,check=True).stdout.strip())
+        return commit,dirty
+    except (OSError,subprocess.CalledProcessError):
+        return None,None
+
+
+def run_once(scorer,filename,n_frames,args):
+    times=StageTimes(scorer.device)
+    scorer.face_detector=TimedFaceDetector(scorer.face_detector,times)
+    tracker=FaceTracker(scorer.face_detector,keyframe_interval=args.keyframe_interval) if args.track else None
+    gate=FrameGate(args.skip_similar) if args.skip_similar is not None else None
+    try:
+        with instrumented(scorer,times),PeakRSS() as rss:
+            start=time.perf_counter()
+            score=scorer.score_video(filename,n_frames,tracker=tracker,gate=gate)
+            wall=time.perf_counter()-start
+    finally:
+        scorer.face_detector=scorer.face_detector.detector
+
+    seconds=dict(times.seconds)
+    seconds['decode']=max(0.,seconds.pop('extract')-seconds['detect']-seconds['crop'])
+    return {
+        'wall_s':round(wall,4),
+        'frames_per_s':round(n_frames/wall,2),
+        'stages_s':{stage:round(seconds[stage],4) for stage in STAGES},
+        'detector_calls':times.calls['detect'],
+        'classify_calls':times.calls['classify'],
+        'peak_rss_mb':round(rss.peak/2**20,1),
+        'peak_growth_mb':round((rss.peak-rss.start)/2**20,1),
+        'score':score,
+    }
+
+
+def main(args):
+    if args.video:
+        filename=args.video
+    else:
+        video_dir=args.video_dir or os.path.join(tempfile.gettempdir(),'deepfake_bench')
+        os.makedirs(video_dir,exist_ok=True)
+        filename=video_path(video_dir,args)
+        if not os.path.exists(filename):
+            print(f'generating {filename}')
+            tmp=f'{os.path.splitext(filename)[0]}.{os.getpid()}.tmp.{CODEC_EXT.get(args.codec,"avi")}'
+            make_video(tmp,args.width,args.height,args.frames,args.fps,args.codec,args.faces,args.seed)
+            os.replace(tmp,filename)
+
+    cap=cv2.VideoCapture(filename)
+    frame_count=int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    n_frames=min(args.n_frames or frame_count,frame_count)
+
+    if args.threads:
+        torch.set_num_threads(args.threads)
+    face_detector=load_face_detector(device) if args.detector=='retinaface' else StubFaceDetector()
+    scorer=VideoScorer(build_classifier(args.classifier,args.weight_name,device),face_detector,device=device,batch_size=args.batch_size)
+
+    runs=[]
+    for i in range(args.warmup+args.repeat):
+        result=run_once(scorer,filename,n_frames,args)
+        if i>=args.warmup:
+            runs.append(result)
+            print(f"run {len(runs)}| {result['wall_s']:.2f}s, {result['frames_per_s']:.1f} frames/s, "
+                  +', '.join(f'{s} {t:.2f}s' for s,t in result['stages_s'].items())
+                  +f", peak RSS {result['peak_rss_mb']}MB (+{result['peak_growth_mb']}MB)")
+
+    median=lambda values:float(np.median(values))
+    summary={
+        'wall_s':median([r['wall_s'] for r in runs]),
+        'frames_per_s':median([r['frames_per_s'] for r in runs]),
+        'stages_s':{s:median([r['stages_s'][s] for r in runs]) for s in STAGES},
+        'peak_rss_mb':max(r['peak_rss_mb'] for r in runs),
+        'peak_growth_mb':max(r['peak_growth_mb'] for r in runs),
+    }
+    commit,dirty=git_commit()
+    report={
+        'commit':commit,
+        'dirty':dirty,
+        'created':datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'machine':{'platform':platform.platform(),'cpu_count':os.cpu_count(),'torch':torch.__version__,
+                   'opencv':cv2.__version__,'threads':torch.get_num_threads(),'device':str(device)},
+        'params':{'video':os.path.basename(filename),'frame_count':frame_count,'n_frames':n_frames,
+                  'detector':args.detector,'classifier':'weights' if args.weight_name else args.classifier,
+                  'batch_size':args.batch_size,'track':args.track,'skip_similar':args.skip_similar,
+                  'warmup':args.warmup,'repeat':args.repeat},
+        'median':summary,
+        'runs':runs,
+    }
+    print(f"\n{os.path.basename(filename)}, {n_frames}/{frame_count} frames sampled, commit {(commit or 'unknown')[:12]}{' (dirty)' if dirty else ''}")
+    print(f"median: {summary['wall_s']:.2f}s, {summary['frames_per_s']:.1f} frames/s, peak RSS {summary['peak_rss_mb']}MB")
+    for stage,seconds in summary['stages_s'].items():
+        print(f'  {stage:<9} {seconds:8.3f}s  {1000*seconds/max(1,n_frames):7.2f}ms/frame')
+    if args.json:
+        with open(args.json,'w') as f:
+            json.dump(report,f,indent=2)
+
+
+if __name__=='__main__':
+
+    parser=argparse.ArgumentParser(description='Benchmark the video scoring path on a generated video')
+    parser.add_argument('--resolution',default='1280x720',help='WIDTHxHEIGHT of the generated video')
+    parser.add_argument('--frames',default=300,type=int,help='length of the generated video')
+    parser.add_argument('--fps',default=25,type=int)
+    parser.add_argument('--codec',default='mp4v',help='fourcc: mp4v, MJPG, XVID, avc1 (if the OpenCV build has it)')
+    parser.add_argument('--faces',default=1,type=int,help='face-like regions drawn per frame')
+    parser.add_argument('--seed',default=0,type=int)
+    parser.add_argument('--video',default=None,help='benchmark this file instead of a generated one')
+    parser.add_argument('--video-dir',dest='video_dir',default=None,help='where generated videos are cached (default: <tmp>/deepfake_bench)')
+    parser.add_argument('-n',dest='n_frames',default=None,type=int,help='frames sampled by extract_frames (default: every frame)')
+    parser.add_argument('--detector',default='stub',choices=('stub','retinaface'))
+    parser.add_argument('--classifier',default='efficientnet-b4',choices=('efficientnet-b4','stub'),help='ignored when -w is given')
+    parser.add_argument('-w',dest='weight_name',default=None,help='real Detector checkpoint')
+    parser.add_argument('--batch-size',dest='batch_size',default=32,type=int)
+    parser.add_argument('--track',action='store_true',help='run the face detector on keyframes only')
+    parser.add_argument('--keyframe-interval',dest='keyframe_interval',default=8,type=int)
+    parser.add_argument('--skip-similar',dest='skip_similar',default=None,type=float,help='frame gate threshold (see frame_gate.py)')
+    parser.add_argument('--warmup',default=1,type=int)
+    parser.add_argument('--repeat',default=3,type=int)
+    parser.add_argument('--threads',default=None,type=int,help='torch threads (default: torch\'s own)')
+    parser.add_argument('--device',default=None,help='torch device (default: cuda if available, else cpu)')
+    parser.add_argument('--json',default=None,help='write the full report here')
+    args=parser.parse_args()
+    args.width,args.height=(int(v) for v in args.resolution.lower().split('x'))
+
+    device=get_device(args.device)
+
+    main(args)
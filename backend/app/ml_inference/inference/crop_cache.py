@@ -0,0 +1,93 @@
+import os
+import json
+import hashlib
+import numpy as np
+
+
+def video_hash(filename,block_size=1<<20):
+	# content hash from the size plus head/middle/tail blocks: identifies a
+	# video without reading multi-GB files end to end
+	size=os.path.getsize(filename)
+	h=hashlib.sha1(str(size).encode())
+	with open(filename,'rb') as f:
+		for offset in sorted({0,max(0,size//2-block_size//2),max(0,size-block_size)}):
+			f.seek(offset)
+			h.update(f.read(block_size))
+	return h.hexdigest()
+
+
+class CropCache:
+	"""
+	Persistent cache of extract_frames output.
+
+	Each entry is a pair of .npy shards, <key>.crops.npy (uint8 [N,3,H,W]) and
+	<key>.idx.npy (int64 [N]), where the key hashes the video content, n_frames
+	and the face detector / tracker settings. Shards are opened memory-mapped
+	so cached crops go straight into torch.from_numpy without a copy.
+
+	Empty extractions are never stored: extract_frames returns no crops for an
+	unreadable or truncated video as well as for one without faces, and only
+	the latter would be safe to remember.
+	"""
+
+	def __init__(self,cache_dir,settings=None):
+		self.cache_dir=cache_dir
+		self.settings=settings or {}
+		self.hits=0
+		self.misses=0
+		os.makedirs(cache_dir,exist_ok=True)
+
+	def key(self,filename,n_frames,**extra):
+		params=dict(self.settings,n_frames=n_frames,**extra)
+		blob=json.dumps(params,sort_keys=True)+video_hash(filename)
+		return hashlib.sha1(blob.encode()).hexdigest()
+
+	def _paths(self,key):
+		shard_dir=os.path.join(self.cache_dir,key[:2])
+		return os.path.join(shard_dir,f'{key}.crops.npy'),os.path.join(shard_dir,f'{key}.idx.npy')
+
+	def load(self,key):
+		crops_path,idx_path=self._paths(key)
+		if not (os.path.exists(crops_path) and os.path.exists(idx_path)):
+			return None
+		# copy-on-write maps are writable views, which torch.from_numpy accepts without warning
+		crops=np.load(crops_path,mmap_mode='c')
+		idx=np.load(idx_path)
+		if len(idx)==0:
+			# written before empty results stopped being cached
+			return None
+		return crops,idx
+
+	def store(self,key,face_list,idx_list):
+		crops_path,idx_path=self._paths(key)
+		os.makedirs(os.path.dirname(crops_path),exist_ok=True)
+		tmp_crops=f'{crops_path}.{os.getpid()}.tmp'
+		tmp_idx=f'{idx_path}.{os.getpid()}.tmp'
+
+		# fill the shard crop by crop instead of stacking a second copy in RAM
+		out=np.lib.format.open_memmap(tmp_crops,mode='w+',dtype=np.uint8,shape=(len(face_list),)+tuple(face_list[0].shape))
+		for i,face in enumerate(face_list):
+			out[i]=face
+		out.flush()
+		del out
+		with open(tmp_idx,'wb') as f:
+			np.save(f,np.asarray(idx_list,dtype=np.int64))
+
+		# idx is renamed last: load() only sees complete entries
+		os.replace(tmp_crops,crops_path)
+		os.replace(tmp_idx,idx_path)
+
+	def get_or_extract(self,filename,n_frames,extract,**extra):
+		# extract() -> (face_list, idx_list), only called on a miss
+		key=self.key(filename,n_frames,**extra)
+		cached=self.load(key)
+		if cached is not None:
+			self.hits+=1
+			return cached
+		self.misses+=1
+		face_list,idx_list=extract()
+		if len(face_list)==0:
+			# retried on the next run, see the class docstring
+			return face_list,idx_list
+		self.store(key,face_list,idx_list)
+		return self.load(key)
@@ -1,25 +1,27 @@
 from glob import glob
 import os
 import sys
+import csv
 import json
 import numpy as np
 from PIL import Image
-from glob import glob 
-import os
-import pandas as pd
+from manifest import load_manifest,glob_tracked
 
+# All loaders read from cached manifests (see manifest.py); the _build_*
+# functions below only run when a manifest is missing or stale.
 
-def init_ff(dataset='all',phase='test'):
-	assert dataset in ['all','Deepfakes','Face2Face','FaceSwap','NeuralTextures']
+
+def _build_ff(dataset,phase):
 	original_path='data/FaceForensics++/original_sequences/youtube/raw/videos/'
 	folder_list = sorted(glob(original_path+'*'))
 
 	list_dict = json.load(open(f'data/FaceForensics++/{phase}.json','r'))
-	filelist=[]
+	filelist=set()
 	for i in list_dict:
-		filelist+=i
+		filelist.update(i)
 	image_list = [i for i in folder_list if os.path.basename(i)[:3] in filelist]
 	label_list=[0]*len(image_list)
+	deps=[original_path,f'data/FaceForensics++/{phase}.json']
 
 
 	if dataset=='all':
@@ -32,13 +34,19 @@ def init_ff(dataset='all',phase='test'):
 		fake_path=f'data/FaceForensics++/manipulated_sequences/{fake}/raw/videos/'
 		folder_list_all=sorted(glob(fake_path+'*'))
 		folder_list+=[i for i in folder_list_all if os.path.basename(i)[:3] in filelist]
+		deps.append(fake_path)
 	label_list+=[1]*len(folder_list)
 	image_list+=folder_list
-	return image_list,label_list
+	return image_list,label_list,deps
 
 
+def init_ff(dataset='all',phase='test'):
+	assert dataset in ['all','Deepfakes','Face2Face','FaceSwap','NeuralTextures']
+	return load_manifest(f'FF-{dataset}',phase,lambda:_build_ff(dataset,phase))
 
-def init_dfd():
+
+
+def _build_dfd():
 	real_path='data/FaceForensics++/original_sequences/actors/raw/videos/*.mp4'
 	real_videos=sorted(glob(real_path))
 	fake_path='data/FaceForensics++/manipulated_sequences/DeepFakeDetection/raw/videos/*.mp4'
@@ -48,53 +56,65 @@ def init_dfd():
 
 	image_list=real_videos+fake_videos
 
-	return image_list,label_list
+	return image_list,label_list,[os.path.dirname(real_path),os.path.dirname(fake_path)]
+
+
+def init_dfd():
+	return load_manifest('DFD','test',_build_dfd)
+
+
+def _build_dfdc():
+	label_path='data/DFDC/labels.csv'
+	with open(label_path,newline='') as f:
+		rows=list(csv.DictReader(f))
+	folder_list=[f'data/DFDC/videos/{row["filename"]}' for row in rows]
+	label_list=[int(float(row['label'])) for row in rows]
+
+	return folder_list,label_list,[label_path]
 
 
 def init_dfdc():
-		
-	label=pd.read_csv('data/DFDC/labels.csv',delimiter=',')
-	folder_list=[f'data/DFDC/videos/{i}' for i in label['filename'].tolist()]
-	label_list=label['label'].tolist()
-	
-	return folder_list,label_list
+	return load_manifest('DFDC','test',_build_dfdc)
 
 
-def init_dfdcp(phase='test'):
+def _build_dfdcp(phase):
 
 	phase_integrated={'train':'train','val':'train','test':'test'}
 
-	all_img_list=[]
-	all_label_list=[]
-
 	with open('data/DFDCP/dataset.json') as f:
 		df=json.load(f)
-	fol_lab_list_all=[[f"data/DFDCP/{k.split('/')[0]}/videos/{k.split('/')[-1]}",df[k]['label']=='fake'] for k in df if df[k]['set']==phase_integrated[phase]]
-	name2lab={os.path.basename(fol_lab_list_all[i][0]):fol_lab_list_all[i][1] for i in range(len(fol_lab_list_all))}
-	fol_list_all=[f[0] for f in fol_lab_list_all]
-	fol_list_all=[os.path.basename(p)for p in fol_list_all]
-	folder_list=glob('data/DFDCP/method_*/videos/*/*/*.mp4')+glob('data/DFDCP/original_videos/videos/*/*.mp4')
-	folder_list=[p for p in folder_list if os.path.basename(p) in fol_list_all]
+	# basename -> label for the requested split; dict lookups keep filtering linear
+	name2lab={os.path.basename(k):df[k]['label']=='fake' for k in df if df[k]['set']==phase_integrated[phase]}
+	fake_list,fake_dirs=glob_tracked('data/DFDCP/method_*/videos/*/*/*.mp4')
+	real_list,real_dirs=glob_tracked('data/DFDCP/original_videos/videos/*/*.mp4')
+	folder_list=[p for p in fake_list+real_list if os.path.basename(p) in name2lab]
 	label_list=[name2lab[os.path.basename(p)] for p in folder_list]
-	
 
-	return folder_list,label_list
 
+	return folder_list,label_list,['data/DFDCP/dataset.json']+fake_dirs+real_dirs
 
 
+def init_dfdcp(phase='test'):
+	return load_manifest('DFDCP',phase,lambda:_build_dfdcp(phase))
 
-def init_ffiw():
+
+
+
+def _build_ffiw():
 	# assert dataset in ['real','fake']
 	path='data/FFIW/FFIW10K-v1-release/'
 	folder_list=sorted(glob(path+'source/val/videos/*.mp4'))+sorted(glob(path+'target/val/videos/*.mp4'))
 	label_list=[0]*250+[1]*250
-	return folder_list,label_list
+	return folder_list,label_list,[path+'source/val/videos/',path+'target/val/videos/']
+
 
+def init_ffiw():
+	return load_manifest('FFIW','val',_build_ffiw)
 
 
-def init_cdf():
 
-	image_list=[]
+def _build_cdf():
+
 	label_list=[]
 
 	video_list_txt='data/Celeb-DF-v2/List_of_testing_videos.txt'
@@ -102,13 +122,12 @@ def init_cdf():
 		
 		folder_list=[]
 		for data in f:
-			# print(data)
 			line=data.split()
-			# print(line)
 			path=line[1].split('/')
 			folder_list+=['data/Celeb-DF-v2/'+path[0]+'/videos/'+path[1]]
 			label_list+=[1-int(line[0])]
-		return folder_list,label_list
-		
+		return folder_list,label_list,[video_list_txt]
 
 
+def init_cdf():
+	return load_manifest('CDF','test',_build_cdf)
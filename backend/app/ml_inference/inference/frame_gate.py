@@ -0,0 +1,107 @@
+import os
+import time
+import argparse
+import numpy as np
+import cv2
+
+
+class FrameGate:
+	"""
+	Skips sampled frames that look almost the same as the last analysed one.
+
+	Each frame is shrunk to a size x size grayscale thumbnail. When its mean
+	absolute difference from the last analysed frame's thumbnail is below
+	threshold (in 0-255 intensity levels) the frame is a repeat: face
+	detection and classification are skipped and it takes the score of the
+	frame it repeats. Comparing against the last analysed frame, not the
+	previous one, keeps slow drift from adding up past the threshold.
+
+	Use one gate per video; repeats maps skipped frame -> analysed frame.
+	"""
+
+	def __init__(self,threshold=2.,size=32):
+		self.threshold=threshold
+		self.size=size
+		self.reference=None
+		self.reference_idx=None
+		self.repeats={}
+		self.frames=0
+		self.skipped=0
+
+	def settings(self):
+		return {'threshold':self.threshold,'size':self.size}
+
+	def stats(self):
+		return {
+			'frames':self.frames,
+			'analysed':self.frames-self.skipped,
+			'skipped':self.skipped,
+		}
+
+	def check(self,frame,idx):
+		# frame: BGR or RGB uint8 as decoded; True if it needs to be analysed
+		self.frames+=1
+		gray=cv2.cvtColor(frame,cv2.COLOR_BGR2GRAY)
+		thumb=cv2.resize(gray,(self.size,self.size),interpolation=cv2.INTER_AREA).astype(np.float32)
+		if self.reference is not None and np.abs(thumb-self.reference).mean()<self.threshold:
+			self.skipped+=1
+			self.repeats[idx]=self.reference_idx
+			return False
+		self.reference=thumb
+		self.reference_idx=idx
+		return True
+
+
+def compare_gate(scorer,filename,num_frames,thresholds):
+	# score a video with every frame analysed and with the gate at each
+	# threshold; report frames skipped against the change in video score
+	t0=time.time()
+	reference=scorer.score_video(filename,num_frames)
+	report={'score':reference,'time_s':round(time.time()-t0,2),'gated':{}}
+	for threshold in thresholds:
+		gate=FrameGate(threshold)
+		t0=time.time()
+		score=scorer.score_video(filename,num_frames,gate=gate)
+		entry=gate.stats()
+		entry['score']=score
+		entry['abs_diff']=abs(score-reference) if score is not None and reference is not None else None
+		entry['time_s']=round(time.time()-t0,2)
+		report['gated'][threshold]=entry
+	return report
+
+
+if __name__=='__main__':
+	from scoring import VideoScorer,get_device
+
+	parser=argparse.ArgumentParser(description='Frames skipped by the near-duplicate gate vs the change in video score')
+	parser.add_argument('videos',nargs='+')
+	parser.add_argument('-w',dest='weight_name',type=str)
+	parser.add_argument('-n',dest='n_frames',default=32,type=int)
+	parser.add_argument('--thresholds',default='1,2,4',help='comma-separated gate thresholds to compare (intensity levels)')
+	parser.add_argument('--device',default=None,help='torch device (default: cuda if available, else cpu)')
+	args=parser.parse_args()
+
+	thresholds=[float(t) for t in args.thresholds.split(',')]
+	scorer=VideoScorer.load(args.weight_name,device=get_device(args.device))
+
+	totals={t:{'frames':0,'skipped':0,'diffs':[],'time_s':0.} for t in thresholds}
+	base_time=0.
+	for filename in args.videos:
+		report=compare_gate(scorer,filename,args.n_frames,thresholds)
+		base_time+=report['time_s']
+		print(f"{os.path.basename(filename)}| score: {report['score']}, time: {report['time_s']}s")
+		for t,entry in report['gated'].items():
+			totals[t]['frames']+=entry['frames']
+			totals[t]['skipped']+=entry['skipped']
+			totals[t]['time_s']+=entry['time_s']
+			if entry['abs_diff'] is not None:
+				totals[t]['diffs'].append(entry['abs_diff'])
+			print(f"  threshold {t}| skipped {entry['skipped']}/{entry['frames']}, score: {entry['score']}, |diff|: {entry['abs_diff']}, time: {entry['time_s']}s")
+
+	print(f'\nno gate: {base_time:.1f}s')
+	for t,total in totals.items():
+		diffs=total['diffs']
+		skipped=total['skipped']/total['frames'] if total['frames'] else 0.
+		print(f"threshold {t}| skipped: {total['skipped']}/{total['frames']} ({skipped:.1%}), "
+			f"mean |diff|: {np.mean(diffs) if diffs else float('nan'):.4f}, max |diff|: {max(diffs,default=float('nan')):.4f}, "
+			f"time: {total['time_s']:.1f}s")
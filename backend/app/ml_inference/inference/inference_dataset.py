@@ -1,38 +1,79 @@
 import os
 import torch
-import torch.nn as nn
-import torch.nn.functional as F
-import torch.optim as optim
-from torchvision import datasets,transforms,models,utils
 import numpy as np
-import matplotlib.pyplot as plt
-import os
-import pandas as pd
-from PIL import Image
-import sys
 import random
-import shutil
-from model import Detector
 import argparse
-from datetime import datetime
+import csv
+import time
+import multiprocessing as mp
 from tqdm import tqdm
-from retinaface.pre_trained_models import get_model
-from preprocess import extract_frames
+from tracking import FaceTracker
+from frame_gate import FrameGate
+from scoring import VideoScorer,get_device,AGGREGATIONS
+from crop_cache import CropCache
 from datasets import *
-from sklearn.metrics import confusion_matrix, roc_auc_score
+import manifest
 import warnings
 warnings.filterwarnings('ignore')
 
-def main(args):
+def write_scores(path,video_list,target_list,scores):
+    os.makedirs(os.path.dirname(path) or '.',exist_ok=True)
+    with open(path,'w',newline='') as f:
+        writer=csv.writer(f)
+        writer.writerow(['filename','label','score'])
+        for row in zip(video_list,target_list,scores):
+            writer.writerow(row)
+
+
+def score_shard(shard_id,indices,video_list,args,device,num_threads=None):
+    # Score video_list[i] for i in indices with this process's own model and
+    # face detector. Returns (shard_id, [(i, scores)], stats).
+    if num_threads:
+        torch.set_num_threads(num_threads)
+    t0=time.time()
+    scorer=VideoScorer.load(args.weight_name,device=device,aggregation=args.aggregation,k=args.k,q=args.q)
+    cache=CropCache(args.crop_cache,settings={'detector':'resnet50_2020-07-20','max_size':2048,'image_size':380}) if args.crop_cache else None
+    t_load=time.time()-t0
+
+    n_models=len(args.weight_name)
+    results=[]
+    n_frames_seen=n_detector_calls=0
+    n_gated=n_skipped=0
+    for i in tqdm(indices,disable=shard_id>0,desc=f'shard {shard_id}'):
+        filename=video_list[i]
+        try:
+            tracker=FaceTracker(scorer.face_detector,keyframe_interval=args.keyframe_interval) if args.track else None
+            gate=FrameGate(args.skip_similar) if args.skip_similar is not None else None
+            pred=scorer.score_video_all(filename,args.n_frames,tracker=tracker,cache=cache,gate=gate)
+            if tracker is not None:
+                n_frames_seen+=tracker.frames
+                n_detector_calls+=tracker.detector_calls
+            if gate is not None:
+                n_gated+=gate.frames
+                n_skipped+=gate.skipped
+            if pred is None:
+                pred=[0.5]*n_models
+        except Exception as e:
+            print(e)
+            pred=[0.5]*n_models
+        results.append((i,pred))
+
+    stats={
+        'videos':len(indices),
+        'load_s':t_load,
+        'score_s':time.time()-t0-t_load,
+        'threads':torch.get_num_threads(),
+        'frames_seen':n_frames_seen,
+        'detector_calls':n_detector_calls,
+        'gated_frames':n_gated,
+        'skipped_frames':n_skipped,
+        'cache_hits':cache.hits if cache else 0,
+        'cache_misses':cache.misses if cache else 0,
+    }
+    return shard_id,results,stats
 
-    model=Detector()
-    model=model.to(device)
-    cnn_sd=torch.load(args.weight_name)["model"]
-    model.load_state_dict(cnn_sd)
-    model.eval()
 
-    face_detector = get_model("resnet50_2020-07-20", max_size=2048,device=device)
-    face_detector.eval()
+def main(args):
 
     if args.dataset == 'FFIW':
         video_list,target_list=init_ffiw()
@@ -49,34 +90,42 @@ def main(args):
     else:
         NotImplementedError
 
-    output_list=[]
-    for filename in tqdm(video_list):
-        try:
-            face_list,idx_list=extract_frames(filename,args.n_frames,face_detector)
-
-            with torch.no_grad():
-                img=torch.tensor(face_list).to(device).float()/255
-                pred=model(img).softmax(1)[:,1]
-                
-                
-            pred_list=[]
-            idx_img=-1
-            for i in range(len(pred)):
-                if idx_list[i]!=idx_img:
-                    pred_list.append([])
-                    idx_img=idx_list[i]
-                pred_list[-1].append(pred[i].item())
-            pred_res=np.zeros(len(pred_list))
-            for i in range(len(pred_res)):
-                pred_res[i]=max(pred_list[i])
-            pred=pred_res.mean()
-        except Exception as e:
-            print(e)
-            pred=0.5
-        output_list.append(pred)
+    n_workers=max(1,min(args.workers,len(video_list)))
+    if n_workers==1:
+        shard_results=[score_shard(0,list(range(len(video_list))),video_list,args,device)]
+    else:
+        # strided shards mix real and fake (and short and long) videos evenly
+        threads=args.threads_per_worker or max(1,(os.cpu_count() or 1)//n_workers)
+        shards=[list(range(w,len(video_list),n_workers)) for w in range(n_workers)]
+        ctx=mp.get_context('spawn')
+        with ctx.Pool(n_workers) as pool:
+            shard_results=pool.starmap(score_shard,[(w,shards[w],video_list,args,device,threads) for w in range(n_workers)])
+
+    # deterministic merge: every score goes back to its original position
+    output_list=[None]*len(video_list)
+    for _,results,_ in shard_results:
+        for i,pred in results:
+            output_list[i]=pred
 
-    auc=roc_auc_score(target_list,output_list)
-    print(f'{args.dataset}| AUC: {auc:.4f}')
+    from sklearn.metrics import roc_auc_score
+    for m,weight_name in enumerate(args.weight_name):
+        scores=[pred[m] for pred in output_list]
+        auc=roc_auc_score(target_list,scores)
+        print(f'{args.dataset}| {os.path.basename(weight_name)}| AUC: {auc:.4f}')
+        if args.out_dir:
+            write_scores(os.path.join(args.out_dir,f'{os.path.splitext(os.path.basename(weight_name))[0]}_{args.dataset}.csv'),video_list,target_list,scores)
+
+    totals={k:sum(stats[k] for _,_,stats in shard_results) for k in ('frames_seen','detector_calls','gated_frames','skipped_frames','cache_hits','cache_misses')}
+    if n_workers>1:
+        for shard_id,_,stats in sorted(shard_results,key=lambda r:r[0]):
+            rate=stats['videos']/stats['score_s'] if stats['score_s']>0 else float('inf')
+            print(f"shard {shard_id}| videos: {stats['videos']}, threads: {stats['threads']}, load: {stats['load_s']:.1f}s, score: {stats['score_s']:.1f}s, {rate:.2f} videos/s")
+    if args.crop_cache:
+        print(f"crop cache| hits: {totals['cache_hits']}, misses: {totals['cache_misses']}")
+    if args.skip_similar is not None and totals['gated_frames']:
+        print(f"frame gate| skipped: {totals['skipped_frames']}/{totals['gated_frames']} ({totals['skipped_frames']/totals['gated_frames']:.1%})")
+    if args.track and totals['frames_seen']:
+        print(f"tracking| detector calls: {totals['detector_calls']}/{totals['frames_seen']} ({1-totals['detector_calls']/totals['frames_seen']:.1%} saved)")
 
 
 
@@ -93,13 +142,30 @@ if __name__=='__main__':
     torch.backends.cudnn.deterministic = True
     torch.backends.cudnn.benchmark = False
 
-    device = torch.device('cuda')
-
     parser=argparse.ArgumentParser()
-    parser.add_argument('-w',dest='weight_name',type=str)
+    parser.add_argument('-w',dest='weight_name',type=str,nargs='+',help='one or more checkpoints, evaluated in a single pass')
     parser.add_argument('-d',dest='dataset',type=str)
     parser.add_argument('-n',dest='n_frames',default=32,type=int)
+    parser.add_argument('--track',action='store_true',help='run RetinaFace on keyframes only and track faces in between')
+    parser.add_argument('--keyframe-interval',dest='keyframe_interval',default=8,type=int)
+    parser.add_argument('--skip-similar',dest='skip_similar',default=None,type=float,help='reuse the last analysed frame\'s score for frames whose thumbnail differs by less than this (mean intensity levels, e.g. 2)')
+    parser.add_argument('--aggregation',default='mean',choices=AGGREGATIONS,help='how per-frame maxima become the video score')
+    parser.add_argument('-k',default=4,type=int,help='frames averaged by --aggregation topk')
+    parser.add_argument('-q',default=0.9,type=float,help='quantile used by --aggregation quantile')
+    parser.add_argument('--device',default=None,help='torch device (default: cuda if available, else cpu)')
+    parser.add_argument('--workers',default=1,type=int,help='worker processes, each with its own model and face detector')
+    parser.add_argument('--threads-per-worker',dest='threads_per_worker',default=None,type=int,help='torch threads per worker (default: cpu_count // workers)')
+    parser.add_argument('--out-dir',dest='out_dir',default=None,help='write per-video scores to <out-dir>/<checkpoint>_<dataset>.csv')
+    parser.add_argument('--crop-cache',dest='crop_cache',default=None,help='directory of memory-mapped face-crop shards reused across runs')
+    parser.add_argument('--refresh-manifest',dest='refresh_manifest',action='store_true',help='rebuild the cached dataset manifest')
+    parser.add_argument('--verify-manifest',dest='verify_manifest',action='store_true',help='also stat every video and rebuild if one was rewritten in place')
     args=parser.parse_args()
+    if args.skip_similar is not None and args.crop_cache:
+        parser.error('--skip-similar cannot be combined with --crop-cache')
+
+    device=get_device(args.device)
+    manifest.FORCE_REFRESH=args.refresh_manifest
+    manifest.VERIFY=args.verify_manifest
 
     main(args)
 
@@ -1,37 +1,25 @@
-import os
 import torch
-import torch.nn as nn
-import torch.nn.functional as F
-import torch.optim as optim
-import torchvision
-from torchvision import datasets,transforms,models,utils
 import numpy as np
-import matplotlib.pyplot as plt
-import os
-import pandas as pd
-from PIL import Image
-import sys
+import cv2
 import random
-import shutil
 from model import Detector
 import argparse
-from datetime import datetime
-from tqdm import tqdm
-from retinaface.pre_trained_models import get_model
 from preprocess import extract_face
+from scoring import get_device
 import warnings
 warnings.filterwarnings('ignore')
 
 def main(args):
+    from retinaface.pre_trained_models import get_model
 
     model=Detector()
     model=model.to(device)
-    cnn_sd=torch.load(args.weight_name)["model"]
+    cnn_sd=torch.load(args.weight_name,map_location=device)["model"]
     model.load_state_dict(cnn_sd)
     model.eval()
 
     frame = cv2.imread(args.input_image)
-	frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
 
     face_detector = get_model("resnet50_2020-07-20", max_size=max(frame.shape),device=device)
     face_detector.eval()
@@ -56,12 +44,13 @@ if __name__=='__main__':
     torch.backends.cudnn.deterministic = True
     torch.backends.cudnn.benchmark = False
 
-    device = torch.device('cuda')
-
     parser=argparse.ArgumentParser()
     parser.add_argument('-w',dest='weight_name',type=str)
     parser.add_argument('-i',dest='input_image',type=str)
+    parser.add_argument('--device',default=None,help='torch device (default: cuda if available, else cpu)')
     args=parser.parse_args()
 
+    device=get_device(args.device)
+
     main(args)
 
@@ -1,55 +1,33 @@
-import os
 import torch
-import torch.nn as nn
-import torch.nn.functional as F
-import torch.optim as optim
-from torchvision import datasets,transforms,models,utils
 import numpy as np
-import matplotlib.pyplot as plt
-import os
-import pandas as pd
-from PIL import Image
-import sys
 import random
-import shutil
-from model import Detector
 import argparse
-from datetime import datetime
-from tqdm import tqdm
-from retinaface.pre_trained_models import get_model
-from preprocess import extract_frames
+from tracking import FaceTracker
+from frame_gate import FrameGate
+from scoring import VideoScorer,get_device,AGGREGATIONS
 import warnings
 warnings.filterwarnings('ignore')
 
 def main(args):
 
-    model=Detector()
-    model=model.to(device)
-    cnn_sd=torch.load(args.weight_name)["model"]
-    model.load_state_dict(cnn_sd)
-    model.eval()
-
-    face_detector = get_model("resnet50_2020-07-20", max_size=2048,device=device)
-    face_detector.eval()
-
-    face_list,idx_list=extract_frames(args.input_video,args.n_frames,face_detector)
-
-    with torch.no_grad():
-        img=torch.tensor(face_list).to(device).float()/255
-        pred=model(img).softmax(1)[:,1]
-        
-        
-    pred_list=[]
-    idx_img=-1
-    for i in range(len(pred)):
-        if idx_list[i]!=idx_img:
-            pred_list.append([])
-            idx_img=idx_list[i]
-        pred_list[-1].append(pred[i].item())
-    pred_res=np.zeros(len(pred_list))
-    for i in range(len(pred_res)):
-        pred_res[i]=max(pred_list[i])
-    pred=pred_res.mean()
+    scorer=VideoScorer.load(args.weight_name,device=device,aggregation=args.aggregation,k=args.k,q=args.q)
+
+    if args.adaptive:
+        pred,n_scored,n_visited=scorer.score_video_adaptive(args.input_video,args.max_frames,args.min_frames,args.threshold,args.confidence)
+        pred=0.5 if pred is None else pred
+        print(f'fakeness: {pred:.4f} (frames used: {n_scored}, visited: {n_visited}/{args.max_frames})')
+        return
+
+    tracker=FaceTracker(scorer.face_detector,keyframe_interval=args.keyframe_interval) if args.track else None
+    gate=FrameGate(args.skip_similar) if args.skip_similar is not None else None
+    pred=scorer.score_video(args.input_video,args.n_frames,tracker=tracker,gate=gate)
+    if tracker is not None:
+        print(f'tracking: {tracker.stats()}')
+    if gate is not None:
+        print(f'frame gate: {gate.stats()}')
+    if pred is None:
+        print('No faces detected')
+        return
 
     print(f'fakeness: {pred:.4f}')
 
@@ -68,13 +46,28 @@ if __name__=='__main__':
     torch.backends.cudnn.deterministic = True
     torch.backends.cudnn.benchmark = False
 
-    device = torch.device('cuda')
-
     parser=argparse.ArgumentParser()
     parser.add_argument('-w',dest='weight_name',type=str)
     parser.add_argument('-i',dest='input_video',type=str)
     parser.add_argument('-n',dest='n_frames',default=32,type=int)
+    parser.add_argument('--track',action='store_true',help='run RetinaFace on keyframes only and track faces in between')
+    parser.add_argument('--keyframe-interval',dest='keyframe_interval',default=8,type=int)
+    parser.add_argument('--skip-similar',dest='skip_similar',default=None,type=float,help='reuse the last analysed frame\'s score for frames whose thumbnail differs by less than this (mean intensity levels, e.g. 2)')
+    parser.add_argument('--adaptive',action='store_true',help='sequential early stopping instead of a fixed n_frames')
+    parser.add_argument('--max-frames',dest='max_frames',default=32,type=int,help='frame cap in adaptive mode')
+    parser.add_argument('--min-frames',dest='min_frames',default=4,type=int,help='frames scored before stopping is allowed')
+    parser.add_argument('--threshold',default=0.5,type=float,help='decision threshold the bound is tested against')
+    parser.add_argument('--confidence',default=0.95,type=float,help='two-sided confidence level of the stopping bound')
+    parser.add_argument('--aggregation',default='mean',choices=AGGREGATIONS,help='how per-frame maxima become the video score')
+    parser.add_argument('-k',default=4,type=int,help='frames averaged by --aggregation topk')
+    parser.add_argument('-q',default=0.9,type=float,help='quantile used by --aggregation quantile')
+    parser.add_argument('--device',default=None,help='torch device (default: cuda if available, else cpu)')
     args=parser.parse_args()
+    if args.adaptive and (args.track or args.skip_similar is not None):
+        # adaptive mode seeks frames coarse-to-fine, so there is no previous frame to track from or compare with
+        parser.error('--adaptive cannot be combined with --track or --skip-similar')
+
+    device=get_device(args.device)
 
     main(args)
 
@@ -0,0 +1,114 @@
+import os
+import json
+import time
+import glob as globlib
+
+MANIFEST_DIR='data/.manifests'
+MANIFEST_VERSION=2
+# set by --refresh-manifest to rebuild every manifest that gets loaded
+FORCE_REFRESH=False
+# set by --verify-manifest to also stat every entry, catching files
+# rewritten in place (one stat per video: slow on DFDC-sized lists)
+VERIFY=False
+
+
+def _mtime(path):
+	try:
+		return os.stat(path).st_mtime_ns
+	except FileNotFoundError:
+		return None
+
+
+def _stat(path):
+	# (size, mtime) of an entry, (-1, -1) if it is missing
+	try:
+		st=os.stat(path)
+	except FileNotFoundError:
+		return -1,-1
+	return st.st_size,st.st_mtime_ns
+
+
+def glob_tracked(pattern):
+	# glob(pattern), plus every directory the walk lists: the one above the
+	# first wildcard and all matches below it. Adding or removing a file or
+	# directory anywhere along the walk bumps the mtime of one of them, so
+	# they are the deps to pass to load_manifest for a multi-level pattern.
+	parts=pattern.split('/')
+	dirs=[]
+	for i in range(len(parts)-1):
+		if globlib.has_magic('/'.join(parts[:i+2])):
+			dirs+=globlib.glob('/'.join(parts[:i+1]) or '.')
+	return globlib.glob(pattern),[d for d in dirs if os.path.isdir(d)]
+
+
+def _dependencies(paths,extra_deps):
+	# every directory that holds an entry, plus the label files / directories
+	# the builder walked. Adding or removing a video bumps its parent
+	# directory's mtime, so stat-ing these directories is enough to notice
+	# tree changes without re-globbing.
+	deps=set(extra_deps)
+	for p in paths:
+		deps.add(os.path.dirname(p))
+	return {d:_mtime(d) for d in sorted(deps)}
+
+
+def _is_fresh(manifest,verify=False):
+	if manifest.get('version')!=MANIFEST_VERSION:
+		return False
+	if not all(_mtime(d)==m for d,m in manifest['deps'].items()):
+		return False
+	if not verify:
+		return True
+	# a video rewritten in place leaves its directory's mtime alone
+	return all(_stat(p)==(size,mtime) for p,size,mtime in zip(manifest['path'],manifest['size'],manifest['mtime']))
+
+
+def build_manifest(dataset,split,paths,labels,extra_deps=()):
+	sizes=[]
+	mtimes=[]
+	for p in paths:
+		size,mtime=_stat(p)
+		sizes.append(size)
+		mtimes.append(mtime)
+	# column-oriented so the file stays compact for DFDC-sized lists
+	return {
+		'version':MANIFEST_VERSION,
+		'dataset':dataset,
+		'split':split,
+		'created':time.time(),
+		'deps':_dependencies(paths,extra_deps),
+		'path':list(paths),
+		'label':[int(l) for l in labels],
+		'size':sizes,
+		'mtime':mtimes,
+	}
+
+
+def manifest_path(dataset,split):
+	return os.path.join(MANIFEST_DIR,f'{dataset}_{split}.json')
+
+
+def load_manifest(dataset,split,builder,refresh=False,verify=False):
+	"""
+	Return (paths, labels) for a dataset split from its cached manifest.
+
+	builder() is only called when the manifest is missing, stale (one of its
+	dependencies changed mtime) or refresh is set. With verify (or VERIFY)
+	an entry that changed size or mtime also makes it stale. It must return (paths, labels, extra_deps) where extra_deps lists
+	the label files and every directory its globs walked (see glob_tracked).
+	"""
+	path=manifest_path(dataset,split)
+	if not (refresh or FORCE_REFRESH) and os.path.exists(path):
+		with open(path) as f:
+			manifest=json.load(f)
+		if _is_fresh(manifest,verify or VERIFY):
+			return manifest['path'],manifest['label']
+
+	paths,labels,extra_deps=builder()
+	manifest=build_manifest(dataset,split,paths,labels,extra_deps)
+	os.makedirs(MANIFEST_DIR,exist_ok=True)
+	tmp=f'{path}.{os.getpid()}.tmp'
+	with open(tmp,'w') as f:
+		json.dump(manifest,f,separators=(',',':'))
+	os.replace(tmp,path)
+	return manifest['path'],manifest['label']
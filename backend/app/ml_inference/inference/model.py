@@ -1,7 +1,5 @@
 import torch
 from torch import nn
-import torchvision
-from torch.nn import functional as F
 from efficientnet_pytorch import EfficientNet
 
 
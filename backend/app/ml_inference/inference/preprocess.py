@@ -1,66 +1,181 @@
+import os
+import queue
+import threading
 import numpy as np
 import cv2
 from PIL import Image
 import sys
 from tqdm import tqdm
 
-def extract_frames(filename,num_frames,model,image_size=(380,380)):
+def iter_frame_faces(filename,num_frames,model,image_size=(380,380),tracker=None,gate=None):
+	# yields (frame index, face crops) for num_frames evenly spaced frames;
+	# the frames in between are only grabbed, never converted to images.
+	# gate: optional frame_gate.FrameGate; frames it marks as repeats are skipped
 	cap_org = cv2.VideoCapture(filename)
 	
 	if not cap_org.isOpened():
 		print(f'Cannot open: {filename}')
-		# sys.exit()
-		return []
+		return
 	
-	croppedfaces=[]
-	idx_list=[]
 	frame_count_org = int(cap_org.get(cv2.CAP_PROP_FRAME_COUNT))
 	
-	frame_idxs = np.linspace(0, frame_count_org - 1, num_frames, endpoint=True, dtype=int)
-	for cnt_frame in range(frame_count_org): 
-		ret_org, frame_org = cap_org.read()
-		height,width=frame_org.shape[:-1]
-		if not ret_org:
-			tqdm.write('Frame read {} Error! : {}'.format(cnt_frame,os.path.basename(filename)))
-			break
-		
-		if cnt_frame not in frame_idxs:
-			continue
-
-		frame = cv2.cvtColor(frame_org, cv2.COLOR_BGR2RGB)
-		
-		faces = model.predict_jsons(frame)
-		try:
-			if len(faces)==0:
-				tqdm.write('No faces in {}:{}'.format(cnt_frame,os.path.basename(filename)))
+	frame_idxs = set(np.linspace(0, frame_count_org - 1, num_frames, endpoint=True, dtype=int).tolist())
+	try:
+		for cnt_frame in range(frame_count_org): 
+			ret_org = cap_org.grab()
+			if ret_org and cnt_frame in frame_idxs:
+				ret_org, frame_org = cap_org.retrieve()
+			if not ret_org:
+				tqdm.write('Frame read {} Error! : {}'.format(cnt_frame,os.path.basename(filename)))
+				break
+			
+			if cnt_frame not in frame_idxs:
+				continue
+			if gate is not None and not gate.check(frame_org,cnt_frame):
 				continue
 
-			size_list=[]
-			croppedfaces_temp=[]
-			idx_list_temp=[]
-			
-			for face_idx in range(len(faces)):
-				x0,y0,x1,y1=faces[face_idx]['bbox']
-				bbox=np.array([[x0,y0],[x1,y1]])
-				croppedfaces_temp.append(cv2.resize(crop_face(frame,None,bbox,False,crop_by_bbox=True,only_img=True,phase='test'),dsize=image_size).transpose((2,0,1)))
-				idx_list_temp.append(cnt_frame)
-				size_list.append((x1-x0)*(y1-y0))
+			frame = cv2.cvtColor(frame_org, cv2.COLOR_BGR2RGB)
 			
-			max_size=max(size_list)
-			croppedfaces_temp=[f for face_idx,f in enumerate(croppedfaces_temp) if size_list[face_idx]>=max_size/2]
-			idx_list_temp=[f for face_idx,f in enumerate(idx_list_temp) if size_list[face_idx]>=max_size/2]
-			croppedfaces+=croppedfaces_temp
-			idx_list+=idx_list_temp	
-		except Exception as e:
-			print(f'error in {cnt_frame}:{filename}')
-			print(e)
-			continue
-	cap_org.release()
+			faces = model.predict_jsons(frame) if tracker is None else tracker.update(frame)
+			try:
+				if len(faces)==0:
+					tqdm.write('No faces in {}:{}'.format(cnt_frame,os.path.basename(filename)))
+					continue
+
+				croppedfaces=crop_faces(frame,faces,image_size)
+			except Exception as e:
+				print(f'error in {cnt_frame}:{filename}')
+				print(e)
+				continue
+			yield cnt_frame,croppedfaces
+	finally:
+		cap_org.release()
 
-	
 
+def extract_frames(filename,num_frames,model,image_size=(380,380),tracker=None,gate=None):
+	# tracker: optional tracking.FaceTracker wrapping model; detects on keyframes only
+	croppedfaces=[]
+	idx_list=[]
+	for cnt_frame,faces in iter_frame_faces(filename,num_frames,model,image_size,tracker,gate):
+		croppedfaces+=faces
+		idx_list+=[cnt_frame]*len(faces)
 	return croppedfaces,idx_list
 
+
+def iter_face_batches(filename,num_frames,model,batch_size=32,image_size=(380,380),tracker=None,gate=None):
+	# streaming extract_frames: yields (uint8 crops [B,3,H,W], int64 frame indices [B])
+	# with B == batch_size except for the last batch, so memory holds one batch
+	# whatever the video length or number of faces. Each batch is a new array:
+	# consumers may keep it while the next one is filled.
+	crops=np.empty((batch_size,3,image_size[1],image_size[0]),dtype=np.uint8)
+	idx=np.empty(batch_size,dtype=np.int64)
+	n=0
+	for cnt_frame,faces in iter_frame_faces(filename,num_frames,model,image_size,tracker,gate):
+		for face in faces:
+			crops[n]=face
+			idx[n]=cnt_frame
+			n+=1
+			if n==batch_size:
+				yield crops,idx
+				crops=np.empty_like(crops)
+				idx=np.empty_like(idx)
+				n=0
+	if n:
+		yield crops[:n],idx[:n]
+
+
+class _Raised:
+	def __init__(self,exc):
+		self.exc=exc
+
+
+def prefetch(iterator,depth=2):
+	# run iterator in a background thread at most depth items ahead, so video
+	# decoding and face detection overlap with the consumer's inference.
+	# Exceptions are re-raised in the consumer; leaving early stops the thread.
+	items=queue.Queue(depth)
+	stop=threading.Event()
+	done=object()
+
+	def put(item):
+		while not stop.is_set():
+			try:
+				items.put(item,timeout=0.1)
+				return True
+			except queue.Full:
+				pass
+		return False
+
+	def produce():
+		try:
+			for item in iterator:
+				if not put(item):
+					break
+		except BaseException as e:
+			put(_Raised(e))
+		finally:
+			close=getattr(iterator,'close',None)
+			if close is not None:
+				close()
+			put(done)
+
+	thread=threading.Thread(target=produce,daemon=True)
+	thread.start()
+	try:
+		while True:
+			item=items.get()
+			if item is done:
+				break
+			if isinstance(item,_Raised):
+				raise item.exc
+			yield item
+	finally:
+		stop.set()
+		thread.join()
+
+def crop_faces(frame,faces,image_size=(380,380)):
+	# crop every detected face, dropping faces smaller than half the largest one
+	croppedfaces=[]
+	size_list=[]
+	for face_idx in range(len(faces)):
+		x0,y0,x1,y1=faces[face_idx]['bbox']
+		bbox=np.array([[x0,y0],[x1,y1]])
+		croppedfaces.append(cv2.resize(crop_face(frame,None,bbox,False,crop_by_bbox=True,only_img=True,phase='test'),dsize=image_size).transpose((2,0,1)))
+		size_list.append((x1-x0)*(y1-y0))
+
+	max_size=max(size_list)
+	return [f for face_idx,f in enumerate(croppedfaces) if size_list[face_idx]>=max_size/2]
+
+
+def coarse_to_fine_order(n):
+	# visit 0..n-1 so that every prefix is spread evenly over the clip:
+	# 0, n/2, n/4, 3n/4, n/8, ...
+	order=[]
+	seen=set()
+	step=1<<max(0,(n-1).bit_length())
+	while step>=1:
+		for i in range(0,n,step):
+			if i not in seen:
+				seen.add(i)
+				order.append(i)
+		step//=2
+	return order
+
+
+def extract_faces_at(cap,frame_idx,model,image_size=(380,380)):
+	# seek to one frame and return its face crops ([] if unreadable or no face)
+	cap.set(cv2.CAP_PROP_POS_FRAMES,int(frame_idx))
+	ret,frame_org=cap.read()
+	if not ret:
+		return []
+	frame=cv2.cvtColor(frame_org,cv2.COLOR_BGR2RGB)
+	# retinaface returns a single empty bbox when nothing is found
+	faces=[f for f in model.predict_jsons(frame) if len(f['bbox'])==4]
+	if len(faces)==0:
+		return []
+	return crop_faces(frame,faces,image_size)
+
+
 def extract_face(frame,model,image_size=(380,380)):
 	
 	
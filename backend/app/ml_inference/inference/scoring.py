@@ -0,0 +1,221 @@
+"""
+Video scoring engine shared by inference_video.py, inference_dataset.py and
+the API. Per-face predictions are reduced to per-frame maxima and then to a
+video score with tensor ops only, so there is a single host sync per video.
+Runs on CUDA when available and falls back to CPU.
+"""
+import numpy as np
+import torch
+from statistics import NormalDist
+
+
+AGGREGATIONS=('mean','max','topk','quantile')
+
+
+def get_device(name=None):
+    if name:
+        return torch.device(name)
+    return torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+
+
+def frame_maxima(pred,idx):
+    # pred: [N] or [M,N] per-face fake probabilities (M checkpoints),
+    # idx: [N] frame index of each face
+    # returns the sorted unique frame indices and the max prediction per frame ([F] or [M,F])
+    frames,inverse=torch.unique(idx,return_inverse=True)
+    out=torch.full(pred.shape[:-1]+(len(frames),),float('-inf'),dtype=pred.dtype,device=pred.device)
+    return frames,out.scatter_reduce(-1,inverse.expand_as(pred),pred,reduce='amax')
+
+
+def aggregate(frame_scores,method='mean',k=4,q=0.9):
+    # reduce per-frame scores over the last dim to one video score per row
+    if method=='mean':
+        return frame_scores.mean(-1)
+    if method=='max':
+        return frame_scores.amax(-1)
+    if method=='topk':
+        return frame_scores.topk(min(k,frame_scores.shape[-1]),dim=-1).values.mean(-1)
+    if method=='quantile':
+        return torch.quantile(frame_scores,q,dim=-1)
+    raise ValueError(f'Unknown aggregation: {method}. Choose from: {", ".join(AGGREGATIONS)}')
+
+
+def stop_early(scores,threshold,z,method='mean',k=4,q=0.9,n_boot=200,seed=0):
+    # True once the video score that `method` would report is separated from
+    # threshold by z standard errors. 'mean' uses the analytic standard error,
+    # 'topk' and 'quantile' a bootstrap one. 'max' can only grow as frames are
+    # added, so it stops once it exceeds threshold and never below it.
+    scores=torch.as_tensor(scores,dtype=torch.float64)
+    if method=='max':
+        return scores.max().item()>threshold
+    if method=='mean':
+        stat=scores.mean()
+        se=scores.std()/np.sqrt(len(scores))
+    else:
+        stat=aggregate(scores,method,k,q)
+        resample=torch.from_numpy(np.random.default_rng(seed).integers(0,len(scores),(n_boot,len(scores))))
+        se=aggregate(scores[resample],method,k,q).std()
+    return abs(stat.item()-threshold)>z*se.item()
+
+
+def load_detector(weight_name,device):
+    from model import Detector
+    model=Detector()
+    cnn_sd=torch.load(weight_name,map_location=device)["model"]
+    model.load_state_dict(cnn_sd)
+    return model.to(device).eval()
+
+
+def load_face_detector(device,max_size=2048):
+    from retinaface.pre_trained_models import get_model
+    face_detector=get_model("resnet50_2020-07-20",max_size=max_size,device=device)
+    face_detector.eval()
+    return face_detector
+
+
+class VideoScorer:
+    """
+    Scores videos with one or more SBI Detector checkpoints
+
+    With several models, every face batch is moved to the device once and
+    run through all of them, so decoding and face detection are shared.
+
+    Args:
+        model: SBI Detector in eval mode (already on device), or a list of them
+        face_detector: RetinaFace model, only needed by score_video*
+        device: torch.device; defaults to CUDA if available, else CPU
+        aggregation: how per-frame maxima become a video score
+            ('mean', 'max', 'topk', 'quantile')
+        k: number of top frames averaged by 'topk'
+        q: quantile used by 'quantile'
+        batch_size: faces per forward pass
+    """
+
+    def __init__(self,model,face_detector=None,device=None,aggregation='mean',k=4,q=0.9,batch_size=32):
+        if aggregation not in AGGREGATIONS:
+            raise ValueError(f'Unknown aggregation: {aggregation}. Choose from: {", ".join(AGGREGATIONS)}')
+        self.models=list(model) if isinstance(model,(list,tuple)) else [model]
+        self.model=self.models[0]
+        self.face_detector=face_detector
+        self.device=device or get_device()
+        self.aggregation=aggregation
+        self.k=k
+        self.q=q
+        self.batch_size=batch_size
+
+    @classmethod
+    def load(cls,weight_name,device=None,with_face_detector=True,**kwargs):
+        # weight_name: one checkpoint path or a list of them
+        device=device or get_device()
+        if isinstance(weight_name,(list,tuple)):
+            model=[load_detector(w,device) for w in weight_name]
+        else:
+            model=load_detector(weight_name,device)
+        face_detector=load_face_detector(device) if with_face_detector else None
+        return cls(model,face_detector,device=device,**kwargs)
+
+    @torch.no_grad()
+    def predict_faces_all(self,face_list):
+        # face_list: uint8 crops [N,3,H,W] (array or list of arrays) -> [M,N] fake probs on device
+        faces=torch.from_numpy(np.ascontiguousarray(np.stack(face_list) if isinstance(face_list,list) else face_list))
+        preds=[]
+        for i in range(0,len(faces),self.batch_size):
+            img=faces[i:i+self.batch_size].to(self.device,non_blocking=True).float()/255
+            preds.append(torch.stack([model(img).softmax(1)[:,1] for model in self.models]))
+        return torch.cat(preds,dim=1)
+
+    def predict_faces(self,face_list):
+        # [N] fake probs of the first model
+        return self.predict_faces_all(face_list)[0]
+
+    def aggregate(self,pred,idx_list,repeats=None):
+        # repeats: {skipped frame: analysed frame} from a frame_gate.FrameGate;
+        # each skipped frame counts again with the score of the frame it repeats
+        idx_list=np.asarray(idx_list)
+        idx=torch.as_tensor(idx_list,device=pred.device)
+        _,scores=frame_maxima(pred,idx)
+        if repeats:
+            # frame_maxima orders frames like np.unique, so no device sync is needed
+            position={f:i for i,f in enumerate(np.unique(idx_list).tolist())}
+            cols=[position[src] for src in repeats.values() if src in position]
+            if cols:
+                scores=torch.cat([scores,scores[...,cols]],dim=-1)
+        return aggregate(scores,self.aggregation,self.k,self.q)
+
+    def score_faces_all(self,face_list,idx_list,repeats=None):
+        # one score per model, None when there is nothing to score (no faces found)
+        if len(face_list)==0:
+            return None
+        return self.aggregate(self.predict_faces_all(face_list),idx_list,repeats).tolist()
+
+    def score_faces(self,face_list,idx_list):
+        scores=self.score_faces_all(face_list,idx_list)
+        return None if scores is None else scores[0]
+
+    def extract(self,filename,n_frames,tracker=None,cache=None):
+        # cache: optional crop_cache.CropCache; hits skip decoding and face detection
+        from preprocess import extract_frames
+        extract=lambda:extract_frames(filename,n_frames,self.face_detector,tracker=tracker)
+        if cache is None:
+            return extract()
+        extra={'tracker':tracker.settings()} if tracker is not None else {}
+        return cache.get_or_extract(filename,n_frames,extract,**extra)
+
+    def score_video_stream_all(self,filename,n_frames,tracker=None,gate=None,prefetch_batches=2):
+        # Like score_faces_all(*extract(...)), but crops arrive as fixed-size
+        # uint8 batches decoded in a background thread while the previous batch
+        # is classified. Memory holds about prefetch_batches+2 batches instead
+        # of every crop of the video; only the per-face scores are kept.
+        from preprocess import iter_face_batches,prefetch
+        batches=iter_face_batches(filename,n_frames,self.face_detector,batch_size=self.batch_size,tracker=tracker,gate=gate)
+        preds,idx=[],[]
+        for crops,frame_idx in prefetch(batches,prefetch_batches):
+            preds.append(self.predict_faces_all(crops))
+            idx.append(frame_idx)
+        if not preds:
+            return None
+        return self.aggregate(torch.cat(preds,dim=1),np.concatenate(idx),gate.repeats if gate else None).tolist()
+
+    def score_video_all(self,filename,n_frames,tracker=None,cache=None,gate=None):
+        # cached crops are memory-mapped already; everything else is streamed
+        if cache is None:
+            return self.score_video_stream_all(filename,n_frames,tracker,gate)
+        if gate is not None:
+            # a cache hit would have no record of which frames were repeats
+            raise ValueError('a frame gate cannot be combined with a crop cache')
+        return self.score_faces_all(*self.extract(filename,n_frames,tracker,cache))
+
+    def score_video(self,filename,n_frames,tracker=None,cache=None,gate=None):
+        scores=self.score_video_all(filename,n_frames,tracker,cache,gate)
+        return None if scores is None else scores[0]
+
+    def score_video_adaptive(self,filename,max_frames=32,min_frames=4,threshold=0.5,confidence=0.95):
+        # Score frames coarse-to-fine and stop as soon as the aggregated score of
+        # the per-frame maxima is separated from the threshold by z standard
+        # errors (see stop_early).
+        # Returns (score or None, frames scored, frames visited).
+        import cv2
+        from preprocess import extract_faces_at,coarse_to_fine_order
+
+        cap=cv2.VideoCapture(filename)
+        frame_count=int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+        frame_idxs=np.unique(np.linspace(0,frame_count-1,max_frames,endpoint=True,dtype=int))
+        z=NormalDist().inv_cdf(0.5+confidence/2)
+
+        scores=[]
+        n_visited=0
+        for i in coarse_to_fine_order(len(frame_idxs)):
+            n_visited+=1
+            face_list=extract_faces_at(cap,frame_idxs[i],self.face_detector)
+            if len(face_list)==0:
+                continue
+            # the stopping rule needs every frame score on the host anyway
+            scores.append(self.predict_faces(face_list).max().item())
+
+            if len(scores)>=min_frames and stop_early(scores,threshold,z,self.aggregation,self.k,self.q):
+                break
+        cap.release()
+
+        if not scores:
+            return None,0,n_visited
+        return aggregate(torch.tensor(scores),self.aggregation,self.k,self.q).item(),len(scores),n_visited
@@ -0,0 +1,232 @@
+"""
+Sliding-window scoring of a live video source.
+
+A reader thread pulls frames from anything cv2.VideoCapture opens (a file,
+a camera index, an RTSP/HTTP URL, a named pipe), samples them at --fps into
+a small ring buffer and never waits on analysis: when the ring is full the
+oldest sample is overwritten and counted as dropped. The analysis loop takes
+whatever is buffered, skips samples older than --max-latency, scores their
+faces in one batch and emits the aggregate of the per-frame maxima over the
+last --window seconds as one JSON line per update.
+
+	python stream.py -w weights.tar -i rtsp://camera/stream --fps 2 --window 10
+	python stream.py -w weights.tar -i clip.mp4 --realtime   # file as a live stand-in
+"""
+import argparse
+import json
+import sys
+import threading
+import time
+from collections import deque,namedtuple
+
+import cv2
+import torch
+
+from preprocess import crop_faces
+from scoring import VideoScorer,get_device,frame_maxima,aggregate,AGGREGATIONS
+
+
+# t: media time in seconds, index: frame number in the source,
+# captured: time.monotonic() when it was read, frame: RGB uint8 [H,W,3]
+Sample=namedtuple('Sample',['t','index','captured','frame'])
+
+
+class FrameRing:
+	"""
+	Bounded hand-off between the reader and the analysis loop
+
+	put() never blocks: a full ring overwrites its oldest sample, so a slow
+	consumer loses frames instead of building an ever-growing backlog.
+	"""
+
+	def __init__(self,size):
+		self.samples=deque(maxlen=size)
+		self.cond=threading.Condition()
+		self.closed=False
+		self.sampled=0
+		self.dropped=0
+
+	def put(self,sample):
+		with self.cond:
+			if len(self.samples)==self.samples.maxlen:
+				self.dropped+=1
+			self.samples.append(sample)
+			self.sampled+=1
+			self.cond.notify()
+
+	def take(self,timeout=None):
+		# everything buffered, oldest first; [] on timeout, None once closed and drained
+		with self.cond:
+			self.cond.wait_for(lambda:self.samples or self.closed,timeout)
+			if not self.samples:
+				return None if self.closed else []
+			samples=list(self.samples)
+			self.samples.clear()
+			return samples
+
+	def close(self):
+		with self.cond:
+			self.closed=True
+			self.cond.notify_all()
+
+
+def open_source(source):
+	# digits are a camera index, anything else a path/URL for OpenCV
+	return cv2.VideoCapture(int(source) if source.isdigit() else source)
+
+
+def read_stream(cap,ring,sample_fps,realtime=False,stop=None):
+	"""
+	Read cap until it ends (or stop is set) and put samples into ring
+
+	Frames between samples are only grabbed, not converted. Media time comes
+	from the source frame rate when it reports one and from the wall clock
+	otherwise. realtime paces a file at its own frame rate, like a live feed.
+	"""
+	src_fps=cap.get(cv2.CAP_PROP_FPS)
+	if not 0<src_fps<1000:
+		src_fps=0
+	interval=1/sample_fps
+	start=time.monotonic()
+	next_t=0.
+	index=0
+	try:
+		while stop is None or not stop.is_set():
+			if not cap.grab():
+				break
+			t=index/src_fps if src_fps else time.monotonic()-start
+			if realtime and src_fps:
+				delay=start+t-time.monotonic()
+				if delay>0:
+					time.sleep(delay)
+			index+=1
+			if t<next_t:
+				continue
+			# stay on the sampling grid, but don't try to catch up after a stall
+			next_t=max(next_t+interval,t)
+			ret,frame=cap.retrieve()
+			if not ret:
+				continue
+			ring.put(Sample(t,index-1,time.monotonic(),cv2.cvtColor(frame,cv2.COLOR_BGR2RGB)))
+	finally:
+		cap.release()
+		ring.close()
+
+
+class StreamScorer:
+	"""
+	Sliding-window fake score over sampled frames
+
+	Args:
+		scorer: VideoScorer with a face detector
+		window: seconds of media time the score covers
+		max_latency: samples captured longer ago than this are skipped
+	"""
+
+	def __init__(self,scorer,window=10.,max_latency=2.):
+		self.scorer=scorer
+		self.window=window
+		self.max_latency=max_latency
+		self.scores=deque()  # (t, per-frame maximum) inside the window
+		self.stale=0
+		self.no_face=0
+		self.failed=0
+		self.scored=0
+
+	def update(self,samples):
+		# score a batch of samples and return the current window state
+		now=time.monotonic()
+		fresh=[s for s in samples if now-s.captured<=self.max_latency]
+		self.stale+=len(samples)-len(fresh)
+
+		face_list,idx_list=[],[]
+		for i,sample in enumerate(fresh):
+			# retinaface returns a single empty bbox when nothing is found
+			faces=[f for f in self.scorer.face_detector.predict_jsons(sample.frame) if len(f['bbox'])==4]
+			if len(faces)==0:
+				self.no_face+=1
+				continue
+			try:
+				crops=crop_faces(sample.frame,faces)
+			except Exception as e:
+				# one bad frame must not end the stream
+				print(f'error in frame {sample.index}: {e}',file=sys.stderr)
+				self.failed+=1
+				continue
+			face_list+=crops
+			idx_list+=[i]*len(crops)
+		if face_list:
+			frames,maxima=frame_maxima(self.scorer.predict_faces(face_list),torch.as_tensor(idx_list,device=self.scorer.device))
+			for i,score in zip(frames.tolist(),maxima.tolist()):
+				self.scores.append((fresh[i].t,score))
+			self.scored+=len(frames)
+
+		if samples:
+			newest=samples[-1].t
+			while self.scores and self.scores[0][0]<newest-self.window:
+				self.scores.popleft()
+		score=None
+		if self.scores:
+			s=self.scorer
+			score=aggregate(torch.tensor([v for _,v in self.scores]),s.aggregation,s.k,s.q).item()
+		return {
+			't':round(samples[-1].t,3) if samples else None,
+			'score':score,
+			'window_frames':len(self.scores),
+			'latency_ms':round((time.monotonic()-samples[-1].captured)*1000,1) if samples else None,
+		}
+
+	def run(self,cap,sample_fps=2.,buffer_size=8,realtime=False,emit=print):
+		"""Read cap in the background and emit() one result per analysed batch until it ends"""
+		ring=FrameRing(buffer_size)
+		stop=threading.Event()
+		reader=threading.Thread(target=read_stream,args=(cap,ring,sample_fps,realtime,stop),daemon=True)
+		reader.start()
+		try:
+			while True:
+				samples=ring.take(timeout=1.)
+				if samples is None:
+					break
+				if not samples:
+					continue
+				result=self.update(samples)
+				result.update(sampled=ring.sampled,dropped=ring.dropped,stale=self.stale,no_face=self.no_face,failed=self.failed)
+				emit(result)
+		finally:
+			stop.set()
+			reader.join()
+		return {'sampled':ring.sampled,'dropped':ring.dropped,'stale':self.stale,'no_face':self.no_face,'failed':self.failed,'scored':self.scored}
+
+
+def main(args):
+
+	scorer=VideoScorer.load(args.weight_name,device=device,aggregation=args.aggregation,k=args.k,q=args.q)
+	cap=open_source(args.input)
+	if not cap.isOpened():
+		print(f'Cannot open: {args.input}')
+		return
+
+	stream=StreamScorer(scorer,window=args.window,max_latency=args.max_latency)
+	stats=stream.run(cap,args.fps,args.buffer,args.realtime,emit=lambda r:print(json.dumps(r),flush=True))
+	print(f'stream ended: {stats}')
+
+
+if __name__=='__main__':
+
+	parser=argparse.ArgumentParser()
+	parser.add_argument('-w',dest='weight_name',type=str)
+	parser.add_argument('-i',dest='input',type=str,help='video file, camera index, stream URL or named pipe')
+	parser.add_argument('--fps',default=2.,type=float,help='frames sampled per second of media time')
+	parser.add_argument('--window',default=10.,type=float,help='seconds of sampled frames the score covers')
+	parser.add_argument('--buffer',default=8,type=int,help='ring buffer size; older samples are dropped when full')
+	parser.add_argument('--max-latency',dest='max_latency',default=2.,type=float,help='skip samples older than this (seconds)')
+	parser.add_argument('--realtime',action='store_true',help='play a file at its own frame rate, like a live source')
+	parser.add_argument('--aggregation',default='mean',choices=AGGREGATIONS,help='how per-frame maxima become the window score')
+	parser.add_argument('-k',default=4,type=int,help='frames averaged by --aggregation topk')
+	parser.add_argument('-q',default=0.9,type=float,help='quantile used by --aggregation quantile')
+	parser.add_argument('--device',default=None,help='torch device (default: cuda if available, else cpu)')
+	args=parser.parse_args()
+
+	device=get_device(args.device)
+
+	main(args)
@@ -0,0 +1,194 @@
+import os
+import argparse
+import numpy as np
+import cv2
+
+
+def box_iou(a,b):
+	x0,y0=max(a[0],b[0]),max(a[1],b[1])
+	x1,y1=min(a[2],b[2]),min(a[3],b[3])
+	inter=max(0,x1-x0)*max(0,y1-y0)
+	union=(a[2]-a[0])*(a[3]-a[1])+(b[2]-b[0])*(b[3]-b[1])-inter
+	return inter/union if union>0 else 0.
+
+
+class FaceTracker:
+	"""
+	Drop-in replacement for face_detector.predict_jsons over a frame sequence.
+
+	The detector only runs on keyframes (every keyframe_interval frames); the
+	boxes are propagated to the frames in between by normalized template
+	matching of the keyframe face patch in a window around the last box.
+	Detection is re-run early when a match score falls below min_score or a
+	scene cut is detected (grayscale histogram distance above cut_threshold).
+	"""
+
+	def __init__(self,model,keyframe_interval=8,min_score=0.5,cut_threshold=0.5,template_size=64,search_margin=0.5):
+		self.model=model
+		self.keyframe_interval=keyframe_interval
+		self.min_score=min_score
+		self.cut_threshold=cut_threshold
+		self.template_size=template_size
+		self.search_margin=search_margin
+
+		self.tracks=[]
+		self.prev_hist=None
+		self.since_keyframe=0
+
+		self.frames=0
+		self.detector_calls=0
+		self.redetect_lost=0
+		self.redetect_cut=0
+
+	def settings(self):
+		return {
+			'keyframe_interval':self.keyframe_interval,
+			'min_score':self.min_score,
+			'cut_threshold':self.cut_threshold,
+			'template_size':self.template_size,
+			'search_margin':self.search_margin,
+		}
+
+	def stats(self):
+		return {
+			'frames':self.frames,
+			'detector_calls':self.detector_calls,
+			'saved_calls':self.frames-self.detector_calls,
+			'redetect_lost':self.redetect_lost,
+			'redetect_cut':self.redetect_cut,
+		}
+
+	def _hist(self,gray):
+		hist=cv2.calcHist([gray],[0],None,[64],[0,256])
+		return cv2.normalize(hist,hist).flatten()
+
+	def _template(self,gray,bbox):
+		x0,y0,x1,y1=[int(round(v)) for v in bbox]
+		H,W=gray.shape
+		patch=gray[max(0,y0):min(H,y1),max(0,x0):min(W,x1)]
+		if patch.size==0:
+			return None
+		# match at reduced resolution: cost depends on template_size, not face size
+		scale=min(1.,self.template_size/max(patch.shape))
+		return cv2.resize(patch,None,fx=scale,fy=scale,interpolation=cv2.INTER_AREA),scale
+
+	def _detect(self,frame,gray):
+		self.detector_calls+=1
+		# retinaface returns a single empty bbox when nothing is found
+		faces=[f for f in self.model.predict_jsons(frame) if len(f['bbox'])==4]
+		self.tracks=[]
+		for f in faces:
+			template=self._template(gray,f['bbox'])
+			if template is not None:
+				self.tracks.append((np.array(f['bbox'],dtype=np.float32),template))
+		self.since_keyframe=0
+		return faces
+
+	def _track(self,gray,bbox,template):
+		patch,scale=template
+		x0,y0,x1,y1=bbox
+		w,h=x1-x0,y1-y0
+		H,W=gray.shape
+		sx0,sy0=int(max(0,x0-w*self.search_margin)),int(max(0,y0-h*self.search_margin))
+		sx1,sy1=int(min(W,x1+w*self.search_margin)),int(min(H,y1+h*self.search_margin))
+		region=cv2.resize(gray[sy0:sy1,sx0:sx1],None,fx=scale,fy=scale,interpolation=cv2.INTER_AREA)
+		if region.shape[0]<patch.shape[0] or region.shape[1]<patch.shape[1]:
+			return bbox,0.
+		res=cv2.matchTemplate(region,patch,cv2.TM_CCOEFF_NORMED)
+		_,score,_,loc=cv2.minMaxLoc(res)
+		nx0,ny0=sx0+loc[0]/scale,sy0+loc[1]/scale
+		return np.array([nx0,ny0,nx0+w,ny0+h],dtype=np.float32),score
+
+	def update(self,frame):
+		# frame: RGB uint8, as passed to predict_jsons
+		self.frames+=1
+		gray=cv2.cvtColor(frame,cv2.COLOR_RGB2GRAY)
+		hist=self._hist(gray)
+		cut=self.prev_hist is not None and cv2.compareHist(self.prev_hist,hist,cv2.HISTCMP_BHATTACHARYYA)>self.cut_threshold
+		self.prev_hist=hist
+
+		if cut and self.tracks:
+			self.redetect_cut+=1
+		if cut or not self.tracks or self.since_keyframe>=self.keyframe_interval-1:
+			return self._detect(frame,gray)
+
+		faces=[]
+		tracks=[]
+		for bbox,template in self.tracks:
+			new_bbox,score=self._track(gray,bbox,template)
+			if score<self.min_score:
+				self.redetect_lost+=1
+				return self._detect(frame,gray)
+			tracks.append((new_bbox,template))
+			faces.append({'bbox':new_bbox.tolist(),'score':float(score)})
+		self.tracks=tracks
+		self.since_keyframe+=1
+		return faces
+
+
+def compare_tracking(filename,num_frames,model,**tracker_kwargs):
+	# run per-frame detection and tracking side by side on the sampled frames
+	# and measure how far the tracked boxes drift from the detected ones
+	tracker=FaceTracker(model,**tracker_kwargs)
+	cap=cv2.VideoCapture(filename)
+	frame_count=int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+	frame_idxs=set(np.linspace(0,frame_count-1,num_frames,endpoint=True,dtype=int).tolist())
+
+	ious=[]
+	offsets=[]
+	for cnt_frame in range(frame_count):
+		ret,frame_org=cap.read()
+		if not ret:
+			break
+		if cnt_frame not in frame_idxs:
+			continue
+		frame=cv2.cvtColor(frame_org,cv2.COLOR_BGR2RGB)
+		calls=tracker.detector_calls
+		tracked=tracker.update(frame)
+		if tracker.detector_calls>calls:
+			# keyframe: boxes come straight from the detector, no drift
+			continue
+		reference=[f for f in model.predict_jsons(frame) if len(f['bbox'])==4]
+		for ref in reference:
+			rb=ref['bbox']
+			best=max(tracked,key=lambda t:box_iou(rb,t['bbox']),default=None)
+			if best is None:
+				ious.append(0.)
+				continue
+			tb=best['bbox']
+			ious.append(box_iou(rb,tb))
+			size=max(rb[2]-rb[0],rb[3]-rb[1])
+			offsets.append(np.hypot((tb[0]+tb[2]-rb[0]-rb[2])/2,(tb[1]+tb[3]-rb[1]-rb[3])/2)/size)
+	cap.release()
+
+	report=tracker.stats()
+	report['mean_iou']=float(np.mean(ious)) if ious else None
+	report['min_iou']=float(np.min(ious)) if ious else None
+	report['mean_center_drift']=float(np.mean(offsets)) if offsets else None
+	return report
+
+
+if __name__=='__main__':
+	import torch
+	from retinaface.pre_trained_models import get_model
+
+	parser=argparse.ArgumentParser(description='Detector-call savings and box drift of keyframe tracking vs per-frame RetinaFace')
+	parser.add_argument('videos',nargs='+')
+	parser.add_argument('-n',dest='n_frames',default=32,type=int)
+	parser.add_argument('--keyframe-interval',dest='keyframe_interval',default=8,type=int)
+	parser.add_argument('--min-score',dest='min_score',default=0.5,type=float)
+	parser.add_argument('--cut-threshold',dest='cut_threshold',default=0.5,type=float)
+	args=parser.parse_args()
+
+	device=torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+	face_detector=get_model("resnet50_2020-07-20",max_size=2048,device=device)
+	face_detector.eval()
+
+	total_frames=total_calls=0
+	for filename in args.videos:
+		report=compare_tracking(filename,args.n_frames,face_detector,keyframe_interval=args.keyframe_interval,min_score=args.min_score,cut_threshold=args.cut_threshold)
+		total_frames+=report['frames']
+		total_calls+=report['detector_calls']
+		print(f"{os.path.basename(filename)}| {report}")
+	if total_frames:
+		print(f'detector calls: {total_calls}/{total_frames} ({1-total_calls/total_frames:.1%} saved)')
@@ -1,7 +1,8 @@
-from openai import OpenAI
 import base64
 import math
 
+GPT_MODEL = "gpt-5.4"
+
 # Pirogov (ICML 2025) original GPT prompt — verbatim from paper.
 # Expert role framing is critical for GPT-class models: it "activates" detection performance.
 # Response is purely binary: "YES" = real, "NO" = fake.
@@ -77,8 +78,9 @@ def _compute_fake_prob(first_token_data) -> float | None:
 
 
 class ChatGPTVision:
-    def __init__(self, api_key: str):
-        self.client = OpenAI(api_key=api_key)
+    def __init__(self, api_key: str, base_url: str | None = None):
+        from openai import OpenAI  # ~1s to import; not needed by modules that only read GPT_MODEL
+        self.client = OpenAI(api_key=api_key, base_url=base_url or None)
 
     def verify(self, image_bytes: bytes) -> tuple[bool, float]:
         """
@@ -93,12 +95,14 @@ class ChatGPTVision:
         Returns:
             tuple[bool, float]: (is_fake, deepfake_confidence 0.0–1.0)
         """
-        image_base64 = base64.b64encode(image_bytes).decode("utf-8")
+        # Build the data URL in one step; the intermediate base64 string is
+        # freed immediately instead of living alongside the URL copy
+        image_url = "data:image/jpeg;base64," + base64.b64encode(image_bytes).decode("ascii")
 
         try:
             print("[DEBUG] Calling ChatGPT Vision API (GPT-5.4, Pirogov method)...")
             response = self.client.chat.completions.create(
-                model="gpt-5.4",
+                model=GPT_MODEL,
                 messages=[
                     {
                         "role": "system",
@@ -114,7 +118,7 @@ class ChatGPTVision:
                             {
                                 "type": "image_url",
                                 "image_url": {
-                                    "url": f"data:image/jpeg;base64,{image_base64}"
+                                    "url": image_url
                                 },
                             },
                         ],
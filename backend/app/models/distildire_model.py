@@ -1,15 +1,35 @@
-import torch
-import torchvision.transforms as transforms
-from PIL import Image
-import io
+from __future__ import annotations
+
+import functools
 import os
-import sys
+from typing import TYPE_CHECKING
+
+from app.models.preprocessing import (
+    InputBufferPool, fill_input_tensor, fold_input_normalization, frames_to_input, load_resized,
+)
+
+# torch loads with the first model, not when the API imports this module
+if TYPE_CHECKING:
+    import torch
+
+INPUT_SIZE = 224
+NORMALIZE = ([0.485, 0.456, 0.406], [0.229, 0.224, 0.225])  # ImageNet mean, std
+
+
+def build_transform(input_size: int = INPUT_SIZE):
+    """Preprocessing for ConvNeXt: resize to 224x224, ImageNet normalization"""
+    import torchvision.transforms as transforms  # only the reference path uses torchvision
+    return transforms.Compose([
+        transforms.Resize((input_size, input_size)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=NORMALIZE[0], std=NORMALIZE[1])
+    ])
 
-# Add ml_inference to path for model imports
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ml_inference'))
 
-from improved_model import DistilDIREImproved
 
+def input_conv(model: torch.nn.Module) -> torch.nn.Conv2d:
+    """ConvNeXt stem patchify conv: the first layer to see the input"""
+    return model.backbone.stem[0]
 
 class DistilDIREModel:
     """
@@ -21,18 +41,29 @@ class DistilDIREModel:
     - Performance: Accuracy 86.89%, AP 96.11%
     """
 
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, checkpoint_name: str = 'v2_best_model.pth', quantized: bool = False,
+                 uint8_input: bool = False):
         """
         Initialize DistilDIRE model
 
         Args:
             model_path: Path to the model directory containing:
                 - v2_best_model.pth (fine-tuned weights)
+            checkpoint_name: Fine-tuned weights file inside model_path
+            quantized: Also build an int8 dynamically quantized copy (CPU only),
+                used by predict_tensor(..., quantized=True)
+            uint8_input: Take uint8 pixel tensors, with the input scaling and
+                ImageNet normalization folded into the first convolution
+                (see fold_input_normalization())
         """
+        import torch
+
         self.model_path = model_path
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
-        # Initialize model architecture
+        # Initialize model architecture (imported here: timm only loads once
+        # a model is built, not when the module is imported)
+        from app.ml_inference.improved_model import DistilDIREImproved
         self.model = DistilDIREImproved(
             device=self.device,
             backbone='convnext_base',
@@ -41,12 +72,12 @@ class DistilDIREModel:
         )
 
         # Load fine-tuned weights
-        checkpoint_path = os.path.join(model_path, 'v2_best_model.pth')
+        checkpoint_path = os.path.join(model_path, checkpoint_name)
 
         if not os.path.exists(checkpoint_path):
             raise FileNotFoundError(
                 f"DistilDIRE model checkpoint not found at {checkpoint_path}. "
-                f"Please ensure v2_best_model.pth is in {model_path}"
+                f"Please ensure {checkpoint_name} is in {model_path}"
             )
 
         # Load checkpoint
@@ -57,24 +88,109 @@ class DistilDIREModel:
         self.model = self.model.to(self.device)
         self.model.eval()
 
-        # Image preprocessing (224x224 for ConvNeXt)
-        self.transform = transforms.Compose([
-            transforms.Resize((224, 224)),
-            transforms.ToTensor(),
-            transforms.Normalize(
-                mean=[0.485, 0.456, 0.406],
-                std=[0.229, 0.224, 0.225]
+        # uint8 input: ToTensor + Normalize live in the ConvNeXt stem's patchify
+        # conv instead (4x4 stride 4, unpadded, so the fold is exact). Done
+        # before quantizing so the quantized copy gets the same stem
+        self.input_dtype = torch.uint8 if uint8_input else torch.float32
+        if uint8_input:
+            fold_input_normalization(input_conv(self.model), *NORMALIZE)
+
+        # Optional cheaper backend for degraded service tiers; ConvNeXt's
+        # pointwise convolutions are Linear layers, so most of it quantizes
+        self.quantized_model = None
+        if quantized and self.device.type == 'cpu':
+            self.quantized_model = torch.ao.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
             )
-        ])
+
+        self.buffers = InputBufferPool(self.input_dtype)
 
         print(f"✓ DistilDIRE model loaded successfully on {self.device}")
 
-    def predict(self, image_bytes: bytes) -> tuple[bool, float]:
+    @functools.cached_property
+    def transform(self):
+        """
+        torchvision reference preprocessing (224x224 for ConvNeXt)
+
+        predict() fills pooled buffers with the same values instead; this is
+        built on first use for parity checks (app.cli.input_parity)
+        """
+        return build_transform()
+
+    def preprocess(self, image_bytes: bytes) -> torch.Tensor:
+        """
+        Decode, resize and normalize an image into a model input tensor
+
+        Args:
+            image_bytes: Image file bytes (JPEG, PNG, etc.)
+
+        Returns:
+            Tensor [1, 3, 224, 224] on CPU: float, or uint8 with uint8_input
+        """
+        import torch
+        out = torch.empty(1, 3, INPUT_SIZE, INPUT_SIZE, dtype=self.input_dtype)
+        return fill_input_tensor(load_resized(image_bytes, INPUT_SIZE), out, *NORMALIZE)
+
+    def predict_batch(self, img_tensor: torch.Tensor, quantized: bool = False) -> list[tuple[bool, float]]:
+        """
+        Run the detector on a batch of preprocessed inputs
+
+        Args:
+            img_tensor: Tensor [N, 3, 224, 224], as produced by preprocess()
+            quantized: Use the quantized copy if one was built
+
+        Returns:
+            list: (is_fake: bool, confidence: float) per input
+
+        Raises:
+            ValueError: If the tensor's dtype doesn't match the input mode
+        """
+        import torch
+        if img_tensor.dtype != self.input_dtype:
+            raise ValueError(f"Expected a {self.input_dtype} input tensor, got {img_tensor.dtype}")
+        model = self.quantized_model if quantized and self.quantized_model is not None else self.model
+        with torch.no_grad():
+            output = model(img_tensor.to(self.device).float(), eps=None)  # v2 doesn't use eps
+            logit = output['logit']
+            # Apply sigmoid to convert logit to probability
+            fake_probs = torch.sigmoid(logit).reshape(-1).tolist()
+
+        # Threshold at 0.5
+        return [(fake_prob > 0.5, fake_prob) for fake_prob in fake_probs]
+
+    def predict_tensor(self, img_tensor: torch.Tensor, quantized: bool = False) -> tuple[bool, float]:
+        """
+        Run the detector on a preprocessed input tensor
+
+        Args:
+            img_tensor: Output of preprocess()
+            quantized: Use the quantized copy if one was built
+
+        Returns:
+            tuple: (is_fake: bool, confidence: float)
+        """
+        return self.predict_batch(img_tensor, quantized)[0]
+
+    def predict_frames(self, frames: torch.Tensor, quantized: bool = False) -> list[tuple[bool, float]]:
+        """
+        Predict on frames that are already decoded, skipping image decoding
+
+        Args:
+            frames: uint8 [N, H, W, 3] RGB tensor
+            quantized: See predict_tensor()
+
+        Returns:
+            list: (is_fake: bool, confidence: float) per frame
+        """
+        return self.predict_batch(frames_to_input(frames, INPUT_SIZE, *NORMALIZE, dtype=self.input_dtype), quantized)
+
+    def predict(self, image_bytes: bytes, quantized: bool = False) -> tuple[bool, float]:
         """
         Predict if image is a deepfake
 
         Args:
             image_bytes: Image file bytes (JPEG, PNG, etc.)
+            quantized: See predict_tensor()
 
         Returns:
             tuple: (is_fake: bool, confidence: float)
@@ -82,21 +198,11 @@ class DistilDIREModel:
                 - confidence: Probability of being fake (0.0 to 1.0)
         """
         try:
-            # Load and preprocess image
-            image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-            img_tensor = self.transform(image).unsqueeze(0).to(self.device)
-
-            # Inference
-            with torch.no_grad():
-                output = self.model(img_tensor, eps=None)  # v2 doesn't use eps
-                logit = output['logit']
-                # Apply sigmoid to convert logit to probability
-                fake_prob = torch.sigmoid(logit).item()
-
-            # Threshold at 0.5
-            is_fake = fake_prob > 0.5
-
-            return is_fake, fake_prob
+            img = load_resized(image_bytes, INPUT_SIZE)
+            with self.buffers.borrow((1, 3, INPUT_SIZE, INPUT_SIZE)) as img_tensor:
+                fill_input_tensor(img, img_tensor, *NORMALIZE)
+                del img
+                return self.predict_tensor(img_tensor, quantized)
 
         except Exception as e:
             print(f"Error in DistilDIRE prediction: {e}")
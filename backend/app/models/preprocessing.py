@@ -0,0 +1,261 @@
+from __future__ import annotations
+
+import io
+import threading
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Iterable
+
+from PIL import Image
+
+# numpy and torch are imported where they are used: the API imports this
+# module at startup for compress_image()/image_pixels(), and bulk_scan's
+# decoder processes only decode
+if TYPE_CHECKING:
+    import numpy as np
+    import torch
+
+
+def load_rgb(image_bytes: bytes) -> Image.Image:
+    """Decode image bytes into an RGB PIL image"""
+    return Image.open(io.BytesIO(image_bytes)).convert('RGB')
+
+
+def image_pixels(image_bytes: bytes) -> int:
+    """Width x height from the image header, without decoding the pixels"""
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        return img.width * img.height
+
+
+def load_resized(image_bytes: bytes, size: int) -> Image.Image:
+    """
+    Decode and resize to size x size, keeping only the small image alive
+
+    Same pixels as load_rgb() followed by transforms.Resize((size, size)),
+    but skips the RGB copy when the image is already RGB and drops the
+    full-size decode as soon as the resize is done.
+    """
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        full = img if img.mode == 'RGB' else img.convert('RGB')
+        try:
+            return full.resize((size, size), Image.BILINEAR)
+        finally:
+            full.close()
+
+
+def load_resized_pixels(image_bytes: bytes, sizes: Iterable[int]) -> dict[int, np.ndarray]:
+    """
+    Decode once and resize to several square sizes
+
+    Same pixels as load_resized() for each size, as uint8 [size, size, 3]
+    arrays, ready for frames_to_input() without another resize.
+    """
+    import numpy as np
+    with Image.open(io.BytesIO(image_bytes)) as img:
+        full = img if img.mode == 'RGB' else img.convert('RGB')
+        try:
+            return {size: np.array(full.resize((size, size), Image.BILINEAR)) for size in set(sizes)}
+        finally:
+            full.close()
+
+
+def compress_image(image_bytes: bytes, max_size_mb: float = 5.0) -> bytes:
+    """
+    Compress image to reduce file size while maintaining quality
+
+    Args:
+        image_bytes: Original image bytes
+        max_size_mb: Target max size in MB
+
+    Returns:
+        Compressed image bytes
+    """
+    max_size_bytes = max_size_mb * 1024 * 1024
+
+    # If already small enough, return as is
+    if len(image_bytes) <= max_size_bytes:
+        return image_bytes
+
+    # Open image
+    img = Image.open(io.BytesIO(image_bytes))
+
+    # Convert RGBA to RGB if needed
+    # (superseded images are closed right away so only one full-size copy is alive)
+    if img.mode == 'RGBA':
+        rgb = img.convert('RGB')
+        img.close()
+        img = rgb
+
+    # Calculate resize ratio to target around 2048px max dimension
+    max_dimension = 2048
+    if max(img.size) > max_dimension:
+        ratio = max_dimension / max(img.size)
+        new_size = tuple(int(dim * ratio) for dim in img.size)
+        resized = img.resize(new_size, Image.Resampling.LANCZOS)
+        img.close()
+        img = resized
+
+    # Compress with progressive quality reduction
+    quality = 85
+    output = io.BytesIO()
+
+    while quality > 20:
+        output.seek(0)
+        output.truncate(0)
+        img.save(output, format='JPEG', quality=quality, optimize=True)
+
+        # tell() instead of len(getvalue()), which would copy the buffer each try
+        if output.tell() <= max_size_bytes:
+            break
+
+        quality -= 5
+
+    img.close()
+    compressed_bytes = output.getvalue()
+    output.close()
+    print(f"[DEBUG] Compressed from {len(image_bytes)/(1024*1024):.2f}MB to {len(compressed_bytes)/(1024*1024):.2f}MB (quality={quality})")
+
+    return compressed_bytes
+
+
+def fill_input_tensor(img: Image.Image, out: torch.Tensor, mean=None, std=None) -> torch.Tensor:
+    """
+    Write a resized RGB image into an existing [1, 3, H, W] tensor
+
+    Matches ToTensor() (+ Normalize(mean, std) if given) without allocating
+    a new tensor per request. A uint8 `out` gets the raw pixels and mean/std
+    are ignored: that is for models whose first convolution has them folded
+    in (see fold_input_normalization()).
+    """
+    import numpy as np
+    import torch
+    out[0].copy_(torch.from_numpy(np.array(img)).permute(2, 0, 1))
+    if out.dtype == torch.uint8:
+        return out
+    out.div_(255)
+    if mean is not None:
+        out[0].sub_(torch.tensor(mean).view(3, 1, 1)).div_(torch.tensor(std).view(3, 1, 1))
+    return out
+
+
+def frames_to_input(frames: torch.Tensor, size: int, mean=None, std=None,
+                    dtype: torch.dtype | None = None) -> torch.Tensor:
+    """
+    Resize already-decoded frames into a model input batch
+
+    Args:
+        frames: uint8 [N, H, W, 3] RGB, e.g. a torch.from_numpy view of the
+            caller's buffer (read, never written)
+        size: Output side length
+        mean, std: Normalize() parameters, or None for [0, 1] inputs
+        dtype: torch.uint8 returns the resized pixels as they are (mean/std
+            ignored), as fill_input_tensor() does for uint8 buffers; default
+            torch.float32
+
+    Returns:
+        Tensor [N, 3, size, size] on CPU. The antialiased bilinear resize is
+        rounded to uint8 like PIL's, so values match the image path to
+        within one intensity level. Frames that are already size x size
+        (see load_resized_pixels()) match it exactly.
+    """
+    import torch
+    import torch.nn.functional as F
+    dtype = dtype or torch.float32
+    out = torch.empty(len(frames), 3, size, size, dtype=dtype)
+    for i in range(len(frames)):
+        x = frames[i].permute(2, 0, 1)
+        if x.shape[-2:] == (size, size):
+            out[i] = x
+            continue
+        # One full-size float copy at a time, not the whole batch
+        x = F.interpolate(x.unsqueeze(0).float(), size=(size, size), mode='bilinear', antialias=True, align_corners=False)
+        out[i] = x[0].round_().clamp_(0, 255)
+    if dtype == torch.uint8:
+        return out
+    out.div_(255)
+    if mean is not None:
+        out.sub_(torch.tensor(mean).view(1, 3, 1, 1)).div_(torch.tensor(std).view(1, 3, 1, 1))
+    return out
+
+
+def fold_input_normalization(conv: torch.nn.Conv2d, mean=None, std=None, scale: float = 255) -> torch.nn.Conv2d:
+    """
+    Fold ToTensor() and Normalize() into a model's first convolution, in place
+
+    Afterwards conv(x.float()) on raw 0-255 pixels x gives what the original
+    conv gave on the normalized input ((x / scale) - mean) / std: the weights
+    absorb 1 / (scale * std) per input channel and the bias absorbs the
+    mean. Padding pads the raw pixels with zeros, which is only the same as
+    padding the normalized input when there is no mean, so a padded conv
+    only accepts the scale.
+
+    Args:
+        conv: First convolution, applied directly to the model input
+        mean, std: Normalize() parameters, or None for [0, 1] inputs
+        scale: Input range mapped to [0, 1] (255 for uint8 pixels)
+
+    Raises:
+        ValueError: If mean is given and the conv pads its input
+    """
+    import torch
+    padded = any(conv.padding) if isinstance(conv.padding, tuple) else conv.padding != 'valid'
+    # efficientnet_pytorch pads in a ZeroPad2d in front of the conv
+    padded = padded or any(getattr(getattr(conv, 'static_padding', None), 'padding', ()))
+    if mean is not None and padded:
+        raise ValueError('Cannot fold a mean into a padded convolution')
+    with torch.no_grad():
+        mean = torch.tensor(mean if mean is not None else [0.0] * conv.in_channels, dtype=conv.weight.dtype)
+        std = torch.tensor(std if std is not None else [1.0] * conv.in_channels, dtype=conv.weight.dtype)
+        mean, std = mean.to(conv.weight.device), std.to(conv.weight.device)
+        shift = (conv.weight * (mean / std).view(1, -1, 1, 1)).sum(dim=(1, 2, 3))
+        conv.weight.div_((scale * std).view(1, -1, 1, 1))
+        if mean.any():
+            if conv.bias is None:
+                conv.bias = torch.nn.Parameter(-shift)
+            else:
+                conv.bias.sub_(shift)
+    return conv
+
+
+class InputBufferPool:
+    """
+    Reusable model input tensors, one free list per shape
+
+    Requests of the same shape keep reusing the same few blocks instead of
+    allocating a fresh tensor each time, which keeps the allocator from
+    fragmenting under mixed traffic. The pool only grows to the number of
+    requests that preprocess concurrently.
+    """
+
+    def __init__(self, dtype: torch.dtype | None = None):
+        import torch
+        self.dtype = dtype or torch.float32
+        self._free = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def borrow(self, shape: tuple[int, ...]):
+        with self._lock:
+            free = self._free.setdefault(shape, [])
+            buffer = free.pop() if free else None
+        if buffer is None:
+            import torch
+            buffer = torch.empty(shape, dtype=self.dtype)
+        try:
+            yield buffer
+        finally:
+            with self._lock:
+                self._free[shape].append(buffer)
+
+
+def to_input_tensor(image_bytes: bytes, transform) -> torch.Tensor:
+    """
+    Decode image bytes and apply a model's transform
+
+    Args:
+        image_bytes: Image file bytes (JPEG, PNG, etc.)
+        transform: torchvision transform producing a [3, H, W] tensor
+
+    Returns:
+        Float tensor [1, 3, H, W] on CPU
+    """
+    return transform(load_rgb(image_bytes)).unsqueeze(0)
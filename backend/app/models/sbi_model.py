@@ -1,15 +1,34 @@
-import torch
-import torchvision.transforms as transforms
-from PIL import Image
-import io
+from __future__ import annotations
+
+import functools
 import os
-import sys
+from typing import TYPE_CHECKING
+
+from app.models.preprocessing import (
+    InputBufferPool, fill_input_tensor, fold_input_normalization, frames_to_input, load_resized,
+)
+
+# torch loads with the first model, not when the API imports this module
+if TYPE_CHECKING:
+    import torch
+
+INPUT_SIZE = 380
+NORMALIZE = None  # exp003 takes [0, 1] inputs as-is
+
+
+def build_transform(input_size: int = INPUT_SIZE):
+    """Preprocessing used by exp003: resize to 380x380, scale to [0, 1]"""
+    import torchvision.transforms as transforms  # only the reference path uses torchvision
+    return transforms.Compose([
+        transforms.Resize((input_size, input_size)),
+        transforms.ToTensor(),
+    ])
 
-# Add ml_inference to path for model imports
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..', 'ml_inference'))
 
-from sbi.inference.model import Detector
 
+def input_conv(model: torch.nn.Module) -> torch.nn.Conv2d:
+    """EfficientNet stem conv: the first layer to see the input"""
+    return model.net._conv_stem
 
 class SBIModel:
     """
@@ -21,7 +40,8 @@ class SBIModel:
     - Performance: AUC 98.73%, Accuracy 94.83%
     """
 
-    def __init__(self, model_path: str):
+    def __init__(self, model_path: str, checkpoint_name: str = 'exp003_best_model.pth', quantized: bool = False,
+                 uint8_input: bool = False):
         """
         Initialize SBI model
 
@@ -29,20 +49,29 @@ class SBIModel:
             model_path: Path to the model directory containing:
                 - exp003_best_model.pth (fine-tuned weights)
                 - adv-efficientnet-b4-44fb3a87.pth (backbone weights)
+            checkpoint_name: Fine-tuned weights file inside model_path
+            quantized: Also build an int8 dynamically quantized copy (CPU only),
+                used by predict_tensor(..., quantized=True)
+            uint8_input: Take uint8 pixel tensors, with the input scaling
+                folded into the first convolution (see fold_input_normalization())
         """
+        import torch
+
         self.model_path = model_path
         self.device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
 
-        # Initialize model architecture
+        # Initialize model architecture (imported here: efficientnet_pytorch
+        # only loads once a model is built, not when the module is imported)
+        from app.ml_inference.inference.model import Detector
         self.model = Detector()
 
         # Load fine-tuned weights
-        checkpoint_path = os.path.join(model_path, 'exp003_best_model.pth')
+        checkpoint_path = os.path.join(model_path, checkpoint_name)
 
         if not os.path.exists(checkpoint_path):
             raise FileNotFoundError(
                 f"SBI model checkpoint not found at {checkpoint_path}. "
-                f"Please ensure exp003_best_model.pth is in {model_path}"
+                f"Please ensure {checkpoint_name} is in {model_path}"
             )
 
         # Load checkpoint
@@ -57,20 +86,117 @@ class SBIModel:
         self.model = self.model.to(self.device)
         self.model.eval()
 
-        # Image preprocessing (exp003 uses 380x380)
-        self.transform = transforms.Compose([
-            transforms.Resize((380, 380)),
-            transforms.ToTensor(),
-        ])
+        # uint8 input: the /255 scaling lives in the EfficientNet stem conv
+        # instead (zero padding stays zero, so the fold is exact). Done before
+        # quantizing so the quantized copy gets the same stem
+        self.input_dtype = torch.uint8 if uint8_input else torch.float32
+        if uint8_input:
+            fold_input_normalization(input_conv(self.model))
+
+        # Optional cheaper backend for degraded service tiers. Dynamic
+        # quantization only covers Linear layers, so the gain here is small;
+        # most of the saving comes from the lower input resolution instead
+        self.quantized_model = None
+        if quantized and self.device.type == 'cpu':
+            self.quantized_model = torch.ao.quantization.quantize_dynamic(
+                self.model, {torch.nn.Linear}, dtype=torch.qint8
+            )
+
+        self.buffers = InputBufferPool(self.input_dtype)
 
         print(f"✓ SBI model loaded successfully on {self.device}")
 
-    def predict(self, image_bytes: bytes) -> tuple[bool, float]:
+    @functools.cached_property
+    def transform(self):
+        """
+        torchvision reference preprocessing (exp003 uses 380x380)
+
+        predict() fills pooled buffers with the same values instead; this is
+        built on first use for parity checks (app.cli.input_parity)
+        """
+        return build_transform()
+
+    def preprocess(self, image_bytes: bytes, input_size: int | None = None) -> torch.Tensor:
+        """
+        Decode and resize an image into a model input tensor
+
+        Args:
+            image_bytes: Image file bytes (JPEG, PNG, etc.)
+            input_size: Side length to resize to (default 380). Smaller sizes
+                are cheaper; the backbone pools globally so any size works.
+
+        Returns:
+            Tensor [1, 3, input_size, input_size] on CPU: float, or uint8 with uint8_input
+        """
+        input_size = input_size or INPUT_SIZE
+        import torch
+        out = torch.empty(1, 3, input_size, input_size, dtype=self.input_dtype)
+        return fill_input_tensor(load_resized(image_bytes, input_size), out)
+
+    def predict_batch(self, img_tensor: torch.Tensor, quantized: bool = False) -> list[tuple[bool, float]]:
+        """
+        Run the detector on a batch of preprocessed inputs
+
+        Args:
+            img_tensor: Tensor [N, 3, H, W], as produced by preprocess()
+            quantized: Use the quantized copy if one was built
+
+        Returns:
+            list: (is_fake: bool, confidence: float) per input
+
+        Raises:
+            ValueError: If the tensor's dtype doesn't match the input mode
+        """
+        import torch
+        if img_tensor.dtype != self.input_dtype:
+            raise ValueError(f"Expected a {self.input_dtype} input tensor, got {img_tensor.dtype}")
+        model = self.quantized_model if quantized and self.quantized_model is not None else self.model
+        with torch.no_grad():
+            output = model(img_tensor.to(self.device).float())
+            # Apply softmax to get probabilities
+            probs = torch.nn.functional.softmax(output, dim=1)
+            # Get fake probability (class 1)
+            fake_probs = probs[:, 1].tolist()
+
+        # Threshold at 0.4839 (optimal F1 threshold, consistent with detection_service.py)
+        return [(fake_prob >= 0.4839, fake_prob) for fake_prob in fake_probs]
+
+    def predict_tensor(self, img_tensor: torch.Tensor, quantized: bool = False) -> tuple[bool, float]:
+        """
+        Run the detector on a preprocessed input tensor
+
+        Args:
+            img_tensor: Output of preprocess()
+            quantized: Use the quantized copy if one was built
+
+        Returns:
+            tuple: (is_fake: bool, confidence: float)
+        """
+        return self.predict_batch(img_tensor, quantized)[0]
+
+    def predict_frames(self, frames: torch.Tensor, input_size: int | None = None,
+                       quantized: bool = False) -> list[tuple[bool, float]]:
+        """
+        Predict on frames that are already decoded, skipping image decoding
+
+        Args:
+            frames: uint8 [N, H, W, 3] RGB tensor
+            input_size: See preprocess()
+            quantized: See predict_tensor()
+
+        Returns:
+            list: (is_fake: bool, confidence: float) per frame
+        """
+        return self.predict_batch(frames_to_input(frames, input_size or INPUT_SIZE, dtype=self.input_dtype), quantized)
+
+    def predict(self, image_bytes: bytes, input_size: int | None = None, quantized: bool = False) -> tuple[bool, float]:
         """
         Predict if image is a deepfake
 
         Args:
             image_bytes: Image file bytes (JPEG, PNG, etc.)
+            input_size: See preprocess()
+            quantized: See predict_tensor()
 
         Returns:
             tuple: (is_fake: bool, confidence: float)
@@ -78,22 +204,12 @@ class SBIModel:
                 - confidence: Probability of being fake (0.0 to 1.0)
         """
         try:
-            # Load and preprocess image
-            image = Image.open(io.BytesIO(image_bytes)).convert('RGB')
-            img_tensor = self.transform(image).unsqueeze(0).to(self.device)
-
-            # Inference
-            with torch.no_grad():
-                output = self.model(img_tensor)
-                # Apply softmax to get probabilities
-                probs = torch.nn.functional.softmax(output, dim=1)
-                # Get fake probability (class 1)
-                fake_prob = probs[0, 1].item()
-
-            # Threshold at 0.4839 (optimal F1 threshold, consistent with detection_service.py)
-            is_fake = fake_prob >= 0.4839
-
-            return is_fake, fake_prob
+            input_size = input_size or INPUT_SIZE
+            img = load_resized(image_bytes, input_size)
+            with self.buffers.borrow((1, 3, input_size, input_size)) as img_tensor:
+                fill_input_tensor(img, img_tensor)
+                del img
+                return self.predict_tensor(img_tensor, quantized)
 
         except Exception as e:
             print(f"Error in SBI prediction: {e}")
@@ -0,0 +1,182 @@
+import math
+import threading
+import time
+from collections import deque
+
+# Priority lanes, highest first. A free slot always goes to the oldest
+# interactive request before any batch request is considered.
+LANES = ("interactive", "batch")
+
+
+class QueueFull(Exception):
+    """Raised when a lane's wait queue is at its configured depth"""
+
+    def __init__(self, model: str, lane: str, retry_after: int):
+        self.model = model
+        self.lane = lane
+        self.retry_after = retry_after
+        super().__init__(f"{model} {lane} queue is full, retry in {retry_after}s")
+
+
+class Ticket:
+    """
+    A request's place in one model's queue
+
+    Use as a context manager around the model call: entering waits for a
+    free slot, leaving frees it. cancel() gives the place up if the model
+    is never run. Until its owner enters, the ticket counts toward the lane
+    depth but doesn't hold up the tickets behind it.
+    """
+
+    def __init__(self, queue: "AdmissionQueue", lane: str):
+        self.queue = queue
+        self.lane = lane
+        self.state = "waiting"
+        self.ready = False  # owner is blocked in __enter__
+        self._started = None
+
+    def __enter__(self):
+        self.queue._acquire(self)
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.queue._release(self, time.perf_counter() - self._started)
+        return False
+
+    def cancel(self):
+        if self.state == "waiting":
+            self.queue._cancel(self)
+
+
+class AdmissionQueue:
+    """
+    Bounded, prioritized wait queue in front of one model
+
+    At most `slots` requests run the model at once; the rest wait in their
+    lane. A lane that already holds `depth` waiting requests rejects new ones
+    with QueueFull instead of letting the backlog (and every request's
+    latency) grow without bound.
+    """
+
+    def __init__(self, name: str, slots: int = 1, depths: dict[str, int] | None = None):
+        """
+        Args:
+            name: Model name, used in errors and stats
+            slots: Requests allowed to run the model concurrently
+            depths: lane -> max waiting requests (0 = unbounded)
+        """
+        self.name = name
+        self.slots = slots
+        self.depths = depths or {}
+
+        self._cond = threading.Condition()
+        self._waiting = {lane: deque() for lane in LANES}
+        self._running = 0
+        self._service_time = None  # EWMA of seconds per model call
+        self.admitted = {lane: 0 for lane in LANES}
+        self.rejected = {lane: 0 for lane in LANES}
+
+    def set_slots(self, slots: int):
+        with self._cond:
+            self.slots = max(1, slots)
+            self._cond.notify_all()
+
+    def reserve(self, lane: str, bounded: bool = True) -> Ticket:
+        """
+        Take a place in a lane without blocking
+
+        Args:
+            lane: One of LANES
+            bounded: Enforce the lane depth; False always admits (used by
+                callers that already bound their own concurrency, e.g. job workers)
+
+        Raises:
+            QueueFull: If the lane is at its depth
+        """
+        with self._cond:
+            depth = self.depths.get(lane, 0)
+            if bounded and depth and len(self._waiting[lane]) >= depth:
+                self.rejected[lane] += 1
+                raise QueueFull(self.name, lane, self._retry_after())
+            ticket = Ticket(self, lane)
+            self._waiting[lane].append(ticket)
+            self.admitted[lane] += 1
+            return ticket
+
+    def _retry_after(self) -> int:
+        # Time for the current backlog to drain at the observed service rate
+        backlog = self._running + sum(len(q) for q in self._waiting.values())
+        service_time = self._service_time or 1.0
+        return max(1, math.ceil(service_time * backlog / self.slots))
+
+    def _head(self):
+        # Oldest ticket whose owner is waiting for this model. A request
+        # reserves every model's queue up front but runs them one after
+        # another; its places in the later queues must not block requests
+        # that are ready to run while a slot is free
+        for lane in LANES:
+            for ticket in self._waiting[lane]:
+                if ticket.ready:
+                    return ticket
+        return None
+
+    def _acquire(self, ticket: Ticket):
+        with self._cond:
+            ticket.ready = True
+            while self._running >= self.slots or self._head() is not ticket:
+                self._cond.wait()
+            self._waiting[ticket.lane].remove(ticket)
+            self._running += 1
+            ticket.state = "running"
+
+    def _release(self, ticket: Ticket, elapsed: float):
+        with self._cond:
+            self._running -= 1
+            ticket.state = "done"
+            self._service_time = elapsed if self._service_time is None else 0.8 * self._service_time + 0.2 * elapsed
+            self._cond.notify_all()
+
+    def _cancel(self, ticket: Ticket):
+        with self._cond:
+            self._waiting[ticket.lane].remove(ticket)
+            ticket.state = "cancelled"
+            self._cond.notify_all()
+
+    def load(self) -> float:
+        """Fullest bounded lane as waiting / depth (1.0 = about to reject)"""
+        with self._cond:
+            return max(
+                (len(self._waiting[lane]) / self.depths[lane] for lane in LANES if self.depths.get(lane)),
+                default=0.0,
+            )
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "slots": self.slots,
+                "running": self._running,
+                "waiting": {lane: len(q) for lane, q in self._waiting.items()},
+                "depth": {lane: self.depths.get(lane, 0) for lane in LANES},
+                "admitted": dict(self.admitted),
+                "rejected": dict(self.rejected),
+                "avg_service_ms": round(self._service_time * 1000, 1) if self._service_time is not None else None,
+            }
+
+
+def reserve_all(queues: dict[str, AdmissionQueue], names, lane: str, bounded: bool = True) -> dict[str, Ticket]:
+    """
+    Reserve a place in every named queue, or in none of them
+
+    Raises:
+        QueueFull: From the first full queue; places already taken are released
+    """
+    tickets = {}
+    try:
+        for name in names:
+            tickets[name] = queues[name].reserve(lane, bounded)
+    except QueueFull:
+        for ticket in tickets.values():
+            ticket.cancel()
+        raise
+    return tickets
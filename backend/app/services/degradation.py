@@ -0,0 +1,133 @@
+import threading
+import time
+from collections import deque
+
+# Steps a tier can add, cheapest saving first. Tiers are cumulative: each one
+# applies its own step plus every step of the tiers before it.
+#   no_gpt             - skip the ChatGPT reference call
+#   reduced_resolution - run SBI at DEGRADED_SBI_INPUT_SIZE instead of 380
+#   quantized          - use the int8 model copies (needs QUANTIZED_BACKEND)
+STEPS = ("no_gpt", "reduced_resolution", "quantized")
+
+
+def parse_tiers(spec: str) -> list[tuple[str, float]]:
+    """
+    Parse a tier list such as "no_gpt:0.5,reduced_resolution:0.75"
+
+    Each entry is a step and the load level (see DegradationPolicy) at which
+    it is switched on. Thresholds must increase along the list.
+
+    Raises:
+        ValueError: On an unknown step or non-increasing thresholds
+    """
+    tiers = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        name, _, threshold = part.partition(":")
+        name = name.strip()
+        if name not in STEPS:
+            raise ValueError(f"Unknown degradation step: {name}. Choose from: {', '.join(STEPS)}")
+        threshold = float(threshold)
+        if tiers and threshold <= tiers[-1][1]:
+            raise ValueError(f"Degradation thresholds must increase: {spec}")
+        tiers.append((name, threshold))
+    return tiers
+
+
+class DegradationPolicy:
+    """
+    Picks a service tier from live load, with hysteresis
+
+    Load is the larger of the fullest admission queue (waiting / depth) and
+    the recent mean request latency divided by the latency target, so 1.0
+    means "at capacity". The policy steps down one tier at a time as load
+    crosses each tier's threshold, and steps back up only after load has
+    stayed below recover_ratio x the current tier's threshold for `cooldown`
+    seconds, so it doesn't flap at a boundary.
+    """
+
+    def __init__(self, tiers: list[tuple[str, float]], latency_target_ms: float,
+                 recover_ratio: float = 0.6, cooldown: float = 10, latency_window: float = 30):
+        """
+        Args:
+            tiers: (step, threshold) pairs from parse_tiers(); empty disables degradation
+            latency_target_ms: Request latency that counts as full load
+            recover_ratio: Fraction of a tier's threshold load must fall below to leave it
+            cooldown: Seconds load must stay low before stepping back up
+            latency_window: Seconds of request latencies averaged into the load
+        """
+        self.tiers = tiers
+        self.latency_target = latency_target_ms / 1000
+        self.recover_ratio = recover_ratio
+        self.cooldown = cooldown
+        self.latency_window = latency_window
+
+        self._lock = threading.Lock()
+        self._latencies = deque()
+        self._level = 0  # 0 = full service, i = tiers[:i] applied
+        self._calm_since = None
+        self.transitions = 0
+
+    @property
+    def tier(self) -> str:
+        return self.tiers[self._level - 1][0] if self._level else "full"
+
+    @property
+    def steps(self) -> set[str]:
+        return {name for name, _ in self.tiers[:self._level]}
+
+    def record_latency(self, seconds: float):
+        with self._lock:
+            self._latencies.append((time.monotonic(), seconds))
+
+    def _latency_load(self, now: float) -> float:
+        while self._latencies and self._latencies[0][0] < now - self.latency_window:
+            self._latencies.popleft()
+        if not self._latencies or self.latency_target <= 0:
+            return 0.0
+        return sum(s for _, s in self._latencies) / len(self._latencies) / self.latency_target
+
+    def update(self, queue_load: float) -> tuple[str, set[str], float]:
+        """
+        Re-evaluate the tier for a new request
+
+        Args:
+            queue_load: Fullest admission queue, waiting / depth
+
+        Returns:
+            (tier name, active steps, load)
+        """
+        with self._lock:
+            now = time.monotonic()
+            load = max(queue_load, self._latency_load(now))
+
+            if self._level < len(self.tiers) and load >= self.tiers[self._level][1]:
+                self._level += 1
+                self._calm_since = None
+                self.transitions += 1
+                print(f"⚠ Load {load:.2f}: degrading to tier '{self.tier}'")
+            elif self._level > 0 and load < self.tiers[self._level - 1][1] * self.recover_ratio:
+                if self._calm_since is None:
+                    self._calm_since = now
+                elif now - self._calm_since >= self.cooldown:
+                    self._level -= 1
+                    self._calm_since = None
+                    # Latencies measured in the degraded tier understate full-service cost
+                    self._latencies.clear()
+                    self.transitions += 1
+                    print(f"✓ Load {load:.2f}: recovering to tier '{self.tier}'")
+            else:
+                self._calm_since = None
+
+            return self.tier, self.steps, load
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "tier": self.tier,
+                "tiers": ["full"] + [name for name, _ in self.tiers],
+                "latency_load": round(self._latency_load(time.monotonic()), 3),
+                "transitions": self.transitions,
+            }
@@ -1,126 +1,393 @@
-from app.models.chatgpt_vision import ChatGPTVision
+from __future__ import annotations
+
+from app.models.chatgpt_vision import ChatGPTVision, GPT_MODEL
 from app.models.sbi_model import SBIModel
 from app.models.distildire_model import DistilDIREModel
+from app.services.model_executor import PartitionedModel, executor_plan
+from app.services.model_registry import ModelRegistry, latest_checkpoint
+from app.services.remote_workers import RemoteRegistry, WorkerPool, parse_workers
+from app.services.admission import AdmissionQueue, LANES, reserve_all
+from app.services.degradation import DegradationPolicy, parse_tiers
+from app.services.memory_budget import PixelBudget, StageMemory
+from app.services.profiler import Profiler
+from app.models.preprocessing import image_pixels
 from app.core.config import settings
-import os
+from app.core.model_catalog import CHECKPOINT_FILES, MODEL_NAMES, model_dir
+from typing import TYPE_CHECKING, Iterable
+import time
+import warnings
+
+# torch and numpy load with the first model or decoded frames, not on import
+if TYPE_CHECKING:
+    import numpy as np
+    import torch
+
+MODEL_LABELS = {"sbi": "SBI", "distildire": "DistilDIRE", "chatgpt": "ChatGPT"}
+
+# Per-model decision thresholds (optimal F1 for SBI, default for DistilDIRE, tuned for GPT)
+THRESHOLDS = {"sbi": 0.4839, "distildire": 0.5, "chatgpt": 0.65}
+
 
 class DetectionService:
     def __init__(self):
         print("Initializing Detection Service...")
 
         # Initialize ChatGPT Vision model
-        self.chatgpt_vision = ChatGPTVision(api_key=settings.OPENAI_API_KEY)
+        self.chatgpt_vision = ChatGPTVision(api_key=settings.OPENAI_API_KEY, base_url=settings.OPENAI_BASE_URL)
+
+        # Bounded per-model wait queues; slots track replicas as models load
+        depths = {"interactive": settings.ADMISSION_INTERACTIVE_DEPTH, "batch": settings.ADMISSION_BATCH_DEPTH}
+        self.admission = {name: AdmissionQueue(name, slots=1, depths=depths) for name in MODEL_NAMES}
+        self.admission["chatgpt"].set_slots(settings.CHATGPT_CONCURRENCY)
+
+        # Bounded decode memory: cap on concurrently decoded pixels, per-stage RSS
+        self.pixel_budget = PixelBudget(settings.MEMORY_MAX_DECODED_PIXELS, settings.MEMORY_TRIM_AFTER_PIXELS)
+        self.memory = StageMemory()
+
+        # Cheaper service tiers under load
+        tiers = parse_tiers(settings.DEGRADATION_TIERS)
+        if not settings.QUANTIZED_BACKEND:
+            # Nothing to switch to, the tier would just be a copy of the previous one
+            tiers = [tier for tier in tiers if tier[0] != "quantized"]
+        self.degradation = DegradationPolicy(
+            tiers,
+            latency_target_ms=settings.DEGRADATION_LATENCY_TARGET_MS,
+            cooldown=settings.DEGRADATION_COOLDOWN_SECONDS,
+        )
+
+        # On-demand profiling (admin endpoint); idle until a session starts
+        self.profiler = Profiler(self._torch_modules, sample_interval=settings.PROFILE_SAMPLE_INTERVAL_MS / 1000)
 
         # Initialize SBI and DistilDIRE models
-        # Check if models are available before loading
-        self.use_sbi = False
-        self.use_distildire = False
+        # Each registry serves the newest checkpoint in its directory and, when
+        # MODEL_RELOAD_INTERVAL > 0, hot-swaps new ones without a restart.
+        # A model with no checkpoint yet stays a placeholder until one appears.
+        # In remote mode the checkpoints live on the inference workers instead.
+        self._executor_plan = None
+        self.remote = None
+        self.registries = {}
+        if settings.EXECUTOR_MODE == "remote":
+            self.remote = WorkerPool(
+                parse_workers(settings.REMOTE_WORKERS),
+                token=settings.WORKER_API_TOKEN,
+                health_interval=settings.REMOTE_HEALTH_INTERVAL,
+                timeout=settings.REMOTE_TIMEOUT,
+                retries=settings.REMOTE_RETRIES,
+                on_change=self._remote_slots,
+            )
+            self.registries = {kind: RemoteRegistry(kind, self.remote) for kind in CHECKPOINT_FILES}
+            self.remote.start()
+            self._remote_slots()
+        else:
+            for kind, checkpoint in CHECKPOINT_FILES.items():
+                registry = ModelRegistry(
+                    kind,
+                    self._model_dir(kind),
+                    checkpoint,
+                    loader=lambda path, name, kind=kind: self._load_model(kind, path, name),
+                    poll_interval=settings.MODEL_RELOAD_INTERVAL,
+                )
+                if not registry.load():
+                    print(f"⚠ {MODEL_LABELS[kind]} model files not found or failed to load, using placeholder")
+                registry.start()
+                self.registries[kind] = registry
+
+        print(f"✓ Detection Service initialized:")
+        for kind, registry in self.registries.items():
+            print(f"  - {MODEL_LABELS[kind]}: {registry.version or 'Placeholder'}")
+        print(f"  - ChatGPT Vision: Active")
+
+    @property
+    def use_sbi(self) -> bool:
+        return self.registries["sbi"].available
 
+    @property
+    def use_distildire(self) -> bool:
+        return self.registries["distildire"].available
+
+    def _load_model(self, kind: str, model_path: str, checkpoint_name: str):
+        """Load a detector in-process or as a partitioned worker pool (EXECUTOR_MODE)"""
+        quantized = settings.QUANTIZED_BACKEND == "dynamic"
+        uint8_input = settings.UINT8_INPUT
+        if settings.EXECUTOR_MODE == "partitioned":
+            if self._executor_plan is None:
+                # Plan over the models that will actually load, so cores aren't reserved for a placeholder
+                self._executor_plan = executor_plan(settings, {
+                    name: self._model_dir(name)
+                    for name, checkpoint in CHECKPOINT_FILES.items()
+                    if latest_checkpoint(self._model_dir(name), checkpoint)
+                })
+            if kind not in self._executor_plan:
+                # Checkpoint appeared after startup: lay it out on the cores the others left
+                reserved = [core for layout in self._executor_plan.values() for core in layout["cores"]]
+                self._executor_plan.update(executor_plan(settings, {kind: model_path}, reserved=reserved))
+            model = PartitionedModel(kind, model_path, checkpoint_name=checkpoint_name, quantized=quantized,
+                                     uint8_input=uint8_input, **self._executor_plan[kind])
+            self.admission[kind].set_slots(model.replicas)
+            return model
+        if kind == "sbi":
+            return SBIModel(model_path, checkpoint_name, quantized=quantized, uint8_input=uint8_input)
+        return DistilDIREModel(model_path, checkpoint_name, quantized=quantized, uint8_input=uint8_input)
+
+    def _remote_slots(self):
+        """Admission slots follow the capacity of the healthy workers serving each model"""
+        for kind in CHECKPOINT_FILES:
+            self.admission[kind].set_slots(self.remote.capacity(kind))
+
+    def worker_stats(self) -> dict:
+        """Remote inference workers: health, served models and load (empty outside remote mode)"""
+        if self.remote is None:
+            return {"mode": settings.EXECUTOR_MODE, "workers": []}
+        return {"mode": "remote", **self.remote.stats()}
+
+    _model_dir = staticmethod(model_dir)
+
+    def _torch_modules(self) -> dict:
+        """Networks of the in-process models by name (partitioned workers live in other processes)"""
+        import torch
+        modules = {}
+        for kind, registry in self.registries.items():
+            model = registry.model
+            for attr, suffix in (("model", ""), ("quantized_model", ".quantized")):
+                module = getattr(model, attr, None)
+                if isinstance(module, torch.nn.Module):
+                    modules[kind + suffix] = module
+        return modules
+
+    def close(self):
+        """Stop reload watchers, model worker processes and remote health checks, if any"""
+        for registry in self.registries.values():
+            registry.stop()
+        if self.remote is not None:
+            self.remote.close()
+
+    def _run_model(self, name: str, predict, available: bool, image_bytes: bytes, version: str | None = None) -> dict:
+        """Run one model and wrap its prediction with a status and the version that produced it"""
+        if not available:
+            return {"is_fake": False, "confidence": 0.5, "status": "placeholder", "version": None}
         try:
-            sbi_path = os.path.join(
-                os.path.dirname(__file__),
-                '../../ml_models/deployment_package/models/sbi'
-            )
-            if os.path.exists(os.path.join(sbi_path, 'exp003_best_model.pth')):
-                self.sbi_model = SBIModel(sbi_path)
-                self.use_sbi = True
-            else:
-                print("⚠ SBI model files not found, using placeholder")
+            # Remote models add the version of the worker that answered
+            is_fake, confidence, *served = predict(image_bytes)
+            version = served[0] if served else version
+            status = "active"
         except Exception as e:
-            print(f"⚠ Failed to load SBI model: {e}")
+            print(f"{MODEL_LABELS[name]} prediction error: {e}")
+            is_fake, confidence = False, 0.5
+            status = "error"
+        return {"is_fake": is_fake, "confidence": confidence, "status": status, "version": version}
+
+    def _run_registered(self, name: str, image_bytes: bytes, **options) -> dict:
+        # Hold the model for the whole prediction so a concurrent swap can't close it
+        with self.registries[name].acquire() as (model, version):
+            predict = (lambda b: model.predict(b, **options)) if model is not None else None
+            return self._run_model(name, predict, model is not None, image_bytes, version)
+
+    def _run_frames(self, name: str, frames: torch.Tensor, **options) -> list[dict]:
+        """Run one local model on a batch of decoded frames; one result dict per frame"""
+        with self.registries[name].acquire() as (model, version):
+            if model is None:
+                return [{"is_fake": False, "confidence": 0.5, "status": "placeholder", "version": None}] * len(frames)
+            try:
+                predictions = model.predict_frames(frames, **options)
+                status = "active"
+            except Exception as e:
+                print(f"{MODEL_LABELS[name]} prediction error: {e}")
+                predictions = [(False, 0.5)] * len(frames)
+                status = "error"
+            return [
+                {"is_fake": is_fake, "confidence": confidence, "status": status,
+                 "version": served[0] if served else version}
+                for is_fake, confidence, *served in predictions
+            ]
+
+    @staticmethod
+    def _model_options(name: str, steps: set[str]) -> dict:
+        """predict() keyword arguments for a model under the active degradation steps"""
+        options = {}
+        if name == "sbi" and "reduced_resolution" in steps:
+            options["input_size"] = settings.DEGRADED_SBI_INPUT_SIZE
+        if "quantized" in steps:
+            options["quantized"] = True
+        return options
+
+    def _run_selected(self, image_bytes: bytes, pixels: int, selected: set[str], dropped: set[str],
+                      steps: set[str], tickets: dict, timings: dict | None = None) -> dict:
+        """
+        Run the selected models in order, each in its admission slot; seconds per model go to timings
 
+        SBI and DistilDIRE decode the image under the pixel budget, taken
+        inside their slot: a request never waits for pixels while other
+        requests wait behind its queue place, and whoever holds pixels is
+        already running. The GPT call decodes nothing and holds no pixels.
+        """
+        results = {}
+        for name in MODEL_NAMES:
+            if name in dropped:
+                results[name] = {"is_fake": False, "confidence": None, "status": "dropped", "version": None}
+                continue
+            if name not in selected:
+                results[name] = {"is_fake": False, "confidence": None, "status": "skipped", "version": None}
+                continue
+            with tickets[name], self.memory.stage(name):
+                start = time.perf_counter()
+                if name in self.registries:
+                    # 1. SBI Model / 2. DistilDIRE Model
+                    with self.pixel_budget.acquire(pixels):
+                        results[name] = self._run_registered(name, image_bytes, **self._model_options(name, steps))
+                else:
+                    # 3. ChatGPT Vision
+                    results[name] = self._run_model(name, self.chatgpt_vision.verify, True, image_bytes, GPT_MODEL)
+                if timings is not None:
+                    timings[name] = time.perf_counter() - start
+        return results
+
+    def queue_stats(self) -> dict:
+        """Depth, concurrency and admitted/rejected counts of each model queue"""
+        return {name: queue.stats() for name, queue in self.admission.items()}
+
+    def load_stats(self) -> dict:
+        """Current degradation tier and the load that drives it"""
+        stats = self.degradation.stats()
+        stats["queue_load"] = round(max(queue.load() for queue in self.admission.values()), 3)
+        return stats
+
+    def memory_stats(self) -> dict:
+        """Per-stage peak RSS and decoded-pixel budget usage"""
+        stats = self.memory.stats()
+        stats["pixel_budget"] = self.pixel_budget.stats()
+        return stats
+
+    def detect_frames(self, frames: np.ndarray, models: Iterable[str] | None = None,
+                      priority: str = "interactive", bounded: bool = True) -> dict:
+        """
+        Detect deepfakes in frames the caller has already decoded
+
+        The pixels go to SBI/DistilDIRE preprocessing as a zero-copy
+        torch.from_numpy view: no JPEG encode/decode round trip. ChatGPT
+        needs an encoded image and is not available here. Each model takes
+        the batch's pixel count from the pixel budget inside its slot, as
+        detect() does: resizing makes full-size float copies of the frames.
+
+        Args:
+            frames: uint8 [N, H, W, 3] RGB array (see app.core.tensor_codec)
+            models: Subset of ("sbi", "distildire"); None runs both
+            priority, bounded: As for detect()
+
+        Returns:
+            dict: tier, plus one {is_fake, models} entry per frame in "frames"
+
+        Raises:
+            ValueError: If chatgpt is requested
+            QueueFull: As for detect()
+        """
+        if priority not in LANES:
+            raise ValueError(f"Unknown priority: {priority}. Choose from: {', '.join(LANES)}")
+        selected = set(self.registries if models is None else models)
+        if "chatgpt" in selected:
+            raise ValueError("chatgpt needs an encoded image; use /detect for it")
+
+        import torch
+        with warnings.catch_warnings():
+            # The view is read-only (it shares the request body) and is never written to
+            warnings.simplefilter("ignore", UserWarning)
+            frames = torch.from_numpy(frames)
+
+        pixels = frames.shape[0] * frames.shape[1] * frames.shape[2] if frames.ndim == 4 else 0
+        tier, steps, _ = self.degradation.update(max(queue.load() for queue in self.admission.values()))
+        tickets = reserve_all(self.admission, [name for name in MODEL_NAMES if name in selected], priority, bounded)
+
+        per_model = {}
+        start = time.perf_counter()
         try:
-            distildire_path = os.path.join(
-                os.path.dirname(__file__),
-                '../../ml_models/deployment_package/models/distildire'
-            )
-            if os.path.exists(os.path.join(distildire_path, 'v2_best_model.pth')):
-                self.distildire_model = DistilDIREModel(distildire_path)
-                self.use_distildire = True
-            else:
-                print("⚠ DistilDIRE model files not found, using placeholder")
-        except Exception as e:
-            print(f"⚠ Failed to load DistilDIRE model: {e}")
+            for name in MODEL_NAMES:
+                if name not in selected:
+                    per_model[name] = [{"is_fake": False, "confidence": None, "status": "skipped", "version": None}] * len(frames)
+                    continue
+                with tickets[name], self.memory.stage(name), self.pixel_budget.acquire(pixels):
+                    per_model[name] = self._run_frames(name, frames, **self._model_options(name, steps))
+        finally:
+            for ticket in tickets.values():
+                ticket.cancel()
+        self.degradation.record_latency(time.perf_counter() - start)
+        if self.profiler.active:
+            self.profiler.request_done()
 
-        print(f"✓ Detection Service initialized:")
-        print(f"  - SBI: {'Active' if self.use_sbi else 'Placeholder'}")
-        print(f"  - DistilDIRE: {'Active' if self.use_distildire else 'Placeholder'}")
-        print(f"  - ChatGPT Vision: Active")
+        results = []
+        for i in range(len(frames)):
+            frame_models = {name: per_model[name][i] for name in per_model}
+            results.append({
+                "is_fake": any(
+                    result["status"] == "active" and result["confidence"] >= THRESHOLDS[name]
+                    for name, result in frame_models.items()
+                ),
+                "models": frame_models,
+            })
+        return {"tier": tier, "frames": results}
 
-    def detect(self, image_bytes: bytes) -> dict:
+    def detect(self, image_bytes: bytes, models: Iterable[str] | None = None,
+               priority: str = "interactive", bounded: bool = True, timings: dict | None = None) -> dict:
         """
         Detect deepfake using hybrid approach
 
         Args:
             image_bytes: Image file bytes
+            models: Names of the models to run (subset of MODEL_NAMES).
+                None runs all of them; the others are reported as "skipped".
+            priority: Admission lane, "interactive" or "batch". Interactive
+                requests take a model's free slot ahead of any waiting batch work.
+            bounded: Reject with QueueFull when a selected model's lane is full.
+                False waits instead (for callers with their own concurrency limit).
+            timings: If given, filled with the seconds each model that ran took
+                (excluding its admission wait), for the traffic recorder.
 
         Returns:
             dict: Detection results with deepfake confidence scores
                 - is_fake: True if detected as deepfake, False if real
                 - confidence: Deepfake probability (0.0 = definitely real, 1.0 = definitely fake)
-                - Each model returns (is_fake, deepfake_confidence)
+                - tier: Degradation tier that served the request ("full" normally)
+                - Each model returns (is_fake, deepfake_confidence) and the
+                  checkpoint version (or GPT model) that produced it
+
+        Raises:
+            QueueFull: If bounded and a selected model's queue is full; nothing has run
         """
+        if priority not in LANES:
+            raise ValueError(f"Unknown priority: {priority}. Choose from: {', '.join(LANES)}")
+        selected = set(MODEL_NAMES if models is None else models)
 
-        # 1. SBI Model
-        if self.use_sbi:
-            try:
-                sbi_is_fake, sbi_confidence = self.sbi_model.predict(image_bytes)
-                sbi_status = "active"
-            except Exception as e:
-                print(f"SBI prediction error: {e}")
-                sbi_is_fake, sbi_confidence = False, 0.5
-                sbi_status = "error"
-        else:
-            sbi_is_fake, sbi_confidence = False, 0.5
-            sbi_status = "placeholder"
+        tier, steps, _ = self.degradation.update(max(queue.load() for queue in self.admission.values()))
+        dropped = {"chatgpt"} & selected if "no_gpt" in steps else set()
+        selected -= dropped
 
-        # 2. DistilDIRE Model
-        if self.use_distildire:
-            try:
-                distildire_is_fake, distildire_confidence = self.distildire_model.predict(image_bytes)
-                distildire_status = "active"
-            except Exception as e:
-                print(f"DistilDIRE prediction error: {e}")
-                distildire_is_fake, distildire_confidence = False, 0.5
-                distildire_status = "error"
-        else:
-            distildire_is_fake, distildire_confidence = False, 0.5
-            distildire_status = "placeholder"
+        # Take a place in every selected model's queue up front, so an
+        # overloaded model rejects the request before any model has run
+        tickets = reserve_all(self.admission, [name for name in MODEL_NAMES if name in selected], priority, bounded)
 
-        # 3. ChatGPT Vision
         try:
-            chatgpt_is_fake, chatgpt_confidence = self.chatgpt_vision.verify(image_bytes)
-            chatgpt_status = "active"
-        except Exception as e:
-            print(f"ChatGPT prediction error: {e}")
-            chatgpt_is_fake, chatgpt_confidence = False, 0.5
-            chatgpt_status = "error"
+            pixels = image_pixels(image_bytes)
+        except Exception:
+            pixels = 0  # undecodable; each model reports its own error
+
+        start = time.perf_counter()
+        try:
+            results = self._run_selected(image_bytes, pixels, selected, dropped, steps, tickets, timings)
+        finally:
+            for ticket in tickets.values():
+                ticket.cancel()
+        self.degradation.record_latency(time.perf_counter() - start)
+        if self.profiler.active:
+            self.profiler.request_done()
 
         # Each model has its own optimal threshold (tuned per-model).
-        # Top-level is_fake is true if ANY active model exceeds its threshold.
-        is_fake = any([
-            sbi_status == "active" and sbi_confidence >= 0.4839,
-            distildire_status == "active" and distildire_confidence >= 0.5,
-            chatgpt_status == "active" and chatgpt_confidence >= 0.65,
-        ])
+        # Top-level is_fake is true if ANY active model exceeds its threshold;
+        # skipped, dropped and placeholder models never contribute.
+        is_fake = any(
+            result["status"] == "active" and result["confidence"] >= THRESHOLDS[name]
+            for name, result in results.items()
+        )
 
         return {
             "is_fake": is_fake,
-            "models": {
-                "sbi": {
-                    "is_fake": sbi_is_fake,
-                    "confidence": sbi_confidence,
-                    "status": sbi_status
-                },
-                "distildire": {
-                    "is_fake": distildire_is_fake,
-                    "confidence": distildire_confidence,
-                    "status": distildire_status
-                },
-                "chatgpt": {
-                    "is_fake": chatgpt_is_fake,
-                    "confidence": chatgpt_confidence,
-                    "status": chatgpt_status
-                }
-            }
+            "tier": tier,
+            "models": results
         }
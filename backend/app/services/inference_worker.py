@@ -0,0 +1,128 @@
+"""
+Worker side of remote inference (EXECUTOR_MODE=remote on the API)
+
+A worker only hosts SBI/DistilDIRE. The API process keeps admission,
+degradation, ChatGPT and decoding, and sends each worker frames that are
+already resized to the model's input size (see app.services.remote_workers).
+"""
+from __future__ import annotations
+
+import threading
+import warnings
+from typing import TYPE_CHECKING, Iterable
+
+from app.models.distildire_model import DistilDIREModel
+from app.models.sbi_model import SBIModel
+from app.services.model_registry import ModelRegistry
+from app.core.config import settings
+from app.core.model_catalog import CHECKPOINT_FILES, model_dir
+
+# torch and numpy load with the first checkpoint or request, not on import
+if TYPE_CHECKING:
+    import numpy as np
+
+
+class ModelNotLoaded(LookupError):
+    """The worker doesn't serve this model (not configured or no checkpoint yet)"""
+
+
+def _load_model(kind: str, model_path: str, checkpoint_name: str):
+    quantized = settings.QUANTIZED_BACKEND == "dynamic"
+    model_class = SBIModel if kind == "sbi" else DistilDIREModel
+    return model_class(model_path, checkpoint_name, quantized=quantized, uint8_input=settings.UINT8_INPUT)
+
+
+class InferenceWorker:
+    """
+    Runs pre-resized frames on the models in this host's checkpoint directories
+
+    Models are served through ModelRegistry like on the API, so checkpoint
+    hot reload works the same way. At most `concurrency` calls run at once;
+    the rest wait, and health() reports how many are in flight so the API
+    can route around busy workers.
+    """
+
+    def __init__(self, models: Iterable[str] | None = None, concurrency: int = 1):
+        """
+        Args:
+            models: Subset of ("sbi", "distildire") to load; None loads both
+            concurrency: Inference calls run at once (e.g. one per GPU stream
+                or per core group)
+        """
+        self.concurrency = max(1, concurrency)
+        self._slots = threading.BoundedSemaphore(self.concurrency)
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.served = 0
+        self.failed = 0
+
+        self.registries = {}
+        for kind in models or CHECKPOINT_FILES:
+            registry = ModelRegistry(
+                kind,
+                model_dir(kind),
+                CHECKPOINT_FILES[kind],
+                loader=lambda path, name, kind=kind: _load_model(kind, path, name),
+                poll_interval=settings.MODEL_RELOAD_INTERVAL,
+            )
+            if not registry.load():
+                print(f"⚠ Worker has no {kind} model yet; it will report it once a checkpoint loads")
+            registry.start()
+            self.registries[kind] = registry
+        print(f"✓ Inference worker ready: {self.health()['models']} (concurrency={self.concurrency})")
+
+    def health(self) -> dict:
+        """Served models with their checkpoint versions, plus current load"""
+        return {
+            "status": "ok",
+            "models": {kind: r.version for kind, r in self.registries.items() if r.available},
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "served": self.served,
+            "failed": self.failed,
+        }
+
+    def infer(self, kind: str, frames: np.ndarray, input_size: int | None = None, quantized: bool = False) -> dict:
+        """
+        Predict on uint8 [N, H, W, 3] frames, normally already at the model's input size
+
+        Returns:
+            dict: version of the checkpoint used, and [is_fake, confidence] per frame
+
+        Raises:
+            ModelNotLoaded: If this worker doesn't serve the model
+        """
+        registry = self.registries.get(kind)
+        if registry is None:
+            raise ModelNotLoaded(f"{kind} is not served by this worker")
+        options = {"quantized": quantized}
+        if input_size:
+            options["input_size"] = input_size
+
+        import torch
+        with warnings.catch_warnings():
+            # Read-only view of the request body; preprocessing never writes to it
+            warnings.simplefilter("ignore", UserWarning)
+            frames = torch.from_numpy(frames)
+
+        with self._lock:
+            self.in_flight += 1
+        succeeded = False
+        try:
+            with self._slots, registry.acquire() as (model, version):
+                if model is None:
+                    raise ModelNotLoaded(f"No {kind} checkpoint is loaded on this worker")
+                predictions = model.predict_frames(frames, **options)
+            succeeded = True
+        finally:
+            with self._lock:
+                self.in_flight -= 1
+                if succeeded:
+                    self.served += 1
+                else:
+                    self.failed += 1
+        return {"version": version, "predictions": [[bool(is_fake), float(confidence)] for is_fake, confidence in predictions]}
+
+    def close(self):
+        for registry in self.registries.values():
+            registry.stop()
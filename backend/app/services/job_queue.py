@@ -0,0 +1,333 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+import traceback
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+
+class JobQueue:
+    """
+    Durable FIFO job queue backed by a single SQLite file
+
+    Jobs move through: queued -> running -> done | failed.
+    A failed attempt is re-queued until max_retries is exhausted. A running
+    job holds a lease that its worker renews with heartbeat(); jobs whose
+    lease has expired were left behind by a crashed or restarted process
+    and are re-queued by requeue_running(). Jobs other live processes are
+    running keep their lease and are left alone.
+    """
+
+    def __init__(self, db_path: str, max_retries: int = 2, lease_seconds: float = 60):
+        """
+        Args:
+            db_path: Path of the SQLite database file (created if missing)
+            max_retries: Number of times a failed job is re-queued
+            lease_seconds: How long a running job stays claimed without a heartbeat
+        """
+        self.db_path = db_path
+        self.max_retries = max_retries
+        self.lease_seconds = lease_seconds
+
+        db_dir = os.path.dirname(os.path.abspath(db_path))
+        os.makedirs(db_dir, exist_ok=True)
+
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS jobs (
+                    id TEXT PRIMARY KEY,
+                    status TEXT NOT NULL,
+                    payload BLOB,
+                    params TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    result TEXT,
+                    error TEXT,
+                    created_at REAL NOT NULL,
+                    updated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs (status, created_at)")
+
+    @contextmanager
+    def _connect(self):
+        # One short-lived connection per operation keeps the queue safe to use
+        # from any worker thread; autocommit mode lets us issue BEGIN ourselves.
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def enqueue(self, payload: bytes, params: Optional[dict] = None) -> str:
+        """
+        Add a job to the queue
+
+        Args:
+            payload: Image bytes to run detection on
+            params: Optional JSON-serializable detection parameters
+
+        Returns:
+            The new job id
+        """
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO jobs (id, status, payload, params, created_at, updated_at) "
+                "VALUES (?, 'queued', ?, ?, ?, ?)",
+                (job_id, payload, json.dumps(params or {}), now, now),
+            )
+        return job_id
+
+    def claim(self) -> Optional[tuple[str, bytes, dict]]:
+        """
+        Atomically take the oldest queued job and mark it as running
+
+        Returns:
+            (job_id, payload, params) or None if the queue is empty
+        """
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT id, payload, params FROM jobs WHERE status = 'queued' "
+                "ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row is None:
+                conn.execute("COMMIT")
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'running', attempts = attempts + 1, updated_at = ? "
+                "WHERE id = ?",
+                (time.time(), row["id"]),
+            )
+            conn.execute("COMMIT")
+        return row["id"], row["payload"], json.loads(row["params"] or "{}")
+
+    def complete(self, job_id: str, result: dict):
+        """Store the result of a finished job and drop its payload"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET status = 'done', result = ?, error = NULL, payload = NULL, "
+                "updated_at = ? WHERE id = ?",
+                (json.dumps(result), time.time(), job_id),
+            )
+
+    def heartbeat(self, job_ids: list[str]):
+        """Renew the lease of jobs this process is still running"""
+        if not job_ids:
+            return
+        with self._connect() as conn:
+            conn.execute(
+                f"UPDATE jobs SET updated_at = ? WHERE status = 'running' "
+                f"AND id IN ({', '.join('?' * len(job_ids))})",
+                (time.time(), *job_ids),
+            )
+
+    def fail(self, job_id: str, error: str):
+        """Record a failed attempt, re-queueing the job if retries remain"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE jobs SET "
+                "status = CASE WHEN attempts <= ? THEN 'queued' ELSE 'failed' END, "
+                "payload = CASE WHEN attempts <= ? THEN payload ELSE NULL END, "
+                "error = ?, updated_at = ? WHERE id = ?",
+                (self.max_retries, self.max_retries, error, time.time(), job_id),
+            )
+
+    def get(self, job_id: str) -> Optional[dict]:
+        """Return the public view of a job, or None if it does not exist"""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT id, status, attempts, result, error, created_at, updated_at "
+                "FROM jobs WHERE id = ?",
+                (job_id,),
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "id": row["id"],
+            "status": row["status"],
+            "attempts": row["attempts"],
+            "result": json.loads(row["result"]) if row["result"] else None,
+            "error": row["error"],
+            "created_at": row["created_at"],
+            "updated_at": row["updated_at"],
+        }
+
+    def requeue_running(self) -> tuple[int, int]:
+        """
+        Re-queue running jobs whose lease has expired
+
+        Their worker stopped renewing the lease, so it was interrupted by a
+        crash or restart. The interrupted run already counted as an attempt
+        when it was claimed, so the retry limit of fail() applies: a job that
+        keeps taking the process down is failed instead of looping across
+        restarts.
+
+        Returns:
+            (jobs re-queued, jobs failed)
+        """
+        now = time.time()
+        expired = now - self.lease_seconds
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            failed = conn.execute(
+                "UPDATE jobs SET status = 'failed', payload = NULL, "
+                "error = 'Interrupted by a restart on its last attempt', updated_at = ? "
+                "WHERE status = 'running' AND updated_at < ? AND attempts > ?",
+                (now, expired, self.max_retries),
+            ).rowcount
+            requeued = conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'running' AND updated_at < ?",
+                (now, expired),
+            ).rowcount
+            conn.execute("COMMIT")
+        return requeued, failed
+
+    def purge_finished(self, retention_seconds: float) -> int:
+        """Delete done/failed jobs older than the retention window. Returns rows deleted."""
+        cutoff = time.time() - retention_seconds
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "DELETE FROM jobs WHERE status IN ('done', 'failed') AND updated_at < ?",
+                (cutoff,),
+            )
+            return cursor.rowcount
+
+    def counts(self) -> dict:
+        """Number of jobs per status"""
+        with self._connect() as conn:
+            rows = conn.execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row["status"]: row["n"] for row in rows}
+
+
+class JobWorkerPool:
+    """
+    Pool of background threads that drain a JobQueue
+
+    Each worker claims one job at a time and runs it through the handler.
+    Detection releases the GIL inside torch and blocks on network I/O for
+    GPT, so threads are enough to keep several jobs in flight. The jobs in
+    flight get their lease renewed every third of the lease, and expired
+    leases (of this or any other process) are re-queued on start and then
+    once a minute.
+    """
+
+    def __init__(
+        self,
+        queue: JobQueue,
+        handler: Callable[..., dict],
+        workers: int = 2,
+        result_retention_seconds: float = 86400,
+        poll_interval: float = 0.5,
+    ):
+        """
+        Args:
+            queue: Queue to pull jobs from
+            handler: Called as handler(payload, **params), returns the result dict
+            workers: Number of worker threads
+            result_retention_seconds: How long finished jobs are kept
+            poll_interval: Idle sleep between queue polls, in seconds
+        """
+        self.queue = queue
+        self.handler = handler
+        self.workers = workers
+        self.result_retention_seconds = result_retention_seconds
+        self.poll_interval = poll_interval
+
+        self._stop = threading.Event()
+        self._threads: list[threading.Thread] = []
+        self._last_purge = 0.0
+        self._purge_lock = threading.Lock()
+        self._running: set[str] = set()
+        self._running_lock = threading.Lock()
+
+    def start(self):
+        if self._threads:
+            return
+        self._requeue_expired()
+
+        self._stop.clear()
+        for i in range(self.workers):
+            thread = threading.Thread(target=self._run, name=f"job-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+        thread = threading.Thread(target=self._heartbeat, name="job-heartbeat", daemon=True)
+        thread.start()
+        self._threads.append(thread)
+        print(f"✓ Job worker pool started ({self.workers} workers)")
+
+    def _requeue_expired(self):
+        requeued, failed = self.queue.requeue_running()
+        if requeued:
+            print(f"[DEBUG] Re-queued {requeued} interrupted job(s)")
+        if failed:
+            print(f"⚠ Failed {failed} interrupted job(s) that were on their last attempt")
+
+    def _heartbeat(self):
+        while not self._stop.wait(self.queue.lease_seconds / 3):
+            with self._running_lock:
+                running = list(self._running)
+            try:
+                self.queue.heartbeat(running)
+            except sqlite3.Error as e:
+                print(f"[ERROR] Job heartbeat failed: {e}")
+
+    def stop(self, timeout: float = 10.0):
+        self._stop.set()
+        for thread in self._threads:
+            thread.join(timeout=timeout)
+        self._threads = []
+
+    def _maybe_purge(self):
+        now = time.time()
+        # Purging once a minute is plenty; only one worker does it at a time
+        if now - self._last_purge < 60 or not self._purge_lock.acquire(blocking=False):
+            return
+        try:
+            self._last_purge = now
+            purged = self.queue.purge_finished(self.result_retention_seconds)
+            if purged:
+                print(f"[DEBUG] Purged {purged} expired job(s)")
+            # Jobs of a process that died while this one keeps running
+            self._requeue_expired()
+        except sqlite3.Error as e:
+            print(f"[ERROR] Job queue error: {e}")
+        finally:
+            self._purge_lock.release()
+
+    def _run(self):
+        while not self._stop.is_set():
+            self._maybe_purge()
+
+            try:
+                job = self.queue.claim()
+            except sqlite3.Error as e:
+                print(f"[ERROR] Job queue error: {e}")
+                self._stop.wait(self.poll_interval)
+                continue
+
+            if job is None:
+                self._stop.wait(self.poll_interval)
+                continue
+
+            job_id, payload, params = job
+            with self._running_lock:
+                self._running.add(job_id)
+            try:
+                result = self.handler(payload, **params)
+                self.queue.complete(job_id, result)
+            except Exception as e:
+                print(f"[ERROR] Job {job_id} failed: {type(e).__name__}: {str(e)}")
+                traceback.print_exc()
+                self.queue.fail(job_id, f"{type(e).__name__}: {str(e)}")
+            finally:
+                with self._running_lock:
+                    self._running.discard(job_id)
@@ -0,0 +1,134 @@
+import ctypes
+import ctypes.util
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+_PAGE_SIZE = os.sysconf("SC_PAGE_SIZE") if hasattr(os, "sysconf") else 4096
+
+
+def rss_bytes() -> int:
+    """Current resident set size of this process"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * _PAGE_SIZE
+    except OSError:
+        # No procfs (macOS): peak RSS is the best available figure
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == "darwin" else peak * 1024
+
+
+_libc = None
+
+
+def trim_heap():
+    """Return freed malloc memory to the OS (glibc only; no-op elsewhere)"""
+    global _libc
+    if _libc is None:
+        try:
+            _libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6")
+            _libc.malloc_trim  # raises AttributeError on non-glibc libcs
+        except (OSError, AttributeError):
+            _libc = False
+    if _libc:
+        _libc.malloc_trim(0)
+
+
+class PixelBudget:
+    """
+    Caps the number of image pixels decoded at the same time
+
+    Every request takes its image's pixel count from the budget before
+    decoding and returns it when done; requests that don't fit wait. An
+    image larger than the whole budget still runs, but alone.
+    """
+
+    def __init__(self, max_pixels: int, trim_after_pixels: int = 0):
+        """
+        Args:
+            max_pixels: Budget in pixels (0 = unlimited)
+            trim_after_pixels: Call trim_heap() after releasing an image at
+                least this large (0 = never)
+        """
+        self.max_pixels = max_pixels
+        self.trim_after_pixels = trim_after_pixels
+        self._cond = threading.Condition()
+        self._in_use = 0
+        self.peak_in_use = 0
+        self.waits = 0
+
+    @contextmanager
+    def acquire(self, pixels: int):
+        cost = min(pixels, self.max_pixels) if self.max_pixels else pixels
+        with self._cond:
+            if self.max_pixels and self._in_use + cost > self.max_pixels:
+                self.waits += 1
+                while self._in_use + cost > self.max_pixels:
+                    self._cond.wait()
+            self._in_use += cost
+            self.peak_in_use = max(self.peak_in_use, self._in_use)
+        try:
+            yield
+        finally:
+            with self._cond:
+                self._in_use -= cost
+                self._cond.notify_all()
+            if self.trim_after_pixels and pixels >= self.trim_after_pixels:
+                trim_heap()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return {
+                "max_pixels": self.max_pixels,
+                "in_use": self._in_use,
+                "peak_in_use": self.peak_in_use,
+                "waits": self.waits,
+            }
+
+
+class StageMemory:
+    """
+    Per-stage RSS statistics
+
+    RSS is sampled when each stage starts and ends. For every stage this
+    keeps the highest RSS seen at its end and the largest growth during one
+    run of it.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stages = {}
+        self.started = time.time()
+        self.start_rss = rss_bytes()
+
+    @contextmanager
+    def stage(self, name: str):
+        before = rss_bytes()
+        try:
+            yield
+        finally:
+            after = rss_bytes()
+            with self._lock:
+                entry = self._stages.setdefault(name, {"calls": 0, "peak_rss": 0, "max_growth": 0})
+                entry["calls"] += 1
+                entry["peak_rss"] = max(entry["peak_rss"], after)
+                entry["max_growth"] = max(entry["max_growth"], after - before)
+
+    def stats(self) -> dict:
+        mb = 1024 * 1024
+        with self._lock:
+            return {
+                "rss_mb": round(rss_bytes() / mb, 1),
+                "start_rss_mb": round(self.start_rss / mb, 1),
+                "stages": {
+                    name: {
+                        "calls": entry["calls"],
+                        "peak_rss_mb": round(entry["peak_rss"] / mb, 1),
+                        "max_growth_mb": round(entry["max_growth"] / mb, 1),
+                    }
+                    for name, entry in self._stages.items()
+                },
+            }
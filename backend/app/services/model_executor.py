@@ -0,0 +1,424 @@
+from __future__ import annotations
+
+import importlib
+import os
+import queue
+import statistics
+import threading
+import time
+from math import prod
+from typing import TYPE_CHECKING
+
+from app.core.cpu_affinity import available_cores, parse_cores
+from app.models.preprocessing import fill_input_tensor, frames_to_input, load_resized
+
+# torch loads when the first executor starts (executor_plan() doesn't need it)
+if TYPE_CHECKING:
+    import torch
+
+# kind -> (module, class) of the in-process model each worker wraps
+MODEL_SPECS = {
+    "sbi": ("app.models.sbi_model", "SBIModel"),
+    "distildire": ("app.models.distildire_model", "DistilDIREModel"),
+}
+
+
+def _worker_main(kind, model_path, model_kwargs, cores, threads, shared_input, conn):
+    # Runs in the child process: pin, size the thread pool, load, then serve
+    # requests whose input is already in the shared-memory buffer.
+    import torch
+    if cores and hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(threads)
+    torch.set_num_interop_threads(1)
+
+    try:
+        module_name, class_name = MODEL_SPECS[kind]
+        model = getattr(importlib.import_module(module_name), class_name)(model_path, **model_kwargs)
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {str(e)}"))
+        return
+    conn.send(("ready", None))
+
+    while True:
+        try:
+            message = conn.recv()
+        except EOFError:
+            break
+        if message[0] == "stop":
+            break
+        _, shape, options = message
+        try:
+            x = shared_input[:prod(shape)].view(shape)
+            conn.send(("ok", model.predict_tensor(x, **options)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {str(e)}"))
+
+
+class _Replica:
+    """One worker process with its own shared-memory input buffer"""
+
+    def __init__(self, ctx, name: str, kind: str, model_path: str, model_kwargs: dict,
+                 cores: list[int], threads: int, max_input_numel: int, start_timeout: float,
+                 input_dtype: torch.dtype | None = None):
+        import torch
+        self.ctx = ctx
+        self.name = name
+        self.kind = kind
+        self.model_path = model_path
+        self.model_kwargs = model_kwargs
+        self.cores = cores
+        self.threads = threads
+        self.start_timeout = start_timeout
+        # Allocated once; each request copies its input here and only sends the shape
+        self.shared_input = torch.zeros(max_input_numel, dtype=input_dtype or torch.float32).share_memory_()
+        self.process = None
+        self.conn = None
+        self.start()
+
+    def start(self):
+        self.conn, child_conn = self.ctx.Pipe()
+        self.process = self.ctx.Process(
+            target=_worker_main,
+            args=(self.kind, self.model_path, self.model_kwargs, self.cores, self.threads, self.shared_input, child_conn),
+            name=self.name,
+            daemon=True,
+        )
+        self.process.start()
+        child_conn.close()
+
+        if not self.conn.poll(self.start_timeout):
+            self.stop()
+            raise TimeoutError(f"{self.name} did not start within {self.start_timeout}s")
+        status, detail = self.conn.recv()
+        if status != "ready":
+            self.stop()
+            raise RuntimeError(f"{self.name} failed to load: {detail}")
+
+    def input_view(self, shape: tuple[int, ...]) -> torch.Tensor:
+        """The shared buffer viewed as an input of this shape, to be filled in place"""
+        if prod(shape) > self.shared_input.numel():
+            raise ValueError(f"Input of {prod(shape)} elements exceeds the {self.shared_input.numel()} element buffer")
+        return self.shared_input[:prod(shape)].view(shape)
+
+    def run(self, tensor: torch.Tensor, **options) -> tuple[bool, float]:
+        self.input_view(tuple(tensor.shape)).copy_(tensor)
+        return self.run_shared(tuple(tensor.shape), **options)
+
+    def run_shared(self, shape: tuple[int, ...], **options) -> tuple[bool, float]:
+        """Predict on the input already written through input_view(shape)"""
+        self.conn.send(("predict", shape, options))
+        status, value = self.conn.recv()
+        if status == "error":
+            raise RuntimeError(value)
+        return value
+
+    def stop(self):
+        if self.process is None:
+            return
+        try:
+            self.conn.send(("stop",))
+        except (BrokenPipeError, OSError):
+            pass
+        self.process.join(timeout=5)
+        if self.process.is_alive():
+            self.process.kill()
+        self.process = None
+
+
+class PartitionedModel:
+    """
+    Runs SBIModel or DistilDIREModel in dedicated worker processes
+
+    Each replica is pinned to its own slice of the configured core set and
+    uses a fixed torch thread budget, so the two detectors stop competing
+    for one intra-op pool. Images are decoded and preprocessed in the calling
+    process, directly into the worker's shared-memory input buffer.
+    Exposes the same predict()/predict_tensor() interface as the in-process
+    models.
+    """
+
+    def __init__(self, kind: str, model_path: str, cores: list[int] | None = None,
+                 threads: int | None = None, replicas: int = 1, start_timeout: float = 300,
+                 checkpoint_name: str | None = None, quantized: bool = False, uint8_input: bool = False):
+        """
+        Args:
+            kind: "sbi" or "distildire"
+            model_path: Model directory, as for the in-process model
+            cores: Core ids for this model; split evenly across replicas.
+                None leaves the workers unpinned.
+            threads: torch threads per replica (default: cores per replica)
+            replicas: Number of worker processes
+            start_timeout: Seconds to wait for each worker to load its model
+            checkpoint_name: Weights file inside model_path (default: the model's own default)
+            quantized: Have each worker also build the model's quantized copy
+            uint8_input: Workers take uint8 pixels (see the models' uint8_input)
+        """
+        import torch
+        import torch.multiprocessing as mp
+
+        module = importlib.import_module(MODEL_SPECS[kind][0])
+        self.kind = kind
+        self.module = module
+        self.normalize = module.NORMALIZE or ()
+        self.input_dtype = torch.uint8 if uint8_input else torch.float32
+        model_kwargs = {"quantized": quantized, "uint8_input": uint8_input}
+        if checkpoint_name:
+            model_kwargs["checkpoint_name"] = checkpoint_name
+        # Inputs may be smaller than INPUT_SIZE (degraded tiers), never larger
+        input_numel = 3 * module.INPUT_SIZE * module.INPUT_SIZE
+
+        cores = cores or []
+        per_replica = max(1, len(cores) // replicas) if cores else 0
+        ctx = mp.get_context("spawn")
+
+        self._replicas = []
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        try:
+            for i in range(replicas):
+                replica_cores = cores[i * per_replica:(i + 1) * per_replica] if cores else []
+                # More replicas than cores: wrap around rather than leave one unpinned
+                if cores and not replica_cores:
+                    replica_cores = [cores[i % len(cores)]]
+                replica_threads = threads or max(1, len(replica_cores) or (os.cpu_count() or 1) // replicas)
+                replica = _Replica(ctx, f"{kind}-worker-{i}", kind, model_path, model_kwargs, replica_cores,
+                                   replica_threads, input_numel, start_timeout, self.input_dtype)
+                self._replicas.append(replica)
+                self._idle.put(replica)
+        except Exception:
+            self.close()
+            raise
+
+        layout = ", ".join(f"{r.cores or 'any'}x{r.threads}t" for r in self._replicas)
+        print(f"✓ {kind} executor started: {replicas} replica(s) [{layout}]")
+
+    @property
+    def replicas(self) -> int:
+        """Healthy replicas (restarts that fail drop theirs)"""
+        return len(self._replicas)
+
+    def preprocess(self, image_bytes: bytes, input_size: int | None = None) -> torch.Tensor:
+        import torch
+        input_size = input_size or self.module.INPUT_SIZE
+        img = load_resized(image_bytes, input_size)
+        return fill_input_tensor(img, torch.empty(1, 3, input_size, input_size, dtype=self.input_dtype), *self.normalize)
+
+    def _dispatch(self, run):
+        # run(replica) on the next idle replica
+        replica = self._idle.get()
+        if replica is None:
+            # Every replica is gone; pass the marker on to the next waiter
+            self._idle.put(None)
+            raise RuntimeError(f"No healthy {self.kind} replicas left")
+        healthy = True
+        try:
+            return run(replica)
+        except (EOFError, BrokenPipeError, ConnectionResetError):
+            # Worker died mid-request: bring a fresh one up for the next caller
+            print(f"⚠ {replica.name} crashed, restarting")
+            replica.stop()
+            try:
+                replica.start()
+            except Exception as e:
+                healthy = False
+                print(f"[ERROR] {replica.name} failed to restart, dropping it: {e}")
+            raise
+        finally:
+            if healthy:
+                self._idle.put(replica)
+            else:
+                self._drop(replica)
+
+    def _drop(self, replica: _Replica):
+        """Retire a replica that could not be restarted; callers fail fast once none are left"""
+        with self._lock:
+            if replica in self._replicas:
+                self._replicas.remove(replica)
+            if not self._replicas:
+                self._idle.put(None)
+
+    def predict_tensor(self, img_tensor: torch.Tensor, quantized: bool = False) -> tuple[bool, float]:
+        return self._dispatch(lambda replica: replica.run(img_tensor, quantized=quantized))
+
+    def predict(self, image_bytes: bytes, input_size: int | None = None, quantized: bool = False) -> tuple[bool, float]:
+        try:
+            input_size = input_size or self.module.INPUT_SIZE
+            shape = (1, 3, input_size, input_size)
+            img = load_resized(image_bytes, input_size)
+
+            def run(replica):
+                # Preprocess straight into the worker's shared buffer: no per-request input tensor
+                fill_input_tensor(img, replica.input_view(shape), *self.normalize)
+                return replica.run_shared(shape, quantized=quantized)
+
+            return self._dispatch(run)
+
+        except Exception as e:
+            print(f"Error in {self.kind} prediction: {e}")
+            # Return neutral prediction on error, like the in-process models
+            return False, 0.5
+
+    def predict_frames(self, frames: torch.Tensor, input_size: int | None = None,
+                       quantized: bool = False) -> list[tuple[bool, float]]:
+        # Frame by frame: the shared buffers hold a single input
+        input_size = input_size or self.module.INPUT_SIZE
+        return [
+            self.predict_tensor(frames_to_input(frames[i:i + 1], input_size, *self.normalize, dtype=self.input_dtype),
+                                quantized)
+            for i in range(len(frames))
+        ]
+
+    def close(self):
+        for replica in self._replicas:
+            replica.stop()
+        self._replicas = []
+
+
+def _benchmark(model: PartitionedModel, clients: int, requests: int) -> tuple[float, float]:
+    """Returns (throughput in req/s, p95 latency in ms) for concurrent dummy requests"""
+    import torch
+    module = importlib.import_module(MODEL_SPECS[model.kind][0])
+    shape = (1, 3, module.INPUT_SIZE, module.INPUT_SIZE)
+    dummy = torch.randint(0, 256, shape, dtype=torch.uint8) if model.input_dtype == torch.uint8 else torch.rand(shape)
+    model.predict_tensor(dummy)  # warm-up
+
+    latencies = []
+    lock = threading.Lock()
+    remaining = [requests]
+
+    def client():
+        while True:
+            with lock:
+                if remaining[0] == 0:
+                    return
+                remaining[0] -= 1
+            start = time.perf_counter()
+            model.predict_tensor(dummy)
+            with lock:
+                latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=client) for _ in range(clients)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+
+    p95 = statistics.quantiles(latencies, n=20, method="inclusive")[-1] if len(latencies) >= 2 else latencies[0]
+    return requests / elapsed, p95 * 1000
+
+
+def autotune(model_paths: dict[str, str], cores: list[int] | None = None,
+             replica_options: tuple[int, ...] = (1, 2, 4), requests: int = 12) -> dict[str, dict]:
+    """
+    Pick core sets, thread counts and replica counts per model for this host
+
+    1. Measure each model's single-thread latency to get its relative cost.
+    2. Split the cores between models in proportion to cost.
+    3. Within each model's share, try each replica count (threads = cores
+       per replica) under concurrent load and keep the best throughput.
+
+    Args:
+        model_paths: kind -> model directory for the models to place
+        cores: Cores to partition (default: all cores available to this process)
+        replica_options: Replica counts to try
+        requests: Requests per calibration run
+
+    Returns:
+        kind -> {"cores": [...], "threads": int, "replicas": int}
+    """
+    cores = cores or available_cores()
+    print(f"[DEBUG] Auto-tuning executors over cores {cores}...")
+
+    costs = {}
+    for kind, path in model_paths.items():
+        model = PartitionedModel(kind, path, cores=cores[:1], threads=1, replicas=1)
+        try:
+            _, costs[kind] = _benchmark(model, clients=1, requests=3)
+        finally:
+            model.close()
+
+    # Proportional split, at least one core each; with fewer cores than models they share
+    shares = {}
+    if len(cores) < len(model_paths):
+        shares = {kind: cores for kind in model_paths}
+    else:
+        total_cost = sum(costs.values())
+        start = 0
+        kinds = list(model_paths)
+        for i, kind in enumerate(kinds):
+            remaining_models = len(kinds) - i - 1
+            if remaining_models == 0:
+                count = len(cores) - start
+            else:
+                count = round(len(cores) * costs[kind] / total_cost)
+                count = min(max(1, count), len(cores) - start - remaining_models)
+            shares[kind] = cores[start:start + count]
+            start += count
+
+    plan = {}
+    for kind, path in model_paths.items():
+        best = None
+        for replicas in replica_options:
+            if replicas > len(shares[kind]):
+                continue
+            threads = max(1, len(shares[kind]) // replicas)
+            model = PartitionedModel(kind, path, cores=shares[kind], threads=threads, replicas=replicas)
+            try:
+                throughput, p95 = _benchmark(model, clients=replicas * 2, requests=requests)
+            finally:
+                model.close()
+            print(f"[DEBUG] {kind}: {replicas} replica(s) x {threads} thread(s) -> {throughput:.2f} req/s, p95 {p95:.0f}ms")
+            if best is None or throughput > best[0]:
+                best = (throughput, {"cores": shares[kind], "threads": threads, "replicas": replicas})
+        plan[kind] = best[1]
+
+    print(f"✓ Executor plan: {plan}")
+    return plan
+
+
+def executor_plan(settings, model_paths: dict[str, str], reserved: list[int] | None = None) -> dict[str, dict]:
+    """
+    Build the per-model executor layout from settings
+
+    Uses autotune() when EXECUTOR_AUTOTUNE is set. Otherwise it uses
+    <KIND>_CORES / <KIND>_THREADS / <KIND>_REPLICAS. Models whose core set
+    is not configured split the available cores that no configured model
+    (of any kind, loaded or not) and nothing in `reserved` claims.
+
+    Args:
+        settings: Application settings
+        model_paths: kind -> model directory for the models to place
+        reserved: Cores already given to running executors
+    """
+    if settings.EXECUTOR_AUTOTUNE:
+        return autotune(model_paths)
+
+    cores = available_cores()
+    taken = set(reserved or ())
+    for kind in MODEL_SPECS:
+        taken.update(parse_cores(getattr(settings, f"{kind.upper()}_CORES")))
+    free = [core for core in cores if core not in taken]
+    unconfigured = [kind for kind in model_paths if not getattr(settings, f"{kind.upper()}_CORES")]
+    if unconfigured and not free:
+        print(f"⚠ No cores left for {', '.join(unconfigured)} after the configured core sets, sharing all of them")
+        free = cores
+    per_model = max(1, len(free) // max(1, len(unconfigured)))
+
+    plan = {}
+    for kind in model_paths:
+        spec = getattr(settings, f"{kind.upper()}_CORES")
+        if spec:
+            kind_cores = parse_cores(spec)
+        else:
+            # Fewer free cores than unconfigured models: they share them
+            i = unconfigured.index(kind)
+            kind_cores = free[i * per_model:(i + 1) * per_model] or free
+        plan[kind] = {
+            "cores": kind_cores,
+            "threads": getattr(settings, f"{kind.upper()}_THREADS") or None,
+            "replicas": getattr(settings, f"{kind.upper()}_REPLICAS"),
+        }
+    return plan
@@ -0,0 +1,234 @@
+import glob
+import hashlib
+import io
+import os
+import threading
+from contextlib import contextmanager
+from typing import Callable
+
+from PIL import Image
+
+
+def checkpoint_version(path: str) -> str:
+    """
+    Version string for a checkpoint file: "<file name>@<first 12 hex of sha256>"
+
+    The content hash means a re-copied file with the same name still gets a
+    new version, and an untouched file keeps its version across restarts.
+    """
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return f"{os.path.basename(path)}@{digest.hexdigest()[:12]}"
+
+
+def latest_checkpoint(model_dir: str, checkpoint_name: str) -> tuple[str, tuple] | None:
+    """
+    Newest checkpoint in model_dir named like checkpoint_name
+
+    Matches the default name and versioned copies sharing its stem
+    (exp003_best_model.pth, exp003_best_model_v2.pth, ...).
+
+    Returns:
+        (path, (file name, size, mtime_ns)), or None if there is none
+    """
+    stem, ext = os.path.splitext(checkpoint_name)
+    newest = None
+    for path in glob.glob(os.path.join(glob.escape(model_dir), f"{glob.escape(stem)}*{ext}")):
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            continue  # removed between glob and stat
+        signature = (os.path.basename(path), stat.st_size, stat.st_mtime_ns)
+        if newest is None or signature[2] > newest[1][2]:
+            newest = (path, signature)
+    return newest
+
+
+def _warmup_image() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (256, 256), (128, 128, 128)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+class _Loaded:
+    """A loaded model plus the number of requests currently using it"""
+
+    def __init__(self, model, version: str, signature: tuple):
+        self.model = model
+        self.version = version
+        self.signature = signature
+        self.in_flight = 0
+        self.retired = False
+
+
+class ModelRegistry:
+    """
+    Serves the newest checkpoint in a model directory and hot-swaps new ones
+
+    Checkpoints are the default file (e.g. exp003_best_model.pth) or any
+    versioned copy next to it (exp003_best_model_v2.pth, ...); the most
+    recently modified one wins. A background thread polls the directory,
+    loads a changed checkpoint, runs a warm-up prediction and only then swaps
+    it in. Requests that already hold the old model finish on it; the old
+    model is closed once the last of them releases it. A checkpoint that fails
+    to load or warm up is skipped until the file changes again, and the
+    previous model keeps serving.
+    """
+
+    def __init__(self, kind: str, model_dir: str, checkpoint_name: str,
+                 loader: Callable[[str, str], object], poll_interval: float = 0):
+        """
+        Args:
+            kind: Model name used in log messages ("sbi", "distildire")
+            model_dir: Directory watched for checkpoints
+            checkpoint_name: Default checkpoint file; versioned copies share its stem
+            loader: Called as loader(model_dir, checkpoint file name) to build a model
+            poll_interval: Seconds between directory scans; 0 disables hot reload
+        """
+        self.kind = kind
+        self.model_dir = model_dir
+        self.checkpoint_name = checkpoint_name
+        self.loader = loader
+        self.poll_interval = poll_interval
+
+        self._lock = threading.Lock()
+        self._current: _Loaded | None = None
+        self._failed_signature = None
+        self._pending_signature = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def available(self) -> bool:
+        return self._current is not None
+
+    @property
+    def version(self) -> str | None:
+        current = self._current
+        return current.version if current else None
+
+    @property
+    def model(self):
+        """Current model for inspection only (e.g. profiling hooks); run it through acquire()"""
+        current = self._current
+        return current.model if current else None
+
+    def _latest_checkpoint(self) -> tuple[str, tuple] | None:
+        return latest_checkpoint(self.model_dir, self.checkpoint_name)
+
+    def load(self) -> bool:
+        """
+        Load the newest checkpoint now if it differs from the one being served
+
+        Returns:
+            True if a new model was swapped in
+        """
+        latest = self._latest_checkpoint()
+        if latest is None:
+            return False
+        path, signature = latest
+        current = self._current
+        if (current is not None and current.signature == signature) or signature == self._failed_signature:
+            return False
+
+        try:
+            version = checkpoint_version(path)
+            if current is not None and current.version == version:
+                # Same bytes (e.g. touched or re-copied): nothing to reload
+                current.signature = signature
+                return False
+            print(f"[DEBUG] Loading {self.kind} checkpoint {version}...")
+            model = self.loader(self.model_dir, os.path.basename(path))
+        except Exception as e:
+            print(f"⚠ Failed to load {self.kind} checkpoint {os.path.basename(path)}: {e}")
+            self._failed_signature = signature
+            return False
+
+        try:
+            # Warm-up pass: fails here instead of on the first request, and
+            # pays one-off allocation/compilation costs before taking traffic
+            model.predict_tensor(model.preprocess(_warmup_image()))
+        except Exception as e:
+            print(f"⚠ {self.kind} checkpoint {version} failed warm-up, keeping current model: {e}")
+            self._failed_signature = signature
+            self._close(model)
+            return False
+
+        with self._lock:
+            previous = self._current
+            self._current = _Loaded(model, version, signature)
+            if previous is not None:
+                previous.retired = True
+                idle = previous.in_flight == 0
+        if previous is not None and idle:
+            self._close(previous.model)
+
+        print(f"✓ {self.kind} serving checkpoint {version}")
+        return True
+
+    @contextmanager
+    def acquire(self):
+        """
+        Pin the current model for the duration of one request
+
+        Yields:
+            (model, version), or (None, None) when no checkpoint is loaded
+        """
+        with self._lock:
+            loaded = self._current
+            if loaded is not None:
+                loaded.in_flight += 1
+        if loaded is None:
+            yield None, None
+            return
+        try:
+            yield loaded.model, loaded.version
+        finally:
+            with self._lock:
+                loaded.in_flight -= 1
+                close = loaded.retired and loaded.in_flight == 0
+            if close:
+                self._close(loaded.model)
+
+    def _watch(self):
+        while not self._stop.wait(self.poll_interval):
+            latest = self._latest_checkpoint()
+            signature = latest[1] if latest else None
+            # Only load once the file has stopped changing between two scans,
+            # so a checkpoint that is still being copied isn't picked up
+            if signature != self._pending_signature:
+                self._pending_signature = signature
+                continue
+            try:
+                self.load()
+            except Exception as e:
+                print(f"[ERROR] {self.kind} reload failed: {e}")
+
+    def start(self):
+        """Start the background watcher (no-op when poll_interval is 0)"""
+        if self.poll_interval <= 0 or self._thread is not None:
+            return
+        self._stop.clear()
+        latest = self._latest_checkpoint()
+        self._pending_signature = latest[1] if latest else None
+        self._thread = threading.Thread(target=self._watch, name=f"{self.kind}-reload", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """Stop the watcher and close the served model"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        with self._lock:
+            current, self._current = self._current, None
+        if current is not None:
+            self._close(current.model)
+
+    @staticmethod
+    def _close(model):
+        # Partitioned models own worker processes; in-process ones are just dropped
+        if hasattr(model, "close"):
+            model.close()
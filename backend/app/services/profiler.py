@@ -0,0 +1,353 @@
+"""
+On-demand profiling of the running backend
+
+Nothing in this module runs until a session is started: no sampler thread,
+no wrapped model forwards, no tracemalloc. The only cost while idle is the
+`profiler.active` check per detection. A session collects, until it has
+seen N detections or T seconds have passed:
+
+- a sampling profile of every Python thread's stack (sys._current_frames)
+- torch.profiler operator statistics and Chrome traces of the model
+  forward passes (in-process models only; partitioned workers are other
+  processes)
+- allocation statistics from tracemalloc and the profiler's per-op memory
+
+and packs them into a zip that stays downloadable for the last few sessions.
+"""
+from __future__ import annotations
+
+import io
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+import uuid
+import zipfile
+from collections import Counter, OrderedDict
+from typing import TYPE_CHECKING, Callable
+
+from app.services.memory_budget import rss_bytes
+
+if TYPE_CHECKING:
+    import torch  # imported when a session wraps a model
+
+MB = 1024 * 1024
+PROFILED_FORWARDS = 20  # forwards per model recorded by torch.profiler per session
+TRACE_CALLS = 3  # of those, exported as Chrome traces
+KEEP_SESSIONS = 5
+TRACEMALLOC_FRAMES = 10
+
+
+class ProfilerBusy(Exception):
+    """A session is already running (or the requested one hasn't finished)"""
+
+
+_torch_profiler_ready = False
+
+
+def _warm_up_torch_profiler():
+    # The first torch.profiler session in a process spends over a second
+    # initializing, far longer with tracemalloc on; pay that before tracing
+    # starts instead of inside the first profiled request
+    global _torch_profiler_ready
+    if _torch_profiler_ready:
+        return
+    import torch
+    with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU]):
+        pass
+    _torch_profiler_ready = True
+
+
+def _frame_label(code) -> str:
+    # Function plus its first line, so every sample of a function collapses to one node
+    path = code.co_filename.replace(os.sep, "/").split("/")
+    return f"{code.co_name} ({'/'.join(path[-2:])}:{code.co_firstlineno})"
+
+
+class _Session:
+    """State of one profiling session; built and torn down by Profiler"""
+
+    def __init__(self, max_requests: int | None, seconds: float, interval: float):
+        self.id = uuid.uuid4().hex[:12]
+        self.max_requests = max_requests
+        self.seconds = seconds
+        self.interval = interval
+        self.started_at = time.time()
+        self.start = time.perf_counter()
+        self.duration = None
+        self.start_rss = rss_bytes()
+        # requests and the forward counters are bumped from request threads
+        self.counts_lock = threading.Lock()
+        self.requests = 0
+        self.samples = 0
+        self.stacks = Counter()
+        self.ops = {}  # model -> op name -> [calls, self cpu us, cpu us, self cpu memory bytes]
+        self.forwards = Counter()
+        self.forward_ms = Counter()
+        self.unprofiled_forwards = 0
+        self.profiles = []  # (model, torch profiler), summarized when the session ends
+        self.traces = []  # (file name, Chrome trace bytes)
+        self.wrapped = []  # modules whose forward is replaced for the session
+        self.started_tracemalloc = False
+        self.stop = threading.Event()
+        self.thread = None
+        self.artifact = None
+
+    def summary(self) -> dict:
+        elapsed = self.duration if self.duration is not None else time.perf_counter() - self.start
+        return {
+            "id": self.id,
+            "started_at": self.started_at,
+            "elapsed_s": round(elapsed, 2),
+            "finished": self.artifact is not None,
+            "max_requests": self.max_requests,
+            "max_seconds": self.seconds,
+            "requests": self.requests,
+            "samples": self.samples,
+            "forwards": dict(self.forwards),
+            "forward_ms": {name: round(ms, 1) for name, ms in self.forward_ms.items()},
+            "unprofiled_forwards": self.unprofiled_forwards,
+        }
+
+
+class Profiler:
+    """
+    One profiling session at a time over the detection pipeline
+
+    Args:
+        modules: Returns the torch modules to trace by name, looked up when
+            a session starts
+        sample_interval: Seconds between stack samples
+    """
+
+    def __init__(self, modules: Callable[[], dict[str, torch.nn.Module]], sample_interval: float = 0.01):
+        self.modules = modules
+        self.sample_interval = sample_interval
+        self.active = False
+        self._session: _Session | None = None
+        self._finished: OrderedDict[str, _Session] = OrderedDict()
+        self._lock = threading.Lock()
+        # torch.profiler is process-wide: profile one forward at a time
+        self._torch_lock = threading.Lock()
+
+    def start(self, max_requests: int | None = None, seconds: float = 30) -> dict:
+        """
+        Start a session that ends after max_requests detections or seconds, whichever is first
+
+        Raises:
+            ProfilerBusy: If a session is already running
+        """
+        with self._lock:
+            if self._session is not None:
+                raise ProfilerBusy(f"Profiling session {self._session.id} is still running")
+            session = _Session(max_requests, seconds, self.sample_interval)
+            modules = self.modules()
+            if modules:
+                _warm_up_torch_profiler()
+            if not tracemalloc.is_tracing():
+                tracemalloc.start(TRACEMALLOC_FRAMES)
+                session.started_tracemalloc = True
+            for name, module in modules.items():
+                self._wrap(session, name, module)
+            session.thread = threading.Thread(target=self._run, args=(session,), name="profiler", daemon=True)
+            self._session = session
+            self.active = True
+            session.thread.start()
+        print(f"[DEBUG] Profiling session {session.id} started "
+              f"(requests={max_requests}, seconds={seconds}, models={[name for name, _ in session.wrapped]})")
+        return session.summary()
+
+    def request_done(self):
+        """Count a finished detection; ends a request-bounded session once it reaches its count"""
+        session = self._session
+        if session is None:
+            return
+        with session.counts_lock:
+            session.requests += 1
+            done = bool(session.max_requests) and session.requests >= session.max_requests
+        if done:
+            session.stop.set()
+
+    def stop(self) -> dict | None:
+        """End the running session now and wait for its artifact; None if none is running"""
+        session = self._session
+        if session is None:
+            return None
+        session.stop.set()
+        session.thread.join()
+        return session.summary()
+
+    def status(self) -> dict:
+        session = self._session
+        return {
+            "active": session.summary() if session else None,
+            "sessions": [s.summary() for s in reversed(self._finished.values())],
+        }
+
+    def artifact(self, session_id: str) -> bytes | None:
+        """
+        Zip of a finished session, or None if the id is unknown (or expired)
+
+        Raises:
+            ProfilerBusy: If that session is still running
+        """
+        session = self._session
+        if session is not None and session.id == session_id:
+            raise ProfilerBusy(f"Profiling session {session_id} is still running")
+        finished = self._finished.get(session_id)
+        return finished.artifact if finished else None
+
+    def _run(self, session: _Session):
+        deadline = session.start + session.seconds
+        me = threading.get_ident()
+        while not session.stop.wait(session.interval):
+            self._sample(session, me)
+            if time.perf_counter() >= deadline:
+                break
+        session.duration = time.perf_counter() - session.start
+        self.active = False
+        self._unwrap(session)
+        allocations = self._allocations(session)
+        for name, prof in session.profiles:
+            self._record(session, name, prof)
+        session.profiles = []
+        session.artifact = self._package(session, allocations)
+        with self._lock:
+            self._session = None
+            self._finished[session.id] = session
+            while len(self._finished) > KEEP_SESSIONS:
+                self._finished.popitem(last=False)
+        print(f"✓ Profiling session {session.id} finished: {session.requests} requests, "
+              f"{session.samples} samples, {len(session.artifact) / MB:.1f}MB artifact")
+
+    @staticmethod
+    def _sample(session: _Session, me: int):
+        names = {t.ident: t.name for t in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            stack = []
+            while frame is not None:
+                stack.append(_frame_label(frame.f_code))
+                frame = frame.f_back
+            stack.append(names.get(ident, f"thread-{ident}"))
+            session.stacks[";".join(reversed(stack))] += 1
+        session.samples += 1
+
+    def _wrap(self, session: _Session, name: str, module: torch.nn.Module):
+        # An instance attribute shadows the class forward until the session ends
+        import torch
+        forward = module.forward
+
+        def profiled_forward(*args, **kwargs):
+            start = time.perf_counter()
+            if (session.stop.is_set() or session.forwards[name] >= PROFILED_FORWARDS
+                    or not self._torch_lock.acquire(blocking=False)):
+                with session.counts_lock:
+                    session.unprofiled_forwards += 1
+                output = forward(*args, **kwargs)
+            else:
+                try:
+                    with torch.profiler.profile(activities=[torch.profiler.ProfilerActivity.CPU],
+                                                record_shapes=True, profile_memory=True) as prof:
+                        output = forward(*args, **kwargs)
+                finally:
+                    self._torch_lock.release()
+                with session.counts_lock:
+                    session.forwards[name] += 1
+                    # key_averages() is slow while tracemalloc runs: summarize after the session
+                    session.profiles.append((name, prof))
+            with session.counts_lock:
+                session.forward_ms[name] += (time.perf_counter() - start) * 1000
+            return output
+
+        module.forward = profiled_forward
+        session.wrapped.append((name, module))
+
+    @staticmethod
+    def _unwrap(session: _Session):
+        for _, module in session.wrapped:
+            module.__dict__.pop("forward", None)
+
+    @staticmethod
+    def _record(session: _Session, name: str, prof):
+        ops = session.ops.setdefault(name, {})
+        traced = sum(1 for trace_name, _ in session.traces if trace_name.startswith(f"torch_trace_{name}_"))
+        for event in prof.key_averages():
+            stats = ops.setdefault(event.key, [0, 0.0, 0.0, 0])
+            stats[0] += event.count
+            stats[1] += event.self_cpu_time_total
+            stats[2] += event.cpu_time_total
+            stats[3] += event.self_cpu_memory_usage
+        if traced < TRACE_CALLS:
+            fd, path = tempfile.mkstemp(suffix=".json")
+            os.close(fd)
+            try:
+                prof.export_chrome_trace(path)
+                with open(path, "rb") as f:
+                    session.traces.append((f"torch_trace_{name}_{traced + 1}.json", f.read()))
+            finally:
+                os.remove(path)
+
+    @staticmethod
+    def _allocations(session: _Session) -> str:
+        if not tracemalloc.is_tracing():
+            return "tracemalloc was stopped by someone else during the session\n"
+        current, peak = tracemalloc.get_traced_memory()
+        snapshot = tracemalloc.take_snapshot().filter_traces([
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, __file__),  # the sampler's own stack counts
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ])
+        if session.started_tracemalloc:
+            tracemalloc.stop()
+        lines = [
+            f"Python allocations traced since the session started: {current / MB:.1f}MB still live, "
+            f"peak {peak / MB:.1f}MB",
+            f"RSS: {session.start_rss / MB:.1f}MB at start, {rss_bytes() / MB:.1f}MB at end",
+            "",
+            "Top 30 live allocation sites:",
+        ]
+        lines += [f"  {stat}" for stat in snapshot.statistics("lineno")[:30]]
+        lines += ["", "Top 5 allocation tracebacks:"]
+        for stat in snapshot.statistics("traceback")[:5]:
+            lines.append(f"  {stat.count} blocks, {stat.size / 1024:.1f}KiB")
+            lines += [f"    {line}" for line in stat.traceback.format()]
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def _package(session: _Session, allocations: str) -> bytes:
+        self_samples, total_samples = Counter(), Counter()
+        for stack, count in session.stacks.items():
+            frames = stack.split(";")
+            self_samples[frames[-1]] += count
+            for frame in set(frames[1:]):
+                total_samples[frame] += count
+        top = [f"{session.samples} samples every {session.interval * 1000:.0f}ms across all threads "
+               f"(waiting threads included)", "", "Self samples:"]
+        top += [f"  {count:>7}  {frame}" for frame, count in self_samples.most_common(40)]
+        top += ["", "Inclusive samples:"]
+        top += [f"  {count:>7}  {frame}" for frame, count in total_samples.most_common(40)]
+
+        ops = []
+        for name, stats in session.ops.items():
+            ops += [f"{name}: {session.forwards[name]} forwards profiled ({session.forward_ms[name]:.1f}ms in all forwards)", "",
+                    f"  {'op':<48} {'calls':>7} {'self cpu ms':>12} {'cpu ms':>10} {'self mem MB':>12}"]
+            for op, (calls, self_us, cpu_us, mem) in sorted(stats.items(), key=lambda kv: -kv[1][1])[:40]:
+                ops.append(f"  {op[:48]:<48} {calls:>7} {self_us / 1000:>12.2f} {cpu_us / 1000:>10.2f} {mem / MB:>12.2f}")
+            ops.append("")
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as archive:
+            archive.writestr("summary.json", json.dumps(session.summary(), indent=2))
+            # Collapsed stacks: flamegraph.pl, speedscope and inferno read this directly
+            archive.writestr("cpu_stacks.txt", "".join(f"{s} {c}\n" for s, c in session.stacks.most_common()))
+            archive.writestr("cpu_top.txt", "\n".join(top) + "\n")
+            archive.writestr("torch_ops.txt", "\n".join(ops) or "No model forward passes ran in-process during the session\n")
+            for name, trace in session.traces:
+                archive.writestr(name, trace)
+            archive.writestr("allocations.txt", allocations)
+        return buffer.getvalue()
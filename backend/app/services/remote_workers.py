@@ -0,0 +1,377 @@
+"""
+API side of remote inference (EXECUTOR_MODE=remote)
+
+SBI/DistilDIRE run on a pool of inference workers (app.worker, started with
+python -m app.cli.inference_worker). The API process keeps everything else,
+decodes and resizes images itself, and sends each call as uint8 frames in
+the RGB8 raw format (app.core.tensor_codec):
+
+    POST {worker}/api/v1/worker/infer/{kind}?input_size=&quantized=
+    X-Worker-Token: <WORKER_API_TOKEN>
+    body: RGB8 header + N x size x size x 3 pixels
+    -> {"version": ..., "predictions": [[is_fake, confidence], ...]}
+
+Workers are health-checked in the background (GET /api/v1/worker/health).
+Each call goes to the healthy worker with the fewest calls in flight from
+this process relative to its concurrency. A worker that fails a call is
+taken out until its next good health check, and the call is retried on
+another worker.
+"""
+from __future__ import annotations
+
+import http.client
+import importlib
+import json
+import threading
+from collections import Counter
+from contextlib import contextmanager
+from typing import TYPE_CHECKING, Callable
+from urllib.parse import urlencode, urlsplit
+
+from app.core.tensor_codec import encode_frames
+from app.models.preprocessing import frames_to_input, load_resized_pixels
+from app.services.model_executor import MODEL_SPECS
+
+if TYPE_CHECKING:
+    import numpy as np
+    import torch
+
+HEALTH_TIMEOUT = 2  # seconds; a worker that can't answer this fast is out
+API_PREFIX = "/api/v1/worker"
+
+
+class NoWorkerAvailable(RuntimeError):
+    """No healthy worker serves the model, or every one tried failed"""
+
+
+def parse_workers(spec: str) -> list[str]:
+    """Comma-separated base URLs such as "http://10.0.0.5:8100,http://10.0.0.6:8100" """
+    urls = []
+    for part in spec.split(","):
+        part = part.strip().rstrip("/")
+        if not part:
+            continue
+        if "://" not in part:
+            part = f"http://{part}"
+        if urlsplit(part).scheme not in ("http", "https"):
+            raise ValueError(f"Unsupported worker URL: {part}")
+        urls.append(part)
+    return urls
+
+
+class _Worker:
+    """One remote worker: last health report, load from this process, keep-alive connections"""
+
+    def __init__(self, url: str):
+        self.url = url
+        parts = urlsplit(url)
+        self._connection_class = http.client.HTTPSConnection if parts.scheme == "https" else http.client.HTTPConnection
+        self._netloc = parts.netloc
+        self._idle = []
+        self._lock = threading.Lock()
+        self.healthy = False
+        self.models = {}  # kind -> checkpoint version, from the last good health check
+        self.concurrency = 1
+        self.in_flight = 0
+        self.served = 0
+        self.failures = 0
+        self.last_error = None
+
+    def request(self, method: str, path: str, timeout: float, body: bytes | None = None,
+                headers: dict | None = None) -> tuple[int, bytes]:
+        """
+        One HTTP exchange on a pooled keep-alive connection
+
+        Raises:
+            OSError, http.client.HTTPException: If the worker can't be reached
+        """
+        with self._lock:
+            conn = self._idle.pop() if self._idle else None
+        reused = conn is not None
+        while True:
+            if conn is None:
+                conn = self._connection_class(self._netloc, timeout=timeout)
+            elif conn.sock is not None:
+                conn.sock.settimeout(timeout)
+            try:
+                conn.request(method, path, body=body, headers=headers or {})
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.RemoteDisconnected, BrokenPipeError, ConnectionResetError):
+                conn.close()
+                if not reused:
+                    raise
+                # The worker closed an idle connection: once more on a fresh one
+                conn, reused = None, False
+                continue
+            except Exception:
+                conn.close()
+                raise
+            break
+        if response.will_close:
+            conn.close()
+        else:
+            with self._lock:
+                self._idle.append(conn)
+        return response.status, data
+
+    def close(self):
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            conn.close()
+
+    def stats(self) -> dict:
+        return {
+            "url": self.url,
+            "healthy": self.healthy,
+            "models": dict(self.models),
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "served": self.served,
+            "failures": self.failures,
+            "last_error": self.last_error,
+        }
+
+
+class WorkerPool:
+    """
+    Health-checked set of inference workers with least-loaded routing
+
+    Args:
+        urls: Worker base URLs
+        token: WORKER_API_TOKEN shared with the workers
+        health_interval: Seconds between health checks of each worker
+        timeout: Seconds per inference call
+        retries: Other workers tried after a call fails
+        on_change: Called (without arguments) when membership or capacity changes
+    """
+
+    def __init__(self, urls: list[str], token: str = "", health_interval: float = 5, timeout: float = 30,
+                 retries: int = 2, on_change: Callable[[], None] | None = None):
+        if not urls:
+            raise ValueError("No remote workers configured (REMOTE_WORKERS)")
+        self.workers = [_Worker(url) for url in urls]
+        self.token = token
+        self.health_interval = health_interval
+        self.timeout = timeout
+        self.retries = retries
+        self.on_change = on_change
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _headers(self) -> dict:
+        return {"X-Worker-Token": self.token} if self.token else {}
+
+    def start(self):
+        """Check every worker once, then keep checking in the background"""
+        self.check_all()
+        up = sum(worker.healthy for worker in self.workers)
+        print(f"✓ Remote worker pool: {up}/{len(self.workers)} workers healthy")
+        self._thread = threading.Thread(target=self._watch, name="remote-workers", daemon=True)
+        self._thread.start()
+
+    def _watch(self):
+        while not self._stop.wait(self.health_interval):
+            try:
+                self.check_all()
+            except Exception as e:
+                print(f"[ERROR] Remote worker health check failed: {e}")
+
+    def check_all(self):
+        changed = False
+        for worker in self.workers:
+            changed |= self._check(worker)
+        if changed and self.on_change:
+            self.on_change()
+
+    def _check(self, worker: _Worker) -> bool:
+        # Returns True if the worker's membership or capacity changed
+        before = (worker.healthy, dict(worker.models), worker.concurrency)
+        try:
+            status, data = worker.request("GET", f"{API_PREFIX}/health", HEALTH_TIMEOUT, headers=self._headers())
+            if status != 200:
+                raise RuntimeError(f"health check answered {status}: {data[:200].decode(errors='replace')}")
+            report = json.loads(data)
+            with self._lock:
+                worker.models = report.get("models", {})
+                worker.concurrency = max(1, int(report.get("concurrency", 1)))
+                worker.healthy = True
+        except Exception as e:
+            with self._lock:
+                worker.healthy = False
+                worker.last_error = f"{type(e).__name__}: {e}"
+        after = (worker.healthy, worker.models, worker.concurrency)
+        if after != before:
+            state = f"up, serving {worker.models}" if worker.healthy else f"down ({worker.last_error})"
+            print(f"[DEBUG] Remote worker {worker.url} {state}")
+            return True
+        return False
+
+    def serves(self, kind: str) -> bool:
+        """Whether any worker has reported the model, healthy right now or not"""
+        return any(kind in worker.models for worker in self.workers)
+
+    def capacity(self, kind: str) -> int:
+        """Calls the healthy workers serving kind can run at once"""
+        return sum(w.concurrency for w in self.workers if w.healthy and kind in w.models)
+
+    def version(self, kind: str) -> str | None:
+        """Checkpoint version most healthy workers serve (they can differ mid-rollout)"""
+        versions = Counter(w.models[kind] for w in self.workers if w.healthy and kind in w.models)
+        return versions.most_common(1)[0][0] if versions else None
+
+    def _pick(self, kind: str, tried: set) -> _Worker | None:
+        with self._lock:
+            candidates = [w for w in self.workers if w.healthy and kind in w.models and w not in tried]
+            if not candidates:
+                return None
+            # Least loaded relative to its concurrency; served spreads ties evenly
+            worker = min(candidates, key=lambda w: (w.in_flight / w.concurrency, w.served))
+            worker.in_flight += 1
+            return worker
+
+    def _failed(self, worker: _Worker, error: str):
+        with self._lock:
+            worker.healthy = False
+            worker.failures += 1
+            worker.last_error = error
+        print(f"⚠ Remote worker {worker.url} failed, routing around it until it passes a health check: {error}")
+        if self.on_change:
+            self.on_change()
+
+    def infer(self, kind: str, frames: np.ndarray, **options) -> tuple[list[tuple[bool, float]], str | None]:
+        """
+        Run frames on the least-loaded worker, retrying on others if it fails
+
+        Args:
+            kind: "sbi" or "distildire"
+            frames: uint8 [N, H, W, 3] RGB, already at the model input size
+            options: input_size / quantized, passed to the worker
+
+        Returns:
+            ((is_fake, confidence) per frame, checkpoint version that produced them)
+
+        Raises:
+            NoWorkerAvailable: If no healthy worker is left to try
+            ValueError: If a worker rejects the request itself (400/413); not retried
+        """
+        body = encode_frames(frames)
+        query = {key: str(value).lower() if isinstance(value, bool) else value for key, value in options.items() if value}
+        path = f"{API_PREFIX}/infer/{kind}" + (f"?{urlencode(query)}" if query else "")
+        headers = {**self._headers(), "Content-Type": "application/octet-stream"}
+
+        tried = set()
+        errors = []
+        for _ in range(self.retries + 1):
+            worker = self._pick(kind, tried)
+            if worker is None:
+                break
+            tried.add(worker)
+            try:
+                status, data = worker.request("POST", path, self.timeout, body=body, headers=headers)
+            except Exception as e:
+                status, data = None, f"{type(e).__name__}: {e}".encode()
+            finally:
+                with self._lock:
+                    worker.in_flight -= 1
+            if status == 200:
+                result = json.loads(data)
+                with self._lock:
+                    worker.served += 1
+                return [(bool(is_fake), float(confidence)) for is_fake, confidence in result["predictions"]], result["version"]
+            detail = data[:200].decode(errors="replace")
+            if status in (400, 413):
+                raise ValueError(f"Worker {worker.url} rejected the request ({status}): {detail}")
+            errors.append(f"{worker.url}: {status or 'unreachable'} {detail}")
+            self._failed(worker, f"{status or 'unreachable'} {detail}")
+        raise NoWorkerAvailable(f"No healthy {kind} worker could serve the request" + (f" ({'; '.join(errors)})" if errors else ""))
+
+    def stats(self) -> dict:
+        return {"workers": [worker.stats() for worker in self.workers]}
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+            self._thread = None
+        for worker in self.workers:
+            worker.close()
+
+
+class RemoteModel:
+    """
+    SBIModel/DistilDIREModel interface backed by a WorkerPool
+
+    Images are decoded and resized here, so only input-sized frames go over
+    the network. Unlike the in-process models, failures raise (and are
+    reported as "error") instead of returning a neutral prediction, and each
+    prediction carries a third element: the checkpoint version of the worker
+    that answered, which can differ between workers mid-rollout.
+    """
+
+    def __init__(self, kind: str, pool: WorkerPool):
+        self.kind = kind
+        self.pool = pool
+        self.input_size = importlib.import_module(MODEL_SPECS[kind][0]).INPUT_SIZE
+
+    def predict_frames(self, frames: torch.Tensor, input_size: int | None = None,
+                       quantized: bool = False) -> list[tuple[bool, float, str | None]]:
+        import torch
+        size = input_size or self.input_size
+        pixels = frames_to_input(frames, size, dtype=torch.uint8).permute(0, 2, 3, 1).contiguous().numpy()
+        predictions, version = self.pool.infer(self.kind, pixels, input_size=input_size, quantized=quantized)
+        return [(is_fake, confidence, version) for is_fake, confidence in predictions]
+
+    def predict(self, image_bytes: bytes, input_size: int | None = None,
+                quantized: bool = False) -> tuple[bool, float, str | None]:
+        size = input_size or self.input_size
+        pixels = load_resized_pixels(image_bytes, [size])[size][None]
+        predictions, version = self.pool.infer(self.kind, pixels, input_size=input_size, quantized=quantized)
+        is_fake, confidence = predictions[0]
+        return is_fake, confidence, version
+
+
+class RemoteRegistry:
+    """
+    Stands in for ModelRegistry when the model runs on remote workers
+
+    Checkpoints and hot reload live on the workers. acquire() yields the
+    version most healthy workers serve; results report the version of the
+    worker that actually answered, which RemoteModel returns with each
+    prediction.
+    """
+
+    def __init__(self, kind: str, pool: WorkerPool):
+        self.kind = kind
+        self.pool = pool
+        self._model = RemoteModel(kind, pool)
+
+    @property
+    def available(self) -> bool:
+        return self.pool.serves(self.kind)
+
+    @property
+    def version(self) -> str | None:
+        return self.pool.version(self.kind)
+
+    @property
+    def model(self):
+        return None  # nothing runs in this process
+
+    def load(self) -> bool:
+        return False
+
+    @contextmanager
+    def acquire(self):
+        if not self.available:
+            yield None, None
+            return
+        yield self._model, self.version
+
+    def start(self):
+        pass
+
+    def stop(self):
+        pass
@@ -0,0 +1,158 @@
+"""
+Sampled recording of /detect traffic for replay (python -m app.cli.replay)
+
+An archive is a directory:
+
+    requests.jsonl      one line per sampled request, in arrival order
+    images/<sha>.jpg    thumbnails ("downscaled" mode only)
+
+Each line holds the arrival time, selected models, priority, response
+status, end-to-end latency, per-model latency and status, the GPT
+confidence, and an image signature: sha256 of the upload, byte size,
+format, dimensions and mode. Image contents are never stored in
+"signature" mode; "downscaled" adds a thumbnail of at most
+RECORD_THUMBNAIL_SIDE pixels per side, which the replayer scales back up
+to the recorded size.
+
+Writing happens on a background thread behind a small queue, so a slow
+disk drops samples instead of delaying responses.
+"""
+import hashlib
+import io
+import json
+import os
+import queue
+import random
+import threading
+
+from PIL import Image
+
+IMAGE_MODES = ("signature", "downscaled")
+REQUESTS_FILE = "requests.jsonl"
+IMAGES_DIR = "images"
+
+
+def image_signature(image_bytes: bytes) -> dict:
+    """sha256, byte size, format, dimensions and mode of an encoded image (header only)"""
+    signature = {
+        "sha256": hashlib.sha256(image_bytes).hexdigest(),
+        "bytes": len(image_bytes),
+        "format": None,
+        "width": None,
+        "height": None,
+        "mode": None,
+    }
+    try:
+        with Image.open(io.BytesIO(image_bytes)) as image:
+            signature.update(format=image.format, width=image.width, height=image.height, mode=image.mode)
+    except Exception:
+        pass  # not an image; the request was rejected and is recorded as such
+    return signature
+
+
+class TrafficRecorder:
+    """
+    Samples requests into an archive directory
+
+    Args:
+        directory: Archive directory; empty disables recording
+        sample_rate: Fraction of requests recorded (0-1)
+        images: "signature" or "downscaled"
+        thumbnail_side: Longest thumbnail side in "downscaled" mode
+        max_requests: Recording stops once the archive holds this many requests
+        queue_size: Samples waiting for the writer before new ones are dropped
+    """
+
+    def __init__(self, directory: str, sample_rate: float, images: str = "signature",
+                 thumbnail_side: int = 256, max_requests: int = 100_000, queue_size: int = 32):
+        if images not in IMAGE_MODES:
+            raise ValueError(f"Unknown RECORD_IMAGES: {images}. Choose from: {', '.join(IMAGE_MODES)}")
+        self.directory = directory
+        self.sample_rate = sample_rate
+        self.images = images
+        self.thumbnail_side = thumbnail_side
+        self.max_requests = max_requests
+        self.enabled = bool(directory) and sample_rate > 0
+        self.recorded = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = None
+        self._lock = threading.Lock()
+        if self.enabled:
+            os.makedirs(os.path.join(directory, IMAGES_DIR), exist_ok=True)
+            path = os.path.join(directory, REQUESTS_FILE)
+            if os.path.exists(path):
+                # Appending to an earlier recording: the cap covers the whole archive
+                with open(path) as f:
+                    self.recorded = sum(1 for _ in f)
+            print(f"✓ Recording {sample_rate:.0%} of /detect requests to {directory} ({images})")
+
+    def sample(self) -> bool:
+        """Decide whether the request about to run is recorded"""
+        return self.enabled and self.recorded < self.max_requests and random.random() < self.sample_rate
+
+    def submit(self, image_bytes: bytes, **fields):
+        """
+        Queue a sampled request for writing
+
+        Args:
+            image_bytes: The upload as received (before compression)
+            fields: started (unix time), latency_ms, status, models, priority,
+                tier, model_ms, model_status, gpt_confidence
+        """
+        try:
+            self._queue.put_nowait((image_bytes, fields))
+        except queue.Full:
+            self.dropped += 1
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._write_loop, name="traffic-recorder", daemon=True)
+                self._thread.start()
+
+    def _write_loop(self):
+        path = os.path.join(self.directory, REQUESTS_FILE)
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            image_bytes, fields = item
+            try:
+                record = self._record(image_bytes, fields)
+                with open(path, "a") as f:
+                    f.write(json.dumps(record) + "\n")
+                self.recorded += 1
+            except Exception as e:
+                print(f"[ERROR] Traffic recorder: {type(e).__name__}: {e}")
+
+    def _record(self, image_bytes: bytes, fields: dict) -> dict:
+        signature = image_signature(image_bytes)
+        if self.images == "downscaled" and signature["format"]:
+            thumbnail = os.path.join(self.directory, IMAGES_DIR, f"{signature['sha256']}.jpg")
+            if not os.path.exists(thumbnail):
+                with Image.open(io.BytesIO(image_bytes)) as image:
+                    image.draft("RGB", (self.thumbnail_side, self.thumbnail_side))  # JPEG: decode at reduced scale
+                    image = image.convert("RGB")
+                    image.thumbnail((self.thumbnail_side, self.thumbnail_side))
+                    image.save(thumbnail, format="JPEG", quality=85)
+            signature["thumbnail"] = os.path.basename(thumbnail)
+        return {**fields, "image": signature}
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "directory": self.directory or None,
+            "sample_rate": self.sample_rate,
+            "images": self.images,
+            "recorded": self.recorded,
+            "max_requests": self.max_requests,
+            "dropped": self.dropped,
+        }
+
+    def close(self):
+        """Write what is queued, then stop the writer"""
+        with self._lock:
+            thread, self._thread = self._thread, None
+        if thread is not None:
+            self._queue.put(None)
+            thread.join(timeout=10)
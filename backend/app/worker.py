@@ -0,0 +1,16 @@
+from fastapi import FastAPI
+from app.api.v1.endpoints import worker
+
+# Inference-only app for remote workers (EXECUTOR_MODE=remote on the API):
+# hosts SBI/DistilDIRE, no public endpoints, no ChatGPT, no job queue
+app = FastAPI(title="Deepfake Detection Inference Worker")
+
+app.include_router(worker.router, prefix="/api/v1", tags=["worker"])
+
+@app.on_event("shutdown")
+def stop_models():
+    worker.inference_worker.close()
+
+@app.get("/health")
+async def health():
+    return {"status": "ok"}
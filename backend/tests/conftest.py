@@ -0,0 +1,16 @@
+import os
+import tempfile
+
+# The endpoint modules build their services on import. Point them at an
+# empty model directory so they start placeholders instead of loading
+# checkpoints, without reload watchers, a real API key or a shared job db
+_tmp = tempfile.mkdtemp(prefix="backend-tests-")
+os.environ.update({
+    "MODEL_SBI_PATH": os.path.join(_tmp, "no-models"),
+    "MODEL_DISTILDIRE_PATH": os.path.join(_tmp, "no-models"),
+    "MODEL_RELOAD_INTERVAL": "0",
+    "OPENAI_API_KEY": "test",
+    "JOB_DB_PATH": os.path.join(_tmp, "jobs.sqlite3"),
+    "RECORD_DIR": "",
+    "EXECUTOR_MODE": "inprocess",
+})
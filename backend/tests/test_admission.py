@@ -0,0 +1,106 @@
+import threading
+import time
+
+import pytest
+
+from app.services.admission import AdmissionQueue, QueueFull, reserve_all
+
+
+def enter_in_thread(ticket, hold: threading.Event | None = None):
+    """Enter ticket on a thread; the thread leaves once hold is set"""
+    entered = threading.Event()
+
+    def run():
+        with ticket:
+            entered.set()
+            if hold is not None:
+                hold.wait(5)
+
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread, entered
+
+
+def test_reserved_but_idle_ticket_does_not_block_a_free_slot():
+    # A request holds a place in this queue while it still runs another
+    # model; a later request that is ready must get the idle slot
+    queue = AdmissionQueue("distildire", slots=1)
+    idle = queue.reserve("interactive")
+    ready = queue.reserve("interactive")
+
+    thread, entered = enter_in_thread(ready)
+    assert entered.wait(1), "ready ticket waited behind a ticket whose owner was not waiting"
+    thread.join(1)
+
+    with idle:
+        assert idle.state == "running"
+    assert queue.stats()["waiting"] == {"interactive": 0, "batch": 0}
+
+
+def test_idle_tickets_still_count_toward_the_lane_depth():
+    queue = AdmissionQueue("sbi", slots=1, depths={"interactive": 2})
+    queue.reserve("interactive")
+    queue.reserve("interactive")
+    with pytest.raises(QueueFull):
+        queue.reserve("interactive")
+    assert queue.rejected["interactive"] == 1
+
+
+def test_waiting_tickets_run_in_lane_then_arrival_order():
+    queue = AdmissionQueue("sbi", slots=1)
+    order = []
+    blocker = queue.reserve("batch")
+    hold = threading.Event()
+    blocker_thread, entered = enter_in_thread(blocker, hold)
+    assert entered.wait(1)
+
+    tickets = [("batch-1", queue.reserve("batch")), ("interactive-1", queue.reserve("interactive")),
+               ("interactive-2", queue.reserve("interactive"))]
+    threads = []
+    for name, ticket in tickets:
+        def run(name=name, ticket=ticket):
+            with ticket:
+                order.append(name)
+        threads.append(threading.Thread(target=run, daemon=True))
+        threads[-1].start()
+        while not ticket.ready:
+            time.sleep(0.001)
+
+    hold.set()
+    for thread in [blocker_thread, *threads]:
+        thread.join(2)
+    assert order == ["interactive-1", "interactive-2", "batch-1"]
+
+
+def test_slots_limit_concurrency():
+    queue = AdmissionQueue("chatgpt", slots=2)
+    hold = threading.Event()
+    started = [enter_in_thread(queue.reserve("interactive"), hold) for _ in range(3)]
+    time.sleep(0.2)
+    assert sum(entered.is_set() for _, entered in started) == 2
+    assert queue.stats()["running"] == 2
+    hold.set()
+    for thread, entered in started:
+        thread.join(2)
+        assert entered.is_set()
+    assert queue.stats()["running"] == 0
+
+
+def test_reserve_all_releases_places_when_one_queue_is_full():
+    queues = {
+        "sbi": AdmissionQueue("sbi", depths={"interactive": 1}),
+        "distildire": AdmissionQueue("distildire", depths={"interactive": 1}),
+    }
+    queues["distildire"].reserve("interactive")
+    with pytest.raises(QueueFull) as excinfo:
+        reserve_all(queues, ["sbi", "distildire"], "interactive")
+    assert excinfo.value.model == "distildire"
+    assert queues["sbi"].stats()["waiting"]["interactive"] == 0
+
+
+def test_cancelled_ticket_leaves_the_queue():
+    queue = AdmissionQueue("sbi")
+    ticket = queue.reserve("batch")
+    ticket.cancel()
+    assert ticket.state == "cancelled"
+    assert queue.stats()["waiting"]["batch"] == 0
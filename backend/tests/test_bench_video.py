@@ -0,0 +1,127 @@
+import json
+from types import SimpleNamespace
+
+import cv2
+import numpy as np
+import pytest
+import torch
+
+import bench_video
+import preprocess
+from bench_video import StubClassifier, StubFaceDetector, instrumented, make_video, run_once
+from scoring import VideoScorer
+
+
+def read_frames(path):
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while True:
+        ok, frame = cap.read()
+        if not ok:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
+
+
+def bench_args(**overrides):
+    args = dict(
+        width=160, height=120, frames=12, fps=25, codec="MJPG", faces=1, seed=0, video=None, video_dir=None,
+        n_frames=6, detector="stub", classifier="stub", weight_name=None, batch_size=4, track=False,
+        keyframe_interval=4, skip_similar=None, warmup=0, repeat=2, threads=None, json=None,
+    )
+    args.update(overrides)
+    return SimpleNamespace(**args)
+
+
+@pytest.fixture
+def scorer():
+    return VideoScorer(StubClassifier().eval(), StubFaceDetector(), device=torch.device("cpu"), batch_size=4)
+
+
+def test_make_video_is_deterministic(tmp_path):
+    paths = [str(tmp_path / name) for name in ("a.avi", "b.avi", "c.avi")]
+    make_video(paths[0], 160, 120, 5, codec="MJPG", seed=1)
+    make_video(paths[1], 160, 120, 5, codec="MJPG", seed=1)
+    make_video(paths[2], 160, 120, 5, codec="MJPG", seed=2)
+    first, again, other = (read_frames(p) for p in paths)
+    assert len(first) == 5 and first[0].shape == (120, 160, 3)
+    assert all(np.array_equal(a, b) for a, b in zip(first, again))
+    assert not np.array_equal(first[0], other[0])
+
+
+def test_make_video_rejects_a_missing_codec(tmp_path):
+    with pytest.raises(ValueError, match="not available"):
+        make_video(str(tmp_path / "x.avi"), 160, 120, 2, codec="QQQQ")
+
+
+@pytest.mark.parametrize("n_faces", [0, 1, 2])
+def test_stub_detector_finds_the_drawn_faces(tmp_path, n_faces):
+    path = str(tmp_path / "faces.avi")
+    # faces are placed at random and may overlap; with this seed they don't
+    make_video(path, 320, 240, 3, codec="MJPG", n_faces=n_faces, seed=1)
+    frame = cv2.cvtColor(read_frames(path)[0], cv2.COLOR_BGR2RGB)
+    faces = StubFaceDetector().predict_jsons(frame)
+    assert len(faces) == n_faces
+    for face in faces:
+        x0, y0, x1, y1 = face["bbox"]
+        assert 0 <= x0 < x1 <= 320 and 0 <= y0 < y1 <= 240
+
+
+def test_stub_classifier_returns_two_logits():
+    assert StubClassifier()(torch.zeros(3, 3, 64, 64)).shape == (3, 2)
+
+
+def test_video_path_encodes_the_settings():
+    path = bench_video.video_path("/tmp/bench", bench_args(codec="mp4v"))
+    assert path == "/tmp/bench/160x120_12f_25fps_1faces_mp4v_s0.mp4"
+
+
+def test_instrumented_restores_the_pipeline(scorer):
+    iter_frame_faces, crop_faces = preprocess.iter_frame_faces, preprocess.crop_faces
+    times = bench_video.StageTimes(torch.device("cpu"))
+    with pytest.raises(RuntimeError):
+        with instrumented(scorer, times):
+            assert preprocess.iter_frame_faces is not iter_frame_faces
+            assert "forward" in scorer.model.__dict__
+            raise RuntimeError("run failed")
+    assert preprocess.iter_frame_faces is iter_frame_faces and preprocess.crop_faces is crop_faces
+    assert "forward" not in scorer.model.__dict__
+
+
+def test_run_once_times_every_stage(tmp_path, scorer):
+    path = str(tmp_path / "clip.avi")
+    make_video(path, 160, 120, 12, codec="MJPG", n_faces=1)
+    detector = scorer.face_detector
+
+    result = run_once(scorer, path, 6, bench_args())
+
+    assert scorer.face_detector is detector
+    assert set(result["stages_s"]) == {"decode", "detect", "crop", "classify"}
+    assert all(seconds >= 0 for seconds in result["stages_s"].values())
+    assert result["detector_calls"] == 6 and result["classify_calls"] == 2
+    assert result["score"] is not None and result["frames_per_s"] > 0
+
+
+def test_run_once_with_tracking_calls_the_detector_on_keyframes(tmp_path, scorer):
+    path = str(tmp_path / "clip.avi")
+    make_video(path, 160, 120, 12, codec="MJPG", n_faces=1)
+    result = run_once(scorer, path, 12, bench_args(track=True, keyframe_interval=4))
+    assert 3 <= result["detector_calls"] < 12
+
+
+def test_main_writes_a_json_report(tmp_path, monkeypatch, capsys):
+    monkeypatch.setattr(bench_video, "device", torch.device("cpu"), raising=False)
+    report_path = tmp_path / "bench.json"
+    args = bench_args(video_dir=str(tmp_path / "videos"), json=str(report_path))
+
+    bench_video.main(args)
+    bench_video.main(args)
+
+    # the second run reuses the generated video
+    assert capsys.readouterr().out.count("generating") == 1
+    report = json.loads(report_path.read_text())
+    assert report["params"]["frame_count"] == 12 and report["params"]["n_frames"] == 6
+    assert report["params"]["classifier"] == "stub"
+    assert len(report["runs"]) == 2
+    assert set(report["median"]["stages_s"]) == {"decode", "detect", "crop", "classify"}
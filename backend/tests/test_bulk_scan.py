@@ -0,0 +1,45 @@
+import io
+import subprocess
+import sys
+from pathlib import Path
+
+from PIL import Image
+
+from app.cli.bulk_scan import decode
+
+BACKEND = Path(__file__).resolve().parent.parent
+
+
+def write_image(path, size=(300, 200)):
+    buffer = io.BytesIO()
+    Image.new("RGB", size, (10, 120, 200)).save(buffer, format="PNG")
+    path.write_bytes(buffer.getvalue())
+    return str(path)
+
+
+def test_decode_resizes_once_per_input_size(tmp_path):
+    path = write_image(tmp_path / "a.png")
+    decoded_path, pixels, error = decode(path, (380, 224))
+    assert (decoded_path, error) == (path, None)
+    assert {size: array.shape for size, array in pixels.items()} == {380: (380, 380, 3), 224: (224, 224, 3)}
+
+
+def test_decode_reports_unreadable_files(tmp_path):
+    (tmp_path / "broken.jpg").write_bytes(b"not an image")
+    path, pixels, error = decode(str(tmp_path / "broken.jpg"), (224,))
+    assert pixels is None and error.startswith("UnidentifiedImageError")
+    assert decode(str(tmp_path / "missing.jpg"), (224,))[2].startswith("FileNotFoundError")
+
+
+def test_decoder_processes_do_not_load_torch(tmp_path):
+    # What a spawned decoder runs: bulk_scan's module level, then decode()
+    path = write_image(tmp_path / "a.png")
+    script = (
+        "import sys\n"
+        "from app.cli.bulk_scan import decode\n"
+        f"assert decode({path!r}, (380, 224))[2] is None\n"
+        "print(sorted(m for m in ('torch', 'torchvision', 'timm', 'openai') if m in sys.modules))\n"
+    )
+    result = subprocess.run([sys.executable, "-c", script], cwd=BACKEND, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
@@ -0,0 +1,96 @@
+import numpy as np
+import torch
+
+from crop_cache import CropCache, video_hash
+
+
+def write_video(path, content=b"not really a video"):
+    path.write_bytes(content)
+    return str(path)
+
+
+def faces(n, size=8, seed=0):
+    rng = np.random.default_rng(seed)
+    return [rng.integers(0, 256, (3, size, size), dtype=np.uint8) for _ in range(n)]
+
+
+class CountingExtract:
+    def __init__(self, result):
+        self.result = result
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        return self.result
+
+
+def test_round_trip_returns_memory_mapped_crops(tmp_path):
+    video = write_video(tmp_path / "a.mp4")
+    crops = faces(3)
+    extract = CountingExtract((crops, [0, 0, 4]))
+    cache = CropCache(str(tmp_path / "cache"), settings={"image_size": 8})
+
+    first_crops, first_idx = cache.get_or_extract(video, 8, extract)
+    second_crops, second_idx = cache.get_or_extract(video, 8, extract)
+
+    assert extract.calls == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert isinstance(second_crops, np.memmap)
+    assert second_crops.dtype == np.uint8 and second_crops.shape == (3, 3, 8, 8)
+    assert np.array_equal(second_crops, np.stack(crops))
+    assert second_idx.dtype == np.int64 and second_idx.tolist() == [0, 0, 4]
+    assert np.array_equal(first_crops, second_crops) and first_idx.tolist() == second_idx.tolist()
+    # copy-on-write maps are writable, so torch takes them without a copy or a warning
+    assert torch.from_numpy(second_crops).shape == (3, 3, 8, 8)
+
+
+def test_key_depends_on_content_frames_and_settings(tmp_path):
+    video = write_video(tmp_path / "a.mp4")
+    same = write_video(tmp_path / "copy.mp4")
+    other = write_video(tmp_path / "b.mp4", b"another video")
+    cache = CropCache(str(tmp_path / "cache"), settings={"image_size": 8})
+
+    assert video_hash(video) == video_hash(same)
+    assert cache.key(video, 8) == cache.key(same, 8)
+    assert cache.key(video, 8) != cache.key(other, 8)
+    assert cache.key(video, 8) != cache.key(video, 16)
+    assert cache.key(video, 8) != cache.key(video, 8, tracker={"interval": 5})
+    assert cache.key(video, 8) != CropCache(str(tmp_path / "cache"), settings={"image_size": 16}).key(video, 8)
+
+
+def test_empty_extraction_is_retried(tmp_path):
+    # an unreadable video and a video without faces both come back empty
+    video = write_video(tmp_path / "broken.mp4")
+    cache = CropCache(str(tmp_path / "cache"))
+
+    assert cache.get_or_extract(video, 8, CountingExtract(([], []))) == ([], [])
+    extract = CountingExtract((faces(2), [1, 3]))
+    crops, idx = cache.get_or_extract(video, 8, extract)
+
+    assert extract.calls == 1
+    assert (cache.hits, cache.misses) == (0, 2)
+    assert crops.shape[0] == 2 and idx.tolist() == [1, 3]
+
+
+def test_stale_empty_entry_is_a_miss(tmp_path):
+    video = write_video(tmp_path / "broken.mp4")
+    cache = CropCache(str(tmp_path / "cache"))
+    key = cache.key(video, 8)
+    crops_path, idx_path = cache._paths(key)
+    (tmp_path / "cache" / key[:2]).mkdir()
+    np.save(crops_path, np.zeros((0, 3, 0, 0), dtype=np.uint8))
+    np.save(idx_path, np.zeros(0, dtype=np.int64))
+
+    assert cache.load(key) is None
+    extract = CountingExtract((faces(1), [2]))
+    assert cache.get_or_extract(video, 8, extract)[1].tolist() == [2]
+    assert extract.calls == 1
+
+
+def test_store_leaves_no_temporary_files(tmp_path):
+    video = write_video(tmp_path / "a.mp4")
+    cache = CropCache(str(tmp_path / "cache"))
+    cache.get_or_extract(video, 8, CountingExtract((faces(2), [0, 1])))
+    names = sorted(p.name for p in (tmp_path / "cache").rglob("*") if p.is_file())
+    assert len(names) == 2
+    assert names[0].endswith(".crops.npy") and names[1].endswith(".idx.npy")
@@ -0,0 +1,57 @@
+import pytest
+
+from app.services.degradation import DegradationPolicy, parse_tiers
+
+TIERS = [("no_gpt", 0.5), ("reduced_resolution", 0.75), ("quantized", 0.9)]
+
+
+def test_parse_tiers():
+    assert parse_tiers(" no_gpt:0.5, reduced_resolution:0.75,quantized:0.9,") == TIERS
+    assert parse_tiers("") == []
+
+
+@pytest.mark.parametrize("spec", ["no_gpt:0.5,bogus:0.7", "no_gpt:0.5,quantized:0.5", "no_gpt:high"])
+def test_parse_tiers_rejects_bad_specs(spec):
+    with pytest.raises(ValueError):
+        parse_tiers(spec)
+
+
+def test_no_tiers_always_full():
+    policy = DegradationPolicy([], latency_target_ms=1000)
+    assert policy.update(5.0)[:2] == ("full", set())
+
+
+def test_steps_down_one_tier_per_update_and_accumulates_steps():
+    policy = DegradationPolicy(TIERS, latency_target_ms=1000)
+    assert policy.update(0.4)[:2] == ("full", set())
+    assert policy.update(1.0)[:2] == ("no_gpt", {"no_gpt"})
+    assert policy.update(1.0)[:2] == ("reduced_resolution", {"no_gpt", "reduced_resolution"})
+    assert policy.update(1.0)[:2] == ("quantized", {"no_gpt", "reduced_resolution", "quantized"})
+    assert policy.update(1.0)[0] == "quantized"
+    assert policy.transitions == 3
+
+
+def test_recovery_needs_load_below_the_recover_ratio_for_the_cooldown():
+    policy = DegradationPolicy(TIERS, latency_target_ms=1000, recover_ratio=0.6, cooldown=0)
+    policy.update(0.6)
+    assert policy.tier == "no_gpt"
+    # Below the threshold but above 0.6 x 0.5: hysteresis keeps the tier
+    for _ in range(3):
+        assert policy.update(0.4)[0] == "no_gpt"
+    assert policy.update(0.2)[0] == "no_gpt"  # calm period starts
+    assert policy.update(0.2)[0] == "full"
+
+
+def test_cooldown_restarts_when_load_rises():
+    policy = DegradationPolicy(TIERS, latency_target_ms=1000, cooldown=3600)
+    policy.update(0.6)
+    for _ in range(3):
+        assert policy.update(0.1)[0] == "no_gpt"
+
+
+def test_latency_counts_as_load():
+    policy = DegradationPolicy(TIERS, latency_target_ms=1000)
+    policy.record_latency(0.8)
+    tier, _, load = policy.update(0.0)
+    assert load == pytest.approx(0.8)
+    assert tier == "no_gpt"
@@ -0,0 +1,205 @@
+import threading
+import time
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import detection_service as detection_module
+from app.services.admission import AdmissionQueue
+from app.services.degradation import DegradationPolicy
+from app.services.detection_service import MODEL_NAMES, DetectionService
+from app.services.memory_budget import PixelBudget, StageMemory
+
+
+class FakeRegistry:
+    def __init__(self, predict, predict_frames=None):
+        self._model = SimpleNamespace(predict=predict, predict_frames=predict_frames)
+
+    @contextmanager
+    def acquire(self):
+        yield self._model, "v1"
+
+
+def make_service(predict, verify, max_pixels=64_000_000, predict_frames=None):
+    # Everything detect() touches, without loading models
+    service = DetectionService.__new__(DetectionService)
+    service.admission = {name: AdmissionQueue(name, slots=1) for name in MODEL_NAMES}
+    service.pixel_budget = PixelBudget(max_pixels)
+    service.memory = StageMemory()
+    service.degradation = DegradationPolicy([], latency_target_ms=8000)
+    service.profiler = SimpleNamespace(active=False)
+    service.registries = {name: FakeRegistry(predict, predict_frames) for name in ("sbi", "distildire")}
+    service.chatgpt_vision = SimpleNamespace(verify=verify)
+    return service
+
+
+@pytest.fixture
+def pixels_by_name(monkeypatch):
+    # Image "bytes" are names; their pixel counts come from this table
+    table = {}
+    gates = {}
+
+    def image_pixels(image_bytes):
+        gate = gates.get(image_bytes)
+        if gate is not None:
+            gate.wait(5)
+        return table[image_bytes]
+
+    monkeypatch.setattr(detection_module, "image_pixels", image_pixels)
+    return table, gates
+
+
+def run_in_threads(*calls, timeout=5):
+    results, errors = {}, []
+
+    def run(name, fn):
+        try:
+            results[name] = fn()
+        except Exception as e:  # pragma: no cover - reported below
+            errors.append(e)
+
+    threads = [threading.Thread(target=run, args=call, daemon=True) for call in calls]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join(timeout)
+    assert not errors
+    assert not any(thread.is_alive() for thread in threads), "requests deadlocked"
+    return results
+
+
+def test_large_images_do_not_deadlock_on_queue_places_and_pixel_budget(pixels_by_name):
+    # C reserves its queue places first but reaches the pixel budget only
+    # after A holds 40MP of it; 30MP + 40MP doesn't fit the 64MP budget
+    table, gates = pixels_by_name
+    table.update({b"A": 40_000_000, b"C": 30_000_000})
+    gates[b"C"] = threading.Event()
+
+    def predict(image_bytes, **options):
+        gates[b"C"].set()
+        time.sleep(0.05)
+        return False, 0.1
+
+    service = make_service(predict, verify=lambda b: (False, 0.1))
+    models = ("sbi", "distildire")
+    results = run_in_threads(
+        ("C", lambda: service.detect(b"C", models=models)),
+        ("A", lambda: service.detect(b"A", models=models)),
+    )
+    assert {results[name]["models"]["distildire"]["status"] for name in "AC"} == {"active"}
+    assert service.pixel_budget.stats()["in_use"] == 0
+
+
+def test_gpt_call_holds_no_pixels(pixels_by_name):
+    table, _ = pixels_by_name
+    table[b"img"] = 1_000_000
+    service = make_service(lambda b, **o: (False, 0.1), verify=None)
+    in_use = []
+    service.chatgpt_vision.verify = lambda b: (in_use.append(service.pixel_budget.stats()["in_use"]), (False, 0.2))[1]
+
+    result = service.detect(b"img")
+    assert in_use == [0]
+    assert result["models"]["chatgpt"]["status"] == "active"
+
+
+def test_oversized_images_run_one_at_a_time(pixels_by_name):
+    table, _ = pixels_by_name
+    table.update({b"big-1": 100_000_000, b"big-2": 100_000_000})
+    running, peak = [0], [0]
+    lock = threading.Lock()
+
+    def predict(image_bytes, **options):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.05)
+        with lock:
+            running[0] -= 1
+        return False, 0.1
+
+    service = make_service(predict, verify=lambda b: (False, 0.1))
+    run_in_threads(
+        ("1", lambda: service.detect(b"big-1", models=("sbi",))),
+        ("2", lambda: service.detect(b"big-2", models=("distildire",))),
+    )
+    assert peak[0] == 1
+
+
+def test_concurrent_large_uploads_stay_within_the_budget(pixels_by_name):
+    # Eight 24MP uploads against a 64MP budget: at most two decode at once
+    table, _ = pixels_by_name
+    names = [f"upload-{i}".encode() for i in range(8)]
+    table.update({name: 24_000_000 for name in names})
+    in_use = []
+    lock = threading.Lock()
+
+    def predict(image_bytes, **options):
+        with lock:
+            in_use.append(service.pixel_budget.stats()["in_use"])
+        time.sleep(0.15)  # longer than run_in_threads' stagger, so uploads overlap
+        return False, 0.1
+
+    service = make_service(predict, verify=lambda b: (False, 0.1))
+    service.admission = {name: AdmissionQueue(name, slots=4) for name in MODEL_NAMES}
+    results = run_in_threads(
+        *[(name, lambda name=name: service.detect(name, models=("sbi", "distildire"))) for name in names],
+        timeout=10,
+    )
+    assert len(results) == len(names)
+    assert len(in_use) == 2 * len(names)
+    assert max(in_use) <= 48_000_000
+    stats = service.pixel_budget.stats()
+    assert stats["peak_in_use"] == 48_000_000
+    assert stats["waits"] > 0
+    assert stats["in_use"] == 0
+
+
+def test_detect_frames_takes_its_pixels_from_the_budget():
+    np = pytest.importorskip("numpy")
+    frames = np.zeros((4, 100, 50, 3), dtype=np.uint8)
+    in_use = []
+
+    def predict_frames(batch, **options):
+        in_use.append(service.pixel_budget.stats()["in_use"])
+        return [(False, 0.1)] * len(batch)
+
+    service = make_service(lambda b, **o: (False, 0.1), verify=None, predict_frames=predict_frames)
+    result = service.detect_frames(frames)
+    assert in_use == [4 * 100 * 50] * 2
+    assert [frame["models"]["sbi"]["status"] for frame in result["frames"]] == ["active"] * 4
+    assert service.pixel_budget.stats()["in_use"] == 0
+
+
+def test_detect_frames_waits_for_pixels_held_by_uploads(pixels_by_name):
+    np = pytest.importorskip("numpy")
+    table, _ = pixels_by_name
+    table[b"upload"] = 60_000_000
+    release = threading.Event()
+    order = []
+
+    def predict(image_bytes, **options):
+        order.append("upload")
+        release.wait(5)
+        return False, 0.1
+
+    def predict_frames(batch, **options):
+        order.append("frames")
+        return [(False, 0.1)] * len(batch)
+
+    service = make_service(predict, verify=None, predict_frames=predict_frames)
+    service.admission = {name: AdmissionQueue(name, slots=2) for name in MODEL_NAMES}
+    frames = np.zeros((8, 1000, 1000, 3), dtype=np.uint8)
+    upload = threading.Thread(target=lambda: service.detect(b"upload", models=("sbi",)), daemon=True)
+    upload.start()
+    time.sleep(0.05)
+    scan = threading.Thread(target=lambda: service.detect_frames(frames, models=("distildire",)), daemon=True)
+    scan.start()
+    time.sleep(0.1)
+    assert order == ["upload"]  # 60MP + 8MP doesn't fit
+    release.set()
+    upload.join(5)
+    scan.join(5)
+    assert order == ["upload", "frames"]
+    assert service.pixel_budget.stats()["waits"] == 1
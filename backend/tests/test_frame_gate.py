@@ -0,0 +1,107 @@
+import cv2
+import numpy as np
+import pytest
+import torch
+
+from bench_video import FACE_RGB, StubFaceDetector
+from frame_gate import FrameGate, compare_gate
+from scoring import VideoScorer
+
+
+def frame(level, size=(48, 64)):
+    return np.full(size + (3,), level, dtype=np.uint8)
+
+
+class CountingDetector(StubFaceDetector):
+    def __init__(self):
+        super().__init__()
+        self.calls = 0
+
+    def predict_jsons(self, frame):
+        self.calls += 1
+        return super().predict_jsons(frame)
+
+
+class BrightnessModel(torch.nn.Module):
+    def forward(self, x):
+        m = x.mean(dim=(1, 2, 3))
+        return torch.stack([torch.zeros_like(m), 8 * (m - 0.5)], dim=1)
+
+
+def write_scenes(path, backgrounds, frames_per_scene=8):
+    # one still shot per background, each with the same face drawn in the middle
+    writer = cv2.VideoWriter(path, cv2.VideoWriter_fourcc(*"MJPG"), 25, (160, 120))
+    for level in backgrounds:
+        shot = np.full((120, 160, 3), level, dtype=np.uint8)
+        cv2.ellipse(shot, (80, 60), (25, 32), 0, 0, 360, FACE_RGB[::-1], -1)
+        for _ in range(frames_per_scene):
+            writer.write(shot)
+    writer.release()
+    return path
+
+
+def test_first_frame_is_always_analysed():
+    gate = FrameGate(threshold=1000)
+    assert gate.check(frame(10), 0)
+    assert gate.stats() == {"frames": 1, "analysed": 1, "skipped": 0}
+
+
+def test_repeats_map_to_the_last_analysed_frame():
+    gate = FrameGate(threshold=2)
+    results = [gate.check(frame(level), idx) for idx, level in [(0, 100), (3, 100), (6, 101), (9, 160), (12, 160)]]
+    assert results == [True, False, False, True, False]
+    assert gate.repeats == {3: 0, 6: 0, 12: 9}
+    assert gate.stats() == {"frames": 5, "analysed": 2, "skipped": 3}
+
+
+def test_slow_drift_is_measured_against_the_reference():
+    # every step is below the threshold, but the drift from frame 0 is not
+    gate = FrameGate(threshold=2)
+    assert [gate.check(frame(100 + step), step) for step in range(5)] == [True, False, True, False, True]
+    assert gate.repeats == {1: 0, 3: 2}
+
+
+def test_zero_threshold_never_skips():
+    gate = FrameGate(threshold=0)
+    assert all(gate.check(frame(50), idx) for idx in range(4))
+    assert gate.repeats == {}
+
+
+def test_small_local_change_is_averaged_away():
+    still = frame(100)
+    moved = still.copy()
+    moved[:4, :4] = 255
+    gate = FrameGate(threshold=2)
+    gate.check(still, 0)
+    assert not gate.check(moved, 1)
+
+
+def test_settings():
+    assert FrameGate(threshold=1.5, size=16).settings() == {"threshold": 1.5, "size": 16}
+
+
+def test_gated_video_detects_once_per_shot_and_keeps_the_score(tmp_path):
+    path = write_scenes(str(tmp_path / "shots.avi"), [20, 90])
+    detector = CountingDetector()
+    scorer = VideoScorer(BrightnessModel(), detector, device=torch.device("cpu"), batch_size=4)
+
+    reference = scorer.score_video(path, 8)
+    calls = detector.calls
+    gate = FrameGate(threshold=2)
+    gated = scorer.score_video(path, 8, gate=gate)
+
+    assert calls == 8 and detector.calls - calls == 2
+    assert gate.stats() == {"frames": 8, "analysed": 2, "skipped": 6}
+    assert gated == pytest.approx(reference, abs=1e-6)
+
+
+def test_compare_gate_reports_skips_and_score_change(tmp_path):
+    path = write_scenes(str(tmp_path / "still.avi"), [60])
+    scorer = VideoScorer(BrightnessModel(), StubFaceDetector(), device=torch.device("cpu"))
+
+    report = compare_gate(scorer, path, 6, [0, 4])
+
+    assert report["score"] is not None
+    assert report["gated"][0]["skipped"] == 0
+    assert report["gated"][4]["frames"] == 6 and report["gated"][4]["skipped"] == 5
+    assert report["gated"][4]["abs_diff"] == pytest.approx(0, abs=1e-6)
@@ -0,0 +1,21 @@
+import os
+import subprocess
+import sys
+
+BACKEND = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Loose enough for a busy test machine, tight enough to catch a heavy
+# library (torch alone is over a second) coming back onto a startup path
+TOLERANCE_PERCENT = 100
+MIN_DELTA_MS = 250
+
+
+def test_import_budget():
+    # Import rules, plus import times against the committed baseline
+    # (re-record import_times.json on the machine that runs this)
+    result = subprocess.run(
+        [sys.executable, "-m", "app.cli.import_budget", "--baseline", "import_times.json",
+         "--tolerance", str(TOLERANCE_PERCENT), "--min-delta-ms", str(MIN_DELTA_MS)],
+        cwd=BACKEND, capture_output=True, text=True, timeout=600,
+    )
+    assert result.returncode == 0, result.stdout[-3000:] + result.stderr[-2000:]
@@ -0,0 +1,132 @@
+import csv
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+import inference_dataset
+
+
+VIDEOS = ["real_a.mp4", "fake_b.mp4", "broken.mp4", "noface.mp4", "real_c.mp4", "fake_d.mp4"]
+LABELS = [0, 1, 0, 1, 0, 1]
+
+
+class FakeScorer:
+    # one score per checkpoint: fake videos score high on the first, low on the second
+    face_detector = None
+
+    def __init__(self, weight_name):
+        self.weight_name = weight_name
+
+    @classmethod
+    def load(cls, weight_name, device=None, **kwargs):
+        return cls(weight_name)
+
+    def score_video_all(self, filename, n_frames, tracker=None, cache=None, gate=None):
+        if filename == "broken.mp4":
+            raise RuntimeError("cannot decode")
+        if filename == "noface.mp4":
+            return None
+        fake = filename.startswith("fake")
+        return [0.9 if fake else 0.1, 0.2 if fake else 0.7][:len(self.weight_name)]
+
+
+def make_args(tmp_path, **overrides):
+    args = dict(
+        weight_name=["ckpt/first.tar", "ckpt/second.tar"], dataset="FF", n_frames=8,
+        aggregation="mean", k=4, q=0.9, track=False, keyframe_interval=8, skip_similar=None,
+        crop_cache=None, workers=1, threads_per_worker=None, out_dir=str(tmp_path / "out"),
+    )
+    args.update(overrides)
+    return SimpleNamespace(**args)
+
+
+@pytest.fixture
+def dataset(monkeypatch):
+    monkeypatch.setattr(inference_dataset, "VideoScorer", FakeScorer)
+    monkeypatch.setattr(inference_dataset, "init_ff", lambda: (list(VIDEOS), list(LABELS)))
+    monkeypatch.setattr(inference_dataset, "device", torch.device("cpu"), raising=False)
+
+
+def read_scores(path):
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    return [(r["filename"], int(r["label"]), float(r["score"])) for r in rows]
+
+
+def test_score_shard_returns_one_score_per_checkpoint(tmp_path, dataset):
+    shard_id, results, stats = inference_dataset.score_shard(3, [0, 2, 3], VIDEOS, make_args(tmp_path), torch.device("cpu"))
+    assert shard_id == 3
+    # failures and videos without faces fall back to 0.5 for every checkpoint
+    assert results == [(0, [0.1, 0.7]), (2, [0.5, 0.5]), (3, [0.5, 0.5])]
+    assert stats["videos"] == 3
+
+
+def test_main_writes_a_csv_and_auc_per_checkpoint(tmp_path, dataset, capsys):
+    inference_dataset.main(make_args(tmp_path))
+
+    out = capsys.readouterr().out
+    assert "FF| first.tar| AUC:" in out and "FF| second.tar| AUC:" in out
+    first = read_scores(tmp_path / "out" / "first_FF.csv")
+    second = read_scores(tmp_path / "out" / "second_FF.csv")
+    assert [(name, label) for name, label, _ in first] == list(zip(VIDEOS, LABELS))
+    assert [s for _, _, s in first] == pytest.approx([0.1, 0.9, 0.5, 0.5, 0.1, 0.9])
+    assert [s for _, _, s in second] == pytest.approx([0.7, 0.2, 0.5, 0.5, 0.7, 0.2])
+
+
+def test_write_scores_creates_the_directory(tmp_path):
+    path = tmp_path / "nested" / "dir" / "scores.csv"
+    inference_dataset.write_scores(str(path), ["a.mp4"], [1], [0.25])
+    assert read_scores(path) == [("a.mp4", 1, 0.25)]
+
+
+class ReversedPool:
+    # runs shards in-process and returns them last-finished-first
+    calls = []
+
+    def __init__(self, processes):
+        self.processes = processes
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def starmap(self, func, iterable):
+        args = list(iterable)
+        ReversedPool.calls = args
+        return [func(*a) for a in reversed(args)]
+
+
+@pytest.fixture
+def reversed_pool(monkeypatch):
+    monkeypatch.setattr(inference_dataset.mp, "get_context", lambda method: SimpleNamespace(Pool=ReversedPool))
+    ReversedPool.calls = []
+    return ReversedPool
+
+
+@pytest.mark.parametrize("workers", [2, 4])
+def test_sharded_scores_match_single_process(tmp_path, dataset, reversed_pool, workers):
+    inference_dataset.main(make_args(tmp_path / "single"))
+    inference_dataset.main(make_args(tmp_path / "sharded", workers=workers, threads_per_worker=1))
+
+    assert len(reversed_pool.calls) == workers
+    for name in ("first_FF.csv", "second_FF.csv"):
+        assert read_scores(tmp_path / "sharded" / "out" / name) == read_scores(tmp_path / "single" / "out" / name)
+
+
+def test_shards_are_strided_and_cover_every_video(tmp_path, dataset, reversed_pool):
+    inference_dataset.main(make_args(tmp_path, workers=4, threads_per_worker=2))
+
+    shards = [(call[0], call[1], call[5]) for call in reversed_pool.calls]
+    assert shards == [(0, [0, 4], 2), (1, [1, 5], 2), (2, [2], 2), (3, [3], 2)]
+
+
+def test_workers_are_capped_by_the_number_of_videos(tmp_path, dataset, reversed_pool, capsys):
+    inference_dataset.main(make_args(tmp_path, workers=16, threads_per_worker=1))
+
+    assert len(reversed_pool.calls) == len(VIDEOS)
+    out = capsys.readouterr().out
+    # per-shard lines are printed in shard order, however the pool returned them
+    assert [line.split("|")[0] for line in out.splitlines() if line.startswith("shard ")] == [f"shard {i}" for i in range(len(VIDEOS))]
@@ -0,0 +1,38 @@
+import subprocess
+import sys
+from pathlib import Path
+from types import SimpleNamespace
+
+import pytest
+import torch
+
+import inference_video
+
+SCRIPT = Path(__file__).resolve().parent.parent / "app" / "ml_inference" / "inference" / "inference_video.py"
+
+
+@pytest.mark.parametrize("flags", [["--track"], ["--skip-similar", "2"], ["--track", "--skip-similar", "0"]])
+def test_adaptive_rejects_sequential_options(flags):
+    result = subprocess.run([sys.executable, str(SCRIPT), "-w", "missing.tar", "-i", "missing.mp4", "--adaptive", *flags],
+                            cwd=SCRIPT.parent, capture_output=True, text=True, timeout=120)
+    assert result.returncode == 2
+    assert "--adaptive cannot be combined with --track or --skip-similar" in result.stderr
+
+
+def test_adaptive_reports_frames_used(monkeypatch, capsys):
+    class FakeScorer:
+        @classmethod
+        def load(cls, weight_name, device=None, **kwargs):
+            return cls()
+
+        def score_video_adaptive(self, filename, max_frames, min_frames, threshold, confidence):
+            return 0.8125, 5, 9
+
+    monkeypatch.setattr(inference_video, "VideoScorer", FakeScorer)
+    monkeypatch.setattr(inference_video, "device", torch.device("cpu"), raising=False)
+    args = SimpleNamespace(weight_name="w.tar", input_video="v.mp4", adaptive=True, max_frames=32, min_frames=4,
+                           threshold=0.5, confidence=0.95, aggregation="mean", k=4, q=0.9)
+
+    inference_video.main(args)
+
+    assert capsys.readouterr().out.strip() == "fakeness: 0.8125 (frames used: 5, visited: 9/32)"
@@ -0,0 +1,58 @@
+from contextlib import contextmanager
+
+import numpy as np
+import pytest
+
+from app.services.inference_worker import InferenceWorker, ModelNotLoaded
+
+
+class FakeRegistry:
+    def __init__(self, model):
+        self.model = model
+        self.available = model is not None
+        self.version = "v1" if model is not None else None
+
+    @contextmanager
+    def acquire(self):
+        yield self.model, self.version
+
+
+class FakeModel:
+    def __init__(self, error=None):
+        self.error = error
+
+    def predict_frames(self, frames, **options):
+        if self.error is not None:
+            raise self.error
+        return [(False, 0.25)] * len(frames)
+
+
+def make_worker(**models):
+    # conftest's model directories are empty, so the real registries load nothing
+    worker = InferenceWorker()
+    worker.close()
+    worker.registries = {kind: FakeRegistry(model) for kind, model in models.items()}
+    return worker
+
+
+def frames(n=2):
+    return np.zeros((n, 8, 8, 3), dtype=np.uint8)
+
+
+def test_successful_calls_are_served():
+    worker = make_worker(sbi=FakeModel())
+    assert worker.infer("sbi", frames()) == {"version": "v1", "predictions": [[False, 0.25]] * 2}
+    health = worker.health()
+    assert (health["served"], health["failed"], health["in_flight"]) == (1, 0, 0)
+
+
+def test_failed_calls_are_counted_apart_from_served():
+    worker = make_worker(sbi=FakeModel(RuntimeError("out of memory")), distildire=None)
+    with pytest.raises(RuntimeError):
+        worker.infer("sbi", frames())
+    with pytest.raises(ModelNotLoaded):
+        worker.infer("distildire", frames())
+    with pytest.raises(ModelNotLoaded):
+        worker.infer("chatgpt", frames())  # not a worker model: never reaches a slot
+    health = worker.health()
+    assert (health["served"], health["failed"], health["in_flight"]) == (0, 2, 0)
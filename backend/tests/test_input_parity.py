@@ -0,0 +1,100 @@
+import io
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from app.models import distildire_model, sbi_model
+from app.models.preprocessing import (
+    fill_input_tensor, fold_input_normalization, frames_to_input, load_resized, load_resized_pixels, to_input_tensor,
+)
+
+# (module, stand-in for its stem conv): EfficientNet-B4's padded 3x3/2 conv
+# and ConvNeXt's 4x4/4 patchify conv
+MODELS = {
+    "sbi": (sbi_model, lambda: torch.nn.Conv2d(3, 8, 3, stride=2, padding=1, bias=False)),
+    "distildire": (distildire_model, lambda: torch.nn.Conv2d(3, 8, 4, stride=4)),
+}
+
+
+def random_images(seed=0):
+    rng = np.random.default_rng(seed)
+    images = []
+    for width, height, mode, fmt in [(640, 480, "RGB", "JPEG"), (97, 203, "RGB", "PNG"), (300, 300, "RGBA", "PNG"), (1200, 90, "L", "PNG")]:
+        pixels = rng.integers(0, 256, size=(height, width, len(mode)), dtype=np.uint8)
+        buffer = io.BytesIO()
+        Image.fromarray(pixels.squeeze(-1) if mode == "L" else pixels, mode).save(buffer, format=fmt)
+        images.append(buffer.getvalue())
+    return images
+
+
+def reference(module, image):
+    return to_input_tensor(image, module.build_transform())
+
+
+def one_level(module):
+    """Largest input difference one 8-bit intensity level can make"""
+    std = min(module.NORMALIZE[1]) if module.NORMALIZE else 1.0
+    return 1 / 255 / std
+
+
+@pytest.fixture(params=sorted(MODELS))
+def model(request):
+    torch.manual_seed(0)
+    return MODELS[request.param]
+
+
+def test_fill_input_tensor_matches_transform(model):
+    module, _ = model
+    size = module.INPUT_SIZE
+    for image in random_images():
+        out = torch.empty(1, 3, size, size)
+        fast = fill_input_tensor(load_resized(image, size), out, *(module.NORMALIZE or ()))
+        assert fast is out
+        torch.testing.assert_close(fast, reference(module, image), rtol=0, atol=1e-5)
+
+
+def test_frames_to_input_matches_transform(model):
+    module, _ = model
+    size = module.INPUT_SIZE
+    for image in random_images():
+        expected = reference(module, image)
+        # Frames resized once at decode match exactly
+        frame = torch.from_numpy(load_resized_pixels(image, [size])[size]).unsqueeze(0)
+        torch.testing.assert_close(frames_to_input(frame, size, *(module.NORMALIZE or ())), expected, rtol=0, atol=1e-5)
+        # Full-size frames go through torch's resize: within one level
+        full = np.array(Image.open(io.BytesIO(image)).convert("RGB"))
+        resized = frames_to_input(torch.from_numpy(full).unsqueeze(0), size, *(module.NORMALIZE or ()))
+        assert resized.shape == expected.shape
+        assert (resized - expected).abs().max().item() <= one_level(module) + 1e-5
+
+
+def test_frames_to_input_uint8_matches_resized_pixels(model):
+    module, _ = model
+    size = module.INPUT_SIZE
+    image = random_images()[0]
+    pixels = load_resized_pixels(image, [size])[size]
+    out = frames_to_input(torch.from_numpy(pixels).unsqueeze(0), size, *(module.NORMALIZE or ()), dtype=torch.uint8)
+    assert out.dtype == torch.uint8
+    assert torch.equal(out[0], torch.from_numpy(pixels).permute(2, 0, 1))
+
+
+def test_folded_conv_on_raw_pixels_matches_transform(model):
+    module, make_conv = model
+    size = module.INPUT_SIZE
+    conv = make_conv()
+    folded = make_conv()
+    folded.load_state_dict(conv.state_dict())
+    fold_input_normalization(folded, *(module.NORMALIZE or ()))
+    with torch.no_grad():
+        for image in random_images():
+            expected = conv(reference(module, image))
+            raw = fill_input_tensor(load_resized(image, size), torch.empty(1, 3, size, size, dtype=torch.uint8))
+            actual = folded(raw.float())
+            assert ((actual - expected).abs().max() / expected.abs().max()).item() < 1e-4
+
+
+def test_fold_rejects_a_mean_on_a_padded_conv():
+    with pytest.raises(ValueError):
+        fold_input_normalization(torch.nn.Conv2d(3, 8, 3, padding=1), *distildire_model.NORMALIZE)
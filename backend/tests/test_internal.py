@@ -0,0 +1,70 @@
+import asyncio
+
+import numpy as np
+import pytest
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.testclient import TestClient
+
+from app.api.v1.endpoints import internal
+from app.core.config import settings
+from app.core.tensor_codec import encode_frames
+
+TOKEN = "internal-test-token"
+URL = "/api/v1/internal/detect/raw?models=sbi"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "INTERNAL_API_TOKEN", TOKEN)
+    monkeypatch.setattr(settings, "INTERNAL_MAX_BODY_MB", 1)
+    app = FastAPI()
+    app.include_router(internal.router, prefix="/api/v1")
+    with TestClient(app) as client:
+        yield client
+
+
+def post(client, body, **headers):
+    return client.post(URL, content=body, headers={"x-internal-token": TOKEN, **headers})
+
+
+def frames(n=1, side=16):
+    return encode_frames(np.zeros((n, side, side, 3), dtype=np.uint8))
+
+
+def test_frames_are_scored(client):
+    response = post(client, frames(2))
+    assert response.status_code == 200
+    assert [frame["models"]["sbi"]["status"] for frame in response.json()["frames"]] == ["placeholder"] * 2
+
+
+@pytest.mark.parametrize("value", ["abc", "-1", "1e3", "1_000", "12, 12", ""])
+def test_malformed_content_length_is_a_bad_request(client, value):
+    assert post(client, frames(), **{"content-length": value}).status_code == 400
+
+
+def test_declared_oversized_body_is_refused(client):
+    assert post(client, frames(), **{"content-length": str(2 * 1024 * 1024)}).status_code == 413
+
+
+def test_chunked_body_is_capped_while_reading(client):
+    def chunks():
+        for _ in range(3):
+            yield b"\0" * (512 * 1024)
+
+    assert post(client, chunks()).status_code == 413
+
+
+def test_chunked_body_within_the_cap_is_accepted(client):
+    body = frames()
+    assert post(client, iter([body[:10], body[10:]])).status_code == 200
+
+
+def test_body_without_a_length_is_refused():
+    # Neither Content-Length nor chunked: the body's size is unknown
+    async def receive():
+        return {"type": "http.request", "body": b"RGB8", "more_body": False}
+
+    request = Request({"type": "http", "method": "POST", "headers": []}, receive)
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(internal.read_capped_body(request, 1))
+    assert error.value.status_code == 411
@@ -0,0 +1,257 @@
+import io
+import threading
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.services.job_queue import JobQueue, JobWorkerPool
+
+
+def make_queue(tmp_path, max_retries=2, lease_seconds=60):
+    return JobQueue(str(tmp_path / "jobs.sqlite3"), max_retries=max_retries, lease_seconds=lease_seconds)
+
+
+def wait_for(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.01)
+
+
+class FlakyHandler:
+    """Fails the first `failures` calls, then returns a result"""
+
+    def __init__(self, failures=1):
+        self.failures = failures
+        self.calls = []
+
+    def __call__(self, payload, **params):
+        self.calls.append((payload, params))
+        if len(self.calls) <= self.failures:
+            raise RuntimeError(f"attempt {len(self.calls)} failed")
+        return {"is_fake": False, "size": len(payload)}
+
+
+def test_claim_is_fifo_and_counts_attempts(tmp_path):
+    queue = make_queue(tmp_path)
+    first = queue.enqueue(b"a", {"models": ["sbi"]})
+    second = queue.enqueue(b"b")
+
+    job_id, payload, params = queue.claim()
+    assert (job_id, payload, params) == (first, b"a", {"models": ["sbi"]})
+    assert queue.get(first)["status"] == "running"
+    assert queue.get(first)["attempts"] == 1
+    assert queue.claim()[0] == second
+    assert queue.claim() is None
+
+
+def test_fail_requeues_until_retries_are_exhausted(tmp_path):
+    queue = make_queue(tmp_path, max_retries=2)
+    job_id = queue.enqueue(b"a")
+
+    for attempt in range(1, 4):
+        assert queue.claim()[0] == job_id
+        queue.fail(job_id, f"boom {attempt}")
+        expected = "queued" if attempt <= 2 else "failed"
+        assert queue.get(job_id)["status"] == expected
+
+    job = queue.get(job_id)
+    assert job["attempts"] == 3
+    assert job["error"] == "boom 3"
+    assert queue.claim() is None
+
+
+def test_complete_stores_result(tmp_path):
+    queue = make_queue(tmp_path)
+    job_id = queue.enqueue(b"a")
+    queue.claim()
+    queue.complete(job_id, {"is_fake": True})
+    assert queue.get(job_id)["status"] == "done"
+    assert queue.get(job_id)["result"] == {"is_fake": True}
+    assert queue.counts() == {"done": 1}
+
+
+def test_requeue_running_requeues_interrupted_jobs(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0)
+    job_id = queue.enqueue(b"a")
+    queue.claim()
+
+    assert queue.requeue_running() == (1, 0)
+    assert queue.get(job_id)["status"] == "queued"
+    assert queue.claim()[0] == job_id
+
+
+def test_job_that_keeps_crashing_the_process_is_failed(tmp_path):
+    # Each loop is a restart that finds the job still "running"
+    queue = make_queue(tmp_path, max_retries=2, lease_seconds=0)
+    job_id = queue.enqueue(b"poison")
+
+    restarts = 0
+    while queue.claim() is not None:
+        queue.requeue_running()
+        restarts += 1
+        assert restarts <= 3, "job kept coming back after its retry limit"
+
+    job = queue.get(job_id)
+    assert job["status"] == "failed"
+    assert job["attempts"] == 3
+    assert "restart" in job["error"]
+
+
+def test_purge_finished_keeps_recent_and_unfinished_jobs(tmp_path):
+    queue = make_queue(tmp_path)
+    done = queue.enqueue(b"a")
+    queue.enqueue(b"b")
+    queue.claim()
+    queue.complete(done, {})
+
+    assert queue.purge_finished(retention_seconds=3600) == 0
+    assert queue.purge_finished(retention_seconds=-1) == 1
+    assert queue.get(done) is None
+    assert queue.counts() == {"queued": 1}
+
+
+def test_requeue_running_leaves_jobs_with_a_live_lease(tmp_path):
+    # Another worker process is still running it
+    queue = make_queue(tmp_path, lease_seconds=60)
+    job_id = queue.enqueue(b"a")
+    queue.claim()
+    assert queue.requeue_running() == (0, 0)
+    assert queue.get(job_id)["status"] == "running"
+
+
+def test_heartbeat_renews_the_lease(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.3)
+    job_id = queue.enqueue(b"a")
+    queue.claim()
+    for _ in range(3):
+        time.sleep(0.15)
+        queue.heartbeat([job_id])
+        assert queue.requeue_running() == (0, 0)
+    time.sleep(0.35)
+    assert queue.requeue_running() == (1, 0)
+    assert queue.get(job_id)["status"] == "queued"
+
+
+def test_worker_pool_retries_a_failed_job_until_it_succeeds(tmp_path):
+    queue = make_queue(tmp_path, max_retries=2)
+    handler = FlakyHandler(failures=1)
+    pool = JobWorkerPool(queue, handler, workers=1, poll_interval=0.01)
+    job_id = queue.enqueue(b"img", {"models": ["sbi"]})
+    pool.start()
+    try:
+        wait_for(lambda: queue.get(job_id)["status"] == "done")
+    finally:
+        pool.stop()
+    job = queue.get(job_id)
+    assert job["attempts"] == 2
+    assert job["result"] == {"is_fake": False, "size": 3}
+    assert job["error"] is None
+    assert handler.calls == [(b"img", {"models": ["sbi"]})] * 2
+
+
+def test_worker_pool_fails_a_job_past_the_retry_limit(tmp_path):
+    queue = make_queue(tmp_path, max_retries=1)
+    pool = JobWorkerPool(queue, FlakyHandler(failures=10), workers=2, poll_interval=0.01)
+    job_id = queue.enqueue(b"img")
+    pool.start()
+    try:
+        wait_for(lambda: queue.get(job_id)["status"] == "failed")
+    finally:
+        pool.stop()
+    job = queue.get(job_id)
+    assert job["attempts"] == 2
+    assert job["error"] == "RuntimeError: attempt 2 failed"
+
+
+def test_worker_pool_start_leaves_jobs_of_live_workers(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=60)
+    other = queue.enqueue(b"other process")
+    queue.claim()
+    pool = JobWorkerPool(queue, FlakyHandler(failures=0), workers=1, poll_interval=0.01)
+    pool.start()
+    try:
+        time.sleep(0.1)
+        assert queue.get(other)["status"] == "running"
+    finally:
+        pool.stop()
+
+
+def test_worker_pool_heartbeats_jobs_in_flight(tmp_path):
+    queue = make_queue(tmp_path, lease_seconds=0.3)
+    release = threading.Event()
+
+    def slow(payload, **params):
+        release.wait(5)
+        return {}
+
+    pool = JobWorkerPool(queue, slow, workers=1, poll_interval=0.01)
+    job_id = queue.enqueue(b"img")
+    pool.start()
+    try:
+        wait_for(lambda: queue.get(job_id)["status"] == "running")
+        time.sleep(0.6)  # two leases: only the heartbeat keeps it claimed
+        assert queue.requeue_running() == (0, 0)
+        release.set()
+        wait_for(lambda: queue.get(job_id)["status"] == "done")
+    finally:
+        release.set()
+        pool.stop()
+    assert queue.get(job_id)["attempts"] == 1
+
+
+@pytest.fixture
+def jobs_api(tmp_path, monkeypatch):
+    from app.api.v1.endpoints import jobs
+
+    queue = make_queue(tmp_path, max_retries=2)
+    handler = FlakyHandler(failures=1)
+    monkeypatch.setattr(jobs, "job_queue", queue)
+    app = FastAPI()
+    app.include_router(jobs.router, prefix="/api/v1")
+    pool = JobWorkerPool(queue, handler, workers=1, poll_interval=0.01)
+    with TestClient(app) as client:
+        yield client, queue, pool, handler
+    pool.stop()
+
+
+def png() -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (8, 8)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_jobs_endpoint_status_transitions(jobs_api):
+    client, queue, pool, handler = jobs_api
+    response = client.post("/api/v1/jobs?models=distildire,sbi", files={"file": ("a.png", png(), "image/png")})
+    assert response.status_code == 202
+    job_id = response.json()["id"]
+    assert response.json()["status"] == "queued"
+    assert client.get(f"/api/v1/jobs/{job_id}").json()["status"] == "queued"
+
+    # Claimed by a worker that hasn't finished yet
+    queue.claim()
+    assert client.get(f"/api/v1/jobs/{job_id}").json()["status"] == "running"
+    queue.fail(job_id, "RuntimeError: worker crashed")
+    job = client.get(f"/api/v1/jobs/{job_id}").json()
+    assert (job["status"], job["attempts"], job["error"]) == ("queued", 1, "RuntimeError: worker crashed")
+
+    # The pool fails it once more, then succeeds on the last attempt
+    pool.start()
+    wait_for(lambda: client.get(f"/api/v1/jobs/{job_id}").json()["status"] == "done")
+    job = client.get(f"/api/v1/jobs/{job_id}").json()
+    assert job["attempts"] == 3
+    assert job["result"]["is_fake"] is False
+    assert handler.calls[0][1] == {"models": ["sbi", "distildire"]}
+
+
+def test_jobs_endpoint_rejects_bad_requests(jobs_api):
+    client, *_ = jobs_api
+    assert client.get("/api/v1/jobs/missing").status_code == 404
+    response = client.post("/api/v1/jobs?models=sbi,bogus", files={"file": ("a.png", png(), "image/png")})
+    assert response.status_code == 400
+    response = client.post("/api/v1/jobs", files={"file": ("a.txt", b"hello", "text/plain")})
+    assert response.status_code == 400
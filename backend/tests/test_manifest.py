@@ -0,0 +1,96 @@
+import os
+
+import pytest
+
+import manifest
+
+PATTERN = "data/DS/method_*/videos/*/*/*.mp4"
+
+
+def write(path, content=b"video"):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "wb") as f:
+        f.write(content)
+
+
+@pytest.fixture
+def tree(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(manifest, "MANIFEST_DIR", "data/.manifests")
+    write("data/DS/method_a/videos/p1/c1/one.mp4")
+    write("data/DS/method_a/videos/p1/c2/two.mp4")
+
+    builds = []
+
+    def builder():
+        paths, dirs = manifest.glob_tracked(PATTERN)
+        paths = sorted(paths)
+        builds.append(paths)
+        return paths, [1] * len(paths), dirs
+
+    def load():
+        return manifest.load_manifest("DS", "test", builder)[0]
+
+    return load, builds
+
+
+def test_unchanged_tree_is_served_from_the_manifest(tree):
+    load, builds = tree
+    assert load() == load()
+    assert len(builds) == 1
+
+
+def test_glob_tracked_lists_every_walked_directory(tree):
+    _, dirs = manifest.glob_tracked(PATTERN)
+    assert sorted(dirs) == [
+        "data/DS", "data/DS/method_a", "data/DS/method_a/videos",
+        "data/DS/method_a/videos/p1", "data/DS/method_a/videos/p1/c1", "data/DS/method_a/videos/p1/c2",
+    ]
+
+
+@pytest.mark.parametrize("change", [
+    lambda: write("data/DS/method_a/videos/p2/c1/three.mp4"),  # new intermediate directory
+    lambda: write("data/DS/method_b/videos/p1/c1/four.mp4"),  # new method directory
+    lambda: write("data/DS/method_a/videos/p1/c3/five.mp4"),  # new leaf directory
+    lambda: os.remove("data/DS/method_a/videos/p1/c2/two.mp4"),
+])
+def test_tree_changes_rebuild(tree, change):
+    load, builds = tree
+    before = load()
+    change()
+    after = load()
+    assert len(builds) == 2 and after != before
+
+
+def rewrite_in_place():
+    # New content, but the directory's mtime is left as it was
+    directory = "data/DS/method_a/videos/p1/c1"
+    stamp = os.stat(directory).st_mtime_ns
+    write(f"{directory}/one.mp4", b"a longer video")
+    os.utime(directory, ns=(stamp, stamp))
+
+
+def test_video_rewritten_in_place_rebuilds_with_verify(tree, monkeypatch):
+    load, builds = tree
+    load()
+    rewrite_in_place()
+    monkeypatch.setattr(manifest, "VERIFY", True)
+    load()
+    assert len(builds) == 2
+
+
+def test_entries_are_not_stat_ed_without_verify(tree, monkeypatch):
+    load, builds = tree
+    load()
+    rewrite_in_place()
+    monkeypatch.setattr(manifest, "_stat", lambda path: pytest.fail("entry was stat-ed"))
+    load()
+    assert len(builds) == 1
+
+
+def test_refresh_rebuilds(tree, monkeypatch):
+    load, builds = tree
+    load()
+    monkeypatch.setattr(manifest, "FORCE_REFRESH", True)
+    load()
+    assert len(builds) == 2
@@ -0,0 +1,76 @@
+import threading
+import time
+
+from app.services.memory_budget import PixelBudget, StageMemory
+
+
+def run_in_thread(target):
+    thread = threading.Thread(target=target, daemon=True)
+    thread.start()
+    return thread
+
+
+def test_images_that_fit_share_the_budget():
+    budget = PixelBudget(100)
+    with budget.acquire(40), budget.acquire(60):
+        assert budget.stats()["in_use"] == 100
+    assert budget.stats() == {"max_pixels": 100, "in_use": 0, "peak_in_use": 100, "waits": 0}
+
+
+def test_image_that_does_not_fit_waits_for_a_release():
+    budget = PixelBudget(100)
+    entered = threading.Event()
+
+    def second():
+        with budget.acquire(70):
+            entered.set()
+
+    with budget.acquire(50):
+        thread = run_in_thread(second)
+        assert not entered.wait(0.2)
+    assert entered.wait(2)
+    thread.join(2)
+    assert budget.stats()["waits"] == 1
+
+
+def test_oversized_image_runs_alone():
+    budget = PixelBudget(100)
+    with budget.acquire(500):
+        assert budget.stats()["in_use"] == 100  # capped at the whole budget
+        blocked = threading.Event()
+
+        def small():
+            with budget.acquire(1):
+                blocked.set()
+
+        thread = run_in_thread(small)
+        assert not blocked.wait(0.2)
+    thread.join(2)
+    assert blocked.is_set()
+
+
+def test_unlimited_budget_never_waits():
+    budget = PixelBudget(0)
+    with budget.acquire(10**9), budget.acquire(10**9):
+        pass
+    assert budget.stats()["waits"] == 0
+
+
+def test_release_on_error():
+    budget = PixelBudget(100)
+    try:
+        with budget.acquire(80):
+            raise RuntimeError
+    except RuntimeError:
+        pass
+    assert budget.stats()["in_use"] == 0
+
+
+def test_stage_memory_counts_calls():
+    memory = StageMemory()
+    for _ in range(3):
+        with memory.stage("sbi"):
+            time.sleep(0)
+    stats = memory.stats()
+    assert stats["stages"]["sbi"]["calls"] == 3
+    assert stats["rss_mb"] > 0
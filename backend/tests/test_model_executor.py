@@ -0,0 +1,143 @@
+import queue
+import threading
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import model_executor
+from app.services.model_executor import PartitionedModel, executor_plan
+
+MODEL_PATHS = {"sbi": "models/sbi", "distildire": "models/distildire"}
+
+
+def make_settings(**overrides):
+    values = {"EXECUTOR_AUTOTUNE": False}
+    for kind in ("SBI", "DISTILDIRE"):
+        values.update({f"{kind}_CORES": "", f"{kind}_THREADS": 0, f"{kind}_REPLICAS": 1})
+    values.update(overrides)
+    return SimpleNamespace(**values)
+
+
+@pytest.fixture
+def eight_cores(monkeypatch):
+    monkeypatch.setattr(model_executor, "available_cores", lambda: list(range(8)))
+
+
+def all_cores(plan):
+    return [core for layout in plan.values() for core in layout["cores"]]
+
+
+def test_plan_splits_cores_evenly(eight_cores):
+    plan = executor_plan(make_settings(SBI_REPLICAS=2), MODEL_PATHS)
+    assert plan == {
+        "sbi": {"cores": [0, 1, 2, 3], "threads": None, "replicas": 2},
+        "distildire": {"cores": [4, 5, 6, 7], "threads": None, "replicas": 1},
+    }
+
+
+@pytest.mark.parametrize("configured, spec, expected_other", [
+    ("sbi", "0-5", [6, 7]),
+    ("sbi", "2-4,7", [0, 1, 5, 6]),
+    ("distildire", "0,1", [2, 3, 4, 5, 6, 7]),
+])
+def test_plan_gives_the_other_model_the_remaining_cores(eight_cores, configured, spec, expected_other):
+    other = next(kind for kind in MODEL_PATHS if kind != configured)
+    plan = executor_plan(make_settings(**{f"{configured.upper()}_CORES": spec}), MODEL_PATHS)
+    assert plan[other]["cores"] == expected_other
+    assert len(all_cores(plan)) == len(set(all_cores(plan)))
+
+
+def test_plan_keeps_configured_cores_for_a_model_that_loads_later(eight_cores):
+    # Only SBI has a checkpoint at startup, DistilDIRE's cores stay free
+    plan = executor_plan(make_settings(DISTILDIRE_CORES="4-7"), {"sbi": MODEL_PATHS["sbi"]})
+    assert plan["sbi"]["cores"] == [0, 1, 2, 3]
+
+
+def test_plan_for_a_late_model_avoids_reserved_cores(eight_cores):
+    plan = executor_plan(make_settings(), {"sbi": MODEL_PATHS["sbi"]})
+    assert plan["sbi"]["cores"] == list(range(8))
+    late = executor_plan(make_settings(), {"distildire": MODEL_PATHS["distildire"]}, reserved=[0, 1, 2, 3, 4, 5])
+    assert late["distildire"]["cores"] == [6, 7]
+
+
+def test_plan_shares_all_cores_when_none_are_left(eight_cores):
+    plan = executor_plan(make_settings(SBI_CORES="0-7"), MODEL_PATHS)
+    assert plan["distildire"]["cores"] == list(range(8))
+
+
+class FakeReplica:
+    def __init__(self, name, fail_with=None, restart_error=None):
+        self.name = name
+        self.fail_with = fail_with
+        self.restart_error = restart_error
+        self.starts = self.stops = 0
+
+    def run(self, tensor, **options):
+        if self.fail_with is not None:
+            error, self.fail_with = self.fail_with, None
+            raise error
+        return False, 0.1
+
+    def start(self):
+        self.starts += 1
+        if self.restart_error is not None:
+            raise self.restart_error
+
+    def stop(self):
+        self.stops += 1
+
+
+def make_model(*replicas):
+    # PartitionedModel's dispatch state, without spawning workers
+    model = PartitionedModel.__new__(PartitionedModel)
+    model.kind = "sbi"
+    model._replicas = list(replicas)
+    model._idle = queue.Queue()
+    model._lock = threading.Lock()
+    for replica in replicas:
+        model._idle.put(replica)
+    return model
+
+
+def test_crashed_replica_is_restarted_and_reused():
+    replica = FakeReplica("sbi-worker-0", fail_with=EOFError())
+    model = make_model(replica)
+    with pytest.raises(EOFError):
+        model.predict_tensor(None)
+    assert (replica.stops, replica.starts) == (1, 1)
+    assert model.replicas == 1
+    assert model.predict_tensor(None) == (False, 0.1)
+
+
+def test_replica_that_fails_to_restart_is_dropped():
+    dead = FakeReplica("sbi-worker-0", fail_with=BrokenPipeError(), restart_error=TimeoutError("no start"))
+    healthy = FakeReplica("sbi-worker-1")
+    model = make_model(dead, healthy)
+    with pytest.raises(BrokenPipeError):
+        model.predict_tensor(None)
+    assert model.replicas == 1
+    # Only the healthy replica serves from now on
+    for _ in range(3):
+        assert model.predict_tensor(None) == (False, 0.1)
+    assert model._idle.qsize() == 1
+    assert model._idle.get_nowait() is healthy
+
+
+def test_requests_fail_fast_once_every_replica_is_dropped():
+    dead = FakeReplica("sbi-worker-0", fail_with=ConnectionResetError(), restart_error=RuntimeError("bad weights"))
+    model = make_model(dead)
+    with pytest.raises(ConnectionResetError):
+        model.predict_tensor(None)
+    assert model.replicas == 0
+    for _ in range(2):
+        with pytest.raises(RuntimeError, match="No healthy sbi replicas"):
+            model.predict_tensor(None)
+
+
+def test_model_errors_keep_the_replica():
+    replica = FakeReplica("sbi-worker-0", fail_with=RuntimeError("bad input"))
+    model = make_model(replica)
+    with pytest.raises(RuntimeError):
+        model.predict_tensor(None)
+    assert (replica.stops, replica.starts) == (0, 0)
+    assert model._idle.get_nowait() is replica
@@ -0,0 +1,186 @@
+import os
+import threading
+import time
+
+from app.services.model_registry import ModelRegistry, checkpoint_version, latest_checkpoint
+
+CHECKPOINT = "exp003_best_model.pth"
+
+
+class StubModel:
+    """Loaded from a checkpoint whose bytes say how it behaves"""
+
+    def __init__(self, weights: bytes):
+        self.weights = weights
+        self.closed = False
+
+    def preprocess(self, image_bytes):
+        return image_bytes
+
+    def predict_tensor(self, tensor):
+        if self.weights == b"nan":
+            raise RuntimeError("warm-up produced NaN")
+        return False, 0.1
+
+    def close(self):
+        self.closed = True
+
+
+def stub_loader(loaded):
+    def load(model_dir, name):
+        with open(os.path.join(model_dir, name), "rb") as f:
+            weights = f.read()
+        if weights == b"corrupt":
+            raise RuntimeError("invalid load key")
+        model = StubModel(weights)
+        loaded.append(model)
+        return model
+    return load
+
+
+def write_checkpoint(model_dir, name, weights, age=0):
+    # Explicit mtimes: newer files must win even on coarse filesystem clocks
+    path = os.path.join(model_dir, name)
+    with open(path, "wb") as f:
+        f.write(weights)
+    mtime = time.time() - 100 + age
+    os.utime(path, (mtime, mtime))
+    return path
+
+
+def make_registry(tmp_path, poll_interval=0):
+    loaded = []
+    registry = ModelRegistry("sbi", str(tmp_path), CHECKPOINT, loader=stub_loader(loaded), poll_interval=poll_interval)
+    return registry, loaded
+
+
+def test_latest_checkpoint_picks_the_newest_versioned_copy(tmp_path):
+    write_checkpoint(tmp_path, CHECKPOINT, b"v1", age=0)
+    newest = write_checkpoint(tmp_path, "exp003_best_model_v2.pth", b"v2", age=10)
+    write_checkpoint(tmp_path, "other_model.pth", b"x", age=20)
+    path, (name, size, _) = latest_checkpoint(str(tmp_path), CHECKPOINT)
+    assert (path, name, size) == (newest, "exp003_best_model_v2.pth", 2)
+    assert latest_checkpoint(str(tmp_path / "missing"), CHECKPOINT) is None
+
+
+def test_version_follows_content_not_mtime(tmp_path):
+    path = write_checkpoint(tmp_path, CHECKPOINT, b"v1")
+    version = checkpoint_version(path)
+    assert version.startswith(f"{CHECKPOINT}@")
+    write_checkpoint(tmp_path, CHECKPOINT, b"v1", age=5)
+    assert checkpoint_version(path) == version
+
+
+def test_empty_directory_serves_placeholder(tmp_path):
+    registry, _ = make_registry(tmp_path)
+    assert not registry.load()
+    with registry.acquire() as (model, version):
+        assert (model, version) == (None, None)
+
+
+def test_swap_while_requests_are_in_flight(tmp_path):
+    registry, loaded = make_registry(tmp_path)
+    write_checkpoint(tmp_path, CHECKPOINT, b"v1")
+    assert registry.load()
+    old_version = registry.version
+
+    with registry.acquire() as (old, version):
+        assert version == old_version
+        write_checkpoint(tmp_path, "exp003_best_model_v2.pth", b"v2", age=10)
+        assert registry.load()
+        # New requests get the new model while this one keeps the old
+        with registry.acquire() as (new, new_version):
+            assert new.weights == b"v2"
+            assert new_version.startswith("exp003_best_model_v2.pth@")
+        assert old.weights == b"v1"
+        assert not old.closed  # still in use
+    assert old.closed
+    assert not loaded[1].closed
+
+
+def test_old_model_closes_after_the_last_of_several_requests(tmp_path):
+    registry, loaded = make_registry(tmp_path)
+    write_checkpoint(tmp_path, CHECKPOINT, b"v1")
+    registry.load()
+    holding = threading.Barrier(4)
+    release = threading.Event()
+
+    def request():
+        with registry.acquire():
+            holding.wait(5)
+            release.wait(5)
+
+    threads = [threading.Thread(target=request, daemon=True) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    holding.wait(5)
+    write_checkpoint(tmp_path, "exp003_best_model_v2.pth", b"v2", age=10)
+    registry.load()
+    assert not loaded[0].closed
+    release.set()
+    for thread in threads:
+        thread.join(5)
+    assert loaded[0].closed
+    assert registry.version.startswith("exp003_best_model_v2.pth@")
+
+
+def test_idle_old_model_closes_on_swap(tmp_path):
+    registry, loaded = make_registry(tmp_path)
+    write_checkpoint(tmp_path, CHECKPOINT, b"v1")
+    registry.load()
+    write_checkpoint(tmp_path, "exp003_best_model_v2.pth", b"v2", age=10)
+    registry.load()
+    assert loaded[0].closed
+    registry.stop()
+    assert loaded[1].closed
+    assert not registry.available
+
+
+def test_bad_checkpoint_keeps_the_previous_model(tmp_path):
+    registry, loaded = make_registry(tmp_path)
+    write_checkpoint(tmp_path, CHECKPOINT, b"v1")
+    registry.load()
+    good_version = registry.version
+
+    # Fails to load
+    write_checkpoint(tmp_path, "exp003_best_model_v2.pth", b"corrupt", age=10)
+    assert not registry.load()
+    assert registry.version == good_version
+    # Loads but fails warm-up: closed, never served
+    write_checkpoint(tmp_path, "exp003_best_model_v3.pth", b"nan", age=20)
+    assert not registry.load()
+    assert registry.version == good_version
+    assert loaded[-1].weights == b"nan" and loaded[-1].closed
+    assert not loaded[0].closed
+
+    # Skipped until the file changes, then retried
+    assert not registry.load()
+    assert len(loaded) == 2
+    write_checkpoint(tmp_path, "exp003_best_model_v3.pth", b"v3", age=30)
+    assert registry.load()
+    assert registry.version.startswith("exp003_best_model_v3.pth@")
+
+
+def test_touched_checkpoint_is_not_reloaded(tmp_path):
+    registry, loaded = make_registry(tmp_path)
+    write_checkpoint(tmp_path, CHECKPOINT, b"v1")
+    registry.load()
+    write_checkpoint(tmp_path, CHECKPOINT, b"v1", age=10)
+    assert not registry.load()
+    assert len(loaded) == 1
+
+
+def test_watcher_swaps_in_a_new_checkpoint(tmp_path):
+    registry, loaded = make_registry(tmp_path, poll_interval=0.02)
+    write_checkpoint(tmp_path, CHECKPOINT, b"v1")
+    registry.load()
+    registry.start()
+    try:
+        write_checkpoint(tmp_path, "exp003_best_model_v2.pth", b"v2", age=10)
+        deadline = time.monotonic() + 5
+        while not registry.version.startswith("exp003_best_model_v2.pth@"):
+            assert time.monotonic() < deadline, "checkpoint was not picked up"
+            time.sleep(0.01)
+    finally:
+        registry.stop()
+    assert [model.closed for model in loaded] == [True, True]
@@ -0,0 +1,79 @@
+import io
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from app.api.v1.endpoints import detection
+from app.core.model_catalog import parse_model_selection
+
+
+@pytest.mark.parametrize("value, expected", [
+    (None, None),
+    ("", None),
+    ("  ", None),
+    ("all", None),
+    ("sbi", ("sbi",)),
+    ("DistilDIRE, sbi", ("sbi", "distildire")),  # canonical order, case-insensitive
+    ("sbi,sbi,SBI", ("sbi",)),
+    ("chatgpt,,sbi,", ("sbi", "chatgpt")),
+])
+def test_parse_model_selection(value, expected):
+    assert parse_model_selection(value) == expected
+
+
+@pytest.mark.parametrize("value, message", [
+    ("bogus", "Unknown model(s): bogus"),
+    ("sbi,gpt4,resnet", "Unknown model(s): gpt4, resnet"),
+    (",", "At least one model must be selected"),
+    (" , ,", "At least one model must be selected"),
+])
+def test_parse_model_selection_rejects(value, message):
+    with pytest.raises(ValueError, match=message.replace("(", r"\(").replace(")", r"\)")):
+        parse_model_selection(value)
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(detection.router, prefix="/api/v1")
+    with TestClient(app) as client:
+        yield client
+
+
+def detect(client, models=None):
+    buffer = io.BytesIO()
+    Image.new("RGB", (32, 32)).save(buffer, format="PNG")
+    params = {} if models is None else {"models": models}
+    return client.post("/api/v1/detect", params=params, files={"file": ("a.png", buffer.getvalue(), "image/png")})
+
+
+@pytest.mark.parametrize("models", ["bogus", "sbi,bogus", ","])
+def test_detect_rejects_bad_selections_with_400(client, models):
+    response = detect(client, models)
+    assert response.status_code == 400
+    assert "model" in response.json()["detail"]
+
+
+def test_unselected_models_are_skipped(client):
+    response = detect(client, "sbi,sbi")
+    assert response.status_code == 200
+    result = response.json()
+    assert result["models"]["sbi"]["status"] == "placeholder"  # no checkpoint in tests
+    for name in ("distildire", "chatgpt"):
+        assert result["models"][name] == {"is_fake": False, "confidence": None, "status": "skipped", "version": None}
+    assert result["is_fake"] is False
+
+
+def test_detect_passes_the_canonical_selection_to_the_service(client, monkeypatch):
+    seen = []
+
+    def detect_service(image_bytes, models=None, **kwargs):
+        seen.append(models)
+        return {"is_fake": False, "tier": "full", "models": {}}
+
+    monkeypatch.setattr(detection.detection_service, "detect", detect_service)
+    assert detect(client, "distildire,sbi").status_code == 200
+    assert detect(client, "").status_code == 200
+    assert seen == [("sbi", "distildire"), None]
@@ -0,0 +1,119 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from preprocess import extract_faces_at, prefetch
+
+
+class FakeCapture:
+    def __init__(self, frame):
+        self.frame = frame
+
+    def set(self, prop, value):
+        pass
+
+    def read(self):
+        return True, self.frame
+
+
+class FakeDetector:
+    def __init__(self, faces):
+        self.faces = faces
+
+    def predict_jsons(self, frame):
+        return self.faces
+
+
+def test_extract_faces_at_skips_retinaface_no_face_sentinel():
+    cap = FakeCapture(np.zeros((64, 64, 3), dtype=np.uint8))
+    assert extract_faces_at(cap, 0, FakeDetector([{"bbox": [], "score": -1}])) == []
+
+
+def test_extract_faces_at_crops_detected_faces():
+    cap = FakeCapture(np.zeros((64, 64, 3), dtype=np.uint8))
+    faces = extract_faces_at(cap, 0, FakeDetector([{"bbox": [10, 10, 40, 40], "score": 0.99}]), image_size=(32, 32))
+    assert len(faces) == 1 and faces[0].shape == (3, 32, 32)
+
+
+class Source:
+    # generator-backed iterator that records how far it got and whether it was closed
+    def __init__(self, n, fail_at=None, exc=None):
+        self.produced = []
+        self.closed = threading.Event()
+        self.thread = None
+        self.gen = self._run(n, fail_at, exc)
+
+    def _run(self, n, fail_at, exc):
+        self.thread = threading.current_thread()
+        try:
+            for i in range(n):
+                if i == fail_at:
+                    raise exc
+                self.produced.append(i)
+                yield i
+        finally:
+            self.closed.set()
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.gen)
+
+    def close(self):
+        self.gen.close()
+
+
+def test_prefetch_yields_every_item_in_order_from_another_thread():
+    source = Source(50)
+    assert list(prefetch(source, depth=3)) == list(range(50))
+    assert source.thread is not threading.current_thread()
+    assert source.closed.is_set()
+
+
+def test_prefetch_reraises_the_producer_exception_after_earlier_items():
+    error = ValueError("corrupt frame")
+    source = Source(10, fail_at=4, exc=error)
+    received = []
+    with pytest.raises(ValueError) as raised:
+        for item in prefetch(source):
+            received.append(item)
+    assert raised.value is error
+    assert received == [0, 1, 2, 3]
+
+
+def test_prefetch_propagates_base_exceptions():
+    source = Source(10, fail_at=0, exc=KeyboardInterrupt())
+    with pytest.raises(KeyboardInterrupt):
+        list(prefetch(source))
+
+
+def test_prefetch_stays_at_most_depth_items_ahead():
+    source = Source(100)
+    items = prefetch(source, depth=2)
+    assert next(items) == 0
+    time.sleep(0.2)
+    # one item handed out, two queued and one held by the blocked put
+    assert len(source.produced) <= 4
+    items.close()
+
+
+def test_leaving_early_stops_and_closes_the_producer():
+    source = Source(1000)
+    for item in prefetch(source, depth=2):
+        if item == 3:
+            break
+    assert source.closed.wait(1)
+    assert len(source.produced) < 10
+
+
+def test_consumer_exception_stops_the_producer():
+    source = Source(1000)
+    with pytest.raises(RuntimeError):
+        for item in prefetch(source, depth=2):
+            if item == 2:
+                raise RuntimeError("inference failed")
+    assert source.closed.wait(1)
+    assert not source.thread.is_alive()
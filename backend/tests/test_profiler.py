@@ -0,0 +1,124 @@
+import io
+import json
+import threading
+import zipfile
+
+import pytest
+import torch
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.services import profiler as profiler_module
+from app.services.profiler import Profiler, ProfilerBusy
+
+TOKEN = "admin-test-token"
+
+
+def finished(profiler, session_id):
+    artifact = profiler.artifact(session_id)
+    assert artifact is not None
+    return zipfile.ZipFile(io.BytesIO(artifact))
+
+
+def test_session_ends_after_max_requests():
+    profiler = Profiler(dict, sample_interval=0.001)
+    session_id = profiler.start(max_requests=3, seconds=30)["id"]
+    assert profiler.active
+    for _ in range(3):
+        profiler.request_done()
+    # the sampler thread packs the artifact and clears the running session
+    profiler.stop()
+
+    assert not profiler.active
+    summary = profiler.status()["sessions"][0]
+    assert summary["id"] == session_id and summary["requests"] == 3 and summary["finished"]
+    archive = finished(profiler, session_id)
+    assert {"summary.json", "cpu_stacks.txt", "cpu_top.txt", "torch_ops.txt", "allocations.txt"} <= set(archive.namelist())
+    assert json.loads(archive.read("summary.json"))["requests"] == 3
+
+
+def test_request_done_counts_every_concurrent_request():
+    profiler = Profiler(dict, sample_interval=0.01)
+    profiler.start(max_requests=None, seconds=30)
+    threads = [threading.Thread(target=lambda: [profiler.request_done() for _ in range(2000)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert profiler.stop()["requests"] == 16000
+
+
+def test_request_done_without_a_session_is_a_no_op():
+    profiler = Profiler(dict)
+    profiler.request_done()
+    assert profiler.stop() is None
+    assert profiler.status() == {"active": None, "sessions": []}
+
+
+def test_only_one_session_at_a_time():
+    profiler = Profiler(dict, sample_interval=0.01)
+    session_id = profiler.start(seconds=30)["id"]
+    try:
+        with pytest.raises(ProfilerBusy):
+            profiler.start(seconds=30)
+        with pytest.raises(ProfilerBusy):
+            profiler.artifact(session_id)
+        assert profiler.status()["active"]["id"] == session_id
+    finally:
+        profiler.stop()
+    assert profiler.artifact("unknown") is None
+
+
+def test_model_forwards_are_profiled_then_unwrapped(monkeypatch):
+    monkeypatch.setattr(profiler_module, "PROFILED_FORWARDS", 2)
+    model = torch.nn.Linear(4, 2)
+    profiler = Profiler(lambda: {"sbi": model}, sample_interval=0.01)
+    session_id = profiler.start(seconds=30)["id"]
+    with torch.no_grad():
+        for _ in range(5):
+            model(torch.ones(1, 4))
+    summary = profiler.stop()
+
+    assert "forward" not in model.__dict__
+    assert summary["forwards"] == {"sbi": 2} and summary["unprofiled_forwards"] == 3
+    archive = finished(profiler, session_id)
+    assert "sbi: 2 forwards profiled" in archive.read("torch_ops.txt").decode()
+    assert sorted(n for n in archive.namelist() if n.startswith("torch_trace_")) == ["torch_trace_sbi_1.json", "torch_trace_sbi_2.json"]
+
+
+def test_only_the_last_sessions_are_kept(monkeypatch):
+    monkeypatch.setattr(profiler_module, "KEEP_SESSIONS", 2)
+    profiler = Profiler(dict, sample_interval=0.01)
+    ids = []
+    for _ in range(3):
+        ids.append(profiler.start(seconds=30)["id"])
+        profiler.stop()
+    assert profiler.artifact(ids[0]) is None
+    assert [s["id"] for s in profiler.status()["sessions"]] == ids[:0:-1]
+
+
+@pytest.fixture
+def admin(monkeypatch):
+    from app.api.v1.endpoints import admin
+    from app.core.config import settings
+
+    monkeypatch.setattr(settings, "ADMIN_API_TOKEN", TOKEN)
+    monkeypatch.setattr(admin.detection_service, "profiler", Profiler(dict, sample_interval=0.01))
+    app = FastAPI()
+    app.include_router(admin.router, prefix="/api/v1")
+    with TestClient(app) as client:
+        yield client
+
+
+def test_admin_endpoints_run_a_session(admin):
+    headers = {"x-admin-token": TOKEN}
+    assert admin.post("/api/v1/admin/profile", params={"seconds": 30}).status_code == 401
+    session_id = admin.post("/api/v1/admin/profile", params={"seconds": 30}, headers=headers).json()["id"]
+    assert admin.post("/api/v1/admin/profile", headers=headers).status_code == 409
+    assert admin.get(f"/api/v1/admin/profile/{session_id}", headers=headers).status_code == 409
+    assert admin.post("/api/v1/admin/profile/stop", headers=headers).json()["id"] == session_id
+    assert admin.post("/api/v1/admin/profile/stop", headers=headers).status_code == 404
+
+    response = admin.get(f"/api/v1/admin/profile/{session_id}", headers=headers)
+    assert response.status_code == 200 and response.headers["content-type"] == "application/zip"
+    assert admin.get("/api/v1/admin/profile/unknown", headers=headers).status_code == 404
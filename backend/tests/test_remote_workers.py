@@ -0,0 +1,68 @@
+import io
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+
+from app.services.detection_service import DetectionService
+from app.services.remote_workers import RemoteRegistry, parse_workers
+
+
+class FakePool:
+    """Most workers serve v1, but the one answering serves v2"""
+
+    def __init__(self, confidence=0.9):
+        self.confidence = confidence
+        self.calls = []
+
+    def serves(self, kind):
+        return True
+
+    def version(self, kind):
+        return "v1"
+
+    def infer(self, kind, frames, **options):
+        self.calls.append((kind, frames.shape, options))
+        return [(True, self.confidence)] * len(frames), "v2"
+
+
+def png(width=64, height=48):
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (120, 30, 200)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def service():
+    service = DetectionService.__new__(DetectionService)
+    service.registries = {"sbi": RemoteRegistry("sbi", FakePool())}
+    return service
+
+
+def test_image_result_reports_the_version_of_the_worker_that_answered(service):
+    result = service._run_registered("sbi", png())
+    assert result == {"is_fake": True, "confidence": 0.9, "status": "active", "version": "v2"}
+    kind, shape, _ = service.registries["sbi"].pool.calls[0]
+    assert kind == "sbi" and shape[0] == 1 and shape[-1] == 3
+
+
+def test_frame_results_report_the_version_of_the_worker_that_answered(service):
+    frames = torch.from_numpy(np.zeros((3, 48, 64, 3), dtype=np.uint8))
+    results = service._run_frames("sbi", frames)
+    assert [result["version"] for result in results] == ["v2"] * 3
+    assert all(result["status"] == "active" for result in results)
+
+
+def test_failed_remote_call_is_an_error_with_the_pool_version(service):
+    def fail(kind, frames, **options):
+        raise RuntimeError("no worker")
+    service.registries["sbi"].pool.infer = fail
+    result = service._run_registered("sbi", png())
+    assert result["status"] == "error" and result["version"] == "v1"
+
+
+def test_parse_workers():
+    assert parse_workers(" 10.0.0.5:8100, https://w2/ ,") == ["http://10.0.0.5:8100", "https://w2"]
+    with pytest.raises(ValueError):
+        parse_workers("ftp://w3")
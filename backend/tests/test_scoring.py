@@ -0,0 +1,174 @@
+import numpy as np
+import pytest
+import torch
+
+from scoring import VideoScorer, aggregate, frame_maxima, stop_early
+
+
+class BrightnessModel(torch.nn.Module):
+    # fake probability grows with the mean brightness of the crop
+    def forward(self, x):
+        m = x.mean(dim=(1, 2, 3))
+        return torch.stack([torch.zeros_like(m), 8 * (m - 0.5)], dim=1)
+
+
+def crops(*levels):
+    return np.stack([np.full((3, 8, 8), level, dtype=np.uint8) for level in levels])
+
+
+def test_frame_maxima_per_frame_and_model():
+    pred = torch.tensor([[0.1, 0.7, 0.3, 0.2], [0.9, 0.4, 0.5, 0.6]])
+    idx = torch.tensor([5, 5, 2, 9])
+    frames, maxima = frame_maxima(pred, idx)
+    assert frames.tolist() == [2, 5, 9]
+    assert torch.allclose(maxima, torch.tensor([[0.3, 0.7, 0.2], [0.5, 0.9, 0.6]]))
+
+
+def test_frame_maxima_single_model():
+    frames, maxima = frame_maxima(torch.tensor([0.2, 0.8, 0.4]), torch.tensor([1, 1, 3]))
+    assert frames.tolist() == [1, 3]
+    assert maxima.tolist() == pytest.approx([0.8, 0.4])
+
+
+@pytest.mark.parametrize("method, expected", [
+    ("mean", 0.5), ("max", 0.9), ("topk", 0.8), ("quantile", 0.84),
+])
+def test_aggregate(method, expected):
+    scores = torch.tensor([[0.1, 0.9, 0.7, 0.3]])
+    assert aggregate(scores, method, k=2, q=0.9).tolist() == pytest.approx([expected])
+
+
+def test_aggregate_topk_with_fewer_frames_than_k():
+    assert aggregate(torch.tensor([0.2, 0.4]), "topk", k=4).item() == pytest.approx(0.3)
+
+
+def test_aggregate_rejects_unknown_method():
+    with pytest.raises(ValueError, match="Unknown aggregation"):
+        aggregate(torch.tensor([0.5]), "median")
+
+
+def test_stop_early_mean_uses_standard_error():
+    assert stop_early([0.9, 0.92, 0.88, 0.91], threshold=0.5, z=1.96)
+    assert not stop_early([0.1, 0.9, 0.2, 0.8], threshold=0.5, z=1.96)
+
+
+def test_stop_early_follows_the_aggregation():
+    # Mostly real frames with a few confidently fake ones: the mean is clearly
+    # below the threshold, but the top-2 average reported for topk is not
+    scores = [0.05, 0.1, 0.08, 0.95, 0.06, 0.07, 0.1, 0.04, 0.09, 0.9, 0.06, 0.08, 0.05, 0.1, 0.07, 0.06]
+    assert stop_early(scores, threshold=0.5, z=1.96, method="mean")
+    assert not stop_early(scores, threshold=0.5, z=1.96, method="topk", k=2)
+    assert stop_early([0.9, 0.95, 0.92, 0.97], threshold=0.5, z=1.96, method="quantile", q=0.9)
+
+
+def test_stop_early_max_only_stops_above_threshold():
+    assert stop_early([0.1, 0.2, 0.6], threshold=0.5, z=1.96, method="max")
+    assert not stop_early([0.1, 0.1, 0.1, 0.1], threshold=0.5, z=1.96, method="max")
+
+
+def test_frame_maxima_single_face():
+    frames, maxima = frame_maxima(torch.tensor([0.3]), torch.tensor([7]))
+    assert frames.tolist() == [7]
+    assert maxima.tolist() == pytest.approx([0.3])
+
+
+def test_frame_maxima_unsorted_sparse_indices():
+    pred = torch.tensor([0.4, 0.1, 0.6, 0.2, 0.9])
+    frames, maxima = frame_maxima(pred, torch.tensor([40, 3, 40, 17, 3]))
+    assert frames.tolist() == [3, 17, 40]
+    assert maxima.tolist() == pytest.approx([0.9, 0.2, 0.6])
+
+
+def test_aggregate_single_frame_is_that_frame():
+    for method in ("mean", "max", "topk", "quantile"):
+        assert aggregate(torch.tensor([0.42]), method).item() == pytest.approx(0.42)
+
+
+def test_aggregate_reduces_each_row():
+    scores = torch.tensor([[0.1, 0.3], [0.5, 0.9]])
+    assert aggregate(scores, "mean").tolist() == pytest.approx([0.2, 0.7])
+    assert aggregate(scores, "quantile", q=0.0).tolist() == pytest.approx([0.1, 0.5])
+    assert aggregate(scores, "quantile", q=1.0).tolist() == pytest.approx([0.3, 0.9])
+
+
+def test_video_scorer_rejects_unknown_aggregation():
+    with pytest.raises(ValueError, match="Unknown aggregation"):
+        VideoScorer(BrightnessModel(), device=torch.device("cpu"), aggregation="median")
+
+
+def test_score_faces_all_without_faces_is_none():
+    scorer = VideoScorer(BrightnessModel(), device=torch.device("cpu"))
+    assert scorer.score_faces_all([], []) is None
+    assert scorer.score_faces(np.zeros((0, 3, 8, 8), dtype=np.uint8), []) is None
+
+
+def test_predict_faces_is_independent_of_batch_size():
+    faces = crops(0, 60, 128, 200, 255)
+    whole = VideoScorer(BrightnessModel(), device=torch.device("cpu"), batch_size=32).predict_faces(faces)
+    split = VideoScorer(BrightnessModel(), device=torch.device("cpu"), batch_size=2).predict_faces(list(faces))
+    assert whole.shape == (5,)
+    assert torch.allclose(whole, split)
+    assert whole.argsort().tolist() == [0, 1, 2, 3, 4]
+
+
+def test_score_faces_uses_per_frame_maxima():
+    scorer = VideoScorer(BrightnessModel(), device=torch.device("cpu"), aggregation="mean")
+    faces = crops(0, 255, 128)
+    pred = scorer.predict_faces(faces)
+    # frame 0 holds a dark and a bright face, frame 1 a grey one
+    expected = (max(pred[0], pred[1]) + pred[2]).item() / 2
+    assert scorer.score_faces(faces, [0, 0, 1]) == pytest.approx(expected)
+
+
+def test_aggregate_counts_repeated_frames_again():
+    scorer = VideoScorer(BrightnessModel(), device=torch.device("cpu"), aggregation="mean")
+    pred = torch.tensor([0.2, 0.8])
+    assert scorer.aggregate(pred, [0, 5]).item() == pytest.approx(0.5)
+    # frames 1-3 were skipped as near-duplicates of frame 5, frame 9 of an unscored frame
+    repeats = {1: 5, 2: 5, 3: 5, 9: 7}
+    assert scorer.aggregate(pred, [0, 5], repeats).item() == pytest.approx((0.2 + 4 * 0.8) / 5)
+
+
+def test_score_video_all_rejects_gate_with_cache():
+    scorer = VideoScorer(BrightnessModel(), device=torch.device("cpu"))
+    with pytest.raises(ValueError, match="frame gate"):
+        scorer.score_video_all("unused.mp4", 4, cache=object(), gate=object())
+
+
+def test_streamed_score_matches_extracted_crops(tmp_path):
+    from bench_video import StubFaceDetector, make_video
+
+    path = str(tmp_path / "clip.avi")
+    make_video(path, 160, 120, 12, codec="MJPG", n_faces=2, seed=3)
+    scorer = VideoScorer(BrightnessModel(), StubFaceDetector(), device=torch.device("cpu"), batch_size=3)
+    face_list, idx_list = scorer.extract(path, 6)
+    assert len(face_list) > 0
+    expected = scorer.score_faces_all(face_list, idx_list)
+    assert scorer.score_video_all(path, 6) == pytest.approx(expected, abs=1e-6)
+
+
+class DarknessModel(BrightnessModel):
+    def forward(self, x):
+        return super().forward(x).flip(1)
+
+
+def test_multi_model_rows_match_single_model_scorers():
+    cpu = torch.device("cpu")
+    faces = crops(10, 90, 180, 250)
+    idx = [0, 0, 3, 6]
+    both = VideoScorer([BrightnessModel(), DarknessModel()], device=cpu, aggregation="topk", k=2, batch_size=3)
+    pred = both.predict_faces_all(faces)
+    assert pred.shape == (2, 4)
+    scores = both.score_faces_all(faces, idx)
+    assert len(scores) == 2
+    for m, model in enumerate([BrightnessModel(), DarknessModel()]):
+        single = VideoScorer(model, device=cpu, aggregation="topk", k=2)
+        assert torch.allclose(pred[m], single.predict_faces(faces))
+        assert scores[m] == pytest.approx(single.score_faces(faces, idx))
+    assert both.score_faces(faces, idx) == pytest.approx(scores[0])
+
+
+def test_multi_model_repeats_apply_to_every_model():
+    scorer = VideoScorer([BrightnessModel(), DarknessModel()], device=torch.device("cpu"))
+    pred = torch.tensor([[0.2, 0.8], [0.6, 0.4]])
+    assert scorer.aggregate(pred, [0, 5], {6: 5, 7: 5}).tolist() == pytest.approx([0.65, 0.45])
@@ -0,0 +1,43 @@
+import time
+from types import SimpleNamespace
+
+import numpy as np
+import torch
+
+from stream import Sample, StreamScorer
+
+
+class FakeDetector:
+    def __init__(self, faces_per_frame):
+        self.faces_per_frame = faces_per_frame
+
+    def predict_jsons(self, frame):
+        return self.faces_per_frame[int(frame[0, 0, 0])]
+
+
+def make_scorer(faces_per_frame):
+    return SimpleNamespace(
+        face_detector=FakeDetector(faces_per_frame),
+        predict_faces=lambda crops: torch.full((len(crops),), 0.8),
+        device=torch.device("cpu"), aggregation="mean", k=4, q=0.9,
+    )
+
+
+def sample(i):
+    frame = np.zeros((64, 64, 3), dtype=np.uint8)
+    frame[0, 0, 0] = i
+    return Sample(t=float(i), index=i, captured=time.monotonic(), frame=frame)
+
+
+def test_update_counts_retinaface_no_face_sentinel_as_no_face():
+    stream = StreamScorer(make_scorer({0: [{"bbox": [], "score": -1}], 1: [{"bbox": [8, 8, 40, 40], "score": 0.9}]}))
+    result = stream.update([sample(0), sample(1)])
+    assert stream.no_face == 1 and stream.failed == 0 and stream.scored == 1
+    assert result["window_frames"] == 1
+    assert abs(result["score"] - 0.8) < 1e-6
+
+
+def test_update_survives_a_frame_that_fails_to_crop():
+    stream = StreamScorer(make_scorer({0: [{"bbox": [8, 8, None, None], "score": 0.9}], 1: [{"bbox": [8, 8, 40, 40], "score": 0.9}]}))
+    stream.update([sample(0), sample(1)])
+    assert stream.failed == 1 and stream.scored == 1
@@ -0,0 +1,90 @@
+import io
+import random
+
+import numpy as np
+import pytest
+
+from app.core.tensor_codec import RAW_HEADER, RAW_MAGIC, decode_frames, encode_frames
+
+
+def npy(array: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, array)
+    return buffer.getvalue()
+
+
+@pytest.fixture
+def frames():
+    return np.random.default_rng(0).integers(0, 256, size=(2, 5, 7, 3), dtype=np.uint8)
+
+
+def test_raw_round_trip(frames):
+    decoded = decode_frames(encode_frames(frames))
+    assert decoded.shape == frames.shape
+    assert np.array_equal(decoded, frames)
+    assert not decoded.flags.writeable  # a view of the body, not a copy
+
+
+@pytest.mark.parametrize("shape", [(5, 7, 3), (2, 5, 7, 3)])
+def test_npy_round_trip(shape):
+    array = np.arange(np.prod(shape), dtype=np.uint8).reshape(shape)
+    decoded = decode_frames(npy(array))
+    assert decoded.shape == (1,) * (4 - len(shape)) + shape
+    assert np.array_equal(decoded.reshape(shape), array)
+
+
+@pytest.mark.parametrize("body, message", [
+    (b"", "Unknown frame format"),
+    (b"GIF89a", "Unknown frame format"),
+    (RAW_MAGIC + b"\x01", "Truncated"),
+    (RAW_HEADER.pack(RAW_MAGIC, 1, 2, 2, 4) + bytes(16), "RGB frames"),
+    (RAW_HEADER.pack(RAW_MAGIC, 0, 2, 2, 3), "Empty"),
+    (RAW_HEADER.pack(RAW_MAGIC, 1, 2, 2, 3) + bytes(5), "needs 12 bytes"),
+    (RAW_HEADER.pack(RAW_MAGIC, 2**32 - 1, 2**32 - 1, 2**32 - 1, 3), "needs"),
+])
+def test_raw_rejects_bad_bodies(body, message):
+    with pytest.raises(ValueError, match=message):
+        decode_frames(body)
+
+
+def test_npy_rejects_wrong_dtype_and_layout(frames):
+    with pytest.raises(ValueError, match="uint8"):
+        decode_frames(npy(frames.astype(np.float32)))
+    with pytest.raises(ValueError, match="Fortran"):
+        decode_frames(npy(np.asfortranarray(frames[0])))
+    with pytest.raises(ValueError, match="RGB frames"):
+        decode_frames(npy(frames[..., :2].copy()))
+
+
+@pytest.mark.parametrize("header", [
+    b"{'descr': '|u1', 'fortran_order': False, 'shape': (2, 2, 3), ",  # unterminated
+    b"[1, 2, 3]",
+    b"{'descr': '|u1'}",
+    b"{'descr': 'nonsense', 'fortran_order': False, 'shape': (1, 1, 3)}",
+    b"{'descr': '|u1', 'fortran_order': False, 'shape': (1, -1, 3)}",
+    b"{'descr': '|u1', 'fortran_order': False, 'shape': 'abc'}",
+    b"\xff\xfe not python",
+])
+def test_npy_rejects_malformed_headers(header):
+    body = b"\x93NUMPY\x01\x00" + len(header).to_bytes(2, "little") + header + bytes(12)
+    with pytest.raises(ValueError):
+        decode_frames(body)
+
+
+def test_truncated_and_garbled_bodies_only_raise_value_error(frames):
+    # Every prefix and a batch of random corruptions of valid bodies
+    rng = random.Random(0)
+    for body in (npy(frames), encode_frames(frames)):
+        for end in range(len(body)):
+            try:
+                decode_frames(body[:end])
+            except ValueError:
+                pass
+        for _ in range(500):
+            garbled = bytearray(body)
+            for _ in range(rng.randint(1, 8)):
+                garbled[rng.randrange(min(len(garbled), 128))] = rng.randrange(256)
+            try:
+                decode_frames(bytes(garbled))
+            except ValueError:
+                pass
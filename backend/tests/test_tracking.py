@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+
+from bench_video import StubFaceDetector, make_video
+from tracking import FaceTracker, box_iou, compare_tracking
+
+NO_FACE = [{"bbox": [], "score": -1}]  # RetinaFace's empty result
+
+
+class BoxDetector:
+    """Returns the true box of each frame and counts its calls"""
+
+    def __init__(self):
+        self.truth = {}
+        self.calls = 0
+
+    def predict_jsons(self, frame):
+        self.calls += 1
+        bbox = self.truth.get(id(frame))
+        return NO_FACE if bbox is None else [{"bbox": bbox, "score": 0.99}]
+
+
+def textured_frames(n, step=(3, 2), size=(160, 200), seed=0):
+    # A noise "face" sliding over a noise background; template matching
+    # needs texture to lock on to
+    rng = np.random.default_rng(seed)
+    background = rng.integers(0, 256, size + (3,), dtype=np.uint8)
+    face = rng.integers(0, 256, (40, 32, 3), dtype=np.uint8)
+    for i in range(n):
+        x, y = 40 + step[0] * i, 30 + step[1] * i
+        frame = background.copy()
+        frame[y:y + 40, x:x + 32] = face
+        yield frame, [float(x), float(y), float(x + 32), float(y + 40)]
+
+
+def run(tracker, detector, frames):
+    boxes = []
+    for frame, bbox in frames:
+        detector.truth[id(frame)] = bbox
+        boxes.append((tracker.update(frame), bbox))
+    return boxes
+
+
+def test_box_iou():
+    assert box_iou([0, 0, 10, 10], [0, 0, 10, 10]) == 1
+    assert box_iou([0, 0, 10, 10], [5, 0, 15, 10]) == pytest.approx(1 / 3)
+    assert box_iou([0, 0, 10, 10], [20, 20, 30, 30]) == 0
+    assert box_iou([0, 0, 0, 0], [0, 0, 0, 0]) == 0
+
+
+def test_detector_runs_on_keyframes_only_and_boxes_follow_the_face():
+    detector = BoxDetector()
+    tracker = FaceTracker(detector, keyframe_interval=4)
+    boxes = run(tracker, detector, textured_frames(12))
+    assert detector.calls == tracker.detector_calls == 3
+    assert tracker.stats() == {"frames": 12, "detector_calls": 3, "saved_calls": 9, "redetect_lost": 0, "redetect_cut": 0}
+    for faces, truth in boxes:
+        assert len(faces) == 1
+        assert box_iou(faces[0]["bbox"], truth) > 0.8
+
+
+def test_lost_track_redetects():
+    detector = BoxDetector()
+    tracker = FaceTracker(detector, keyframe_interval=8)
+    frames = list(textured_frames(2))
+    # The face is replaced by something else where the tracker looks for it
+    changed = frames[1][0].copy()
+    changed[30:90, 40:90] = np.random.default_rng(1).integers(0, 256, (60, 50, 3), dtype=np.uint8)
+    run(tracker, detector, frames + [(changed, None)])
+    assert tracker.redetect_lost == 1
+    assert tracker.detector_calls == 2
+
+
+def test_scene_cut_redetects():
+    detector = BoxDetector()
+    tracker = FaceTracker(detector, keyframe_interval=8)
+    frames = list(textured_frames(3))
+    cut = np.full_like(frames[0][0], 255)
+    run(tracker, detector, frames[:2] + [(cut, None)])
+    assert tracker.redetect_cut == 1
+    assert tracker.detector_calls == 2
+
+
+def test_no_face_sentinel_is_dropped_and_retried_every_frame():
+    detector = BoxDetector()
+    tracker = FaceTracker(detector, keyframe_interval=8)
+    frames = [(frame, None) for frame, _ in textured_frames(3)]
+    assert [faces for faces, _ in run(tracker, detector, frames)] == [[], [], []]
+    assert tracker.detector_calls == 3  # nothing to track, so every frame detects
+
+
+def test_settings_round_trip():
+    tracker = FaceTracker(None, keyframe_interval=5, min_score=0.4)
+    assert FaceTracker(None, **tracker.settings()).settings() == tracker.settings()
+
+
+def test_compare_tracking_reports_savings_and_drift(tmp_path):
+    path = str(tmp_path / "faces.avi")
+    try:
+        make_video(path, 320, 240, 48, codec="MJPG", n_faces=1, seed=3)
+    except ValueError:
+        pytest.skip("MJPG is not available in this OpenCV build")
+    report = compare_tracking(path, 24, StubFaceDetector(min_area=200), keyframe_interval=6)
+    assert report["frames"] == 24
+    assert report["detector_calls"] < report["frames"]
+    assert report["saved_calls"] == report["frames"] - report["detector_calls"]
+    assert report["mean_iou"] > 0.7
+    assert report["min_iou"] <= report["mean_iou"]
+    assert 0 <= report["mean_center_drift"] < 0.2
+
+
+def test_compare_tracking_on_an_unreadable_video(tmp_path):
+    report = compare_tracking(str(tmp_path / "missing.mp4"), 8, StubFaceDetector())
+    assert report["frames"] == 0
+    assert report["mean_iou"] is None and report["mean_center_drift"] is None
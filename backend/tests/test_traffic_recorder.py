@@ -0,0 +1,158 @@
+import hashlib
+import io
+import json
+import os
+import threading
+
+import pytest
+from openai.types.chat import ChatCompletion
+from PIL import Image
+
+from app.cli.replay import completion, load_archive
+from app.models.chatgpt_vision import _compute_fake_prob
+from app.services import traffic_recorder as recorder_module
+from app.services.traffic_recorder import IMAGES_DIR, REQUESTS_FILE, TrafficRecorder, image_signature
+
+
+def jpeg(width=640, height=480) -> bytes:
+    buffer = io.BytesIO()
+    Image.new("RGB", (width, height), (200, 40, 40)).save(buffer, format="JPEG")
+    return buffer.getvalue()
+
+
+def fields(**overrides):
+    return {"started": 0.0, "latency_ms": 12.5, "status": 200, "models": None, "priority": "interactive", **overrides}
+
+
+def test_image_signature_reads_the_header_only():
+    signature = image_signature(jpeg())
+    assert (signature["format"], signature["width"], signature["height"], signature["mode"]) == ("JPEG", 640, 480, "RGB")
+    assert image_signature(b"not an image")["format"] is None
+
+
+def test_disabled_recorder_never_samples(tmp_path):
+    assert not TrafficRecorder("", 1.0).sample()
+    assert not TrafficRecorder(str(tmp_path), 0).sample()
+
+
+def test_sampling_stops_at_the_cap(tmp_path):
+    recorder = TrafficRecorder(str(tmp_path), 1.0, max_requests=2)
+    for _ in range(2):
+        assert recorder.sample()
+        recorder.submit(jpeg(), **fields())
+    recorder.close()
+    assert recorder.recorded == 2
+    assert not recorder.sample()
+
+
+def test_cap_covers_an_earlier_recording(tmp_path):
+    with open(tmp_path / REQUESTS_FILE, "w") as f:
+        f.write("{}\n{}\n{}\n")
+    assert TrafficRecorder(str(tmp_path), 1.0, max_requests=4).recorded == 3
+    assert not TrafficRecorder(str(tmp_path), 1.0, max_requests=3).sample()
+
+
+def test_sample_rate_is_respected(tmp_path, monkeypatch):
+    draws = iter([0.01, 0.5, 0.2, 0.9])
+    monkeypatch.setattr(recorder_module.random, "random", lambda: next(draws))
+    recorder = TrafficRecorder(str(tmp_path), 0.25)
+    assert [recorder.sample() for _ in range(4)] == [True, False, True, False]
+
+
+def test_full_queue_drops_samples_instead_of_blocking(tmp_path, monkeypatch):
+    recorder = TrafficRecorder(str(tmp_path), 1.0, queue_size=1)
+    writing, release = threading.Event(), threading.Event()
+    record = recorder._record
+
+    def slow_record(image_bytes, fields):
+        writing.set()
+        release.wait(5)
+        return record(image_bytes, fields)
+
+    monkeypatch.setattr(recorder, "_record", slow_record)
+    recorder.submit(jpeg(), **fields(status=200))  # taken by the writer, which stalls
+    assert writing.wait(5)
+    recorder.submit(jpeg(), **fields(status=429))  # fills the queue
+    recorder.submit(jpeg(), **fields(status=400))  # dropped
+    assert recorder.dropped == 1
+    release.set()
+    recorder.close()
+    assert recorder.stats()["recorded"] == 2
+    assert [record["status"] for record in load_archive(str(tmp_path))] == [200, 429]
+
+
+def test_signature_mode_stores_no_image_contents(tmp_path):
+    recorder = TrafficRecorder(str(tmp_path), 1.0)
+    recorder.submit(jpeg(), **fields())
+    recorder.close()
+    (record,) = load_archive(str(tmp_path))
+    assert "thumbnail" not in record["image"]
+    assert os.listdir(tmp_path / IMAGES_DIR) == []
+
+
+def test_downscaled_mode_writes_one_thumbnail_per_image(tmp_path):
+    recorder = TrafficRecorder(str(tmp_path), 1.0, images="downscaled", thumbnail_side=64)
+    image = jpeg(640, 480)
+    recorder.submit(image, **fields())
+    recorder.submit(image, **fields())
+    recorder.submit(b"not an image", **fields(status=400))
+    recorder.close()
+
+    records = load_archive(str(tmp_path))
+    thumbnail = records[0]["image"]["thumbnail"]
+    assert thumbnail == records[1]["image"]["thumbnail"] == f"{records[0]['image']['sha256']}.jpg"
+    assert "thumbnail" not in records[2]["image"]
+    assert os.listdir(tmp_path / IMAGES_DIR) == [thumbnail]
+    with Image.open(tmp_path / IMAGES_DIR / thumbnail) as saved:
+        assert saved.size == (64, 48)
+    # The record keeps the original's signature, not the thumbnail's
+    assert (records[0]["image"]["width"], records[0]["image"]["height"]) == (640, 480)
+
+
+def test_unknown_image_mode_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        TrafficRecorder(str(tmp_path), 1.0, images="full")
+
+
+@pytest.mark.parametrize("confidence", [0.05, 0.3, 0.5, 0.65, 0.8, 0.95])
+def test_replayed_completion_decodes_to_the_recorded_confidence(confidence):
+    response = ChatCompletion.model_validate(completion(confidence, "gpt-test"))
+    first = response.choices[0].logprobs.content[0]
+    assert _compute_fake_prob(first) == pytest.approx(confidence, abs=1e-6)
+
+
+def test_replayed_completion_without_a_confidence_is_uncertain():
+    response = ChatCompletion.model_validate(completion(None, "gpt-test"))
+    assert _compute_fake_prob(response.choices[0].logprobs.content[0]) == pytest.approx(0.5)
+
+
+def test_archive_lines_round_trip(tmp_path):
+    recorder = TrafficRecorder(str(tmp_path), 1.0)
+    recorder.submit(jpeg(), **fields(model_ms={"chatgpt": 812.0}, gpt_confidence=0.71))
+    recorder.close()
+    with open(tmp_path / REQUESTS_FILE) as f:
+        (line,) = f.read().splitlines()
+    assert json.loads(line)["gpt_confidence"] == 0.71
+
+
+def test_detect_records_the_upload_as_received(tmp_path, monkeypatch):
+    from fastapi import FastAPI
+    from fastapi.testclient import TestClient
+
+    from app.api.v1.endpoints import detection
+
+    recorder = TrafficRecorder(str(tmp_path), 1.0)
+    monkeypatch.setattr(detection, "traffic_recorder", recorder)
+    app = FastAPI()
+    app.include_router(detection.router, prefix="/api/v1")
+    image = jpeg()
+    with TestClient(app) as client:
+        assert client.post("/api/v1/detect?models=sbi", files={"file": ("a.jpg", image, "image/jpeg")}).status_code == 200
+        assert client.post("/api/v1/detect?models=sbi", files={"file": ("a.txt", b"hi", "text/plain")}).status_code == 400
+    recorder.close()
+
+    accepted, rejected = load_archive(str(tmp_path))
+    assert accepted["image"]["sha256"] == hashlib.sha256(image).hexdigest()
+    assert (accepted["status"], accepted["content_type"], accepted["models"]) == (200, "image/jpeg", ["sbi"])
+    assert accepted["model_status"]["sbi"] == "placeholder"
+    assert (rejected["status"], rejected["content_type"], rejected["image"]["bytes"]) == (400, "text/plain", 0)
@@ -9,7 +9,8 @@ export default function ModelResultCard({ modelKey, modelResult }) {
   const confidencePercent = confidence * 100;
   const isFake = confidencePercent >= (THRESHOLD[modelKey] * 100);
   const isError = modelResult.status === 'error';
-  const isPlaceholder = modelResult.status === 'placeholder';
+  // "dropped": not run because the backend was shedding load
+  const isPlaceholder = modelResult.status === 'placeholder' || modelResult.status === 'dropped';
 
   // Determine badge styling
   let badge;